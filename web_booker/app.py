@@ -1,5 +1,30 @@
 """
 变更记录（手动维护）:
+- 2026-10-18 StateSampler 改定长环形桶：300 个按秒槽位各存定宽状态计数向量（同秒以最后一次为准）并维护滚动合计，ingest 与过期只碰单个槽，snapshot 不再合并 300 个 dict；get_matrix 按 (shop, token 指纹, 日期) 喂入，与上一轮比较得各状态流入/流出，/api/state-sampler 新增 transitions_per_min（近 60 秒折算），近一分钟流入达 STATE_SAMPLER_RECOMMEND_MIN_INFLOW_PER_MIN 的状态也推荐为 locked
+- 2026-10-18 结构化日志事件 log_event(分类, 事件, level, **fields)：调用线程只取时间戳/tid 追加一个元组，LOG_EVENT_RENDERER 后台按 LOG_EVENT_FORMATS 渲染成与原来相同的行再进内存缓冲/推送/落盘（_LogSink 按行首时间排序落盘）；submit_delivery_campaign / submit_interval_post_campaign 每次 POST/重试/每轮矩阵的日志与 get_matrix 调试输出改走事件，不再即时拼 items 列表；log_category_levels 按分类设 off|info|debug，未配置的随 verbose_logs
+- 2026-10-18 结构化日志查询：LOG_BUFFER 元素改为 LogRecord(seq, ts, tid, refill_id, level, text)，/api/logs 支持 since_seq 增量（format=records 返回 last_seq/gap；since_seq 超过当前 seq 即重启后重新计数时 gap/reset 为真并返回整个缓冲）与 start/end/tid/refill_id/level/kw 过滤，window_min 按记录时间戳比较不再逐行 strptime；按天日志文件由 LOG_FILE_INDEX 建稀疏时间索引（每 LOG_FILE_INDEX_STRIDE_BYTES 一个行首偏移，文件变长只扫新增部分），/api/logs/file 支持 tail/before 向前翻页与 cursor/limit 向后分页，不带参数时整文件分块流式下发，诊断导出只读文件尾部，均不再 readlines 整个文件
+- 2026-10-18 前端静态包：index.html 内联的 CSS/JS 拆到 static/app.css、static/app.js，STATIC_ASSETS 启动时按内容 md5 打指纹并预压 gzip，经 /assets/<名>.<md5>.<后缀> 下发（Cache-Control 一年 immutable + ETag）；主页面按 (page_mode, 当天) 记忆渲染、带 ETag 回源 304，每页只注入 BEIJINTICK_BOOT（page_mode/今天）小引导数据；启动冒烟渲染顺带预热四个页面
+- 2026-10-18 实时推送 /api/events（SSE）：LIVE_EVENTS 给日志行、refill 任务状态、全局暂停、静默窗口切换、矩阵增量统一编单调递增 id，有界缓冲内按 Last-Event-ID 续传（断档发 reset）；状态类事件由后台线程按秒比对签名、仅有订阅者时运行，矩阵增量仅有订阅者时计算；前端全局暂停横幅改订阅推送（本地倒计时），不再每秒轮询
+- 2026-10-18 mine 覆盖与 get_matrix 解耦：每账号一份 MineOrderIndex（(日期, 场地, 时段) → billNum），get_matrix(include_mine_overlay=True) 只查表标 mine，不再同步翻 getPlaceOrder；索引过期（MINE_INDEX_MAX_AGE_SECONDS）时后台增量刷新（整页与索引一致即停，定期/作废后全量），递送与全量间隔 POST 受理都先乐观记入、取消成功先删除并作废；meta 带 mine_index_age_ms，诊断导出含统计
+- 2026-10-18 多账号矩阵共享 MATRIX_SHARE：余量与账号无关，只读路径（/api/matrix、mine-overview 对账）以 build_client_for_account(acc, matrix_share=True) 建的客户端按 (馆方地址, shop_num, 日期) 共用基础矩阵 GET（single-flight 总是等在途请求、已完成结果发出后 matrix_share_max_age_ms 内复用且不超过 delivery_plan_max_age_seconds；bypass_cache 只取本客户端未见过的新一轮；别人那次失败自己重拉），mine 覆盖仍按账号各查各的；抢票/refill/手动预订 POST 前的矩阵 GET 一律带本账号 token 自己发，matrix_share_max_age_ms 默认 0。run_metric 记 matrix_shared_count，诊断导出含统计
+- 2026-10-18 refill_tasks.json 改为写后合并 + 原子落盘（DebouncedJsonWriter）：save_refill_tasks 只置脏，后台静默 REFILL_PERSIST_DEBOUNCE_SECONDS 后（最多拖 REFILL_PERSIST_MAX_DELAY_SECONDS）取快照写一次，临时文件 fsync 后 os.replace，旧版留 .bak；加载时主文件缺失/损坏自动从 .tmp/.bak 恢复。接口增删改同步落盘，「执行中」状态不再触发写盘也不落盘（快照里沿用该任务上一次落盘的结果），退出时 flush
+- 2026-10-18 任务指标改为只追加的 NDJSON 分段存储 RUN_METRICS_STORE（task_run_metrics/seg_*.ndjson，满 METRICS_SEGMENT_MAX_RECORDS 条换段）：写一条只 append 一行，内存索引（时间/任务/来源/解锁标记 + 文件偏移）支撑 /api/run-metrics、/api/run-metrics/export 与诊断导出按需读取；保留天数/条数在读取时即生效，过期段删除与半数过期段重写由后台压缩完成；旧 task_run_metrics.json 首次加载时导入并改名 .migrated
+- 2026-10-18 get_matrix 解析单遍化：响应 bytes 直接 json.loads（不再经 resp.json 编码探测），project_place_array 一遍只取 shortname/starttime/state 写矩阵并顺带统计 state 计数喂 STATE_SAMPLER.ingest_counts（state 映射按原值缓存，CourtMatrix 状态码按字符串缓存），debug_states 仅 verbose 时收集；meta 带 parse_ms / response_bytes，递送 run_metric 记 matrix_parse_ms_total / matrix_response_bytes_total
+- 2026-10-18 服务器时钟同步 SERVER_CLOCK：所有馆方响应的 Date 头作样本，按「Date 秒跳变」区间求交（RTT 过滤、最新优先、时钟跳变自动丢旧样本）得亚秒级时差与不确定度；定时任务唤醒前 clock_sync_lead_seconds 内后台按二分相位发 HEAD 探测收紧区间。ApiClient 时差与日志前缀统一取它，execute_task 开抢时刻按 +不确定度 - 单程时延发首个 POST，run_metric.clock_sync 记录
+- 2026-10-18 自动任务定时改为 PreciseTaskScheduler：最小堆按服务器对齐时间排各任务唤醒点（触发时刻 - task_fire_lead_seconds，legacy 预热开启时取预热窗口；预热探针在开抢前 delivery_min_post_interval_seconds + 1s 内停发，不破坏 POST 间隔），Condition 等待 + 最后 scheduler_spin_window_ms 自旋；execute_task 到开抢时刻同样 sleep+spin，run_metric 记 fire_error_ms / scheduler_wake_error_ms。schedule 库只剩健康检查
+- 2026-10-18 独立 refill 改由 RefillExecutor 执行：调度 tick 只判定到期并入队，有界 worker 池（refill_worker_pool_size）并发跑各任务，同任务在途不重复触发、同账号并发上限 refill_per_account_concurrency、按账号轮转取任务；手动执行 1 轮同走执行池，诊断导出含统计
+- 2026-10-18 通知后台发送 NotificationDispatcher：send_notification / send_wechat_notification 默认只入队（任务结果、refill 截止、健康检查不再等短信宝/PushPlus），worker 池发送、传输失败退避重试、同内容去重与仅数字不同的排队消息合并，诊断导出含统计；测试短信 wait=True 仍同步
+- 2026-10-18 双线路 gym_line_mode：fastest=未指定 gym_connect_ip 的账号按实测 RTT/错误率（GymLineStats，来自真实矩阵 GET 与 POST）选线（POST 只按分数选，轮测另一线只由矩阵 GET 承担）；race=矩阵 GET 双线同时发取先回者；run_metric.gym_line_latency 为各线路时延直方图，/api/gym-sessions 附 gym_lines
+- 2026-10-18 log() 只做格式化+入队：LOG_BUFFER 改 deque(maxlen)，控制台与按天文件由 _LogSink 后台线程攒批写（常驻句柄、跨天换文件并清理、队列满丢最旧并计数，诊断导出含统计）；读日志文件前 flush
+- 2026-10-18 benchmarks/：关键路径基准（fieldinfo/下单 body/合法分批/run 合并/各求解模式/refill 分层/get_matrix 解析），固定 20 场×14 小时矩阵与多组任务，输出 µs/op 与 tracemalloc 分配，--save/--compare 基线对比回退
+- 2026-10-18 离线模拟器 tools/gym_simulator.py：本地仿 getPlaceInfoByShortName / reservationPlace / getPlaceOrder（售罄曲线、「操作过快」限流、按日志拟合时延：POST 时延取 run_metric 新增的 post_latencies_ms，即单次 reservationPlace elapsed_ms）；ApiClient.gym_base_url（环境变量 BEIJINTICK_GYM_BASE_URL）指向它，bench 子命令离线对比两种递送的首个受理耗时与抢到格数
+- 2026-10-18 solve_candidate_from_matrix 新增 mode=exact：按时段可订位掩码精确求总格数最大（同 S 按 _score_items 择优），返回结构不变；delivery_solver_exact（任务 config 可覆盖全局，执行参数页可改）开启后首组算场与自动递送 refill 使用
+- 2026-10-18 求解档位表 LRU（SOLVER_PLAN_CACHE / cached_level_plan）：降级/单调/按总和枚举的 level_spec 按（时段顺序、上限、块数/缺口）缓存为只读结构，run_metric 记 solver_plan_cache_hit_count / miss_count
+- 2026-10-18 矩阵增量 diff_court_matrices（get_matrix 可选 delta_base）：递送循环 refill 与独立 refill 在上轮无解、缺口不变且相关格无「变为可订」时跳过求解（refill_solve_skipped_count）
+- 2026-10-18 CourtMatrix：get_matrix 的 matrix 字段为紧凑状态码数组（场地×时段，bytes）+ 下标表，仍是只读 dict 视图；求解器（solve_candidate_from_matrix / compute_first_group_from_matrix / mine_places_by_time_from_matrix / 散号与 refill 分层）直接按下标与按时段缓存的可订场地查询
+- 2026-10-18 get_matrix 结果冻结为只读 FrozenDict 并与缓存共享，命中不再 json.dumps/json.loads 深拷贝；需改动走 thaw_matrix_result（tools/bench_matrix_cache.py 对比单次命中耗时）
+- 2026-10-18 递送引擎 delivery_engine=pipelined：主单/补缺 POST 在途时后台预拉下一轮矩阵（按发起时刻计保鲜，已受理格叠加为 booked），省掉回包后的矩阵 RTT（这一批受理即达标时不预拉，计 pipelined_matrix_prefetch_skipped_count；全量间隔 POST 的 prewarm 仍阻塞到首个 POST 之前）；默认 sequential 不变
+- 2026-10-18 进程级账号会话池 GymSessionRegistry：build_client_for_account 复用同账号 Session（域名+双线路各一 keep-alive 池），空闲回收/连续传输失败重建，/api/gym-sessions 观测
 - 2026-04-07 多账号 gym_connect_ip：按账号强制 TCP 连接北外双线路公网 IP（TLS SNI/Host 仍为 gymvip.bfsu.edu.cn）；基础配置-账号信息可选 114.247.63.124 / 60.247.76.34 或留空走 DNS
 - 2026-04-04 手动 /api/book：默认关闭 verify_pending 深度复核（manual_deep_reconcile_enabled）；响应 gym_message_raw；首单同批软重试内不再检查 plan 保鲜
 - 2026-04-04 已订总览 /api/mine-overview：以 getPlaceOrder 为主；订单分页截断且矩阵 mine 更多时，按同账号矩阵补展示（mine_matrix_backfill=1）
@@ -25,7 +50,7 @@
 - 2026-03-31 log() 互斥、毫秒时间戳、tid 前缀；/api/logs 时间窗解析兼容毫秒
 """
 
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response
 from jinja2 import Environment, TemplateSyntaxError
 import requests
 import json
@@ -38,17 +63,21 @@ import schedule
 import time
 import threading
 import os
+import atexit
+import bisect
 import logging
 import hashlib
+import gzip
 import html
 import re
 import random
 import secrets
 import itertools
+import heapq
 import builtins
 import copy
-from collections import deque
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from collections import deque, OrderedDict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
 from contextlib import contextmanager
 from dataclasses import dataclass
 from requests.adapters import HTTPAdapter
@@ -57,6 +86,8 @@ from requests.adapters import HTTPAdapter
 GYM_API_TARGET_HOST = "gymvip.bfsu.edu.cn"
 GYM_API_LINE_IPS = ("114.247.63.124", "60.247.76.34")
 GYM_API_LINE_IP_SET = frozenset(GYM_API_LINE_IPS)
+# 离线回放/压测：设 BEIJINTICK_GYM_BASE_URL=http://127.0.0.1:8765 时所有馆方请求改发本地模拟器（tools/gym_simulator.py）
+GYM_API_BASE_URL_ENV = "BEIJINTICK_GYM_BASE_URL"
 
 
 def timestamped_print(*args, **kwargs):
@@ -73,53 +104,164 @@ print = timestamped_print
 HEALTH_CHECK_NEXT_RUN = None
 
 
+# state 采样：计数窗口（秒）、迁移速率窗口（秒）、状态列数（超出的状态值并入 -999 列）、按 (shop, 日期) 记上一轮计数的 key 上限
+STATE_SAMPLER_WINDOW_SECONDS = 300
+STATE_SAMPLER_RATE_WINDOW_SECONDS = 60
+STATE_SAMPLER_MAX_STATES = 16
+STATE_SAMPLER_MAX_KEYS = 64
+# 近一分钟流入某状态的格子数达到此值也推荐为 locked（开放瞬间的锁定态在 5 分钟累计里占比很低）
+STATE_SAMPLER_RECOMMEND_MIN_INFLOW_PER_MIN = 3
+
+
+class _SecondRing:
+    """按秒的定长环形桶：每槽一个定宽计数向量，维护窗口 (now-seconds, now] 内的合计；写入与过期只碰单个槽。"""
+
+    def __init__(self, seconds, width):
+        self.seconds = max(1, int(seconds))
+        self.width = int(width)
+        self.totals = [0] * self.width
+        self.live = 0
+        self._sec = [None] * self.seconds
+        self._vec = [[0] * self.width for _ in range(self.seconds)]
+        self._evicted_to = None
+
+    def _clear(self, i):
+        vec = self._vec[i]
+        self.totals = [t - v for t, v in zip(self.totals, vec)]
+        self._vec[i] = [0] * self.width
+
+    def evict(self, now_sec):
+        lo = now_sec - self.seconds + 1
+        start = self._evicted_to
+        if start is None or lo - start >= self.seconds:
+            # 首次或整窗都已过期：直接清空
+            if start is not None and self.live:
+                self.totals = [0] * self.width
+                self._sec = [None] * self.seconds
+                self._vec = [[0] * self.width for _ in range(self.seconds)]
+                self.live = 0
+            self._evicted_to = lo
+            return
+        for sec in range(start, lo):
+            i = sec % self.seconds
+            if self._sec[i] == sec:
+                self._clear(i)
+                self._sec[i] = None
+                self.live -= 1
+        self._evicted_to = max(start, lo)
+
+    def add(self, sec, vec, replace=False):
+        """把 vec 计入 sec 所在槽；replace=True 时同一秒以最后一次为准。"""
+        self.evict(sec)
+        i = sec % self.seconds
+        if self._sec[i] != sec:
+            self._sec[i] = sec
+            self.live += 1
+        elif replace:
+            self._clear(i)
+        self._vec[i] = [a + b for a, b in zip(self._vec[i], vec)]
+        self.totals = [a + b for a, b in zip(self.totals, vec)]
+
+
 class StateSampler:
-    """按秒聚合 state 分布（仅计数）并给出 locked 推荐。"""
+    """
+    按秒聚合 state 分布（仅计数）并给出 locked 推荐。
+    计数为 STATE_SAMPLER_WINDOW_SECONDS 个槽的环形数组（每槽定宽状态计数向量，同一秒以最后一次为准）+ 滚动合计，
+    ingest / 过期 / snapshot 都与窗口长度无关。带 key（shop, 日期）喂入时与该 key 上一轮比较，
+    各状态的增减记作流入/流出，给出近 STATE_SAMPLER_RATE_WINDOW_SECONDS 秒折算的每分钟迁移速率。
+    """
 
-    def __init__(self):
+    def __init__(self, window_s=STATE_SAMPLER_WINDOW_SECONDS, rate_window_s=STATE_SAMPLER_RATE_WINDOW_SECONDS,
+                 max_states=STATE_SAMPLER_MAX_STATES):
         self._lock = threading.Lock()
-        self._bucket = {}
-        self._max_buckets = 300
+        self._max_states = max(2, int(max_states))
+        self._cols = {-999: 0}
+        self._col_states = [-999]
+        self._counts = _SecondRing(window_s, self._max_states)
+        self._flow_in = _SecondRing(rate_window_s, self._max_states)
+        self._flow_out = _SecondRing(rate_window_s, self._max_states)
+        self._last_by_key = OrderedDict()
+
+    def _col(self, state):
+        col = self._cols.get(state)
+        if col is None:
+            if len(self._col_states) >= self._max_states:
+                return 0
+            col = len(self._col_states)
+            self._cols[state] = col
+            self._col_states.append(state)
+        return col
 
-    def ingest(self, raw_list):
-        now_sec = int(time.time())
+    def ingest(self, raw_list, key=None):
         counts = {}
         for place in raw_list or []:
             for slot in place.get('projectInfo', []) or []:
                 try:
-                    key = int(slot.get('state'))
+                    key_state = int(slot.get('state'))
                 except Exception:
-                    key = -999
-                counts[key] = counts.get(key, 0) + 1
+                    key_state = -999
+                counts[key_state] = counts.get(key_state, 0) + 1
+        self.ingest_counts(counts, key=key)
+
+    def ingest_counts(self, counts, key=None):
+        """已在解析时顺带统计好的 {state: 次数}（get_matrix 单遍解析用），不再二次遍历 placeArray。"""
+        now_sec = int(time.monotonic())
         with self._lock:
-            self._bucket[now_sec] = counts
-            stale_before = now_sec - self._max_buckets
-            for ts in list(self._bucket.keys()):
-                if ts < stale_before:
-                    self._bucket.pop(ts, None)
+            vec = [0] * self._max_states
+            for state, cnt in (counts or {}).items():
+                vec[self._col(state)] += int(cnt)
+            self._counts.add(now_sec, vec, replace=True)
+            if key is None:
+                return
+            prev = self._last_by_key.pop(key, None)
+            self._last_by_key[key] = vec
+            if len(self._last_by_key) > STATE_SAMPLER_MAX_KEYS:
+                self._last_by_key.popitem(last=False)
+            if prev is None:
+                return
+            inflow = [max(0, a - b) for a, b in zip(vec, prev)]
+            outflow = [max(0, b - a) for a, b in zip(vec, prev)]
+            if any(inflow):
+                self._flow_in.add(now_sec, inflow)
+            if any(outflow):
+                self._flow_out.add(now_sec, outflow)
 
     def snapshot(self):
+        now_sec = int(time.monotonic())
         with self._lock:
-            data = dict(self._bucket)
-        merged = {}
-        for v in data.values():
-            for s, c in v.items():
-                merged[s] = merged.get(s, 0) + int(c)
+            for ring in (self._counts, self._flow_in, self._flow_out):
+                ring.evict(now_sec)
+            states = list(self._col_states)
+            totals = list(self._counts.totals)
+            flow_in = list(self._flow_in.totals)
+            flow_out = list(self._flow_out.totals)
+            seconds = self._counts.live
+            rate_scale = 60.0 / self._flow_in.seconds
+
+        merged = {states[j]: n for j, n in enumerate(totals[:len(states)]) if n}
+        transitions = {
+            states[j]: {"in": round(flow_in[j] * rate_scale, 2), "out": round(flow_out[j] * rate_scale, 2)}
+            for j in range(len(states))
+            if flow_in[j] or flow_out[j]
+        }
 
         available_count = merged.get(1, 0)
+        threshold = max(5, int(available_count * 0.05))
         locked_recommend = []
         for state, cnt in sorted(merged.items(), key=lambda x: (-x[1], x[0])):
             if state in (1, 4, -999):
                 continue
             if cnt <= 0:
                 continue
-            if cnt >= max(5, int(available_count * 0.05)):
+            inflow = transitions.get(state, {}).get("in", 0)
+            if cnt >= threshold or inflow >= STATE_SAMPLER_RECOMMEND_MIN_INFLOW_PER_MIN:
                 locked_recommend.append(state)
 
         return {
-            'seconds': len(data),
+            'seconds': seconds,
             'states': merged,
             'recommended_locked_states': locked_recommend,
+            'transitions_per_min': transitions,
         }
 
 
@@ -426,6 +568,7 @@ CONFIG = {
     "health_check_interval_min": 30.0, # 检查间隔（分钟）
     "health_check_start_time": "00:00", # 起始时间 (HH:MM)
     "verbose_logs": False,  # 是否打印高频调试日志
+    "log_category_levels": {},  # 结构化日志分类级别 {分类: off|info|debug}（delivery / interval_post / matrix），未配置的随 verbose_logs
     "log_to_file": True,  # 是否将运行日志按天写入文件，便于次日查看
     "log_file_dir": "logs",  # 日志文件目录，相对工作目录
     "log_retention_days": 3,  # 日志文件保留最近 N 天，超过自动删除，0=不清理
@@ -435,6 +578,28 @@ CONFIG = {
     "transient_storm_extend_timeout_after": 3,  # 连续失败 >= 此数时使用 matrix_timeout_storm_seconds
     "metrics_keep_last": 300,  # 统一观测文件最大保留条数
     "metrics_retention_days": 7,  # 统一观测文件保留天数
+    # 进程级账号会话池：空闲回收秒数、每线路 keep-alive 连接上限、连续传输失败多少次后重建会话
+    "gym_session_idle_evict_seconds": 900,
+    "gym_session_pool_maxsize": 4,
+    "gym_session_unhealthy_error_streak": 3,
+    # 递送引擎：sequential=拉矩阵→POST 串行；pipelined=POST 在途时后台预拉下一轮矩阵
+    "delivery_engine": "sequential",
+    # 双线路：pinned=按账号 gym_connect_ip（留空走 DNS）；fastest=未指定线路的账号按实测最快线路发请求；
+    # race=在 fastest 基础上矩阵 GET 同时发两条线路取先回者。某线路超过 probe 秒数无样本时轮它一次保持热连接
+    "gym_line_mode": "pinned",
+    "gym_line_probe_interval_seconds": 5,
+    # 独立 refill 执行池：worker 数；同一账号同时在跑的 refill 任务上限（馆方按账号限流，默认 1 即同账号串行）
+    "refill_worker_pool_size": 4,
+    "refill_per_account_concurrency": 1,
+    # 自动任务定时：提前多少秒唤醒（建 client、预热连接），开抢前最后多少毫秒改自旋等待以保证触发精度
+    "task_fire_lead_seconds": 3,
+    "scheduler_spin_window_ms": 300,
+    # 服务器时钟同步：定时任务唤醒前多少秒开始后台探测；RTT 超过该值的 Date 样本不参与估计
+    "clock_sync_enabled": True,
+    "clock_sync_lead_seconds": 120,
+    "clock_sync_max_rtt_ms": 800,
+    # 多账号矩阵共享：同馆同日期的矩阵 GET 一次供各账号共用，结果发出后多少毫秒内可复用（0=不共享；另受 delivery_plan_max_age_seconds 限制）
+    "matrix_share_max_age_ms": 0,
     # Web 管理界面登录（可选，建议在 config.secret.json 中开启并填写用户名密码）
     "web_ui_auth": {"enabled": False, "username": "", "password": ""},
     # Flask 会话签名密钥，仅写入 config.secret.json；缺失时启动自动生成
@@ -470,6 +635,8 @@ CONFIG = {
     "delivery_monotone_total_downgrade": True,
     # aggressive / refill 单调缺口：在可行前提下按总格数 Σk 最大，同 S 内全 level_spec 枚举后取 _score_items 最优；关则保留单调档位表 + 自上而下第一可行
     "delivery_solver_max_total_cells": True,
+    # 首组算场与自动递送 refill（单调缺口）改用 solve_candidate_from_matrix(mode="exact") 位掩码精确求解
+    "delivery_solver_exact": False,
     "manual_submit_profile": "manual_minimal",
     "auto_submit_profile": "auto_minimal",
     "submit_profiles": {
@@ -809,6 +976,15 @@ def _merge_task_venue_strategy(task_config, primary_items):
     return out
 
 
+DELIVERY_ENGINE_MODES = ("sequential", "pipelined")
+
+
+def get_delivery_engine_mode():
+    """递送引擎（全局执行参数）：sequential=拉矩阵→算场→POST 串行；pipelined=POST 在途时后台预拉下一轮矩阵。"""
+    m = str(CONFIG.get("delivery_engine") or "").strip().lower()
+    return m if m in DELIVERY_ENGINE_MODES else "sequential"
+
+
 def get_task_delivery_mode(task_config):
     """任务递送模式：缺省 matrix（与旧 tasks.json 兼容）。interval_post=全量间隔 POST。"""
     if not isinstance(task_config, dict):
@@ -1112,6 +1288,7 @@ def validate_required_execution_config(cfg):
         "delivery_solver_aggressive_best_tier",
         "delivery_monotone_total_downgrade",
         "delivery_solver_max_total_cells",
+        "delivery_solver_exact",
     ):
         if bk not in cfg or cfg.get(bk) is None:
             continue
@@ -1171,19 +1348,43 @@ DEPRECATED_EXEC_PARAM_KEYS = frozenset({
     "max_places_per_timeslot",
     "delivery_refill_max_places_per_timeslot",
 })
-LOG_BUFFER = []
 MAX_LOG_SIZE = 500
+# 内存日志环形缓冲：元素为 LogRecord，seq 进程内单调递增，供 /api/logs?since_seq= 增量拉取
+LogRecord = namedtuple("LogRecord", "seq ts tid refill_id level text")
+LOG_BUFFER = deque(maxlen=MAX_LOG_SIZE)
 _LOG_IO_LOCK = threading.Lock()
-# 行首 `[HH:MM:SS` 或 `[HH:MM:SS.mmm`（与 log() 输出一致，供 window_min 解析）
-_LOG_LINE_TIME_HEAD = re.compile(r"^\[(\d{2}:\d{2}:\d{2})(?:\.\d{1,6})?\]")
-# 与 client.server_time_offset_seconds 同步，供 log() 前缀估计服务器时间（HTTP Date）
+_LOG_SEQ = 0
+# 日志后台落地：待写队列上限（满了丢最旧并计数）、攒批等待、单批上限
+LOG_SINK_QUEUE_MAX = 20000
+LOG_SINK_FLUSH_INTERVAL_S = 0.2
+LOG_SINK_BATCH_MAX = 512
+# 行首 `[HH:MM:SS.mmm] tid=xxx| `（与 log() 输出一致，供日志文件按时间/任务过滤）
+_LOG_LINE_HEAD = re.compile(r"^\[(\d{2}:\d{2}:\d{2}(?:\.\d{1,6})?)\] (?:tid=([^|]*)\| )?")
+_LOG_REFILL_TAG = re.compile(r"\[refill#([^|\]\s]+)[|\]]")
+# 日志文件稀疏时间索引：每隔多少字节记一个 (行首时间, 偏移)；分页/尾部单次最多返回行数；整文件下载分块大小
+LOG_FILE_INDEX_STRIDE_BYTES = 64 * 1024
+LOG_QUERY_MAX_LINES = 5000
+LOG_FILE_STREAM_CHUNK_BYTES = 64 * 1024
+# 由 SERVER_CLOCK 维护的服务器时差估计，供 log() 前缀估计服务器时间（HTTP Date）
 _LOG_TIME_OFFSET_SECONDS = 0.0
+# 服务器时钟同步：样本保留窗口、样本上限、后台探测目标不确定度与单个唤醒窗口内最多探测次数
+CLOCK_SYNC_WINDOW_SECONDS = 900
+CLOCK_SYNC_MAX_SAMPLES = 256
+CLOCK_SYNC_TARGET_UNCERTAINTY_MS = 15.0
+CLOCK_SYNC_BURST_MAX_PROBES = 24
+CLOCK_SYNC_PROBE_PATH = "easyserp/index.html"
 MAX_TARGET_COUNT = 9
 REFILL_TASKS_FILE = os.path.join(BASE_DIR, "refill_tasks.json")
+# refill_tasks.json 写后合并：最后一次修改后静默多少秒落盘；持续修改时最多拖多少秒
+REFILL_PERSIST_DEBOUNCE_SECONDS = 1.0
+REFILL_PERSIST_MAX_DELAY_SECONDS = 5.0
 REFILL_SCHEDULER_STATE_FILE = os.path.join(BASE_DIR, "refill_scheduler_state.json")
 REFILL_GLOBAL_PAUSE_MINUTES_DEFAULT = 5
+# 旧版整文件 JSON（仅首次加载时导入分段存储）；新记录写 TASK_RUN_METRICS_DIR 下的 seg_*.ndjson
 TASK_RUN_METRICS_FILE = os.path.join(BASE_DIR, "task_run_metrics.json")
-_TASK_RUN_METRICS_LOCK = threading.Lock()
+TASK_RUN_METRICS_DIR = os.path.join(BASE_DIR, "task_run_metrics")
+METRICS_SEGMENT_MAX_RECORDS = 200
+METRICS_COMPACT_MIN_INTERVAL_SECONDS = 60.0
 # 独立 Refill 结构化诊断（NDJSON，与一键导出诊断包联动）
 DIAGNOSTIC_REFILL_NDJSON_FILE = os.path.join(BASE_DIR, "diagnostic_refill.ndjson")
 # 独立 refill 任务结构化诊断（NDJSON，与一键导出诊断包联动）
@@ -1200,45 +1401,313 @@ def _percentile(sorted_values, p):
     return float(sorted_values[idx])
 
 
-def append_task_run_metric(record, keep_last=None, retention_days=None):
-    try:
-        with _TASK_RUN_METRICS_LOCK:
-            old = []
-            if os.path.exists(TASK_RUN_METRICS_FILE):
+def _run_metric_ts_ms(rec):
+    if not isinstance(rec, dict):
+        return 0
+    for k in ('finished_at', 'started_at', 'ts'):
+        v = rec.get(k)
+        if v is None:
+            continue
+        try:
+            return int(v)
+        except Exception:
+            continue
+    return 0
+
+
+def _run_metric_limits(keep_last=None, retention_days=None):
+    """(保留条数, 最早保留时间 ms)：metrics_keep_last / metrics_retention_days。"""
+    keep_last_val = max(50, min(5000, int(keep_last if keep_last is not None else CONFIG.get('metrics_keep_last', 300) or 300)))
+    retention_days_val = max(1, min(30, int(retention_days if retention_days is not None else CONFIG.get('metrics_retention_days', 7) or 7)))
+    return keep_last_val, int((time.time() - retention_days_val * 24 * 3600) * 1000)
+
+
+@dataclass
+class _RunMetricRef:
+    ts_ms: int
+    task_id: str
+    source: str
+    unlock: bool
+    segment: str
+    offset: int
+    length: int
+
+
+class RunMetricsStore:
+    """
+    任务指标只追加存储：目录下 seg_00000001.ndjson 起按序分段，每行一条记录。
+
+    - append 只在当前段末尾写一行（满 METRICS_SEGMENT_MAX_RECORDS 条换新段），不再读改写整个历史
+    - 内存索引记每条的时间、task_id、来源、是否「锁定→解锁」与文件偏移；读取先按索引筛再按偏移取原文
+    - 保留口径（天数 + 最近条数）在读取时即生效；过期数据的删除/重写由后台压缩线程做，不阻塞写入方
+    """
+
+    def __init__(
+        self,
+        directory=TASK_RUN_METRICS_DIR,
+        legacy_file=TASK_RUN_METRICS_FILE,
+        segment_max_records=METRICS_SEGMENT_MAX_RECORDS,
+        auto_compact=True,
+    ):
+        self.directory = directory
+        self.legacy_file = legacy_file
+        self._segment_max = max(1, int(segment_max_records))
+        self._auto_compact = bool(auto_compact)
+        self._lock = threading.RLock()
+        self._refs = None
+        self._active = None
+        self._active_count = 0
+        self._last_compact_mono = 0.0
+        self._compact_wakeup = threading.Event()
+        self._compact_limits = (None, None)
+        self._compact_thread = None
+        self._stats = {"appended": 0, "compactions": 0, "segments_deleted": 0, "segments_rewritten": 0, "records_dropped": 0}
+
+    @staticmethod
+    def _ref_for(rec, segment, offset, length):
+        return _RunMetricRef(
+            ts_ms=_run_metric_ts_ms(rec),
+            task_id=str(rec.get('task_id')),
+            source=str(rec.get('source') or 'auto').lower(),
+            unlock=bool(rec.get('saw_locked')) and bool(rec.get('unlocked_after_locked')),
+            segment=segment,
+            offset=offset,
+            length=length,
+        )
+
+    def _segment_path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _segment_names(self):
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        return sorted(n for n in names if n.startswith("seg_") and n.endswith(".ndjson"))
+
+    def _scan_segment(self, name, truncate_partial=False):
+        refs = []
+        path = self._segment_path(name)
+        good_end = 0
+        with open(path, "rb") as f:
+            offset = 0
+            for raw in f:
+                length = len(raw)
+                if not raw.endswith(b"\n"):
+                    break
                 try:
-                    with open(TASK_RUN_METRICS_FILE, 'r', encoding='utf-8') as f:
-                        old = json.load(f) or []
-                except Exception:
-                    old = []
-            if not isinstance(old, list):
-                old = []
-
-            old.append(record)
-
-            keep_last_val = max(50, min(5000, int(keep_last if keep_last is not None else CONFIG.get('metrics_keep_last', 300) or 300)))
-            retention_days_val = max(1, min(30, int(retention_days if retention_days is not None else CONFIG.get('metrics_retention_days', 7) or 7)))
-            cutoff_ms = int((time.time() - retention_days_val * 24 * 3600) * 1000)
-
-            def _ts_ms(rec):
-                if not isinstance(rec, dict):
-                    return 0
-                for k in ('finished_at', 'started_at', 'ts'):
-                    v = rec.get(k)
-                    if v is None:
+                    rec = json.loads(raw)
+                except ValueError:
+                    rec = None
+                if isinstance(rec, dict):
+                    refs.append(self._ref_for(rec, name, offset, length))
+                offset += length
+                good_end = offset
+        if truncate_partial and os.path.getsize(path) != good_end:
+            # 上次进程在写一行途中退出：截掉半行，后续追加不会粘连
+            with open(path, "r+b") as f:
+                f.truncate(good_end)
+        return refs
+
+    def _ensure_loaded_locked(self):
+        if self._refs is not None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        refs = []
+        names = self._segment_names()
+        for i, name in enumerate(names):
+            try:
+                refs.extend(self._scan_segment(name, truncate_partial=(i == len(names) - 1)))
+            except OSError:
+                continue
+        self._refs = refs
+        if names:
+            self._active = names[-1]
+            self._active_count = sum(1 for r in refs if r.segment == self._active)
+        self._import_legacy_locked()
+
+    def _import_legacy_locked(self):
+        if not self.legacy_file or not os.path.exists(self.legacy_file):
+            return
+        try:
+            with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                old = json.load(f) or []
+        except Exception:
+            old = []
+        for rec in old if isinstance(old, list) else []:
+            if isinstance(rec, dict):
+                self._append_locked(rec)
+        try:
+            os.replace(self.legacy_file, self.legacy_file + ".migrated")
+        except OSError:
+            pass
+
+    def _next_segment_name(self):
+        last = self._active or ""
+        try:
+            seq = int(last[4:12]) + 1 if last else 1
+        except ValueError:
+            seq = len(self._segment_names()) + 1
+        return f"seg_{seq:08d}.ndjson"
+
+    def _append_locked(self, record):
+        if self._active is None or self._active_count >= self._segment_max:
+            self._active = self._next_segment_name()
+            self._active_count = 0
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with open(self._segment_path(self._active), "ab") as f:
+            offset = f.tell()
+            f.write(line)
+        self._refs.append(self._ref_for(record, self._active, offset, len(line)))
+        self._active_count += 1
+        self._stats["appended"] += 1
+
+    def append(self, record, keep_last=None, retention_days=None):
+        if not isinstance(record, dict):
+            return
+        with self._lock:
+            self._ensure_loaded_locked()
+            self._append_locked(record)
+            rotated = self._active_count == 1
+        if self._auto_compact and (
+            rotated or time.monotonic() - self._last_compact_mono >= METRICS_COMPACT_MIN_INTERVAL_SECONDS
+        ):
+            self._schedule_compaction(keep_last, retention_days)
+
+    def _live_refs_locked(self, keep_last=None, retention_days=None):
+        keep_last_val, cutoff_ms = _run_metric_limits(keep_last, retention_days)
+        live = [r for r in self._refs if r.ts_ms >= cutoff_ms]
+        return live[-keep_last_val:]
+
+    def _read_refs(self, refs):
+        out = []
+        handles = {}
+        try:
+            for ref in refs:
+                f = handles.get(ref.segment)
+                if f is None:
+                    try:
+                        f = handles[ref.segment] = open(self._segment_path(ref.segment), "rb")
+                    except OSError:
                         continue
+                f.seek(ref.offset)
+                try:
+                    rec = json.loads(f.read(ref.length))
+                except ValueError:
+                    continue
+                if isinstance(rec, dict):
+                    out.append(rec)
+        finally:
+            for f in handles.values():
+                f.close()
+        return out
+
+    def query(self, limit=None, task_id=None, source=None, unlock_only=False):
+        """保留口径内、按写入顺序（旧→新）的最近 limit 条；task_id / source / unlock_only 走索引筛选。"""
+        with self._lock:
+            self._ensure_loaded_locked()
+            refs = self._live_refs_locked()
+            if task_id is not None:
+                refs = [r for r in refs if r.task_id == str(task_id)]
+            if source in ('auto', 'manual'):
+                refs = [r for r in refs if r.source == source]
+            if unlock_only:
+                refs = [r for r in refs if r.unlock]
+            if limit is not None:
+                refs = refs[-max(0, int(limit)):] if int(limit) > 0 else []
+            return self._read_refs(refs)
+
+    def _schedule_compaction(self, keep_last=None, retention_days=None):
+        with self._lock:
+            self._compact_limits = (keep_last, retention_days)
+            if self._compact_thread is None or not self._compact_thread.is_alive():
+                self._compact_thread = threading.Thread(target=self._compact_loop, name="metrics-compact", daemon=True)
+                self._compact_thread.start()
+        self._compact_wakeup.set()
+
+    def _compact_loop(self):
+        while True:
+            self._compact_wakeup.wait()
+            self._compact_wakeup.clear()
+            try:
+                self.compact(*self._compact_limits)
+            except Exception as e:
+                print(f"⚠️ 任务指标压缩失败: {e}")
+
+    def compact(self, keep_last=None, retention_days=None):
+        """删除全部过期的非当前段；过期过半的非当前段只保留有效行重写。"""
+        with self._lock:
+            self._ensure_loaded_locked()
+            self._last_compact_mono = time.monotonic()
+            live_ids = {id(r) for r in self._live_refs_locked(keep_last, retention_days)}
+            by_segment = OrderedDict()
+            for ref in self._refs:
+                by_segment.setdefault(ref.segment, []).append(ref)
+            kept = []
+            for name, refs in by_segment.items():
+                live = [r for r in refs if id(r) in live_ids]
+                dead = len(refs) - len(live)
+                if name == self._active or dead == 0 or (live and dead * 2 < len(refs)):
+                    kept.extend(refs)
+                    continue
+                path = self._segment_path(name)
+                if not live:
                     try:
-                        return int(v)
-                    except Exception:
+                        os.remove(path)
+                    except OSError:
+                        kept.extend(refs)
                         continue
-                return 0
+                    self._stats["segments_deleted"] += 1
+                else:
+                    lines = []
+                    with open(path, "rb") as f:
+                        for r in live:
+                            f.seek(r.offset)
+                            lines.append(f.read(r.length))
+                    tmp = path + ".tmp"
+                    with open(tmp, "wb") as f:
+                        offset = 0
+                        for r, raw in zip(live, lines):
+                            f.write(raw)
+                            r.offset = offset
+                            offset += len(raw)
+                    os.replace(tmp, path)
+                    kept.extend(live)
+                    self._stats["segments_rewritten"] += 1
+                self._stats["records_dropped"] += dead
+            self._refs = kept
+            self._stats["compactions"] += 1
+
+    def stats(self):
+        with self._lock:
+            self._ensure_loaded_locked()
+            return {
+                **self._stats,
+                "indexed_records": len(self._refs),
+                "segments": len({r.segment for r in self._refs}),
+                "active_segment": self._active,
+            }
+
 
-            old = [r for r in old if _ts_ms(r) >= cutoff_ms]
-            old = old[-keep_last_val:]
-            with open(TASK_RUN_METRICS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(old, f, ensure_ascii=False, indent=2)
+RUN_METRICS_STORE = RunMetricsStore()
+
+
+def append_task_run_metric(record, keep_last=None, retention_days=None):
+    """追加一条任务指标；keep_last / retention_days 覆盖本次触发的后台压缩口径（默认取 CONFIG）。"""
+    try:
+        RUN_METRICS_STORE.append(record, keep_last=keep_last, retention_days=retention_days)
     except Exception as e:
         print(f"⚠️ 任务指标写入失败: {e}")
 
+
+def load_task_run_metrics(limit=None, task_id=None, source=None, unlock_only=False):
+    """读取保留口径内的任务指标（旧→新）；读取失败返回空列表。"""
+    try:
+        return RUN_METRICS_STORE.query(limit=limit, task_id=task_id, source=source, unlock_only=unlock_only)
+    except Exception as e:
+        print(f"⚠️ 任务指标读取失败: {e}")
+        return []
+
 TRANSPORT_ERROR_EVENTS_MAX = 30
 METRICS_LATENCY_SAMPLES_KEEP = 80
 
@@ -1303,73 +1772,777 @@ def record_matrix_fetch_failure(run_metric, phase, err_msg, elapsed_ms=None):
     append_transport_error_event(run_metric, phase, b, str(err_msg or "")[:200], elapsed_ms)
 
 
-def _log_timestamp_str():
-    dt = datetime.now() + timedelta(seconds=float(_LOG_TIME_OFFSET_SECONDS or 0.0))
+def _log_now_ts():
+    """log() 行首使用的时间戳（本机时间 + 估计服务器时差），epoch 秒。"""
+    return time.time() + float(_LOG_TIME_OFFSET_SECONDS or 0.0)
+
+
+def _log_timestamp_str(ts=None):
+    dt = datetime.fromtimestamp(_log_now_ts() if ts is None else ts)
     return dt.strftime("%H:%M:%S") + f".{dt.microsecond // 1000:03d}"
 
 
 def _snapshot_log_buffer():
     with _LOG_IO_LOCK:
-        return list(LOG_BUFFER)
+        return [rec.text for rec in LOG_BUFFER]
 
 
-def _log_line_naive_datetime_for_window(line, now_dt):
-    """从行首解析当日墙钟时间，供 window_min 过滤；无法解析返回 None。"""
-    m = _LOG_LINE_TIME_HEAD.match(line or "")
-    if not m:
-        return None
-    t = datetime.strptime(m.group(1), "%H:%M:%S").time()
-    cur = now_dt.replace(hour=t.hour, minute=t.minute, second=t.second, microsecond=0)
-    if cur > now_dt:
-        cur = cur - timedelta(days=1)
-    return cur
+def _log_level_of(text):
+    if "❌" in text or "Traceback" in text:
+        return "error"
+    if "⚠️" in text:
+        return "warn"
+    return "info"
+
+
+def _log_refill_id_of(text):
+    if "[refill#" not in text:
+        return ""
+    m = _LOG_REFILL_TAG.search(text)
+    return m.group(1) if m else ""
+
+
+def _log_filter_match(flt, ts_str, tid, refill_id, level, text):
+    """
+    flt 为 _log_query_filters 的结果；ts_str 为行首 HH:MM:SS.mmm，start/end 为 HH:MM 或 HH:MM:SS，
+    按同长度前缀做字符串比较（end 含端点），不做时间解析。
+    """
+    start = flt.get("start")
+    if start and ts_str[:len(start)] < start:
+        return False
+    end = flt.get("end")
+    if end and ts_str[:len(end)] > end:
+        return False
+    if flt.get("tid") and tid != flt["tid"]:
+        return False
+    if flt.get("refill_id") and refill_id != flt["refill_id"]:
+        return False
+    if flt.get("level") and level not in flt["level"]:
+        return False
+    if flt.get("kw") and flt["kw"] not in text.lower():
+        return False
+    return True
+
+
+def _log_query_filters(args):
+    """从请求参数取公共过滤条件：tid / refill_id / level（逗号分隔）/ status_kw|kw / start / end。"""
+    flt = {}
+    for key in ("tid", "refill_id"):
+        val = (args.get(key) or "").strip()
+        if val:
+            flt[key] = val
+    levels = [x.strip().lower() for x in (args.get("level") or "").split(",") if x.strip()]
+    if levels:
+        flt["level"] = frozenset(levels)
+    kw = (args.get("kw") or args.get("status_kw") or "").strip().lower()
+    if kw:
+        flt["kw"] = kw
+    for key in ("start", "end"):
+        val = (args.get(key) or "").strip()
+        if val:
+            if not re.match(r"^\d{2}:\d{2}(:\d{2})?$", val):
+                raise ValueError(f"参数 {key} 需为 HH:MM 或 HH:MM:SS")
+            flt[key] = val
+    return flt
+
+
+def query_log_records(flt=None, since_seq=0, since_ts=None, limit=None):
+    """
+    查询内存环形缓冲：返回 (records, last_seq, gap)。since_seq 之后的记录按 seq 升序；
+    gap=True 表示 since_seq 之后有记录已被挤出缓冲（调用方应改查日志文件或整体重拉）；
+    since_seq 比当前 last_seq 还大（进程重启后 seq 从 0 重新计）时同样 gap=True，并按 since_seq=0 返回整个缓冲。
+    """
+    flt = flt or {}
+    with _LOG_IO_LOCK:
+        records = list(LOG_BUFFER)
+        last_seq = _LOG_SEQ
+    if since_seq and since_seq > last_seq:
+        return query_log_records(flt, since_seq=0, since_ts=since_ts, limit=limit)[0], last_seq, True
+    gap = bool(since_seq) and bool(records) and records[0].seq > since_seq + 1
+    if since_seq:
+        # seq 连续递增：直接按差值定位起点
+        skip = since_seq - records[0].seq + 1 if records else 0
+        records = records[max(0, skip):]
+    out = []
+    for rec in records:
+        if since_ts is not None and rec.ts < since_ts:
+            continue
+        if flt and not _log_filter_match(flt, rec.text[1:13], rec.tid, rec.refill_id, rec.level, rec.text):
+            continue
+        out.append(rec)
+    if limit is not None and len(out) > limit:
+        out = out[-limit:]
+    return out, last_seq, gap
+
+
+def _log_dir_path():
+    log_dir = (CONFIG.get("log_file_dir") or "logs").strip() or "logs"
+    if not os.path.isabs(log_dir):
+        log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), log_dir)
+    return log_dir
+
+
+def _sort_log_lines_by_time(lines):
+    """按行首 HH:MM:SS.mmm 稳定排序（log_event 的行由后台渲染、提交略晚）；有行无时间前缀或跨零点时保持原序。"""
+    keys = []
+    for line in lines:
+        if line[:1] != "[" or line[13:14] != "]":
+            return lines
+        keys.append(line[1:13])
+    if all(keys[i] <= keys[i + 1] for i in range(len(keys) - 1)):
+        return lines
+    if min(keys)[:2] == "00" and max(keys)[:2] == "23":
+        return lines
+    return [lines[i] for i in sorted(range(len(lines)), key=keys.__getitem__)]
+
+
+class _LogSink:
+    """
+    日志后台落地：log() 只入队，后台线程攒批写控制台与按天文件。
+    待写队列有界（满了丢最旧行并计 dropped）；文件句柄常驻，跨天时换到新的 run_YYYYMMDD.log
+    并按 log_retention_days 清理旧文件。flush() 供读日志文件的接口与退出前等待落盘。
+    """
+
+    def __init__(self, maxlen=LOG_SINK_QUEUE_MAX, flush_interval_s=LOG_SINK_FLUSH_INTERVAL_S, batch_max=LOG_SINK_BATCH_MAX):
+        self._maxlen = max(1, int(maxlen))
+        self._flush_interval_s = max(0.0, float(flush_interval_s))
+        self._batch_max = max(1, int(batch_max))
+        self._pending = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._flush_requested = False
+        self._enqueued = 0
+        self._processed = 0
+        self._dropped = 0
+        self._dropped_reported = 0
+        self._written = 0
+        self._batches = 0
+        self._fh = None
+        self._fh_date = ""
+        self._fh_dir = ""
+        self._last_purge_date = ""
+
+    def enqueue(self, line):
+        with self._cond:
+            if len(self._pending) >= self._maxlen:
+                self._pending.popleft()
+                self._dropped += 1
+            self._pending.append(line)
+            self._enqueued += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="log-sink", daemon=True)
+                self._thread.start()
+            if len(self._pending) >= self._batch_max:
+                self._cond.notify_all()
+
+    def flush(self, timeout=2.0):
+        """等已入队的行写完（含控制台与文件）；超时返回 False。"""
+        deadline = time.monotonic() + max(0.0, float(timeout))
+        with self._cond:
+            target = self._enqueued
+            while self._processed + self._dropped < target:
+                if self._thread is None or not self._thread.is_alive():
+                    return False
+                self._flush_requested = True
+                self._cond.notify_all()
+                remain = deadline - time.monotonic()
+                if remain <= 0:
+                    return False
+                self._cond.wait(remain)
+        return True
+
+    def stats(self):
+        with self._cond:
+            return {
+                "pending": len(self._pending),
+                "enqueued": self._enqueued,
+                "written": self._written,
+                "dropped": self._dropped,
+                "batches": self._batches,
+                "file_date": self._fh_date,
+            }
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._pending:
+                    self._cond.wait()
+                if len(self._pending) < self._batch_max and not self._flush_requested and self._flush_interval_s > 0:
+                    self._cond.wait(self._flush_interval_s)
+                batch = _sort_log_lines_by_time(list(self._pending))
+                self._pending.clear()
+                self._flush_requested = False
+                dropped_new = self._dropped - self._dropped_reported
+                self._dropped_reported = self._dropped
+            if dropped_new > 0:
+                batch.append(f"[{_log_timestamp_str()}] ⚠️ [日志] 待写队列已满，丢弃最旧 {dropped_new} 行")
+            try:
+                self._write_batch(batch)
+            except Exception as e:
+                builtins.print(f"⚠️ 写日志失败: {e}")
+            with self._cond:
+                self._processed += len(batch) - (1 if dropped_new > 0 else 0)
+                self._written += len(batch)
+                self._batches += 1
+                self._cond.notify_all()
+
+    def _write_batch(self, batch):
+        text = "\n".join(batch)
+        builtins.print(text, flush=True)
+        if not CONFIG.get("log_to_file"):
+            self._close_file()
+            return
+        try:
+            fh = self._file_for_today()
+            fh.write(text + "\n")
+            fh.flush()
+        except Exception as e:
+            self._close_file()
+            builtins.print(f"⚠️ 写日志文件失败: {e}")
+
+    def _close_file(self):
+        if self._fh is not None:
+            try:
+                self._fh.close()
+            except Exception:
+                pass
+        self._fh = None
+        self._fh_date = ""
+
+    def _file_for_today(self):
+        # 按天落盘，明天仍可查看今天的运行日志；跨天或改目录时换文件，可选保留最近 N 天
+        today_str = datetime.now().strftime("%Y%m%d")
+        log_dir = _log_dir_path()
+        if self._fh is not None and self._fh_date == today_str and self._fh_dir == log_dir:
+            return self._fh
+        self._close_file()
+        os.makedirs(log_dir, exist_ok=True)
+        self._fh = open(os.path.join(log_dir, f"run_{today_str}.log"), "a", encoding="utf-8")
+        self._fh_date = today_str
+        self._fh_dir = log_dir
+        if self._last_purge_date != today_str:
+            self._last_purge_date = today_str
+            self._purge_old_files(log_dir)
+        return self._fh
+
+    def _purge_old_files(self, log_dir):
+        try:
+            retention_days = int(CONFIG.get("log_retention_days", 3) or 0)
+        except (TypeError, ValueError):
+            retention_days = 0
+        if retention_days <= 0:
+            return
+        try:
+            cutoff = (datetime.now() - timedelta(days=retention_days)).strftime("%Y%m%d")
+            for name in os.listdir(log_dir):
+                if name.startswith("run_") and name.endswith(".log") and len(name) == 15:
+                    if name[4:12] < cutoff:
+                        p = os.path.join(log_dir, name)
+                        if os.path.isfile(p):
+                            os.remove(p)
+        except Exception:
+            pass
+
+
+_LOG_SINK = _LogSink()
+atexit.register(_LOG_SINK.flush, 2.0)
+
+
+class LogFileIndex:
+    """
+    按天日志文件（run_YYYYMMDD.log）的稀疏时间索引与分段读取：每隔 stride_bytes 在行首记一个 (HH:MM:SS.mmm, 偏移)，
+    文件变长时只扫新增字节续建（变短视为重建）。读取按索引点切段，一次只读一段：
+    - read_page：从 cursor（或按 start 定位到的索引点）向后分页，返回 next_cursor
+    - tail：从文件尾（或 before 偏移）逐段向前取最后 n 条匹配行，返回 prev_cursor 供继续向前翻
+    - iter_chunks：整文件分块下发
+    任一路径都不会把整个文件读进内存。没有时间前缀的续行归属上一条记录。
+    """
+
+    def __init__(self, stride_bytes=LOG_FILE_INDEX_STRIDE_BYTES):
+        self._stride = max(1, int(stride_bytes))
+        self._lock = threading.Lock()
+        self._files = {}
+
+    def _refresh(self, path):
+        """返回 (索引点列表, 已索引到的偏移)；已索引区只含完整行。"""
+        size = os.path.getsize(path)
+        with self._lock:
+            st = self._files.get(path)
+            if st is None or size < st["indexed"]:
+                st = {"indexed": 0, "entries": []}
+                self._files[path] = st
+            if size > st["indexed"]:
+                entries = st["entries"]
+                off = st["indexed"]
+                with open(path, "rb") as f:
+                    f.seek(off)
+                    while off < size:
+                        raw = f.readline()
+                        if not raw.endswith(b"\n"):
+                            break
+                        if not entries or off - entries[-1][1] >= self._stride:
+                            m = _LOG_LINE_HEAD.match(raw[:64].decode("utf-8", "replace"))
+                            if m:
+                                entries.append((m.group(1), off))
+                        off += len(raw)
+                st["indexed"] = off
+            return list(st["entries"]), st["indexed"]
+
+    @staticmethod
+    def _scan(f, start_off, end_off, flt):
+        """读 [start_off, end_off) 一段，返回 (偏移, 字节数, 所属记录时间, 是否匹配, 行文本) 列表。"""
+        f.seek(start_off)
+        data = f.read(max(0, end_off - start_off))
+        rows = []
+        off = start_off
+        ts_str = ""
+        matched = not flt
+        for raw in data.splitlines(keepends=True):
+            text = raw.decode("utf-8", "replace").rstrip("\r\n")
+            m = _LOG_LINE_HEAD.match(text)
+            if m:
+                ts_str = m.group(1)
+                matched = not flt or _log_filter_match(
+                    flt, ts_str, m.group(2) or "", _log_refill_id_of(text), _log_level_of(text), text
+                )
+            rows.append((off, len(raw), ts_str, matched, text))
+            off += len(raw)
+        return rows
+
+    def read_page(self, path, flt=None, cursor=None, limit=500):
+        flt = flt or {}
+        entries, end_off = self._refresh(path)
+        offsets = [o for _ts, o in entries]
+        if cursor is None:
+            cursor = 0
+            start = flt.get("start")
+            if start and entries:
+                # 最后一个早于 start 的索引点再退一个，容忍多线程写入的毫秒级乱序
+                idx = 0
+                for i, (ts_str, _o) in enumerate(entries):
+                    if ts_str[:len(start)] >= start:
+                        break
+                    idx = i
+                cursor = offsets[max(0, idx - 1)]
+        cursor = max(0, min(int(cursor), end_off))
+        end = flt.get("end")
+        lines = []
+        off = cursor
+        past_end = False
+        with open(path, "rb") as f:
+            while off < end_off and not past_end and len(lines) < limit:
+                i = bisect.bisect_right(offsets, off)
+                seg_end = offsets[i] if i < len(offsets) else end_off
+                for line_off, nbytes, ts_str, matched, text in self._scan(f, off, seg_end, flt):
+                    if end and ts_str and ts_str[:len(end)] > end:
+                        past_end = True
+                        break
+                    if matched:
+                        if len(lines) >= limit:
+                            break
+                        lines.append(text)
+                    off = line_off + nbytes
+        return {
+            "lines": lines,
+            "cursor": cursor,
+            "next_cursor": None if past_end or off >= end_off else off,
+        }
+
+    def tail(self, path, flt=None, n=200, before=None):
+        flt = flt or {}
+        entries, end_off = self._refresh(path)
+        stop_off = end_off if before is None else max(0, min(int(before), end_off))
+        ts_at = {o: ts_str for ts_str, o in entries}
+        starts = sorted({0} | {o for o in ts_at if o < stop_off})
+        bounds = starts + [stop_off]
+        start = flt.get("start")
+        picked = []
+        more = False
+        with open(path, "rb") as f:
+            for i in range(len(starts) - 1, -1, -1):
+                if bounds[i] >= bounds[i + 1]:
+                    continue
+                rows = self._scan(f, bounds[i], bounds[i + 1], flt)
+                picked = [(row[0], row[4]) for row in rows if row[3]] + picked
+                if len(picked) > n:
+                    more = True
+                    break
+                seg_ts = ts_at.get(bounds[i])
+                if start and seg_ts and seg_ts[:len(start)] < start:
+                    break
+        picked = picked[-n:] if n > 0 else []
+        return {
+            "lines": [text for _o, text in picked],
+            "prev_cursor": picked[0][0] if more and picked else None,
+        }
+
+    def iter_chunks(self, path, chunk_bytes=LOG_FILE_STREAM_CHUNK_BYTES):
+        _entries, end_off = self._refresh(path)
+        with open(path, "rb") as f:
+            remain = end_off
+            while remain > 0:
+                data = f.read(min(chunk_bytes, remain))
+                if not data:
+                    break
+                remain -= len(data)
+                yield data
+
+    def stats(self):
+        with self._lock:
+            return {
+                "files": len(self._files),
+                "index_points": sum(len(st["entries"]) for st in self._files.values()),
+                "indexed_bytes": sum(st["indexed"] for st in self._files.values()),
+            }
+
+
+LOG_FILE_INDEX = LogFileIndex()
+
+
+def log_file_path_for(date_str):
+    return os.path.join(_log_dir_path(), f"run_{date_str}.log")
+
+# 实时推送（/api/events）：事件环形缓冲条数、同时连接上限、攒批间隔、心跳间隔、状态轮询间隔
+LIVE_EVENT_BUFFER_SIZE = 2000
+LIVE_EVENT_MAX_SUBSCRIBERS = 8
+LIVE_EVENT_BATCH_SECONDS = 0.1
+LIVE_EVENT_KEEPALIVE_SECONDS = 15.0
+LIVE_STATE_POLL_SECONDS = 1.0
+LIVE_EVENT_TYPES = ("log", "refill", "pause", "quiet", "matrix")
+
+
+class LiveEventHub:
+    """
+    /api/events 的事件源：所有事件（日志行、refill 状态、全局暂停、静默窗口、矩阵增量）共用一个单调递增 id，
+    存在有界环形缓冲里，断线重连按 Last-Event-ID 续传；落在缓冲之外的断点回 reset 让前端整体重拉。
+
+    - 日志行始终入缓冲（只 append，不序列化），保证短暂断线可续
+    - 矩阵增量只在有订阅者时计算（publish_matrix 无人订阅直接返回）
+    - refill / 暂停 / 静默窗口由后台线程每 LIVE_STATE_POLL_SECONDS 比较一次状态签名，变化才发；无订阅者时线程退出
+    """
+
+    def __init__(self, maxlen=LIVE_EVENT_BUFFER_SIZE, max_subscribers=LIVE_EVENT_MAX_SUBSCRIBERS):
+        self._cond = threading.Condition()
+        self._events = deque(maxlen=max(1, int(maxlen)))
+        self._seq = 0
+        self._subscribers = 0
+        self._max_subscribers = max(1, int(max_subscribers))
+        self._watcher = None
+        self._matrix_last = {}
+        self._stats = {"published": 0, "connections": 0, "rejected": 0, "resets": 0, "matrix_events": 0}
+
+    def publish(self, event_type, data):
+        with self._cond:
+            self._seq += 1
+            self._events.append((self._seq, event_type, data))
+            self._stats["published"] += 1
+            if self._subscribers:
+                self._cond.notify_all()
+            return self._seq
+
+    def last_id(self):
+        with self._cond:
+            return self._seq
+
+    def subscriber_count(self):
+        with self._cond:
+            return self._subscribers
+
+    def try_subscribe(self):
+        with self._cond:
+            if self._subscribers >= self._max_subscribers:
+                self._stats["rejected"] += 1
+                return False
+            self._subscribers += 1
+            self._stats["connections"] += 1
+            if self._watcher is None or not self._watcher.is_alive():
+                self._watcher = threading.Thread(target=self._watch_state, name="live-events", daemon=True)
+                self._watcher.start()
+            return True
+
+    def unsubscribe(self):
+        with self._cond:
+            self._subscribers = max(0, self._subscribers - 1)
+            if not self._subscribers:
+                self._matrix_last = {}
+            self._cond.notify_all()
+
+    def events_after(self, last_id, timeout_s):
+        """返回 (last_id 之后的事件列表, 是否断档)；没有新事件时最多等 timeout_s。"""
+        with self._cond:
+            if self._seq <= last_id:
+                self._cond.wait(timeout_s)
+            if self._seq <= last_id:
+                return [], False
+            n_new = self._seq - last_id
+            gap = n_new > len(self._events)
+            if gap:
+                self._stats["resets"] += 1
+            take = min(n_new, len(self._events))
+            return [self._events[-i] for i in range(take, 0, -1)], gap
+
+    def publish_matrix(self, key, date_str, result):
+        """有订阅者时与该 key 上一快照比对，发整表或变化格（state 为矩阵状态字）。"""
+        if not self.subscriber_count():
+            return
+        matrix = result.get("matrix") if isinstance(result, dict) else None
+        if not isinstance(matrix, dict):
+            return
+        with self._cond:
+            prev = self._matrix_last.get(key)
+            self._matrix_last[key] = matrix
+        delta = diff_court_matrices(prev, matrix)
+        if delta is None or (not delta["full"] and not delta["changed_cells"]):
+            return
+        payload = {"date": str(date_str or ""), "full": bool(delta["full"])}
+        if delta["full"]:
+            payload.update(places=list(result.get("places") or ()), times=list(result.get("times") or ()), matrix=matrix)
+        else:
+            payload["cells"] = [[p, t, matrix[p][t]] for p, t in delta["changed_cells"]]
+        with self._cond:
+            self._stats["matrix_events"] += 1
+        self.publish("matrix", payload)
+
+    def _watch_state(self):
+        last_sig = {}
+        while True:
+            with self._cond:
+                if not self._subscribers:
+                    self._watcher = None
+                    return
+            try:
+                seen = set()
+                for event_type, key, data in live_state_items():
+                    seen.add((event_type, key))
+                    sig = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+                    if last_sig.get((event_type, key)) != sig:
+                        last_sig[(event_type, key)] = sig
+                        self.publish(event_type, data)
+                for event_type, key in [k for k in last_sig if k not in seen]:
+                    last_sig.pop((event_type, key), None)
+                    self.publish(event_type, {"id": key, "deleted": True})
+            except Exception as e:
+                print(f"⚠️ [live-events] 状态轮询异常: {e}")
+            time.sleep(LIVE_STATE_POLL_SECONDS)
+
+    def stats(self):
+        with self._cond:
+            out = dict(self._stats)
+            out["last_id"] = self._seq
+            out["buffered"] = len(self._events)
+            out["subscribers"] = self._subscribers
+            return out
+
+
+LIVE_EVENTS = LiveEventHub()
 
 
 def log(msg):
-    """记录日志到内存缓冲区、控制台，可选按天落盘便于次日查看（与控制台同一行格式，带毫秒与可选 tid 前缀）。"""
+    """
+    记录日志：内存缓冲区立即可见（/api/logs），控制台与按天文件交给 _LOG_SINK 后台攒批写，
+    调用线程（递送/POST 线程）只做格式化与入队，不碰磁盘。行格式带毫秒与可选 tid 前缀；
+    内存中另存 LogRecord（seq/ts/tid/refill_id/level），查询不再逐行解析。
+    高频路径（递送/POST 循环）请用 log_event：只入队，行文本在后台渲染。
+    """
     ctx = get_runtime_request_context()
-    tid_raw = ctx.get("task_id") if isinstance(ctx, dict) else None
+    _log_commit(_log_now_ts(), ctx.get("task_id") if isinstance(ctx, dict) else None, str(msg))
+
+
+def _log_commit(ts, tid_raw, raw):
+    """把一行日志写入内存缓冲、实时推送与落盘队列；log() 与 LOG_EVENT_RENDERER 共用。"""
+    global _LOG_SEQ
     tid = str(tid_raw).strip() if tid_raw is not None else ""
     prefix = f"tid={tid}| " if tid else ""
-    raw = str(msg)
-    ts = _log_timestamp_str()
-    line = f"[{ts}] {prefix}{raw}"
+    line = f"[{_log_timestamp_str(ts)}] {prefix}{raw}"
+    refill_id = _log_refill_id_of(raw)
+    level = _log_level_of(raw)
     with _LOG_IO_LOCK:
-        builtins.print(line)
-        LOG_BUFFER.append(line)
-        if len(LOG_BUFFER) > MAX_LOG_SIZE:
-            LOG_BUFFER.pop(0)
-        # 按天落盘，明天仍可查看今天的运行日志；可选保留最近 N 天
-        if CONFIG.get("log_to_file"):
+        _LOG_SEQ += 1
+        LOG_BUFFER.append(LogRecord(_LOG_SEQ, ts, tid, refill_id, level, line))
+    LIVE_EVENTS.publish("log", line)
+    _LOG_SINK.enqueue(line)
+
+
+def is_verbose_logs_enabled():
+    return bool(CONFIG.get("verbose_logs", False))
+
+
+# 结构化日志：分类级别（off < info < debug），log_category_levels 未配置的分类随 verbose_logs（开=debug，关=info）
+LOG_EVENT_LEVEL_RANK = {"off": 0, "info": 1, "debug": 2}
+# 渲染线程：有积压时的攒批间隔 / 空闲时的轮询间隔；待渲染队列上限（满了丢最旧）
+LOG_EVENT_RENDER_INTERVAL_S = 0.05
+LOG_EVENT_IDLE_INTERVAL_S = 0.5
+LOG_EVENT_QUEUE_MAX = LOG_SINK_QUEUE_MAX
+
+
+def _fmt_wall_ms(epoch_s):
+    return datetime.fromtimestamp(epoch_s).strftime("%H:%M:%S.%f")[:-3]
+
+
+# (分类, 事件) -> 行模板：str.format 模板，或 fields -> str 的函数（需截断/条件拼接时）。未登记的事件按 key=value 渲染
+LOG_EVENT_FORMATS = {
+    ("interval_post", "start"): (
+        "[全量间隔POST] 开始 date={date} candidates={candidates} "
+        "goal_cells={goal_cells} min_post_interval={min_post_interval}s budget={budget}s"
+    ),
+    ("interval_post", "prewarm"): "[全量间隔POST] 已执行 prewarm get_matrix（可忽略失败）",
+    ("interval_post", "success"): "[全量间隔POST] 成功 items={items} 剩余目标格={remaining}",
+    ("interval_post", "drop"): lambda f: f"[全量间隔POST] 剔除候选 {f['cid']} msg={str(f.get('msg') or '')[:120]}",
+    ("interval_post", "retry_exhausted"): "[全量间隔POST] 候选 {cid} 重试超限，丢弃",
+    ("interval_post", "requeue"): "[全量间隔POST] 可重试，候选回队尾 {cid} ({mapped})",
+    ("delivery", "batch"): "[极速订场] {tag} group={group_id} ({group_label}) items={items}",
+    ("delivery", "batch_retry"): (
+        "[极速订场] {tag} 同批软重试 {attempt}/{max_tries} group={group_id} ({group_label}) items={items}"
+    ),
+    ("delivery", "refill_post_sent"): lambda f: (
+        f"[极速订场] refill POST发送 wall={_fmt_wall_ms(f['wall'])} "
+        f"campaign_ms={f['campaign_ms']} tag={f['tag']} items={f['items']}"
+    ),
+    ("delivery", "too_fast"): lambda f: f"[极速订场] {f['tag']} too_fast: {str(f.get('msg') or '')[:200]!r}",
+    ("delivery", "post_result"): "[极速订场] {tag} 第{attempt}次提交 action={action} items={items}",
+    ("delivery", "payload_reprime"): "[极速订场] {tag} 数据错误等业务拒单后已重拉矩阵，将同批重试 reprime_n={reprime_n}",
+    ("delivery", "matrix_fail"): "[极速订场] 递送循环 get_matrix 失败: {err}，{retry_s}s 后重试",
+    ("delivery", "matrix_done"): lambda f: (
+        f"[极速订场] 递送循环 矩阵完成 fetch_n={f['fetch_n']} wall={_fmt_wall_ms(f['wall'])} "
+        f"elapsed_ms={f['elapsed_ms']}{' prefetched=1' if f.get('prefetched') else ''}"
+    ),
+    ("delivery", "plan_stale"): "[极速订场] 算场快照过期(>{max_age}s)，重拉矩阵后再递送",
+    ("delivery", "no_candidate"): lambda f: (
+        f"[极速订场] 递送循环 本轮无满足约束候选，缺口={f['need']}，短等待后重拉"
+        f"{'（矩阵无相关新可订格，跳过求解）' if f.get('solve_skipped') else ''}"
+    ),
+    ("delivery", "tier_solved"): "[极速订场] 递送循环 分层求解 tier={tier} used_need={used_need} 原缺口={need}",
+    ("delivery", "round_done"): "[极速订场] 递送循环 本轮多批已处理，下轮重拉矩阵校验满额",
+    ("matrix", "mine_overlay"): "🔵 [mine覆盖] 日期{date} 共标记 {count} 个mine格子",
+    ("matrix", "state_debug"): "🔍 [状态调试] 前5个样本状态: {samples}",
+}
+
+
+def log_event_enabled(category, level="info"):
+    """该分类下 level 级别的事件是否记录：log_category_levels[category]，未配置时随 verbose_logs。"""
+    levels = CONFIG.get("log_category_levels")
+    cat_level = levels.get(category) if levels else None
+    if cat_level is None:
+        cat_level = "debug" if CONFIG.get("verbose_logs") else "info"
+    return LOG_EVENT_LEVEL_RANK.get(level, 1) <= LOG_EVENT_LEVEL_RANK.get(cat_level, 1)
+
+
+def normalize_log_category_levels(raw):
+    """配置值规整为 {分类: off|info|debug}，非法项丢弃。"""
+    if not isinstance(raw, dict):
+        return {}
+    out = {}
+    for k, v in raw.items():
+        key = str(k or "").strip()
+        val = str(v or "").strip().lower()
+        if key and val in LOG_EVENT_LEVEL_RANK:
+            out[key] = val
+    return out
+
+
+class LogEventRenderer:
+    """
+    结构化日志事件的后台渲染：log_event 只把 (ts, tid, 分类, 事件, fields) 追加进 deque，
+    本线程每 LOG_EVENT_RENDER_INTERVAL_S 攒批按 LOG_EVENT_FORMATS 渲染成行，再走 _log_commit（内存缓冲/推送/落盘）。
+    行时间戳取事件发生时刻，落盘时 _LogSink 按时间戳排序，与 log() 直接写的行交错也保持时间顺序。
+    """
+
+    def __init__(self, formats=None, interval_s=LOG_EVENT_RENDER_INTERVAL_S, maxlen=LOG_EVENT_QUEUE_MAX):
+        self._formats = LOG_EVENT_FORMATS if formats is None else formats
+        self._interval_s = max(0.0, float(interval_s))
+        self._queue = deque(maxlen=max(1, int(maxlen)))
+        self._cond = threading.Condition()
+        self._thread = None
+        self._busy = False
+        self._stats = {"rendered": 0, "batches": 0, "format_errors": 0}
+
+    def submit(self, item):
+        self._queue.append(item)
+        if self._thread is None:
+            self._start()
+
+    def _start(self):
+        with self._cond:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="log-render", daemon=True)
+                self._thread.start()
+
+    def render(self, category, event, fields):
+        fmt = self._formats.get((category, event))
+        try:
+            if callable(fmt):
+                return fmt(fields)
+            if fmt is not None:
+                return fmt.format(**fields)
+        except Exception:
+            self._stats["format_errors"] += 1
+        kv = " ".join(f"{k}={v}" for k, v in fields.items())
+        return f"[{category}] {event} {kv}".rstrip()
+
+    def flush(self, timeout=1.0):
+        """等已入队事件渲染并提交完；超时返回 False。"""
+        deadline = time.monotonic() + max(0.0, float(timeout))
+        with self._cond:
+            while self._queue or self._busy:
+                if self._thread is None or not self._thread.is_alive():
+                    return False
+                self._cond.notify_all()
+                remain = deadline - time.monotonic()
+                if remain <= 0:
+                    return False
+                self._cond.wait(min(remain, 0.05))
+        return True
+
+    def stats(self):
+        with self._cond:
+            return dict(self._stats, pending=len(self._queue))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait(self._interval_s if self._queue else LOG_EVENT_IDLE_INTERVAL_S)
+                if not self._queue:
+                    continue
+                self._busy = True
+            n = 0
             try:
-                log_dir = (CONFIG.get("log_file_dir") or "logs").strip() or "logs"
-                if not os.path.isabs(log_dir):
-                    log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), log_dir)
-                os.makedirs(log_dir, exist_ok=True)
-                today_str = datetime.now().strftime("%Y%m%d")
-                log_file = os.path.join(log_dir, f"run_{today_str}.log")
-                retention_days = int(CONFIG.get("log_retention_days", 3) or 0)
-                if retention_days > 0 and getattr(log, "_last_purge_date", None) != today_str:
+                while True:
                     try:
-                        cutoff = (datetime.now() - timedelta(days=retention_days)).strftime("%Y%m%d")
-                        for name in os.listdir(log_dir):
-                            if name.startswith("run_") and name.endswith(".log") and len(name) == 15:
-                                date_str = name[4:12]
-                                if date_str < cutoff:
-                                    p = os.path.join(log_dir, name)
-                                    if os.path.isfile(p):
-                                        os.remove(p)
-                        log._last_purge_date = today_str
-                    except Exception:
-                        pass
-                with open(log_file, "a", encoding="utf-8") as f:
-                    f.write(line + "\n")
+                        ts, tid, category, event, fields = self._queue.popleft()
+                    except IndexError:
+                        break
+                    _log_commit(ts, tid, self.render(category, event, fields))
+                    n += 1
             except Exception as e:
-                builtins.print(f"⚠️ 写日志文件失败: {e}")
+                builtins.print(f"⚠️ 渲染日志事件失败: {e}")
+            with self._cond:
+                self._busy = False
+                self._stats["rendered"] += n
+                self._stats["batches"] += 1
+                self._cond.notify_all()
 
 
-def is_verbose_logs_enabled():
-    return bool(CONFIG.get("verbose_logs", False))
+LOG_EVENT_RENDERER = LogEventRenderer()
+# atexit 后注册先执行：先提交待渲染事件，再由 _LOG_SINK.flush 落盘
+atexit.register(LOG_EVENT_RENDERER.flush, 1.0)
+
+
+def log_event(category, event, level="info", **fields):
+    """
+    结构化日志事件（高频路径用）：调用线程只取时间戳与 tid、追加一个元组，行文本由 LOG_EVENT_RENDERER 后台渲染。
+    fields 按引用保存，入队后调用方不应再修改其中的列表/字典。
+    """
+    if not log_event_enabled(category, level):
+        return
+    ctx = getattr(QUIET_WINDOW_REQUEST_CONTEXT, "value", None)
+    tid = ctx.get("task_id") if isinstance(ctx, dict) else None
+    LOG_EVENT_RENDERER.submit((_log_now_ts(), tid, category, event, fields))
+
+
+def flush_logs(timeout=1.0):
+    """读日志文件/导出前：先让待渲染事件提交，再等落盘。"""
+    LOG_EVENT_RENDERER.flush(timeout)
+    return _LOG_SINK.flush(timeout)
 
 
 def cfg_get(key, default=None):
@@ -1416,27 +2589,30 @@ def _matrix_cell_is_mine(st):
 
 def collect_mine_items_from_matrix(matrix_live, places_list, target_times):
     """从余票矩阵中收集「本人已占」格子，用于通知与 success_items（与递送器内缺口计数语义一致）。"""
+    cm = as_court_matrix(matrix_live)
+    if cm is None:
+        return []
+    place_set = {str(p) for p in places_list}
     raw = []
     for t in target_times:
-        for p in places_list:
-            cell = (matrix_live.get(str(p)) or {}).get(t)
-            if _matrix_cell_is_mine(cell):
-                raw.append({"place": str(p), "time": t})
+        for p in cm.mine_places(t):
+            if p in place_set:
+                raw.append({"place": p, "time": t})
     return normalize_booking_items(raw)
 
 
 def mine_places_by_time_from_matrix(matrix_live, places_list, target_times):
     """各目标时段下已订(min)场地号列表，供求解时邻接偏好排序。"""
+    cm = as_court_matrix(matrix_live)
+    if cm is None:
+        return {}
+    place_set = {str(p) for p in places_list}
     out = {}
     for t in target_times:
         ts = str(t).strip()
-        acc = []
-        for p in places_list:
-            cell = (matrix_live.get(str(p)) or {}).get(ts)
-            if _matrix_cell_is_mine(cell):
-                acc.append(str(p))
+        acc = [p for p in cm.mine_places(ts) if p in place_set]
         if acc:
-            out[ts] = sorted(acc, key=lambda x: int(x))
+            out[ts] = acc
     return out
 
 
@@ -1524,6 +2700,8 @@ def is_matrix_cell_bookable_for_new_booking(state):
 
 def matrix_snapshot_has_locked_cell(matrix):
     """矩阵中是否存在任一 locked 格（用于观测锁定期快照）。"""
+    if isinstance(matrix, CourtMatrix):
+        return matrix.has_locked_cell()
     if not isinstance(matrix, dict):
         return False
     for row in matrix.values():
@@ -1535,20 +2713,306 @@ def matrix_snapshot_has_locked_cell(matrix):
     return False
 
 
-def map_slot_state_int(state_int, locked_state_values_set):
-    if state_int == 1:
-        return "available"
-    if state_int == 2:
-        return "mine"
-    if state_int == 4:
-        return "booked"
-    if state_int == 6:
-        return "locked"
-    if state_int in locked_state_values_set:
+class FrozenDict(dict):
+    """只读 dict：get_matrix 结果与缓存共享同一对象，任何原地写入直接抛 TypeError。
+
+    仍是 dict 子类，jsonify / json.dumps / 读路径不变；需要改动时走 thaw_matrix_result 或 dict(x) 浅拷贝（copy-on-write）。
+    """
+
+    __slots__ = ()
+
+    def _readonly(self, *args, **kwargs):
+        raise TypeError("FrozenDict 只读：请先 thaw_matrix_result()/dict() 复制后再改")
+
+    __setitem__ = _readonly
+    __delitem__ = _readonly
+    __ior__ = _readonly
+    clear = _readonly
+    pop = _readonly
+    popitem = _readonly
+    setdefault = _readonly
+    update = _readonly
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return copy.deepcopy(dict(self), memo)
+
+    def __reduce__(self):
+        return (dict, (dict(self),))
+
+
+def freeze_matrix_result(result):
+    """把 get_matrix 成功结果冻结为 FrozenDict（matrix 为 CourtMatrix，行、meta 均只读；places/times 为 tuple）。"""
+    if not isinstance(result, dict) or isinstance(result, FrozenDict):
+        return result
+    out = {}
+    for k, v in result.items():
+        if k == "matrix" and isinstance(v, dict):
+            v = CourtMatrix(v, times=result.get("times"))
+        elif isinstance(v, dict):
+            v = FrozenDict(v)
+        elif isinstance(v, list):
+            v = tuple(v)
+        out[k] = v
+    return FrozenDict(out)
+
+
+def thaw_matrix_result(result):
+    """copy-on-write：返回可写副本（外层、matrix 各行、meta 均为新 dict；places/times 为新 list）。"""
+    if not isinstance(result, dict):
+        return result
+    out = {}
+    for k, v in result.items():
+        if k == "matrix" and isinstance(v, dict):
+            v = {p: dict(row) if isinstance(row, dict) else row for p, row in v.items()}
+        elif isinstance(v, dict):
+            v = dict(v)
+        elif isinstance(v, (list, tuple)):
+            v = list(v)
+        out[k] = v
+    return out
+
+
+# CourtMatrix 状态码（bytearray 单字节）；0=该场地无此时段
+COURT_STATE_MISSING = 0
+COURT_STATE_AVAILABLE = 1
+COURT_STATE_LOCKED = 2
+COURT_STATE_BOOKED = 3
+COURT_STATE_MINE = 4
+COURT_STATE_OTHER = 5
+_COURT_BOOKABLE_CODES = (COURT_STATE_AVAILABLE, COURT_STATE_LOCKED)
+
+
+def court_state_code(state):
+    """矩阵格字符串 → 状态码；可订/mine 判定与 is_matrix_cell_bookable_for_new_booking、_matrix_cell_is_mine 一致。"""
+    if state is None:
+        return COURT_STATE_MISSING
+    if _matrix_cell_is_mine(state):
+        return COURT_STATE_MINE
+    s = str(state).strip().lower()
+    if s == "available":
+        return COURT_STATE_AVAILABLE
+    if s == "locked":
+        return COURT_STATE_LOCKED
+    if s == "booked":
+        return COURT_STATE_BOOKED
+    return COURT_STATE_OTHER
+
+
+def _court_place_sort_key(p):
+    return int(p) if p.isdigit() else 999
+
+
+class CourtMatrix(FrozenDict):
+    """
+    紧凑场地矩阵：places × times 的 bytearray 状态码 + 场地/时段下标表，求解器直接按下标查询。
+    本身仍是只读 dict（{place: {time: state}}），/api/matrix 与旧读路径原样可用。
+    按时段的可订/mine 场地列表首次查询后缓存（对象不可变，缓存不会过期）。
+    """
+
+    __slots__ = ("places", "times", "place_index", "time_index", "place_nums", "codes", "_by_time")
+
+    def __init__(self, rows, times=None):
+        rows = rows if isinstance(rows, dict) else {}
+        dict.__init__(
+            self,
+            ((str(p), row if isinstance(row, FrozenDict) or not isinstance(row, dict) else FrozenDict(row)) for p, row in rows.items()),
+        )
+        self.places = tuple(sorted(self.keys(), key=_court_place_sort_key))
+        all_times = set(str(t) for t in (times or ()))
+        for row in self.values():
+            if isinstance(row, dict):
+                all_times.update(str(t) for t in row.keys())
+        self.times = tuple(sorted(all_times))
+        self.place_index = {p: i for i, p in enumerate(self.places)}
+        self.time_index = {t: j for j, t in enumerate(self.times)}
+        self.place_nums = tuple(int(p) if p.isdigit() else -1 for p in self.places)
+        n_t = len(self.times)
+        codes = bytearray(len(self.places) * n_t)
+        # 状态字符串只有寥寥几种：每种只走一次 court_state_code
+        code_memo = {}
+        for i, p in enumerate(self.places):
+            row = dict.get(self, p)
+            if not isinstance(row, dict):
+                continue
+            base = i * n_t
+            for t, st in row.items():
+                j = self.time_index.get(str(t))
+                if j is not None:
+                    try:
+                        c = code_memo[st]
+                    except KeyError:
+                        c = code_memo[st] = court_state_code(st)
+                    except TypeError:
+                        c = court_state_code(st)
+                    codes[base + j] = c
+        self.codes = bytes(codes)
+        self._by_time = {}
+
+    def __copy__(self):
+        return dict(self)
+
+    def code(self, place, t):
+        i = self.place_index.get(str(place))
+        j = self.time_index.get(str(t))
+        if i is None or j is None:
+            return COURT_STATE_MISSING
+        return self.codes[i * len(self.times) + j]
+
+    def is_bookable(self, place, t):
+        return self.code(place, t) in _COURT_BOOKABLE_CODES
+
+    def _places_by_time(self, t):
+        """(可订场地, mine 场地)：均为数字场地号、按编号升序的 tuple。"""
+        t = str(t)
+        hit = self._by_time.get(t)
+        if hit is not None:
+            return hit
+        j = self.time_index.get(t)
+        bookable = []
+        mine = []
+        if j is not None:
+            n_t = len(self.times)
+            codes = self.codes
+            for i, p in enumerate(self.places):
+                if self.place_nums[i] < 0:
+                    continue
+                c = codes[i * n_t + j]
+                if c in _COURT_BOOKABLE_CODES:
+                    bookable.append(p)
+                elif c == COURT_STATE_MINE:
+                    mine.append(p)
+        hit = (tuple(bookable), tuple(mine))
+        self._by_time[t] = hit
+        return hit
+
+    def bookable_places(self, t, lo=None, hi=None):
+        """时段 t 下可订场地号（编号升序），可选闭区间 [lo, hi]。"""
+        out = self._places_by_time(t)[0]
+        if lo is None and hi is None:
+            return out
+        lo = -1 if lo is None else int(lo)
+        hi = 10 ** 9 if hi is None else int(hi)
+        return tuple(p for p in out if lo <= int(p) <= hi)
+
+    def mine_places(self, t):
+        """时段 t 下本人已占场地号（编号升序）。"""
+        return self._places_by_time(t)[1]
+
+    def has_locked_cell(self):
+        return COURT_STATE_LOCKED in self.codes
+
+
+def diff_court_matrices(prev, cur):
+    """
+    两次矩阵快照的增量：逐格比较状态码。形状（场地/时段表）不同或无前一快照时 full=True。
+    返回只读 dict：full / changed_cells / changed_times / newly_bookable_cells（由不可订变为可订的格）。
+    """
+    cur = as_court_matrix(cur)
+    if cur is None:
+        return None
+    prev = as_court_matrix(prev) if prev is not None else None
+    if prev is None or prev.places != cur.places or prev.times != cur.times:
+        return FrozenDict(full=True, changed_cells=(), changed_times=(), newly_bookable_cells=())
+    if prev is cur or prev.codes == cur.codes:
+        return FrozenDict(full=False, changed_cells=(), changed_times=(), newly_bookable_cells=())
+    n_t = len(cur.times)
+    changed = []
+    newly = []
+    for k, (a, b) in enumerate(zip(prev.codes, cur.codes)):
+        if a == b:
+            continue
+        cell = (cur.places[k // n_t], cur.times[k % n_t])
+        changed.append(cell)
+        if b in _COURT_BOOKABLE_CODES and a not in _COURT_BOOKABLE_CODES:
+            newly.append(cell)
+    return FrozenDict(
+        full=False,
+        changed_cells=tuple(changed),
+        changed_times=tuple(sorted({t for _p, t in changed})),
+        newly_bookable_cells=tuple(newly),
+    )
+
+
+def matrix_delta_may_unlock(delta, places, times):
+    """
+    上次求解无解时，本次增量是否可能产生新解：仅当相关场地×时段内有格子由不可订变为可订。
+    格子变少（available→booked/mine）不会让无解变有解；full 增量保守视为可能。
+    """
+    if not isinstance(delta, dict) or delta.get("full"):
+        return True
+    place_set = {str(p) for p in (places or [])}
+    time_set = {str(t).strip() for t in (times or [])}
+    for p, t in delta.get("newly_bookable_cells") or ():
+        if p in place_set and t in time_set:
+            return True
+    return False
+
+
+def as_court_matrix(matrix):
+    """求解入口统一转 CourtMatrix；已是 CourtMatrix 原样返回，非 dict 返回 None。"""
+    if isinstance(matrix, CourtMatrix):
+        return matrix
+    if not isinstance(matrix, dict):
+        return None
+    return CourtMatrix(matrix)
+
+
+def map_slot_state_int(state_int, locked_state_values_set):
+    if state_int == 1:
+        return "available"
+    if state_int == 2:
+        return "mine"
+    if state_int == 4:
+        return "booked"
+    if state_int == 6:
+        return "locked"
+    if state_int in locked_state_values_set:
         return "locked"
     return "booked"
 
 
+def project_place_array(place_array, locked_state_values_set, collect_debug=False):
+    """
+    getPlaceInfoByShortName 的 placeArray 单遍投影：只读 shortname / starttime / state。
+
+    返回 (matrix, all_times, state_counts, debug_states)；state_counts 供 STATE_SAMPLER.ingest_counts，
+    debug_states 仅 collect_debug 时收集前 5 个样本。同一原始 state 值只映射一次。
+    """
+    matrix = {}
+    all_times = set()
+    state_counts = {}
+    debug_states = []
+    state_memo = {}
+    for place in place_array:
+        p_num = place['projectName']['shortname'].replace('ymq', '').replace('mdb', '')
+        status_map = {}
+        for slot in place['projectInfo']:
+            t = slot['starttime']
+            s = slot['state']
+            try:
+                state_key, status = state_memo[s]
+            except (KeyError, TypeError):
+                try:
+                    state_key = int(s)
+                except Exception:
+                    state_key = -999
+                status = map_slot_state_int(state_key, locked_state_values_set)
+                try:
+                    state_memo[s] = (state_key, status)
+                except TypeError:
+                    pass
+            state_counts[state_key] = state_counts.get(state_key, 0) + 1
+            all_times.add(t)
+            status_map[t] = status
+            if collect_debug and len(debug_states) < 5:
+                debug_states.append(f"{p_num}号{t}={s}")
+        matrix[p_num] = status_map
+    return matrix, all_times, state_counts, debug_states
+
+
 def notify_items_from_submit_result(res, fallback_items):
     """提交结果里 success_items 为 [] 时表示「无场次列表」，不得回退为配置主组/旧 items。"""
     if not isinstance(res, dict):
@@ -1854,6 +3318,98 @@ def _build_monotone_need_levels(need_by_time, time_preference_order):
     return _level_specs_unique_by_total_desc(levels)
 
 
+SOLVER_PLAN_CACHE_MAXSIZE = 256
+
+
+class SolverPlanCache:
+    """
+    档位表 LRU：level_spec 枚举只依赖（时段顺序、上限、target_blocks / 缺口），与矩阵无关。
+    值为只读 tuple[FrozenDict] 或 FrozenDict[S -> tuple]，可被多线程共享；命中/未命中另按线程计数供 run_metric 取差值。
+    """
+
+    def __init__(self, maxsize=SOLVER_PLAN_CACHE_MAXSIZE):
+        self.maxsize = max(1, int(maxsize))
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, build):
+        with self._lock:
+            hit = self._data.get(key)
+            if hit is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+        if hit is not None:
+            self._local.hits = getattr(self._local, "hits", 0) + 1
+            return hit
+        value = build()
+        with self._lock:
+            self.misses += 1
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        self._local.misses = getattr(self._local, "misses", 0) + 1
+        return value
+
+    def thread_counters(self):
+        """当前线程累计 (hits, misses)；调用方前后取差得到单次运行的命中数。"""
+        return int(getattr(self._local, "hits", 0)), int(getattr(self._local, "misses", 0))
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._data), "maxsize": self.maxsize, "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+SOLVER_PLAN_CACHE = SolverPlanCache()
+
+
+def _freeze_level_specs(levels):
+    return tuple(FrozenDict(sp) for sp in (levels or []))
+
+
+def _freeze_specs_by_sum(by_sum):
+    return FrozenDict((s, _freeze_level_specs(specs)) for s, specs in (by_sum or {}).items())
+
+
+def cached_level_plan(kind, *args):
+    """
+    solve_candidate_from_matrix 用的档位表（带 LRU）：kind 对应下列构造函数，args 原样透传。
+      downgrade / monotone_total: (target_blocks, target_times, time_preference_order)
+      monotone_need: (need_by_time, time_preference_order)
+      enum_total: (order, cap_per_time)；enum_need: (order, caps_per_time)
+    """
+    if kind == "downgrade":
+        tb, tts, order = args
+        key = (kind, tb, tuple(tts), tuple(order))
+        return SOLVER_PLAN_CACHE.get(key, lambda: _freeze_level_specs(_build_downgrade_levels(tb, tts, order)))
+    if kind == "monotone_total":
+        tb, tts, order = args
+        key = (kind, tb, tuple(tts), tuple(order))
+        return SOLVER_PLAN_CACHE.get(
+            key, lambda: _freeze_level_specs(_build_monotone_total_budget_levels(tb, tts, order))
+        )
+    if kind == "monotone_need":
+        need, order = args
+        key = (kind, tuple(sorted((str(t), str(v)) for t, v in (need or {}).items())), tuple(order))
+        return SOLVER_PLAN_CACHE.get(key, lambda: _freeze_level_specs(_build_monotone_need_levels(need, order)))
+    if kind == "enum_total":
+        order, cap = args
+        key = (kind, tuple(order), str(cap))
+        return SOLVER_PLAN_CACHE.get(key, lambda: _freeze_specs_by_sum(_enumerate_level_specs_by_total(order, cap)))
+    if kind == "enum_need":
+        order, caps = args
+        key = (kind, tuple(order), tuple(str(caps.get(t, 0)) for t in order))
+        return SOLVER_PLAN_CACHE.get(key, lambda: _freeze_specs_by_sum(_enumerate_need_specs_by_total(order, caps)))
+    raise ValueError(f"unknown level plan kind: {kind}")
+
+
 def _normalized_matrix_place_span(lo_raw, hi_raw):
     """矩阵求解可选场地号闭区间；缺省 1–14，限制在 [1, cap]。"""
     cap = 50
@@ -1883,6 +3439,16 @@ def _selectable_place_bounds_from_intent(intent):
     return _normalized_matrix_place_span(raw.get("selectable_place_min"), raw.get("selectable_place_max"))
 
 
+def delivery_solver_exact_enabled(task_config=None):
+    """delivery_solver_exact：任务 config 显式给出时优先（与执行参数校验同样接受 true/false/0/1/yes/no），否则读全局 CONFIG。"""
+    raw = task_config.get("delivery_solver_exact") if isinstance(task_config, dict) else None
+    if raw is None:
+        raw = CONFIG.get("delivery_solver_exact", False)
+    if isinstance(raw, str):
+        return raw.strip().lower() in ("true", "1", "yes")
+    return bool(raw)
+
+
 def compute_first_group_from_matrix(matrix, places, times, config_or_dict):
     """
     从拉活得到的 matrix 计算第一组 group_items（偏好场地 + 块数×时间降级）。
@@ -1912,6 +3478,7 @@ def compute_first_group_from_matrix(matrix, places, times, config_or_dict):
         cfg.get("delivery_matrix_place_min"),
         cfg.get("delivery_matrix_place_max"),
     )
+    matrix = as_court_matrix(matrix)
     places_list = list(places or matrix.keys())
     mine_bt = mine_places_by_time_from_matrix(matrix, places_list, target_times)
     intent = {
@@ -1933,7 +3500,7 @@ def compute_first_group_from_matrix(matrix, places, times, config_or_dict):
         matrix,
         places_list,
         intent,
-        mode="aggressive",
+        mode="exact" if delivery_solver_exact_enabled(cfg) else "aggressive",
     )
     if not solved:
         return None, None
@@ -1962,17 +3529,15 @@ def scatter_pick_items_with_time_streak_bias(
     散号模式：按 time_preference_order 逐时段选场；同一自然日「上一整点」已选场地优先（延续同场地连续时段）。
     与 legacy 散号一致，允许某时段 avail 不足则少选。
     """
+    cm = as_court_matrix(matrix)
+    selectable_set = set(selectable_places)
     filled_by_time = {}
     items = []
     for t in time_preference_order:
         need = int(level_spec.get(t, 0))
         if need <= 0:
             continue
-        avail = [
-            p
-            for p in selectable_places
-            if is_matrix_cell_bookable_for_new_booking((matrix.get(p) or {}).get(t))
-        ]
+        avail = [p for p in cm.bookable_places(t) if p in selectable_set]
         if not avail:
             continue
         prev_t = _prev_consecutive_hour_str(t)
@@ -2005,6 +3570,8 @@ def solve_candidate_from_matrix(matrix, places, intent, mode="strict", state=Non
     mode:
       - strict: 仅接受完整目标，不做降级（need_by_time 时为一档；若 intent 含 monotone_need_relax 则对缺口梯自上而下第一可行）
       - aggressive: 默认按 _build_monotone_total_budget_levels 总需求单调递降；关 delivery_monotone_total_downgrade 时回退 _build_downgrade_levels
+      - exact: 各时段上限取 need_by_time（缺省 target_blocks），按可订位掩码精确求总格数 Σk 最大；同 S 内取 _score_items 最高
+        （连号：每个起点各时段取 min(上限, 自起点连续可订数)，起点数 × 时段数次位运算；散号：每时段 min(上限, 可订数)）
     delivery_solver_max_total_cells（或 intent["solver_max_total_cells"] 显式覆盖）为真时：
       在 aggressive 的「总预算单调」路径、以及 strict+monotone_need_relax 的 refill 路径上，改为按 S 从大到小枚举该 S 下全部 level_spec，
       同 S 内取 _score_items 最高；关则仍用单调档位表 + 自上而下第一可行（及 aggressive_best 等原语义）。
@@ -2013,6 +3580,7 @@ def solve_candidate_from_matrix(matrix, places, intent, mode="strict", state=Non
     """
     if not isinstance(matrix, dict) or not matrix:
         return None
+    matrix = as_court_matrix(matrix)
     cfg = dict(intent or {})
     target_blocks = max(1, min(6, int(cfg.get("target_blocks") or 1)))
     raw_target_times = cfg.get("target_times") or []
@@ -2037,6 +3605,10 @@ def solve_candidate_from_matrix(matrix, places, intent, mode="strict", state=Non
     )
     if not selectable_places:
         return None
+    selectable_set = set(selectable_places)
+    codes = matrix.codes
+    n_times = len(matrix.times)
+    sel_row_base = [matrix.place_index[p] * n_times for p in selectable_places]
 
     monotone_need_relax = bool(cfg.get("monotone_need_relax"))
     use_monotone_total = (
@@ -2050,34 +3622,48 @@ def solve_candidate_from_matrix(matrix, places, intent, mode="strict", state=Non
         use_max_total_cells = bool(CONFIG.get("delivery_solver_max_total_cells", True))
 
     specs_by_s = None
-    if monotone_need_relax and need_by_time:
+    exact_caps = None
+    if mode == "exact":
+        cap_src = need_by_time if need_by_time else {t: target_blocks for t in time_preference_order}
+        exact_caps = {}
+        for t in time_preference_order:
+            try:
+                k = max(0, min(6, int(cap_src.get(t) or 0)))
+            except (TypeError, ValueError):
+                k = 0
+            if k > 0:
+                exact_caps[t] = k
+        if not exact_caps:
+            return None
+        level_specs = []
+    elif monotone_need_relax and need_by_time:
         if use_max_total_cells:
             order_n = [t for t in time_preference_order if int(need_by_time.get(t) or 0) > 0]
             if not order_n:
                 return None
             caps = {t: int(max(0, need_by_time.get(t) or 0)) for t in order_n}
-            specs_by_s = _enumerate_need_specs_by_total(order_n, caps)
+            specs_by_s = cached_level_plan("enum_need", order_n, caps)
             level_specs = []
         else:
-            level_specs = _build_monotone_need_levels(need_by_time, time_preference_order)
+            level_specs = cached_level_plan("monotone_need", need_by_time, time_preference_order)
     elif need_by_time:
         level_specs = [{t: max(0, int(need_by_time.get(t) or 0)) for t in time_preference_order}]
         level_specs = [{t: k for t, k in spec.items() if k > 0} for spec in level_specs]
         level_specs = [spec for spec in level_specs if spec]
     elif use_monotone_total:
         if use_max_total_cells:
-            specs_by_s = _enumerate_level_specs_by_total(time_preference_order, target_blocks)
+            specs_by_s = cached_level_plan("enum_total", time_preference_order, target_blocks)
             level_specs = []
         else:
-            level_specs = _build_monotone_total_budget_levels(target_blocks, target_times, time_preference_order)
+            level_specs = cached_level_plan("monotone_total", target_blocks, target_times, time_preference_order)
     elif mode == "aggressive":
-        level_specs = _build_downgrade_levels(target_blocks, target_times, time_preference_order)
+        level_specs = cached_level_plan("downgrade", target_blocks, target_times, time_preference_order)
     else:
         level_specs = [{t: target_blocks for t in time_preference_order}]
     if specs_by_s is not None:
         if not specs_by_s:
             return None
-    elif not level_specs:
+    elif not level_specs and exact_caps is None:
         return None
 
     def _score_items(items, level_spec):
@@ -2189,12 +3775,18 @@ def solve_candidate_from_matrix(matrix, places, intent, mode="strict", state=Non
 
             if mine_by_time:
                 starts = sorted(starts, key=_start_anchor_rank)
+            spec_cols = [(matrix.time_index.get(t), k) for t, k in level_spec.items()]
             for i in starts:
                 s_places = selectable_places[i : i + K]
                 ok = True
-                for t, k in level_spec.items():
+                for tj, k in spec_cols:
+                    if tj is None:
+                        ok = k <= 0
+                        if not ok:
+                            break
+                        continue
                     for j in range(k):
-                        if not is_matrix_cell_bookable_for_new_booking((matrix.get(s_places[j]) or {}).get(t)):
+                        if codes[sel_row_base[i + j] + tj] not in _COURT_BOOKABLE_CODES:
                             ok = False
                             break
                     if not ok:
@@ -2235,11 +3827,7 @@ def solve_candidate_from_matrix(matrix, places, intent, mode="strict", state=Non
                     need = int(level_spec.get(t, 0))
                     if need <= 0:
                         continue
-                    avail = [
-            p
-            for p in selectable_places
-            if is_matrix_cell_bookable_for_new_booking((matrix.get(p) or {}).get(t))
-        ]
+                    avail = [p for p in matrix.bookable_places(t) if p in selectable_set]
                     mt_list = mine_by_time.get(str(t).strip()) if mine_by_time else None
                     if use_prefer:
                         avail = sorted(
@@ -2289,6 +3877,82 @@ def solve_candidate_from_matrix(matrix, places, intent, mode="strict", state=Non
                 return best_at_s
         return None
 
+    def _solve_exact(caps):
+        """mode=exact：按每时段可订位掩码（bit i = selectable_places[i]）精确求 Σk 最大，同 S 按 _score_items 择优。"""
+        order = [t for t in time_preference_order if t in caps]
+        # 与 max_total 枚举口径一致：无缺口表时 level_spec 含 0 块时段（影响 _score_items 的 block_ratio），有缺口表时省略
+        keep_zero = not need_by_time
+        masks = {}
+        for t in order:
+            tj = matrix.time_index.get(t)
+            m = 0
+            if tj is not None:
+                for i, base in enumerate(sel_row_base):
+                    if codes[base + tj] in _COURT_BOOKABLE_CODES:
+                        m |= 1 << i
+            masks[t] = m
+        if not require_consecutive:
+            spec = {}
+            for t in order:
+                k = min(caps[t], bin(masks[t]).count("1"))
+                if k > 0 or keep_zero:
+                    spec[t] = k
+            if sum(spec.values()) <= 0:
+                return None
+            return _best_for_level(sum(spec.values()) * 1000, spec)
+        best_s = 0
+        cands = []
+        for i in range(len(selectable_places)):
+            spec = {}
+            total = 0
+            for t in order:
+                x = masks[t] >> i
+                run = (x ^ (x + 1)).bit_length() - 1
+                k = min(caps[t], run)
+                if k > 0 or keep_zero:
+                    spec[t] = k
+                    total += k
+            if total <= 0 or total < best_s:
+                continue
+            if total > best_s:
+                best_s = total
+                cands = []
+            cands.append((i, spec))
+        if not cands:
+            return None
+
+        def _cand_rank(c):
+            i, spec = c
+            K = max(spec.values())
+            pref_pen = 0
+            if use_prefer and not (
+                prefer_min <= int(selectable_places[i]) <= prefer_max
+                and prefer_min <= int(selectable_places[i + K - 1]) <= prefer_max
+            ):
+                pref_pen = 1
+            total_d = 0
+            for t, kk in spec.items():
+                mt_list = mine_by_time.get(str(t).strip()) if mine_by_time else None
+                if mt_list:
+                    for p in selectable_places[i : i + K]:
+                        total_d += _place_distance_to_mine_set(p, mt_list)
+            return (pref_pen, total_d, i)
+
+        best = None
+        for i, spec in sorted(cands, key=_cand_rank):
+            items = []
+            for t in time_preference_order:
+                for j in range(int(spec.get(t, 0))):
+                    items.append({"place": str(selectable_places[i + j]), "time": t})
+            items = normalize_booking_items(items)
+            score = _score_items(items, spec)
+            if best is None or score > float(best.get("score") or -1):
+                best = {"items": items, "level_index": best_s * 1000, "level_spec": dict(spec), "score": score}
+        return best
+
+    if exact_caps is not None:
+        return _solve_exact(exact_caps)
+
     if specs_by_s is not None:
         return _solve_max_total_from_specs(specs_by_s)
 
@@ -2331,6 +3995,7 @@ def solve_refill_need_tiered(matrix, places, intent_base, need_by_time, allow_sc
         return None, {}, ""
     if not isinstance(intent_base, dict):
         return None, {}, ""
+    matrix = as_court_matrix(matrix)
     need = {}
     for t, v in (need_by_time or {}).items():
         try:
@@ -2419,7 +4084,7 @@ def solve_refill_need_tiered(matrix, places, intent_base, need_by_time, allow_sc
             key=lambda p: (_place_distance_to_mine_set(p, mt_list) if mt_list else 0, int(p)),
         )
         for p in sel_scan:
-            if is_matrix_cell_bookable_for_new_booking((matrix.get(str(p)) or {}).get(t)):
+            if matrix.is_bookable(p, t):
                 fake = {
                     "items": [{"place": str(p), "time": t}],
                     "level_index": 0,
@@ -2636,8 +4301,8 @@ def legal_batches_from_booking_record_chunking(items, max_records_per_post, max_
     return [booking_runs_to_flat_items(ch) for ch in chunks if ch]
 
 
-def solve_refill_with_policy(matrix, places, intent_base, need_by_time, allow_scatter, policy):
-    """自动递送 refill：默认单调缺口递降第一可行；独立 refill 仍走分层 solve_refill_need_tiered。"""
+def solve_refill_with_policy(matrix, places, intent_base, need_by_time, allow_scatter, policy, exact=None):
+    """自动递送 refill：默认单调缺口递降第一可行；独立 refill 仍走分层 solve_refill_need_tiered。exact=None 时读全局 delivery_solver_exact。"""
     tag = policy.name if isinstance(policy, RefillPolicySpec) else str(policy)
     if policy == REFILL_POLICY_AUTO_CAMPAIGN and bool(CONFIG.get("delivery_monotone_total_downgrade", True)):
         intent = dict(intent_base)
@@ -2646,7 +4311,10 @@ def solve_refill_with_policy(matrix, places, intent_base, need_by_time, allow_sc
         intent["require_consecutive"] = not bool(allow_scatter)
         if bool(CONFIG.get("delivery_solver_auto_time_consecutive", True)):
             intent["solver_scoring"] = "auto_time_consecutive"
-        solved = solve_candidate_from_matrix(matrix, places, intent, mode="strict")
+        if exact is None:
+            exact = delivery_solver_exact_enabled()
+        solve_mode = "exact" if exact else "strict"
+        solved = solve_candidate_from_matrix(matrix, places, intent, mode=solve_mode)
         if solved and solved.get("items"):
             used = dict(solved.get("level_spec") or {})
             tier = "单调缺口递降"
@@ -3064,6 +4732,8 @@ if os.path.exists(CONFIG_FILE):
                 CONFIG['delivery_monotone_total_downgrade'] = bool(saved['delivery_monotone_total_downgrade'])
             if 'delivery_solver_max_total_cells' in saved:
                 CONFIG['delivery_solver_max_total_cells'] = bool(saved['delivery_solver_max_total_cells'])
+            if 'delivery_solver_exact' in saved:
+                CONFIG['delivery_solver_exact'] = bool(saved['delivery_solver_exact'])
             if 'log_to_file' in saved:
                 CONFIG['log_to_file'] = bool(saved['log_to_file'])
             if 'log_file_dir' in saved and isinstance(saved['log_file_dir'], str):
@@ -3101,6 +4771,8 @@ if os.path.exists(CONFIG_FILE):
                 CONFIG['health_check_start_time'] = normalize_time_str(saved['health_check_start_time']) or CONFIG['health_check_start_time']
             if 'verbose_logs' in saved:
                 CONFIG['verbose_logs'] = bool(saved['verbose_logs'])
+            if 'log_category_levels' in saved:
+                CONFIG['log_category_levels'] = normalize_log_category_levels(saved['log_category_levels'])
             if 'metrics_keep_last' in saved:
                 try:
                     CONFIG['metrics_keep_last'] = max(50, min(5000, int(saved['metrics_keep_last'])))
@@ -3125,6 +4797,69 @@ if os.path.exists(CONFIG_FILE):
                     CONFIG['same_time_precheck_limit'] = int(saved['same_time_precheck_limit'])
                 except Exception:
                     pass
+            if 'gym_session_idle_evict_seconds' in saved:
+                try:
+                    CONFIG['gym_session_idle_evict_seconds'] = max(30, min(86400, int(saved['gym_session_idle_evict_seconds'])))
+                except Exception:
+                    pass
+            if 'gym_session_pool_maxsize' in saved:
+                try:
+                    CONFIG['gym_session_pool_maxsize'] = max(1, min(16, int(saved['gym_session_pool_maxsize'])))
+                except Exception:
+                    pass
+            if 'gym_session_unhealthy_error_streak' in saved:
+                try:
+                    CONFIG['gym_session_unhealthy_error_streak'] = max(1, min(50, int(saved['gym_session_unhealthy_error_streak'])))
+                except Exception:
+                    pass
+            if 'delivery_engine' in saved:
+                mode = str(saved.get('delivery_engine') or 'sequential').strip().lower()
+                CONFIG['delivery_engine'] = mode if mode in DELIVERY_ENGINE_MODES else 'sequential'
+            if 'gym_line_mode' in saved:
+                mode = str(saved.get('gym_line_mode') or 'pinned').strip().lower()
+                CONFIG['gym_line_mode'] = mode if mode in GYM_LINE_MODES else 'pinned'
+            if 'gym_line_probe_interval_seconds' in saved:
+                try:
+                    CONFIG['gym_line_probe_interval_seconds'] = max(1, min(300, int(saved['gym_line_probe_interval_seconds'])))
+                except Exception:
+                    pass
+            if 'refill_worker_pool_size' in saved:
+                try:
+                    CONFIG['refill_worker_pool_size'] = max(1, min(16, int(saved['refill_worker_pool_size'])))
+                except Exception:
+                    pass
+            if 'refill_per_account_concurrency' in saved:
+                try:
+                    CONFIG['refill_per_account_concurrency'] = max(1, min(4, int(saved['refill_per_account_concurrency'])))
+                except Exception:
+                    pass
+            if 'task_fire_lead_seconds' in saved:
+                try:
+                    CONFIG['task_fire_lead_seconds'] = max(0, min(110, int(saved['task_fire_lead_seconds'])))
+                except Exception:
+                    pass
+            if 'scheduler_spin_window_ms' in saved:
+                try:
+                    CONFIG['scheduler_spin_window_ms'] = max(0, min(1000, int(saved['scheduler_spin_window_ms'])))
+                except Exception:
+                    pass
+            if 'clock_sync_enabled' in saved:
+                CONFIG['clock_sync_enabled'] = bool(saved['clock_sync_enabled'])
+            if 'clock_sync_lead_seconds' in saved:
+                try:
+                    CONFIG['clock_sync_lead_seconds'] = max(10, min(900, int(saved['clock_sync_lead_seconds'])))
+                except Exception:
+                    pass
+            if 'clock_sync_max_rtt_ms' in saved:
+                try:
+                    CONFIG['clock_sync_max_rtt_ms'] = max(50, min(5000, int(saved['clock_sync_max_rtt_ms'])))
+                except Exception:
+                    pass
+            if 'matrix_share_max_age_ms' in saved:
+                try:
+                    CONFIG['matrix_share_max_age_ms'] = max(0, min(5000, int(saved['matrix_share_max_age_ms'])))
+                except Exception:
+                    pass
             if 'accounts' in saved and isinstance(saved['accounts'], list):
                 CONFIG['accounts'] = copy.deepcopy(saved['accounts'])
             if 'auth' in saved:
@@ -3306,10 +5041,15 @@ def resolve_account(account_id):
     return None
 
 
-def build_client_for_account(account):
+def build_client_for_account(account, matrix_share=False):
     # 禁止继承 CONFIG["auth"] 的 Cookie/token：否则多线程并行（如 /api/mine-overview）会带上主账号会话，
     # 馆方若以 Cookie 为准则两个账号会拉到同一人的订单，仅 accountId 标签不同。
-    c = ApiClient(inherit_global_auth=False)
+    # Session 取自进程级会话池：同账号跨任务/refill/手动预订复用 keep-alive 连接，避免每次新建 TCP+TLS。
+    # matrix_share 只给只读/UI 路径开：矩阵 GET 带本账号 token，要 POST 的客户端必须自己发 GET 预热 token。
+    shared_session, registry_key = GYM_SESSION_REGISTRY.session_for(account)
+    c = ApiClient(inherit_global_auth=False, session=shared_session)
+    c.session_registry_key = registry_key
+    c.matrix_share = bool(matrix_share)
     c.token = str(account.get("token") or "").strip()
     c.shop_num = str(account.get("shop_num") or "").strip()
     c.card_index = str(account.get("card_index") or "").strip()
@@ -3638,8 +5378,999 @@ class _GymLineHTTPSAdapter(HTTPAdapter):
         return host_params, pool_kwargs
 
 
+def _build_gym_keepalive_session(pool_maxsize):
+    """域名与每条线路 IP 各挂一个 _GymLineHTTPSAdapter，互不挤占 keep-alive 连接池。"""
+    n = max(1, int(pool_maxsize or 1))
+    session = requests.Session()
+    session.mount("https://", _GymLineHTTPSAdapter(GYM_API_TARGET_HOST, pool_connections=1, pool_maxsize=n, max_retries=0))
+    for ip in GYM_API_LINE_IPS:
+        session.mount(
+            f"https://{ip}/",
+            _GymLineHTTPSAdapter(GYM_API_TARGET_HOST, pool_connections=1, pool_maxsize=n, max_retries=0),
+        )
+    return session
+
+
+class GymSessionRegistry:
+    """进程级账号会话池：同一账号在 execute_task / refill 轮询 / 手动 /api/book 之间复用同一个 requests.Session。
+
+    - 按账号 id 建档；token/cookie 变化时整体换新 Session，避免旧会话串号
+    - 连续传输层失败达到阈值判为不健康，下次取用时关闭重建（丢弃可能已半断的 keep-alive 连接）
+    - 空闲超过 gym_session_idle_evict_seconds 由调度线程回收
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+
+    @staticmethod
+    def _settings():
+        try:
+            idle_s = max(30.0, float(CONFIG.get("gym_session_idle_evict_seconds", 900) or 900))
+        except (TypeError, ValueError):
+            idle_s = 900.0
+        try:
+            pool_maxsize = max(1, min(16, int(CONFIG.get("gym_session_pool_maxsize", 4) or 4)))
+        except (TypeError, ValueError):
+            pool_maxsize = 4
+        try:
+            err_streak = max(1, min(50, int(CONFIG.get("gym_session_unhealthy_error_streak", 3) or 3)))
+        except (TypeError, ValueError):
+            err_streak = 3
+        return idle_s, pool_maxsize, err_streak
+
+    @staticmethod
+    def account_key(account):
+        acc = account if isinstance(account, dict) else {}
+        return str(acc.get("id") or acc.get("token") or "").strip()
+
+    @staticmethod
+    def _fingerprint(account):
+        acc = account if isinstance(account, dict) else {}
+        raw = f"{str(acc.get('token') or '').strip()}|{str(acc.get('cookie') or '').strip()}"
+        return hashlib.md5(raw.encode("utf-8")).hexdigest()[:12]
+
+    def session_for(self, account):
+        """取该账号的常驻 Session；无账号 key 时返回 (None, "") 由调用方自建。"""
+        key = self.account_key(account)
+        if not key:
+            return None, ""
+        fp = self._fingerprint(account)
+        _idle_s, pool_maxsize, _streak = self._settings()
+        now = time.monotonic()
+        stale = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry["fingerprint"] != fp or entry["unhealthy"]):
+                stale = entry["session"]
+                reason = "credential_changed" if entry["fingerprint"] != fp else "unhealthy"
+                recycled = int(entry.get("recycle_count") or 0) + 1
+                entry = None
+            else:
+                reason = ""
+                recycled = 0
+            if entry is None:
+                entry = {
+                    "session": _build_gym_keepalive_session(pool_maxsize),
+                    "fingerprint": fp,
+                    "created_mono": now,
+                    "created_at_ms": int(time.time() * 1000),
+                    "last_used_mono": now,
+                    "acquire_count": 0,
+                    "ok_count": 0,
+                    "error_count": 0,
+                    "error_streak": 0,
+                    "unhealthy": False,
+                    "pool_maxsize": pool_maxsize,
+                    "recycle_count": recycled,
+                    "last_recycle_reason": reason,
+                }
+                self._entries[key] = entry
+            entry["last_used_mono"] = now
+            entry["acquire_count"] += 1
+            session = entry["session"]
+        if stale is not None:
+            try:
+                stale.close()
+            except Exception:
+                pass
+            log(f"🔌 [会话池] account={key} 会话已重建 reason={reason}")
+        return session, key
+
+    def note_result(self, key, ok):
+        """传输层结果回报：成功清零失败连击；连击达阈值标记不健康。"""
+        if not key:
+            return
+        _idle_s, _pool, err_streak = self._settings()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return
+            entry["last_used_mono"] = time.monotonic()
+            if ok:
+                entry["ok_count"] += 1
+                entry["error_streak"] = 0
+                return
+            entry["error_count"] += 1
+            entry["error_streak"] += 1
+            if entry["error_streak"] >= err_streak:
+                entry["unhealthy"] = True
+
+    def evict_idle(self):
+        idle_s, _pool, _streak = self._settings()
+        now = time.monotonic()
+        evicted = []
+        with self._lock:
+            for key, entry in list(self._entries.items()):
+                if now - float(entry.get("last_used_mono") or 0.0) >= idle_s:
+                    evicted.append((key, self._entries.pop(key)["session"]))
+        for key, session in evicted:
+            try:
+                session.close()
+            except Exception:
+                pass
+        if evicted:
+            log(f"🔌 [会话池] 回收空闲会话 {len(evicted)} 个: {[k for k, _s in evicted]}")
+        return len(evicted)
+
+    def reset(self, key=None):
+        with self._lock:
+            if key is None:
+                dropped = list(self._entries.values())
+                self._entries.clear()
+            else:
+                e = self._entries.pop(str(key), None)
+                dropped = [e] if e else []
+        for entry in dropped:
+            try:
+                entry["session"].close()
+            except Exception:
+                pass
+        return len(dropped)
+
+    @staticmethod
+    def _pool_stats(session):
+        """读取各 adapter 下 urllib3 连接池的空闲连接数（内部属性，失败即跳过）。"""
+        out = {}
+        for prefix, adapter in list((getattr(session, "adapters", None) or {}).items()):
+            if not prefix.startswith("https://"):
+                continue
+            pm = getattr(adapter, "poolmanager", None)
+            pools = getattr(pm, "pools", None)
+            if pools is None:
+                continue
+            try:
+                for pool_key in list(pools.keys()):
+                    pool = pools.get(pool_key)
+                    if pool is None:
+                        continue
+                    host = str(getattr(pool, "host", "") or "")
+                    q = getattr(pool, "pool", None)
+                    out[host] = {
+                        "idle_connections": int(q.qsize()) if q is not None else 0,
+                        "num_connections": int(getattr(pool, "num_connections", 0) or 0),
+                        "num_requests": int(getattr(pool, "num_requests", 0) or 0),
+                    }
+            except Exception:
+                continue
+        return out
+
+    def snapshot(self):
+        idle_s, pool_maxsize, err_streak = self._settings()
+        now = time.monotonic()
+        with self._lock:
+            items = [(k, dict(e)) for k, e in self._entries.items()]
+        sessions = []
+        for key, e in items:
+            sessions.append({
+                "account_key": key,
+                "created_at_ms": e.get("created_at_ms"),
+                "age_seconds": round(now - float(e.get("created_mono") or now), 1),
+                "idle_seconds": round(now - float(e.get("last_used_mono") or now), 1),
+                "acquire_count": int(e.get("acquire_count") or 0),
+                "ok_count": int(e.get("ok_count") or 0),
+                "error_count": int(e.get("error_count") or 0),
+                "error_streak": int(e.get("error_streak") or 0),
+                "unhealthy": bool(e.get("unhealthy")),
+                "recycle_count": int(e.get("recycle_count") or 0),
+                "last_recycle_reason": str(e.get("last_recycle_reason") or ""),
+                "pool_maxsize": int(e.get("pool_maxsize") or pool_maxsize),
+                "pools": self._pool_stats(e["session"]),
+            })
+        return {
+            "idle_evict_seconds": idle_s,
+            "pool_maxsize": pool_maxsize,
+            "unhealthy_error_streak": err_streak,
+            "sessions": sessions,
+        }
+
+
+GYM_SESSION_REGISTRY = GymSessionRegistry()
+
+GYM_LINE_MODES = ("pinned", "fastest", "race")
+# 线路时延直方图分桶上界（ms），最后一桶为 >3200
+GYM_LINE_LATENCY_BUCKETS_MS = (25, 50, 100, 200, 400, 800, 1600, 3200)
+
+
+def get_gym_line_mode():
+    """双线路模式（全局执行参数）：pinned / fastest / race，见 CONFIG 注释。"""
+    m = str(CONFIG.get("gym_line_mode") or "").strip().lower()
+    return m if m in GYM_LINE_MODES else "pinned"
+
+
+def _gym_line_hist_labels():
+    return [f"le_{b}" for b in GYM_LINE_LATENCY_BUCKETS_MS] + [f"gt_{GYM_LINE_LATENCY_BUCKETS_MS[-1]}"]
+
+
+class GymLineStats:
+    """各线路（GYM_API_LINE_IPS）的实测 RTT / 错误：EWMA 供选线，分桶直方图供 run_metric。
+
+    只统计 URL 直连线路 IP 的请求（走 DNS 的无法归属线路）；进程级一份用于选线，ApiClient 各一份用于单次运行的直方图。
+    """
+
+    def __init__(self, alpha=0.3):
+        self._alpha = float(alpha)
+        self._lock = threading.Lock()
+        self._lines = {}
+
+    def _entry(self, ip):
+        e = self._lines.get(ip)
+        if e is None:
+            e = {
+                "count": 0,
+                "errors": 0,
+                "ewma_ms": None,
+                "err_ewma": 0.0,
+                "last_mono": 0.0,
+                "hist": [0] * (len(GYM_LINE_LATENCY_BUCKETS_MS) + 1),
+            }
+            self._lines[ip] = e
+        return e
+
+    def record(self, ip, elapsed_ms, ok):
+        ip = str(ip or "")
+        if ip not in GYM_API_LINE_IP_SET:
+            return
+        ms = max(0.0, float(elapsed_ms or 0.0))
+        a = self._alpha
+        with self._lock:
+            e = self._entry(ip)
+            e["count"] += 1
+            e["last_mono"] = time.monotonic()
+            e["err_ewma"] = (1.0 - a) * e["err_ewma"] + a * (0.0 if ok else 1.0)
+            if not ok:
+                e["errors"] += 1
+                return
+            e["ewma_ms"] = ms if e["ewma_ms"] is None else (1.0 - a) * e["ewma_ms"] + a * ms
+            idx = len(GYM_LINE_LATENCY_BUCKETS_MS)
+            for i, b in enumerate(GYM_LINE_LATENCY_BUCKETS_MS):
+                if ms <= b:
+                    idx = i
+                    break
+            e["hist"][idx] += 1
+
+    def pick(self, probe_interval_s=None, probe=False):
+        """当前应走的线路：按 ewma_ms×(1+4×错误率) 最小（都没样本时取第一条）。
+
+        probe=True（只给幂等矩阵 GET 用）时无样本或超过 probe_interval_s 未测的线路先轮一次；
+        POST 只按分数选，不拿下单请求去试没测过的线路。
+        """
+        if probe_interval_s is None:
+            try:
+                probe_interval_s = float(CONFIG.get("gym_line_probe_interval_seconds", 5) or 5)
+            except (TypeError, ValueError):
+                probe_interval_s = 5.0
+        now = time.monotonic()
+        best_ip, best_score = GYM_API_LINE_IPS[0], None
+        with self._lock:
+            for ip in GYM_API_LINE_IPS:
+                e = self._lines.get(ip)
+                if e is None or e["ewma_ms"] is None or now - e["last_mono"] >= probe_interval_s:
+                    if probe:
+                        if e is not None:
+                            e["last_mono"] = now
+                        return ip
+                    if e is None or e["ewma_ms"] is None:
+                        continue
+                score = e["ewma_ms"] * (1.0 + 4.0 * e["err_ewma"])
+                if best_score is None or score < best_score:
+                    best_ip, best_score = ip, score
+        return best_ip
+
+    def snapshot(self):
+        with self._lock:
+            return {ip: {**e, "hist": list(e["hist"])} for ip, e in self._lines.items()}
+
+    def histogram_since(self, mark=None):
+        """自 mark（snapshot() 返回值）以来各线路的请求数、错误数与时延直方图，外加当前 ewma_ms。"""
+        mark = mark or {}
+        labels = _gym_line_hist_labels()
+        out = {}
+        for ip, e in self.snapshot().items():
+            m = mark.get(ip) or {}
+            m_hist = m.get("hist") or [0] * len(labels)
+            count = e["count"] - int(m.get("count") or 0)
+            if count <= 0:
+                continue
+            out[ip] = {
+                "count": count,
+                "errors": e["errors"] - int(m.get("errors") or 0),
+                "ewma_ms": None if e["ewma_ms"] is None else round(e["ewma_ms"], 1),
+                "hist": {lb: e["hist"][i] - int(m_hist[i]) for i, lb in enumerate(labels)},
+            }
+        return out
+
+
+def merge_gym_line_latency(base, add):
+    """把一次递送的 gym_line_latency 累加进任务级 run_metrics（计数/直方图相加，ewma_ms 取较新值）。"""
+    if not isinstance(add, dict) or not add:
+        return base if isinstance(base, dict) else {}
+    out = dict(base) if isinstance(base, dict) else {}
+    for ip, row in add.items():
+        if not isinstance(row, dict):
+            continue
+        cur = out.get(ip) or {"count": 0, "errors": 0, "ewma_ms": None, "hist": {}}
+        hist = dict(cur.get("hist") or {})
+        for lb, n in (row.get("hist") or {}).items():
+            hist[lb] = int(hist.get(lb) or 0) + int(n or 0)
+        out[ip] = {
+            "count": int(cur.get("count") or 0) + int(row.get("count") or 0),
+            "errors": int(cur.get("errors") or 0) + int(row.get("errors") or 0),
+            "ewma_ms": row.get("ewma_ms") if row.get("ewma_ms") is not None else cur.get("ewma_ms"),
+            "hist": hist,
+        }
+    return out
+
+
+GYM_LINE_STATS = GymLineStats()
+# race 模式下矩阵 GET 同时发两条线路；输家请求在后台跑完（结果仍计入线路统计，顺带保持该线 keep-alive）
+_GYM_LINE_RACE_POOL = ThreadPoolExecutor(max_workers=8, thread_name_prefix="gym-line-race")
+
+
+def _parse_http_date_ts(date_header):
+    if not date_header:
+        return None
+    try:
+        from email.utils import parsedate_to_datetime
+        server_dt = parsedate_to_datetime(date_header)
+        if server_dt.tzinfo is None:
+            server_dt = server_dt.replace(tzinfo=timezone.utc)
+        return float(int(server_dt.timestamp()))
+    except Exception:
+        return None
+
+
+class ServerClockSync:
+    """
+    馆方服务器时差估计（全局一份，所有账号/线路的响应共用）。
+
+    Date 头只有秒级：收到 Date=S 说明请求在途的某一刻服务器时间落在 [S, S+1)，
+    于是时差 θ ∈ [S - t1, S + 1 - t0]（t0/t1 为本机发出/收到）。多个样本区间求交，
+    恰好跨过秒跳变的样本能把区间收到 RTT 量级；估计取区间中点，不确定度取半宽。
+    - RTT 超过 clock_sync_max_rtt_ms 的样本丢弃；参与求交的只取 RTT 不超过最小 RTT 2 倍（至少 +50ms）的样本
+    - 从最新样本往旧样本求交，遇到矛盾（本机或服务器时钟跳变）就丢掉更旧的样本
+    - 后台探测：定时任务唤醒前 clock_sync_lead_seconds 内，按当前区间中点对准秒边界发 HEAD，每次把区间约减半
+    """
+
+    def __init__(self, window_s=CLOCK_SYNC_WINDOW_SECONDS, max_samples=CLOCK_SYNC_MAX_SAMPLES, now_fn=None):
+        self._window_s = float(window_s)
+        self._now_fn = now_fn or time.time
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=max(1, int(max_samples)))
+        self._est = None
+        self._thread = None
+        self._probe_client = None
+        self._probe_burst_key = None
+        self._probe_burst_count = 0
+        self._stats = {"samples": 0, "rejected_rtt": 0, "dropped_inconsistent": 0, "probes": 0, "probe_errors": 0}
+
+    @staticmethod
+    def _max_rtt_s():
+        try:
+            return max(50, min(5000, int(CONFIG.get("clock_sync_max_rtt_ms", 800) or 800))) / 1000.0
+        except (TypeError, ValueError):
+            return 0.8
+
+    def add_sample(self, date_header, started_at, ended_at):
+        """喂一个响应的 Date 头与本机收发时刻（time.time()）；返回是否被采纳。"""
+        server_s = _parse_http_date_ts(date_header)
+        if server_s is None:
+            return False
+        t0, t1 = float(started_at), float(ended_at)
+        rtt = t1 - t0
+        if rtt < 0:
+            return False
+        with self._lock:
+            if rtt > self._max_rtt_s():
+                self._stats["rejected_rtt"] += 1
+                return False
+            self._samples.append((t0, t1, server_s))
+            self._stats["samples"] += 1
+            self._recompute_locked()
+            offset = self._est["offset_s"] if self._est else None
+        if offset is not None:
+            globals()["_LOG_TIME_OFFSET_SECONDS"] = float(offset)
+        return True
+
+    def _recompute_locked(self):
+        now = self._now_fn()
+        while self._samples and self._samples[0][1] < now - self._window_s:
+            self._samples.popleft()
+        if not self._samples:
+            self._est = None
+            return
+        min_rtt = min(t1 - t0 for t0, t1, _s in self._samples)
+        rtt_cap = max(min_rtt * 2.0, min_rtt + 0.05)
+        lo, hi = float("-inf"), float("inf")
+        used = 0
+        keep_from = 0
+        samples = list(self._samples)
+        for idx in range(len(samples) - 1, -1, -1):
+            t0, t1, server_s = samples[idx]
+            if t1 - t0 > rtt_cap:
+                continue
+            new_lo = max(lo, server_s - t1)
+            new_hi = min(hi, server_s + 1.0 - t0)
+            if new_lo > new_hi:
+                keep_from = idx + 1
+                break
+            lo, hi = new_lo, new_hi
+            used += 1
+        if keep_from:
+            for _ in range(keep_from):
+                self._samples.popleft()
+            self._stats["dropped_inconsistent"] += keep_from
+        if used == 0:
+            self._est = None
+            return
+        self._est = {
+            "offset_s": (lo + hi) / 2.0,
+            "uncertainty_s": (hi - lo) / 2.0,
+            "lo_s": lo,
+            "hi_s": hi,
+            "samples_used": used,
+            "min_rtt_s": min_rtt,
+            "updated_at": now,
+        }
+
+    def estimate(self):
+        """{"offset_ms","uncertainty_ms","samples_used","min_rtt_ms","age_s"}；尚无样本时 None。"""
+        with self._lock:
+            est = dict(self._est) if self._est else None
+        if not est:
+            return None
+        return {
+            "offset_ms": round(est["offset_s"] * 1000.0, 3),
+            "uncertainty_ms": round(est["uncertainty_s"] * 1000.0, 3),
+            "samples_used": est["samples_used"],
+            "min_rtt_ms": round(est["min_rtt_s"] * 1000.0, 3),
+            "age_s": round(max(0.0, self._now_fn() - est["updated_at"]), 3),
+        }
+
+    def offset_seconds(self, default=0.0):
+        with self._lock:
+            return float(self._est["offset_s"]) if self._est else float(default or 0.0)
+
+    def now(self):
+        return datetime.now() + timedelta(seconds=self.offset_seconds())
+
+    def next_probe_delay(self):
+        """按当前估计：距下一个「到达服务器时恰在整秒」的本机发送时刻还有几秒（用于二分收紧区间）。"""
+        with self._lock:
+            est = dict(self._est) if self._est else None
+        now = self._now_fn()
+        if not est:
+            return 0.0
+        owd = est["min_rtt_s"] / 2.0
+        server_at_arrival = now + owd + est["offset_s"]
+        delay = (int(server_at_arrival) + 1) - server_at_arrival
+        return delay if delay >= 0.3 else delay + 1.0
+
+    def probe_once(self, client=None):
+        """对馆方发一次 HEAD，只为拿 Date 头；返回是否采到样本。"""
+        c = client or ApiClient(inherit_global_auth=False)
+        url = c._gym_https_url(CLOCK_SYNC_PROBE_PATH)
+        t0 = time.time()
+        try:
+            resp = c.session.head(url, headers=c.headers, timeout=max(0.5, self._max_rtt_s() * 2), verify=False, allow_redirects=False)
+        except requests.RequestException:
+            with self._lock:
+                self._stats["probe_errors"] += 1
+            return False
+        t1 = time.time()
+        with self._lock:
+            self._stats["probes"] += 1
+        return self.add_sample((resp.headers or {}).get("Date"), t0, t1)
+
+    def start_background(self):
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._probe_loop, name="clock-sync", daemon=True)
+            self._thread.start()
+
+    def _probe_loop(self):
+        while True:
+            try:
+                sleep_s = self._probe_step()
+            except Exception as e:
+                log(f"⚠️ [时钟同步] 后台探测异常: {e}")
+                sleep_s = 30.0
+            time.sleep(max(0.05, sleep_s))
+
+    def _probe_step(self):
+        """一次调度判断：需要探测时对准秒边界发一个 HEAD；返回下次检查前的睡眠秒数。"""
+        if not bool(CONFIG.get("clock_sync_enabled", True)):
+            return 30.0
+        wake_dt = PRECISE_TASK_SCHEDULER.next_wake_at()
+        if wake_dt is None:
+            return 30.0
+        try:
+            lead_s = float(max(10, min(900, int(CONFIG.get("clock_sync_lead_seconds", 120) or 120))))
+        except (TypeError, ValueError):
+            lead_s = 120.0
+        to_wake = (wake_dt - self.now()).total_seconds()
+        if to_wake > lead_s:
+            return min(30.0, to_wake - lead_s)
+        if to_wake < 1.0:
+            return 1.0
+        burst_key = wake_dt.isoformat()
+        if burst_key != self._probe_burst_key:
+            self._probe_burst_key = burst_key
+            self._probe_burst_count = 0
+        est = self.estimate()
+        if est and est["uncertainty_ms"] <= CLOCK_SYNC_TARGET_UNCERTAINTY_MS and est["age_s"] < 60:
+            return min(5.0, to_wake)
+        if self._probe_burst_count >= CLOCK_SYNC_BURST_MAX_PROBES:
+            return min(5.0, to_wake)
+        self._probe_burst_count += 1
+        if self._probe_client is None:
+            self._probe_client = ApiClient(inherit_global_auth=False)
+        precise_sleep_until(time.perf_counter() + self.next_probe_delay(), spin_s=0.005)
+        self.probe_once(self._probe_client)
+        return 0.05
+
+    def stats(self):
+        with self._lock:
+            out = {**self._stats, "window_samples": len(self._samples)}
+        out["estimate"] = self.estimate()
+        return out
+
+
+SERVER_CLOCK = ServerClockSync()
+
+
+def _matrix_request_timeout_seconds(request_timeout=None):
+    raw = request_timeout if request_timeout is not None else CONFIG.get('matrix_timeout_seconds', 3.0)
+    return max(0.5, float(raw or 3.0))
+
+
+def matrix_share_max_age_seconds():
+    """跨账号共用矩阵的保鲜上限：matrix_share_max_age_ms，且不超过 delivery_plan_max_age_seconds。"""
+    try:
+        share_s = max(0.0, float(CONFIG.get("matrix_share_max_age_ms", 0) or 0)) / 1000.0
+    except (TypeError, ValueError):
+        share_s = 0.0
+    try:
+        plan_s = float(CONFIG.get("delivery_plan_max_age_seconds", 8.0) or 8.0)
+    except (TypeError, ValueError):
+        plan_s = 8.0
+    return min(share_s, plan_s)
+
+
+class SharedMatrixService:
+    """
+    进程级场地矩阵共享：余量与账号无关（只有 mine 覆盖因人而异），同一 (馆方地址, shop_num, 日期) 的基础矩阵
+    多账号共用一次 GET。
+
+    - single-flight：同 key 已有在途请求（且比调用方见过的更新）时，后来者一律等它的结果而不再发请求——
+      它回来的数据不会比自己现在另发一次更旧，与 max_age_s 无关（max_age_s=0 也照样合并并发请求）
+    - 保鲜：已完成结果按「请求发出时刻」计龄，不超过 max_age_s 才复用；min_gen 要求比调用方上次见过的更新
+    - 只缓存成功结果；失败只回给同一轮的等待者（由调用方决定是否自己重拉）
+    """
+
+    def __init__(self, max_entries=32):
+        self._lock = threading.Lock()
+        self._max_entries = max(1, int(max_entries))
+        self._entries = {}
+        self._inflight = {}
+        self._gen = 0
+        self._stats = {"fetches": 0, "reused": 0, "joined": 0, "fallbacks": 0, "errors": 0, "wait_timeouts": 0}
+
+    def fetch(self, key, fetch_fn, max_age_s, min_gen=0, wait_timeout_s=5.0):
+        """返回 (结果, 代次, 是否取自别人的请求)。"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry["gen"] > min_gen and now - entry["started_at"] <= max_age_s:
+                self._stats["reused"] += 1
+                return entry["data"], entry["gen"], True
+            flight = self._inflight.get(key)
+            owner = not (flight and flight["gen"] > min_gen)
+            if owner:
+                self._gen += 1
+                flight = {"gen": self._gen, "started_at": now, "done": threading.Event(), "data": None}
+                self._inflight[key] = flight
+                self._stats["fetches"] += 1
+            else:
+                self._stats["joined"] += 1
+        if not owner:
+            if not flight["done"].wait(wait_timeout_s):
+                with self._lock:
+                    self._stats["wait_timeouts"] += 1
+                return None, flight["gen"], True
+            return flight["data"], flight["gen"], True
+        data = None
+        try:
+            data = fetch_fn()
+        except Exception as e:
+            data = {"error": str(e)}
+        finally:
+            with self._lock:
+                flight["data"] = data
+                if self._inflight.get(key) is flight:
+                    self._inflight.pop(key, None)
+                if isinstance(data, dict) and not data.get("error"):
+                    cur = self._entries.get(key)
+                    if cur is None or cur["gen"] < flight["gen"]:
+                        self._entries[key] = {"gen": flight["gen"], "started_at": flight["started_at"], "data": data}
+                    if len(self._entries) > self._max_entries:
+                        oldest = min(self._entries, key=lambda k: self._entries[k]["started_at"])
+                        self._entries.pop(oldest, None)
+                else:
+                    self._stats["errors"] += 1
+            flight["done"].set()
+        return data, flight["gen"], False
+
+    def note_fallback(self):
+        with self._lock:
+            self._stats["fallbacks"] += 1
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["cached_keys"] = len(self._entries)
+            out["inflight"] = len(self._inflight)
+            return out
+
+
+MATRIX_SHARE = SharedMatrixService()
+
+
+# 我的订单索引：超过此龄再被 get_matrix 读到时后台增量刷新；距上次全量超过后者时翻完全部页
+MINE_INDEX_MAX_AGE_SECONDS = 60.0
+MINE_INDEX_FULL_REFRESH_SECONDS = 600.0
+
+
+def order_mine_cells(order):
+    """单条订单 → (billNum, ((日期, 场地, 时段), ...))；已取消等不计入 mine 的订单格子为空。日期口径与 _extract_mine_slots 一致。"""
+    bill_num = str(
+        order.get("billNum") or order.get("outtradeno") or order.get("outTradeNo") or order.get("orderNum") or ""
+    ).strip() if isinstance(order, dict) else ""
+    if not _order_row_eligible_for_mine_slots(order):
+        return bill_num, ()
+    arr = order.get("jsonArray") or []
+    if not isinstance(arr, list):
+        return bill_num, ()
+    cells = []
+    for seg in arr:
+        if not isinstance(seg, dict):
+            continue
+        seg_date = normalize_order_schedule_date_key(seg.get("reversionDate"))
+        if not seg_date:
+            seg_date = normalize_order_schedule_date_key(order.get("readydate"))
+        if not seg_date:
+            continue
+        m = re.search(r"(\d+)", str(seg.get("siteName", "")))
+        if not m:
+            continue
+        start = normalize_time_str(seg.get("start"))
+        end = normalize_time_str(seg.get("end"))
+        if not start or not end:
+            continue
+        try:
+            cur = datetime.strptime(start, "%H:%M")
+            end_dt = datetime.strptime(end, "%H:%M")
+        except ValueError:
+            continue
+        while cur < end_dt:
+            cells.append((seg_date, m.group(1), cur.strftime("%H:%M")))
+            cur += timedelta(hours=1)
+    return bill_num, tuple(sorted(set(cells)))
+
+
+class MineOrderIndex:
+    """
+    单账号「我的订单」索引：(日期, 场地, 时段) → billNum，get_matrix 叠加 mine 覆盖只查表（O(格数)），不再同步翻订单。
+
+    - 读永不阻塞：overlay() 只读当前索引；索引未加载、过期或被作废时顺手起后台刷新（同一时刻最多一个）
+    - 增量刷新：getPlaceOrder 按下单时间倒序分页，遇到整页订单与索引一致即停；被作废后或距上次全量超过
+      MINE_INDEX_FULL_REFRESH_SECONDS 时翻完 max_pages 页，以接口为准整体替换
+    - 作废：本账号 POST 被受理（note_booked 先乐观记入格子，billNum 待刷新补上）、取消成功（note_cancelled 先删该单）
+    刷新失败保留旧索引，等下次读到时再试。
+    """
+
+    def __init__(self, page_size=20, max_pages=4):
+        self.page_size = max(10, min(50, int(page_size)))
+        self.max_pages = max(1, min(25, int(max_pages)))
+        self._lock = threading.Lock()
+        self._orders = {}
+        self._pending = {}
+        self._slots = {}
+        self._loaded_mono = None
+        self._full_mono = None
+        self._epoch = 0
+        self._needs_full = True
+        self._refreshing = False
+        self._stats = {"refreshes": 0, "full_refreshes": 0, "pages": 0, "errors": 0, "last_error": "", "overlays": 0}
+
+    def _rebuild_slots(self):
+        slots = {}
+        for bill, cells in list(self._orders.items()) + list(self._pending.items()):
+            for d, p, t in cells:
+                slots.setdefault(d, {})[(p, t)] = "" if bill.startswith("pending:") else bill
+        self._slots = slots
+
+    def slots_for(self, date_str):
+        """{(场地, 时段): billNum}（乐观记入、尚未刷新到的格子 billNum 为空串）。"""
+        key = normalize_order_schedule_date_key(date_str) or str(date_str or "")
+        with self._lock:
+            return dict(self._slots.get(key) or {})
+
+    def is_stale(self):
+        with self._lock:
+            return self._needs_full or self._loaded_mono is None or time.monotonic() - self._loaded_mono > MINE_INDEX_MAX_AGE_SECONDS
+
+    def overlay(self, client, date_str, matrix):
+        """把本账号的格子在（可写的）matrix 上标为 mine，返回 (标记数, 索引年龄毫秒或 None)；索引不新鲜时后台刷新。"""
+        key = normalize_order_schedule_date_key(date_str) or str(date_str or "")
+        with self._lock:
+            day = self._slots.get(key) or {}
+            loaded = self._loaded_mono
+            self._stats["overlays"] += 1
+        count = 0
+        for p, t in day:
+            row = matrix.get(p)
+            if row is not None and t in row:
+                row[t] = "mine"
+                count += 1
+        if self.is_stale():
+            self.refresh_async(client)
+        age_ms = None if loaded is None else int((time.monotonic() - loaded) * 1000)
+        return count, age_ms
+
+    def note_booked(self, date_str, items):
+        key = normalize_order_schedule_date_key(date_str) or str(date_str or "")
+        cells = tuple(
+            (key, str(it.get("place") or "").strip(), str(it.get("time") or "").strip())
+            for it in normalize_booking_items(items or [])
+            if str(it.get("place") or "").strip() and str(it.get("time") or "").strip()
+        )
+        if not cells:
+            return
+        with self._lock:
+            self._pending[f"pending:{self._epoch}:{len(self._pending)}"] = cells
+            self._epoch += 1
+            self._needs_full = True
+            self._rebuild_slots()
+
+    def note_cancelled(self, bill_num):
+        with self._lock:
+            self._orders.pop(str(bill_num or "").strip(), None)
+            self._epoch += 1
+            self._needs_full = True
+            self._rebuild_slots()
+
+    def refresh_async(self, client):
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+        threading.Thread(target=self._refresh_locked_out, args=(client,), name="mine-index", daemon=True).start()
+        return True
+
+    def _refresh_locked_out(self, client):
+        try:
+            self._refresh(client)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def refresh(self, client):
+        """同步刷新一次（已有刷新在跑时返回 False）；返回是否成功。"""
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+        try:
+            return self._refresh(client)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def _refresh(self, client):
+        with self._lock:
+            epoch = self._epoch
+            full = self._needs_full or self._full_mono is None or (
+                time.monotonic() - self._full_mono > MINE_INDEX_FULL_REFRESH_SECONDS
+            )
+            known = dict(self._orders)
+        fetched = {}
+        seen = set()
+        err = ""
+        for page_no in range(self.max_pages):
+            items, err = client.fetch_place_order_page(page_no, self.page_size)
+            if err:
+                break
+            with self._lock:
+                self._stats["pages"] += 1
+            changed = False
+            for order in items:
+                bill, cells = order_mine_cells(order)
+                if not bill:
+                    bill = f"nobill:{page_no}:{len(seen)}"
+                seen.add(bill)
+                if cells:
+                    fetched[bill] = cells
+                if known.get(bill, ()) != cells:
+                    changed = True
+            if len(items) < self.page_size or (not full and not changed):
+                break
+        with self._lock:
+            if err:
+                self._stats["errors"] += 1
+                self._stats["last_error"] = str(err)[:200]
+                return False
+            if full:
+                self._orders = fetched
+            else:
+                merged = {b: c for b, c in self._orders.items() if b not in seen}
+                merged.update(fetched)
+                self._orders = merged
+            now = time.monotonic()
+            self._loaded_mono = now
+            self._stats["refreshes"] += 1
+            if full:
+                self._full_mono = now
+                self._stats["full_refreshes"] += 1
+            if self._epoch == epoch:
+                # 期间没有新的下单/取消：乐观格子已由接口结果取代
+                self._pending = {}
+                self._needs_full = False
+            self._rebuild_slots()
+            return True
+
+    def stats(self):
+        with self._lock:
+            out = dict(self._stats)
+            out["orders"] = len(self._orders)
+            out["pending"] = len(self._pending)
+            out["age_ms"] = None if self._loaded_mono is None else int((time.monotonic() - self._loaded_mono) * 1000)
+            out["needs_full"] = self._needs_full
+            return out
+
+
+_MINE_ORDER_INDEXES = {}
+_MINE_ORDER_INDEXES_LOCK = threading.Lock()
+
+
+def mine_order_index_for(client):
+    """按 (shop_num, token 指纹) 取进程级订单索引：同账号的各个 ApiClient 共用，换 token 即换索引。"""
+    token = str(getattr(client, "token", "") or "").strip()
+    key = f"{str(getattr(client, 'shop_num', '') or '').strip()}|{hashlib.md5(token.encode('utf-8')).hexdigest()[:12]}"
+    with _MINE_ORDER_INDEXES_LOCK:
+        idx = _MINE_ORDER_INDEXES.get(key)
+        if idx is None:
+            idx = MineOrderIndex()
+            _MINE_ORDER_INDEXES[key] = idx
+        return idx
+
+
+def state_sampler_key(client, date_str):
+    """STATE_SAMPLER 的比较 key：(shop_num, token 指纹, 日期)。state 2（mine）因账号而异，不同账号交替拉同一天不能互相比出假流转。"""
+    token = str(getattr(client, "token", "") or "").strip()
+    return (
+        str(getattr(client, "shop_num", "") or "").strip(),
+        hashlib.md5(token.encode("utf-8")).hexdigest()[:12],
+        str(date_str or ""),
+    )
+
+
+def mine_order_index_stats():
+    with _MINE_ORDER_INDEXES_LOCK:
+        items = list(_MINE_ORDER_INDEXES.items())
+    return {key.split("|", 1)[0] + "|" + key.rsplit("|", 1)[-1][:6]: idx.stats() for key, idx in items}
+
+
+class _MatrixPrefetcher:
+    """pipelined 递送引擎：POST 在途时用单个后台线程预拉下一轮矩阵（同一 ApiClient / Session）。
+
+    后台线程继承发起方的 runtime_request_context，静默窗口 owner 判定与主线程一致。
+    """
+
+    def __init__(self, client, date_str, request_timeout):
+        self._client = client
+        self._date_str = date_str
+        self._request_timeout = request_timeout
+        self._pool = None
+        self._future = None
+        self._started_mono = None
+        self.started_count = 0
+
+    def pending(self):
+        return self._future is not None
+
+    def start(self):
+        if self._future is not None:
+            return False
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mx-prefetch")
+        ctx = get_runtime_request_context()
+
+        def _fetch():
+            with runtime_request_context(ctx.get("kind") or "delivery_prefetch", task_id=ctx.get("task_id"), owner=bool(ctx.get("owner"))):
+                return self._client.get_matrix(
+                    self._date_str,
+                    include_mine_overlay=False,
+                    request_timeout=self._request_timeout,
+                    bypass_cache=True,
+                )
+
+        self._started_mono = time.monotonic()
+        self._future = self._pool.submit(_fetch)
+        self.started_count += 1
+        return True
+
+    def take(self):
+        """等待在途预拉并取走结果：返回 (matrix_res, started_mono)；无在途返回 (None, None)。"""
+        fut = self._future
+        if fut is None:
+            return None, None
+        started = self._started_mono
+        self._future = None
+        self._started_mono = None
+        try:
+            return fut.result(), started
+        except Exception as e:
+            return {"error": str(e)}, started
+
+    def close(self):
+        fut = self._future
+        self._future = None
+        if fut is not None:
+            fut.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
+
+
+def overlay_accepted_cells_on_matrix(matrix, accepted_cells):
+    """把本会话已被服务端接受的格子在矩阵副本上标为 booked，避免 POST 在途时预拉的旧快照被再次选中。
+
+    只复制被改动的场地行，原矩阵（可能仍被 get_matrix 缓存引用）不受影响。
+    """
+    if not isinstance(matrix, dict) or not accepted_cells:
+        return matrix
+    out = dict(matrix)
+    touched = False
+    for p, t in accepted_cells:
+        row = out.get(str(p))
+        if not isinstance(row, dict) or str(t) not in row:
+            continue
+        if not is_matrix_cell_bookable_for_new_booking(row.get(str(t))):
+            continue
+        if row is matrix.get(str(p)):
+            row = dict(row)
+            out[str(p)] = row
+        row[str(t)] = "booked"
+        touched = True
+    if isinstance(matrix, CourtMatrix):
+        return CourtMatrix(out, times=matrix.times) if touched else matrix
+    return out
+
+
 class ApiClient:
-    def __init__(self, inherit_global_auth=True):
+    def __init__(self, inherit_global_auth=True, session=None):
         self.host = GYM_API_TARGET_HOST
         self.headers = {
             "Host": self.host,
@@ -3662,23 +6393,119 @@ class ApiClient:
             self.shop_num = ""
             self.card_index = ""
             self.card_st_id = ""
-        self.session = requests.Session()
-        self.session.mount("https://", _GymLineHTTPSAdapter(GYM_API_TARGET_HOST, max_retries=0))
+        if session is not None:
+            self.session = session
+        else:
+            self.session = requests.Session()
+            self.session.mount("https://", _GymLineHTTPSAdapter(GYM_API_TARGET_HOST, max_retries=0))
+        # 来自 GYM_SESSION_REGISTRY 时记录账号 key，传输层结果回报给会话池做健康判定
+        self.session_registry_key = ""
         self.gym_connect_ip = ""
-        self.server_time_offset_seconds = 0.0
+        # 非空时馆方 URL 前缀改为该地址（离线模拟器），Host/Origin 头不变
+        self.gym_base_url = str(os.environ.get(GYM_API_BASE_URL_ENV, "") or "").strip().rstrip("/")
+        # 本客户端的线路观测（递送 run_metric.gym_line_latency 取区间差）；选线用进程级 GYM_LINE_STATS
+        self.line_stats = GymLineStats()
+        self.server_time_offset_seconds = SERVER_CLOCK.offset_seconds()
         self._matrix_cache = {}
         self._matrix_cache_window_s = 0.12
         self._matrix_cache_lock = threading.Lock()
+        # True 时基础矩阵经 MATRIX_SHARE 与其它账号共用（build_client_for_account 打开）；递送期间保鲜上限再取
+        # 本次 delivery_plan_max_age_seconds；_matrix_share_seen 记各 key 本客户端见过的最新代次
+        self.matrix_share = False
+        self.matrix_share_age_cap_s = None
+        self._matrix_share_seen = {}
+        # get_matrix 成功解析的累计：次数 / 响应字节 / 解析耗时 / 取自共享的次数（递送 run_metric 取区间差）
+        self.matrix_parse_stats = {"polls": 0, "bytes": 0, "parse_ms": 0.0, "shared": 0}
+
+    def matrix_parse_snapshot(self):
+        with self._matrix_cache_lock:
+            return dict(self.matrix_parse_stats)
+
+    def matrix_parse_delta(self, since):
+        """与 matrix_parse_snapshot() 之差，键名即 run_metric 字段。"""
+        now = self.matrix_parse_snapshot()
+        since = since or {}
+        return {
+            "matrix_parse_count": int(now["polls"] - int(since.get("polls") or 0)),
+            "matrix_parse_ms_total": round(now["parse_ms"] - float(since.get("parse_ms") or 0.0), 3),
+            "matrix_response_bytes_total": int(now["bytes"] - int(since.get("bytes") or 0)),
+            "matrix_shared_count": int(now["shared"] - int(since.get("shared") or 0)),
+        }
 
-    def _gym_tcp_netloc(self):
+    def _note_session_result(self, ok):
+        key = str(getattr(self, "session_registry_key", "") or "")
+        if key:
+            GYM_SESSION_REGISTRY.note_result(key, ok)
+
+    def _gym_tcp_netloc(self, probe=False):
         ip = str(getattr(self, "gym_connect_ip", "") or "").strip()
         if ip in GYM_API_LINE_IP_SET:
             return ip
+        if get_gym_line_mode() != "pinned":
+            return GYM_LINE_STATS.pick(probe=probe)
         return self.host
 
-    def _gym_https_url(self, path_norm):
+    def _gym_line_racing(self):
+        """race 模式且未按账号指定线路、未指向离线模拟器时，幂等 GET 才双线竞速。"""
+        if get_gym_line_mode() != "race" or str(getattr(self, "gym_base_url", "") or "").strip():
+            return False
+        return str(getattr(self, "gym_connect_ip", "") or "").strip() not in GYM_API_LINE_IP_SET
+
+    def _note_line_result(self, url, elapsed_ms, ok):
+        try:
+            ip = urllib.parse.urlparse(url).hostname or ""
+        except Exception:
+            return
+        if ip in GYM_API_LINE_IP_SET:
+            GYM_LINE_STATS.record(ip, elapsed_ms, ok)
+            self.line_stats.record(ip, elapsed_ms, ok)
+
+    def _timed_line_get(self, url, params, timeout):
+        t0 = time.perf_counter()
+        try:
+            resp = self.session.get(url, headers=self.headers, params=params, timeout=timeout, verify=False)
+        except Exception:
+            self._note_line_result(url, (time.perf_counter() - t0) * 1000.0, False)
+            raise
+        ok = int(getattr(resp, "status_code", 0) or 0) < 500
+        self._note_line_result(url, (time.perf_counter() - t0) * 1000.0, ok)
+        return resp
+
+    def _line_get(self, path_norm, params, timeout):
+        """馆方幂等 GET：race 模式两条线路同时发、取先成功者；否则按 _gym_https_url(probe=True) 选定的线路发一次（轮测线路只走这里）。"""
+        if not self._gym_line_racing():
+            return self._timed_line_get(self._gym_https_url(path_norm, probe=True), params, timeout)
+        tail = str(path_norm or "").strip().lstrip("/")
+        futures = [
+            _GYM_LINE_RACE_POOL.submit(self._timed_line_get, f"https://{ip}/{tail}", params, timeout)
+            for ip in GYM_API_LINE_IPS
+        ]
+        first_exc = None
+        fallback_resp = None
+        pending = set(futures)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for fut in done:
+                exc = fut.exception()
+                if exc is None:
+                    resp = fut.result()
+                    if int(getattr(resp, "status_code", 0) or 0) < 500 or not pending:
+                        return resp
+                    # 先回的 5xx 留作兜底：另一条线路若抛异常，仍把真实的馆方响应交给调用方
+                    if fallback_resp is None:
+                        fallback_resp = resp
+                elif first_exc is None:
+                    first_exc = exc
+        if fallback_resp is not None:
+            return fallback_resp
+        raise first_exc
+
+    def _gym_https_url(self, path_norm, probe=False):
         tail = str(path_norm or "").strip().lstrip("/")
-        return f"https://{self._gym_tcp_netloc()}/{tail}"
+        base = str(getattr(self, "gym_base_url", "") or "").strip().rstrip("/")
+        if base:
+            return f"{base}/{tail}"
+        return f"https://{self._gym_tcp_netloc(probe=probe)}/{tail}"
 
     def _quiet_scope_from_client(self):
         return build_quiet_window_scope(auth={"token": self.token, "shop_num": self.shop_num})
@@ -3731,20 +6558,11 @@ class ApiClient:
         date_header = (resp.headers or {}).get("Date") if resp is not None else None
         if not date_header:
             return
-        try:
-            from email.utils import parsedate_to_datetime
-            server_dt = parsedate_to_datetime(date_header)
-            if server_dt.tzinfo is None:
-                server_dt = server_dt.replace(tzinfo=timezone.utc)
-            server_ts = server_dt.timestamp()
-            midpoint = (started_at + ended_at) / 2.0
-            self.server_time_offset_seconds = server_ts - midpoint
-            globals()["_LOG_TIME_OFFSET_SECONDS"] = float(self.server_time_offset_seconds or 0.0)
-        except Exception:
-            return
+        SERVER_CLOCK.add_sample(date_header, started_at, ended_at)
+        self.server_time_offset_seconds = SERVER_CLOCK.offset_seconds(self.server_time_offset_seconds)
 
     def get_aligned_now(self):
-        return datetime.now() + timedelta(seconds=float(self.server_time_offset_seconds or 0.0))
+        return datetime.now() + timedelta(seconds=SERVER_CLOCK.offset_seconds(self.server_time_offset_seconds))
 
     def _fieldinfo_place_labels(self, p_num):
         try:
@@ -4086,6 +6904,8 @@ class ApiClient:
             )
             ended_at = time.time()
             self._update_server_time_offset(resp, started_at, ended_at)
+            self._note_session_result(True)
+            self._note_line_result(url, (ended_at - started_at) * 1000.0, int(getattr(resp, "status_code", 0) or 0) < 500)
             text = (resp.text or "").strip()
             try:
                 resp_data = resp.json()
@@ -4101,6 +6921,8 @@ class ApiClient:
                 "elapsed_ms": int(max(0.0, ended_at - started_at) * 1000),
             }
         except Exception as e:
+            self._note_session_result(False)
+            self._note_line_result(url, (time.time() - started_at) * 1000.0, False)
             return {
                 "ok": False,
                 "exception_text": str(e),
@@ -4141,6 +6963,7 @@ class ApiClient:
         """全量间隔 POST：枚举单场地连续 L 小时块，按 min_post_interval 递送；动态剔除候选。"""
         url = self._gym_https_url("easyserpClient/place/reservationPlace")
         campaign_started_at = time.time()
+        line_stats_at_start = self.line_stats.snapshot()
         run_id = f"ip-{int(campaign_started_at * 1000)}-{random.randint(1000, 9999)}"
         run_metric = {
             "run_id": run_id,
@@ -4269,9 +7092,9 @@ class ApiClient:
         post_spacing = {"last_end_mono": None}
         success_items_acc = []
 
-        log(
-            f"[全量间隔POST] 开始 date={date_str} candidates={len(blocks)} "
-            f"goal_cells={remaining_goal} min_post_interval={delivery_min_post_interval_s}s budget={delivery_total_budget_s}s"
+        log_event(
+            "interval_post", "start", date=date_str, candidates=len(blocks), goal_cells=remaining_goal,
+            min_post_interval=delivery_min_post_interval_s, budget=delivery_total_budget_s,
         )
 
         if bool(tc.get("interval_post_prewarm_matrix")):
@@ -4279,8 +7102,9 @@ class ApiClient:
                 mx_to = max(0.5, float(CONFIG.get("matrix_timeout_seconds", 10.0) or 10.0))
             except (TypeError, ValueError):
                 mx_to = 10.0
+            # pipelined 下也阻塞等预热完成：它是首个 POST 前本账号 token 的预热 GET，放到后台会和 POST 抢跑
             _ = self.get_matrix(date_str, include_mine_overlay=False, request_timeout=mx_to)
-            log("[全量间隔POST] 已执行 prewarm get_matrix（可忽略失败）")
+            log_event("interval_post", "prewarm")
 
         queue = deque(blocks)
         retry_counts = {}
@@ -4324,6 +7148,7 @@ class ApiClient:
             run_metric["attempt_count_total"] = int(run_metric.get("attempt_count_total") or 0) + 1
             run_metric["dispatch_round_count"] = int(run_metric.get("dispatch_round_count") or 0) + 1
             run_metric.setdefault("submit_latencies_ms", []).append(int(result.get("elapsed_ms") or 0))
+            run_metric.setdefault("post_latencies_ms", []).append(int(result.get("elapsed_ms") or 0))
 
             if result.get("ok"):
                 raw_msg = str(result.get("raw_message") or "")[:200]
@@ -4356,7 +7181,8 @@ class ApiClient:
                 booked_hours = {str(t) for t in (cand.get("times") or [])}
                 remaining_goal -= len(booked_hours)
                 prune_queue_overlap(cand.get("place"), booked_hours)
-                log(f"[全量间隔POST] 成功 items={batch_items} 剩余目标格={remaining_goal}")
+                self.mine_order_index().note_booked(date_str, batch_items)
+                log_event("interval_post", "success", items=batch_items, remaining=remaining_goal)
                 if remaining_goal <= 0:
                     run_metric["goal_satisfied"] = True
                     run_metric["stopped_by"] = "goal_satisfied"
@@ -4368,7 +7194,7 @@ class ApiClient:
 
             if mapped == "drop_candidate":
                 run_metric["interval_candidates_pruned"] = int(run_metric.get("interval_candidates_pruned") or 0) + 1
-                log(f"[全量间隔POST] 剔除候选 {cid} msg={classified.get('normalized_msg', '')[:120]}")
+                log_event("interval_post", "drop", cid=cid, msg=classified.get("normalized_msg", ""))
                 continue
 
             if mapped == "terminal_fail":
@@ -4379,6 +7205,7 @@ class ApiClient:
                 run_metric["delivery_status"] = "exhausted"
                 run_metric["business_status"] = "fail"
                 run_metric["delivery_window_ms"] = int(max(0.0, time.time() - campaign_started_at) * 1000)
+                run_metric["gym_line_latency"] = self.line_stats.histogram_since(line_stats_at_start)
                 return {
                     "status": "fail",
                     "msg": run_metric["business_fail_msg"] or "全量间隔 POST 终局失败",
@@ -4392,7 +7219,7 @@ class ApiClient:
             retry_counts[cid] = rc
             if rc > max_retry_per_candidate:
                 run_metric["interval_candidates_pruned"] = int(run_metric.get("interval_candidates_pruned") or 0) + 1
-                log(f"[全量间隔POST] 候选 {cid} 重试超限，丢弃")
+                log_event("interval_post", "retry_exhausted", cid=cid)
                 continue
             run_metric["interval_retry_requeued"] = int(run_metric.get("interval_retry_requeued") or 0) + 1
             queue.append(cand)
@@ -4405,9 +7232,10 @@ class ApiClient:
                 except (TypeError, ValueError):
                     jitter = 0
                 time.sleep(0.5 + (random.uniform(0.0, jitter / 1000.0) if jitter else 0.0))
-            log(f"[全量间隔POST] 可重试，候选回队尾 {cid} ({mapped})")
+            log_event("interval_post", "requeue", cid=cid, mapped=mapped)
 
         run_metric["delivery_window_ms"] = int(max(0.0, time.time() - campaign_started_at) * 1000)
+        run_metric["gym_line_latency"] = self.line_stats.histogram_since(line_stats_at_start)
         if remaining_goal <= 0:
             run_metric["goal_satisfied"] = True
             run_metric["stopped_by"] = run_metric.get("stopped_by") or "goal_satisfied"
@@ -4527,7 +7355,23 @@ class ApiClient:
             "primary_first_business_action": None,
             "refill_need_snapshot": {},
             "terminal_snapshot": {},
+            "delivery_engine": get_delivery_engine_mode(),
+            "gym_line_mode": get_gym_line_mode(),
+            "pipelined_matrix_prefetch_count": 0,
+            "pipelined_matrix_hit_count": 0,
+            "pipelined_matrix_discard_count": 0,
+            "pipelined_matrix_prefetch_skipped_count": 0,
+            "refill_solve_skipped_count": 0,
+            "solver_plan_cache_hit_count": 0,
+            "solver_plan_cache_miss_count": 0,
+            "matrix_parse_count": 0,
+            "matrix_parse_ms_total": 0.0,
+            "matrix_response_bytes_total": 0,
+            "matrix_shared_count": 0,
         }
+        plan_cache_counters_at_start = SOLVER_PLAN_CACHE.thread_counters()
+        matrix_parse_at_start = self.matrix_parse_snapshot()
+        line_stats_at_start = self.line_stats.snapshot()
         phase_clock = {}
 
         def _campaign_ms_now():
@@ -4621,6 +7465,8 @@ class ApiClient:
                 return CONFIG.get(key, default)
             if key == "max_places_per_timeslot":
                 return int(account_max_places)
+            if key == "delivery_solver_exact":
+                return delivery_solver_exact_enabled(task_config)
             return CONFIG.get(key, default)
 
         timeout_s = max(0.5, float(cfg_campaign("submit_timeout_seconds", 4.0) or 4.0))
@@ -4649,9 +7495,11 @@ class ApiClient:
         _raw_pma = float(cfg_campaign("delivery_plan_max_age_seconds", CONFIG.get("delivery_plan_max_age_seconds", 8.0)) or 8.0)
         plan_max_age_s, _ = _clamp_exec_param("delivery_plan_max_age_seconds", _raw_pma, _raw_pma)
         run_metric["effective_delivery_plan_max_age_seconds"] = float(plan_max_age_s)
+        self.matrix_share_age_cap_s = float(plan_max_age_s)
         headers_snapshot = dict(self.headers or {})
         sessions = [self.session]
         use_main_session = True
+        prefetcher = None
 
         deadline_ts = campaign_started_at + delivery_total_budget_s
         post_spacing = {"last_end_mono": None}
@@ -4715,6 +7563,8 @@ class ApiClient:
 
             _close_phase("delivery_loop")
             pre_matrix_primary_items = normalize_booking_items(groups[0].get("items") or [])
+            if run_metric["delivery_engine"] == "pipelined":
+                prefetcher = _MatrixPrefetcher(self, date_str, matrix_timeout_s)
 
             mx_work = None
             plan_mono_holder = [None]
@@ -4751,17 +7601,29 @@ class ApiClient:
                     if _remain > 0:
                         time.sleep(_remain)
                 if str(phase_tag).startswith("refill"):
-                    campaign_ms = int(max(0.0, time.time() - campaign_started_at) * 1000)
-                    log(
-                        f"[极速订场] refill POST发送 wall={datetime.now().strftime('%H:%M:%S.%f')[:-3]} "
-                        f"campaign_ms={campaign_ms} tag={phase_tag} items={batch_items}"
+                    sent_wall = time.time()
+                    log_event(
+                        "delivery", "refill_post_sent", wall=sent_wall,
+                        campaign_ms=int(max(0.0, sent_wall - campaign_started_at) * 1000), tag=phase_tag, items=batch_items,
                     )
+                if prefetcher is not None:
+                    if (
+                        campaign_intent is not None
+                        and isinstance(mx_work, dict)
+                        and sum(_campaign_need_by_time(mx_work, batch_items).values()) <= 0
+                    ):
+                        # 这一批受理即达标：不在 POST 高峰再并发一次矩阵 GET（下一轮照常确认）
+                        run_metric["pipelined_matrix_prefetch_skipped_count"] += 1
+                    elif prefetcher.start():
+                        # POST 与下一轮矩阵 GET 走不同接口：在途期间后台预拉，省掉回包后的矩阵 RTT
+                        run_metric["pipelined_matrix_prefetch_count"] += 1
                 result = self._post_reservation_once(sessions[0], headers_snapshot, url, body, timeout_s)
                 if delivery_min_post_interval_s > 0:
                     post_spacing["last_end_mono"] = time.perf_counter()
                 run_metric["attempt_count_total"] = (run_metric.get("attempt_count_total") or 0) + 1
                 run_metric["submit_req_count"] = (run_metric.get("submit_req_count") or 0) + 1
                 run_metric.setdefault("submit_latencies_ms", []).append(int(result.get("elapsed_ms") or 0))
+                run_metric.setdefault("post_latencies_ms", []).append(int(result.get("elapsed_ms") or 0))
                 run_metric["dispatch_round_count"] = (run_metric.get("dispatch_round_count") or 0) + 1
                 run_metric["attempt_count_inflight_peak"] = max(
                     int(run_metric.get("attempt_count_inflight_peak") or 0), 1
@@ -4803,10 +7665,7 @@ class ApiClient:
                 if action == "min_backoff_continue":
                     run_metric["rate_limited"] = True
                     run_metric["submit_retry_count"] = (run_metric.get("submit_retry_count") or 0) + 1
-                    log(
-                        f"[极速订场] {phase_tag} too_fast: "
-                        f"{(result.get('raw_message') or result.get('exception_text') or '')[:200]!r}"
-                    )
+                    log_event("delivery", "too_fast", tag=phase_tag, msg=result.get("raw_message") or result.get("exception_text"))
                 elif action == "stop_success":
                     run_metric["submit_success_resp_count"] = (run_metric.get("submit_success_resp_count") or 0) + 1
                 elif action == "continue_delivery":
@@ -4835,9 +7694,9 @@ class ApiClient:
                     "min_backoff_continue",
                 ):
                     run_metric["t_first_accept_ms"] = int(max(0.0, time.time() - campaign_started_at) * 1000)
-                log(
-                    f"[极速订场] {phase_tag} 第{run_metric['dispatch_round_count']}次提交 action={action} "
-                    f"items={batch_items}"
+                log_event(
+                    "delivery", "post_result", tag=phase_tag, attempt=run_metric["dispatch_round_count"],
+                    action=action, items=batch_items,
                 )
                 return classified, result
 
@@ -4912,6 +7771,8 @@ class ApiClient:
             # refill 常配合 include_mine_overlay=False；矩阵若尚未把新开订单标成 mine，
             # 将本会话 stop_success 的格子并入缺口与 mine_places_by_time。
             campaign_accepted_cells = set()
+            # 上轮 refill 无解时的输入与矩阵：缺口/mine 不变且无相关格变为可订时跳过求解
+            refill_solve_memo = {"key": None, "matrix": None}
 
             def _register_campaign_accepted(batch_items):
                 for it in normalize_booking_items(batch_items or []):
@@ -4919,6 +7780,27 @@ class ApiClient:
                     t = str(it.get("time") or "").strip()
                     if p and t:
                         campaign_accepted_cells.add((p, t))
+                self.mine_order_index().note_booked(date_str, batch_items)
+
+            def _campaign_need_by_time(mx, extra_items=()):
+                """各目标时段缺口：矩阵里的 mine + 本会话已受理格（extra_items 视作已受理，用于预判这一批能否达标）。"""
+                matrix_now = mx.get("matrix") or {}
+                blocks_now = max(1, int(campaign_intent.get("target_blocks") or 1))
+                times_now = [str(t).strip() for t in (campaign_intent.get("target_times") or []) if str(t).strip()]
+                extra_cells = {
+                    (str(it.get("place") or "").strip(), str(it.get("time") or "").strip())
+                    for it in normalize_booking_items(extra_items or [])
+                }
+                need = {}
+                for t in times_now:
+                    mine_cnt = 0
+                    for p in (mx.get("places") or list(matrix_now.keys())):
+                        st = (matrix_now.get(str(p)) or {}).get(t)
+                        pair = (str(p).strip(), str(t).strip())
+                        if _matrix_cell_is_mine(st) or pair in campaign_accepted_cells or pair in extra_cells:
+                            mine_cnt += 1
+                    need[t] = max(0, blocks_now - mine_cnt)
+                return need
 
             def _legal_batches_for_items(items_for_batching):
                 """优先按 fieldinfo 条数（账号上限）切 POST；失败则回退旧 group_booking。"""
@@ -4983,11 +7865,11 @@ class ApiClient:
                     for attempt in range(1, max_tries + 1):
                         tag = tag_base if attempt == 1 else f"{tag_base}#r{attempt}"
                         if attempt == 1:
-                            log(f"[极速订场] {tag} group={group_id} ({group_label}) items={batch}")
+                            log_event("delivery", "batch", tag=tag, group_id=group_id, group_label=group_label, items=batch)
                         else:
-                            log(
-                                f"[极速订场] {tag} 同批软重试 {attempt}/{max_tries} "
-                                f"group={group_id} ({group_label}) items={batch}"
+                            log_event(
+                                "delivery", "batch_retry", tag=tag, attempt=attempt, max_tries=max_tries,
+                                group_id=group_id, group_label=group_label, items=batch,
                             )
                         classified_loop, post_result_loop = _campaign_post_batch(batch, tag)
                         if not classified_loop:
@@ -5020,9 +7902,9 @@ class ApiClient:
                                     run_metric["payload_fail_reprime_count"] = int(
                                         run_metric.get("payload_fail_reprime_count") or 0
                                     ) + 1
-                                    log(
-                                        f"[极速订场] {tag} 数据错误等业务拒单后已重拉矩阵，将同批重试 "
-                                        f"reprime_n={run_metric['payload_fail_reprime_count']}"
+                                    log_event(
+                                        "delivery", "payload_reprime", tag=tag,
+                                        reprime_n=run_metric["payload_fail_reprime_count"],
                                     )
                         else:
                             _sleep_with_retry_jitter(min(transport_round_interval_s, 0.5))
@@ -5042,23 +7924,40 @@ class ApiClient:
             while time.time() < deadline_ts:
                 if mx_work is None:
                     mx_t0 = time.perf_counter()
-                    mx_work = self.get_matrix(
-                        date_str, include_mine_overlay=False, request_timeout=matrix_timeout_s, bypass_cache=True
-                    )
+                    prefetched_mono = None
+                    if prefetcher is not None and prefetcher.pending():
+                        mx_pre, pre_started = prefetcher.take()
+                        pre_ok = isinstance(mx_pre, dict) and not mx_pre.get("error")
+                        if pre_ok and (time.monotonic() - float(pre_started)) <= float(plan_max_age_s):
+                            mx_work = dict(mx_pre)
+                            mx_work["matrix"] = overlay_accepted_cells_on_matrix(
+                                mx_pre.get("matrix"), campaign_accepted_cells
+                            )
+                            prefetched_mono = float(pre_started)
+                            run_metric["pipelined_matrix_hit_count"] += 1
+                        else:
+                            run_metric["pipelined_matrix_discard_count"] += 1
+                    if mx_work is None:
+                        mx_work = self.get_matrix(
+                            date_str, include_mine_overlay=False, request_timeout=matrix_timeout_s, bypass_cache=True
+                        )
                     if not isinstance(mx_work, dict) or mx_work.get("error"):
                         err = str((mx_work or {}).get("error", "matrix_fail") if isinstance(mx_work, dict) else "matrix_fail")[:120]
                         mx_fail_ms = int((time.perf_counter() - mx_t0) * 1000)
                         record_matrix_fetch_failure(run_metric, "refill_matrix", err, mx_fail_ms)
-                        log(f"[极速订场] 递送循环 get_matrix 失败: {err}，{refill_poll_interval_s}s 后重试")
+                        log_event("delivery", "matrix_fail", err=err, retry_s=refill_poll_interval_s)
                         time.sleep(refill_poll_interval_s)
                         mx_work = None
                         continue
                     _touch_plan_mono()
+                    if prefetched_mono is not None:
+                        # 保鲜按预拉发起时刻计，plan_max_age 语义与串行一致（不因晚取用而变松）
+                        plan_mono_holder[0] = prefetched_mono
                     run_metric["refill_matrix_fetch_count"] = (run_metric.get("refill_matrix_fetch_count") or 0) + 1
                     mx_elapsed_ms = int((time.perf_counter() - mx_t0) * 1000)
-                    log(
-                        f"[极速订场] 递送循环 矩阵完成 fetch_n={run_metric['refill_matrix_fetch_count']} "
-                        f"wall={datetime.now().strftime('%H:%M:%S.%f')[:-3]} elapsed_ms={mx_elapsed_ms}"
+                    log_event(
+                        "delivery", "matrix_done", fetch_n=run_metric["refill_matrix_fetch_count"], wall=time.time(),
+                        elapsed_ms=mx_elapsed_ms, prefetched=prefetched_mono is not None,
                     )
                     if matrix_snapshot_has_locked_cell(mx_work.get("matrix")):
                         run_metric["campaign_matrix_saw_locked_cell"] = True
@@ -5085,6 +7984,7 @@ class ApiClient:
                                 "delivery_first_group_allow_scatter": bool(
                                     cfg_campaign("delivery_first_group_allow_scatter", False)
                                 ),
+                                "delivery_solver_exact": cfg_campaign("delivery_solver_exact", False),
                             }
                             computed_items, combo_level = compute_first_group_from_matrix(
                                 mx_work["matrix"],
@@ -5206,7 +8106,7 @@ class ApiClient:
                     )
                     if hard_cls is PLAN_STALE:
                         run_metric["delivery_plan_stale_resync_count"] = int(run_metric.get("delivery_plan_stale_resync_count") or 0) + 1
-                        log(f"[极速订场] 算场快照过期(>{plan_max_age_s}s)，重拉矩阵后再递送")
+                        log_event("delivery", "plan_stale", max_age=plan_max_age_s)
                         _close_phase("primary_submit")
                         mx_work = None
                         continue
@@ -5220,15 +8120,7 @@ class ApiClient:
 
                 target_blocks_live = max(1, int(campaign_intent.get("target_blocks") or 1))
                 target_times_live = [str(t).strip() for t in (campaign_intent.get("target_times") or []) if str(t).strip()]
-                need_by_time = {}
-                for t in target_times_live:
-                    mine_cnt = 0
-                    for p in (mx_work.get("places") or list(matrix_live.keys())):
-                        st = (matrix_live.get(str(p)) or {}).get(t)
-                        pair = (str(p).strip(), str(t).strip())
-                        if _matrix_cell_is_mine(st) or pair in campaign_accepted_cells:
-                            mine_cnt += 1
-                    need_by_time[t] = max(0, target_blocks_live - mine_cnt)
+                need_by_time = _campaign_need_by_time(mx_work)
                 run_metric["refill_need_snapshot"] = {
                     "need_by_time": {str(k): int(v) for k, v in (need_by_time or {}).items()},
                     "target_blocks": int(target_blocks_live),
@@ -5265,14 +8157,38 @@ class ApiClient:
                         have.add(str(_p))
                     mine_bt[ts] = sorted(have, key=lambda x: int(x) if str(x).isdigit() else 0)
                 intent_base["mine_places_by_time"] = mine_bt
-                solved, used_need_by_time, tier_label = solve_refill_with_policy(
-                    matrix_live,
-                    places_list,
-                    intent_base,
-                    need_by_time,
-                    allow_scatter=True,
-                    policy=REFILL_POLICY_AUTO_CAMPAIGN,
+                solve_key = (
+                    tuple(sorted((str(k), int(v)) for k, v in need_by_time.items())),
+                    tuple(sorted((k, tuple(v)) for k, v in mine_bt.items())),
                 )
+                solve_skipped = False
+                if refill_solve_memo["key"] == solve_key and refill_solve_memo["matrix"] is not None:
+                    span_lo_live, span_hi_live = _selectable_place_bounds_from_intent(intent_base)
+                    delta = diff_court_matrices(refill_solve_memo["matrix"], matrix_live)
+                    solve_skipped = not matrix_delta_may_unlock(
+                        delta,
+                        [p for p in places_list if str(p).isdigit() and span_lo_live <= int(str(p)) <= span_hi_live],
+                        target_times_live,
+                    )
+                if solve_skipped:
+                    solved, used_need_by_time, tier_label = None, {}, ""
+                    run_metric["refill_solve_skipped_count"] = int(run_metric.get("refill_solve_skipped_count") or 0) + 1
+                else:
+                    solved, used_need_by_time, tier_label = solve_refill_with_policy(
+                        matrix_live,
+                        places_list,
+                        intent_base,
+                        need_by_time,
+                        allow_scatter=True,
+                        policy=REFILL_POLICY_AUTO_CAMPAIGN,
+                        exact=cfg_campaign("delivery_solver_exact", False),
+                    )
+                if not solved or not solved.get("items"):
+                    refill_solve_memo["key"] = solve_key
+                    refill_solve_memo["matrix"] = matrix_live
+                else:
+                    refill_solve_memo["key"] = None
+                    refill_solve_memo["matrix"] = None
                 if not solved or not solved.get("items"):
                     run_metric["refill_no_candidate_count"] = (run_metric.get("refill_no_candidate_count") or 0) + 1
                     refill_no_candidate_streak += 1
@@ -5317,15 +8233,12 @@ class ApiClient:
                             "run_metric": run_metric,
                             "delivery_group_id": group_id,
                         }
-                    log(f"[极速订场] 递送循环 本轮无满足约束候选，缺口={need_by_time}，短等待后重拉")
+                    log_event("delivery", "no_candidate", need=need_by_time, solve_skipped=solve_skipped)
                     time.sleep(refill_poll_interval_s)
                     mx_work = None
                     continue
                 refill_no_candidate_streak = 0
-                log(
-                    f"[极速订场] 递送循环 分层求解 tier={tier_label} used_need={used_need_by_time} "
-                    f"原缺口={need_by_time}"
-                )
+                log_event("delivery", "tier_solved", tier=tier_label, used_need=used_need_by_time, need=need_by_time)
                 run_metric["refill_candidate_found_count"] = (run_metric.get("refill_candidate_found_count") or 0) + 1
                 avail_items = normalize_booking_items(solved.get("items") or [])
                 rbatches_raw = _legal_batches_for_items(avail_items)
@@ -5338,12 +8251,12 @@ class ApiClient:
                 hard_r, hard_rb = _sequential_post_all_batches(rbatches, "refill", stale_check=_plan_is_stale)
                 if hard_r is PLAN_STALE:
                     run_metric["delivery_plan_stale_resync_count"] = int(run_metric.get("delivery_plan_stale_resync_count") or 0) + 1
-                    log(f"[极速订场] 算场快照过期(>{plan_max_age_s}s)，重拉矩阵后再递送")
+                    log_event("delivery", "plan_stale", max_age=plan_max_age_s)
                     mx_work = None
                     continue
                 if hard_r:
                     return _return_task_fail(hard_r, hard_rb or [])
-                log("[极速订场] 递送循环 本轮多批已处理，下轮重拉矩阵校验满额")
+                log_event("delivery", "round_done")
                 run_metric["submit_retry_count"] = (run_metric.get("submit_retry_count") or 0) + 1
                 mx_work = None
                 time.sleep(transport_round_interval_s)
@@ -5374,6 +8287,13 @@ class ApiClient:
                 "delivery_group_id": group_id,
             }
         finally:
+            if prefetcher is not None:
+                prefetcher.close()
+            _pc_hits, _pc_misses = SOLVER_PLAN_CACHE.thread_counters()
+            run_metric["solver_plan_cache_hit_count"] = _pc_hits - plan_cache_counters_at_start[0]
+            run_metric["solver_plan_cache_miss_count"] = _pc_misses - plan_cache_counters_at_start[1]
+            run_metric.update(self.matrix_parse_delta(matrix_parse_at_start))
+            run_metric["gym_line_latency"] = self.line_stats.histogram_since(line_stats_at_start)
             if not use_main_session:
                 for session in sessions:
                     try:
@@ -5502,37 +8422,12 @@ class ApiClient:
         )
         if quiet_info:
             return {"error": quiet_info.get("msg"), "quiet_window_blocked": True, "quiet_window": quiet_info.get("quiet_window")}
-        url = self._gym_https_url("easyserpClient/place/getPlaceOrder")
         all_orders = []
 
         for page_no in range(max_pages):
-            params = {
-                "pageNo": page_no,
-                "pageSize": page_size,
-                "shopNum": self.shop_num,
-                "token": self.token,
-            }
-            try:
-                resp = self.session.get(
-                    url,
-                    headers=self.headers,
-                    params=params,
-                    timeout=max(0.5, float(timeout_s or 10)),
-                    verify=False,
-                )
-                data = resp.json()
-            except Exception as e:
-                return {"error": f"获取订单失败: {e}"}
-
-            if not isinstance(data, dict):
-                return {"error": f"订单接口返回格式错误: {data}"}
-            if data.get("msg") != "success":
-                return {"error": f"订单接口返回异常: {data.get('msg')}"}
-
-            page_items = data.get("data") or []
-            if not isinstance(page_items, list):
-                page_items = []
-
+            page_items, err = self._get_place_order_page(page_no, page_size, timeout_s)
+            if err:
+                return {"error": err}
             all_orders.extend(page_items)
             if len(page_items) < page_size:
                 break
@@ -5545,6 +8440,48 @@ class ApiClient:
             },
         }
 
+    def _get_place_order_page(self, page_no, page_size, timeout_s=6):
+        """拉 getPlaceOrder 的一页，返回 (订单列表, 错误文案)；不做静默窗口判定。"""
+        params = {
+            "pageNo": page_no,
+            "pageSize": page_size,
+            "shopNum": self.shop_num,
+            "token": self.token,
+        }
+        try:
+            resp = self.session.get(
+                self._gym_https_url("easyserpClient/place/getPlaceOrder"),
+                headers=self.headers,
+                params=params,
+                timeout=max(0.5, float(timeout_s or 10)),
+                verify=False,
+            )
+            data = resp.json()
+        except Exception as e:
+            return [], f"获取订单失败: {e}"
+        if not isinstance(data, dict):
+            return [], f"订单接口返回格式错误: {data}"
+        if data.get("msg") != "success":
+            return [], f"订单接口返回异常: {data.get('msg')}"
+        page_items = data.get("data") or []
+        return (page_items if isinstance(page_items, list) else []), ""
+
+    def fetch_place_order_page(self, page_no, page_size, timeout_s=6):
+        """MineOrderIndex 刷新用：同 _get_place_order_page，静默窗口内直接返回错误（后台线程不是 owner）。"""
+        ctx = get_runtime_request_context()
+        quiet_info = quiet_window_block_info(
+            "order_query",
+            requester_task_id=ctx.get("task_id"),
+            owner_allowed=bool(ctx.get("owner")),
+            scope=self._quiet_scope_from_client(),
+        )
+        if quiet_info:
+            return [], str(quiet_info.get("msg") or "静默窗口中")
+        return self._get_place_order_page(page_no, page_size, timeout_s)
+
+    def mine_order_index(self):
+        return mine_order_index_for(self)
+
     def get_use_card_info(self, timeout_s=6):
         """获取用户卡信息（getUseCardInfo），用于展示余额。一用户一卡时取 universal[0].cardcash。"""
         ctx = get_runtime_request_context()
@@ -5629,6 +8566,7 @@ class ApiClient:
         if not isinstance(data, dict):
             return {"ok": False, "msg": "接口返回格式错误"}
         if data.get("msg") == "success":
+            self.mine_order_index().note_cancelled(bill_num)
             return {"ok": True}
         return {"ok": False, "msg": data.get("msg", "未知错误")}
 
@@ -5771,7 +8709,17 @@ class ApiClient:
             ]
         return result
 
-    def get_matrix(self, date_str, include_mine_overlay=True, request_timeout=None, bypass_cache=False):
+    def get_matrix(self, date_str, include_mine_overlay=True, request_timeout=None, bypass_cache=False, delta_base=None):
+        """
+        拉取场地矩阵。delta_base 传入上一快照（get_matrix 结果或其 matrix）时，
+        返回结果额外带 delta（diff_court_matrices），供轮询方跳过无变化的求解。
+        """
+        if delta_base is not None:
+            res = self.get_matrix(date_str, include_mine_overlay, request_timeout, bypass_cache)
+            if not isinstance(res, dict) or res.get("error"):
+                return res
+            base_matrix = delta_base.get("matrix") if isinstance(delta_base, dict) and "matrix" in delta_base else delta_base
+            return FrozenDict(res, delta=diff_court_matrices(base_matrix, res.get("matrix")))
         ctx = get_runtime_request_context()
         quiet_info = quiet_window_block_info(
             "matrix_query",
@@ -5790,12 +8738,66 @@ class ApiClient:
             and cache_hit
             and (now_ts - float(cache_hit.get('ts', 0.0))) <= float(self._matrix_cache_window_s)
         ):
-            try:
-                return json.loads(json.dumps(cache_hit.get('data')))
-            except Exception:
-                return cache_hit.get('data')
+            # 缓存里是 FrozenDict，直接共享不再 json 往返深拷贝；调用方需要改动时自行 thaw_matrix_result
+            return cache_hit.get('data')
+
+        base = self._shared_base_matrix(date_str, request_timeout, bypass_cache)
+        if not isinstance(base, dict) or base.get("error") or not include_mine_overlay:
+            result = base
+        else:
+            # 用我的订单覆盖 mine 状态（仅 showStatus=0 且非取消订单）：查账号订单索引，不在此同步翻订单；
+            # 共享的基础矩阵只读，按账号复制一份再标
+            result = thaw_matrix_result(base)
+            meta = result["meta"]
+            mine_count, index_age_ms = self.mine_order_index().overlay(self, date_str, result["matrix"])
+            meta["mine_index_age_ms"] = index_age_ms
+            if index_age_ms is not None:
+                meta["mine_overlay_ok"] = True
+                meta["mine_slots_count"] = mine_count
+                meta["mine_overlay_error"] = ""
+                if mine_count:
+                    log_event("matrix", "mine_overlay", level="debug", date=date_str, count=mine_count)
+            else:
+                meta["mine_slots_count"] = mine_count
+                meta["mine_overlay_error"] = "订单索引加载中"
+            result = freeze_matrix_result(result)
+        if isinstance(result, FrozenDict):
+            with self._matrix_cache_lock:
+                self._matrix_cache[cache_key] = {'ts': time.time(), 'data': result}
+                if len(self._matrix_cache) > 8:
+                    oldest = min(self._matrix_cache.keys(), key=lambda k: self._matrix_cache[k].get('ts', 0.0))
+                    self._matrix_cache.pop(oldest, None)
+        return result
+
+    def _shared_base_matrix(self, date_str, request_timeout=None, bypass_cache=False):
+        """
+        取不含 mine 覆盖的基础矩阵。matrix_share 开启的客户端（只读路径以 build_client_for_account(acc, matrix_share=True) 建的账号客户端）经 MATRIX_SHARE
+        与同馆同日期的其它账号共用一次 GET：bypass_cache 时只接受本客户端没见过的更新一轮；别人那次失败则自己再拉一次。
+        """
+        if not getattr(self, "matrix_share", False):
+            return self._fetch_base_matrix(date_str, request_timeout)
+        key = (str(getattr(self, "gym_base_url", "") or ""), str(self.shop_num or ""), str(date_str or ""))
+        min_gen = self._matrix_share_seen.get(key, 0) if bypass_cache else 0
+        cap = getattr(self, "matrix_share_age_cap_s", None)
+        max_age_s = matrix_share_max_age_seconds() if cap is None else min(matrix_share_max_age_seconds(), float(cap))
+        res, gen, shared = MATRIX_SHARE.fetch(
+            key,
+            lambda: self._fetch_base_matrix(date_str, request_timeout),
+            max_age_s=max_age_s,
+            min_gen=min_gen,
+            wait_timeout_s=_matrix_request_timeout_seconds(request_timeout) + 1.0,
+        )
+        if shared and (not isinstance(res, dict) or res.get("error")):
+            MATRIX_SHARE.note_fallback()
+            return self._fetch_base_matrix(date_str, request_timeout)
+        self._matrix_share_seen[key] = gen
+        if shared:
+            with self._matrix_cache_lock:
+                self.matrix_parse_stats["shared"] += 1
+        return res
 
-        url = self._gym_https_url("easyserpClient/place/getPlaceInfoByShortName")
+    def _fetch_base_matrix(self, date_str, request_timeout=None):
+        """实际拉一次 getPlaceInfoByShortName 并投影为冻结矩阵（meta 的 mine_* 为未覆盖状态）。"""
         params = {
             "shopNum": self.shop_num,
             "dateymd": date_str,
@@ -5805,14 +8807,21 @@ class ApiClient:
         try:
             # 抢票高峰期采用短超时，避免单次请求卡住吞掉黄金窗口；配合上层高频重试。
             started_at = time.time()
-            matrix_timeout = max(0.5, float(request_timeout if request_timeout is not None else CONFIG.get('matrix_timeout_seconds', 3.0) or 3.0))
-            resp = self.session.get(url, headers=self.headers, params=params, timeout=matrix_timeout, verify=False)
+            matrix_timeout = _matrix_request_timeout_seconds(request_timeout)
+            try:
+                resp = self._line_get("easyserpClient/place/getPlaceInfoByShortName", params, matrix_timeout)
+            except requests.RequestException:
+                self._note_session_result(False)
+                raise
             ended_at = time.time()
             self._update_server_time_offset(resp, started_at, ended_at)
+            self._note_session_result(True)
 
+            body = resp.content
+            parse_t0 = time.perf_counter()
             try:
-                data = resp.json()
-            except json.JSONDecodeError:
+                data = json.loads(body)
+            except ValueError:
                 # 服务器可能返回了 HTML 错误页或空内容
                 print(f"❌ [原始响应] 非JSON格式: {resp.text[:100]}...")
                 return {"error": "服务器返回无效数据(可能是崩了)"}
@@ -5849,14 +8858,6 @@ class ApiClient:
             if not isinstance(place_array, list):
                 return {"error": "无法找到场地列表"}
 
-            STATE_SAMPLER.ingest(place_array)
-
-            matrix = {}
-            all_times = set()
-
-            # 添加调试日志，打印前几个数据的状态值，以便分析“全红”原因
-            debug_states = []
-
             locked_state_values = set()
             for raw_state in CONFIG.get('locked_state_values', [2, 3, 5, 6]):
                 try:
@@ -5876,122 +8877,658 @@ class ApiClient:
             )
             last_day_open_time_str = last_open_t.strftime("%H:%M:%S")
 
-            for place in place_array:
-                p_name = place['projectName']['shortname']
-                p_num = p_name.replace('ymq', '').replace('mdb', '')
+            # 单遍：写矩阵 + 统计 state 分布；调试样本（分析“全红”原因）只在 matrix 分类开 debug 时收集
+            verbose = log_event_enabled("matrix", "debug")
+            matrix, all_times, state_counts, debug_states = project_place_array(
+                place_array, locked_state_values, collect_debug=verbose
+            )
+            STATE_SAMPLER.ingest_counts(state_counts, key=state_sampler_key(self, date_str))
+            parse_ms = (time.perf_counter() - parse_t0) * 1000.0
+            response_bytes = len(body or b"")
+            with self._matrix_cache_lock:
+                self.matrix_parse_stats["polls"] += 1
+                self.matrix_parse_stats["bytes"] += response_bytes
+                self.matrix_parse_stats["parse_ms"] += parse_ms
 
-                status_map = {}
-                for slot in place['projectInfo']:
-                    t = slot['starttime']
-                    s = slot['state']
-                    all_times.add(t)
+            if verbose:
+                log_event("matrix", "state_debug", level="debug", samples=debug_states)
 
-                    if len(debug_states) < 5:
-                        debug_states.append(f"{p_num}号{t}={s}")
+            sorted_places = sorted(matrix.keys(), key=lambda x: int(x) if x.isdigit() else 999)
+            sorted_times = sorted(list(all_times))
 
-                    try:
-                        state_int = int(s)
-                    except Exception:
-                        state_int = -999
+            result = freeze_matrix_result({
+                "places": sorted_places,
+                "times": sorted_times,
+                "matrix": matrix,
+                "meta": {
+                    "mine_overlay_ok": False,
+                    "mine_slots_count": 0,
+                    "mine_overlay_error": "首轮加速模式：跳过mine覆盖",
+                    "date_booking_scope": date_booking_scope,
+                    "last_day_open_time": last_day_open_time_str,
+                    "parse_ms": round(parse_ms, 3),
+                    "response_bytes": response_bytes,
+                }
+            })
+            LIVE_EVENTS.publish_matrix((str(self.shop_num or ""), str(date_str or "")), date_str, result)
+            return result
 
-                    status_map[t] = map_slot_state_int(state_int, locked_state_values)
+        except Exception as e:
+            return {"error": str(e)}
 
-                matrix[p_num] = status_map
-            
-            if is_verbose_logs_enabled():
-                print(f"🔍 [状态调试] 前5个样本状态: {debug_states}")
-
-            # 用我的订单覆盖 mine 状态（仅 showStatus=0 且非取消订单）
-            mine_overlay_ok = False
-            mine_overlay_error = ""
-            mine_slots_count = 0
-
-            if include_mine_overlay:
-                orders_res = self.get_place_orders()
-                if "error" not in orders_res:
-                    mine_overlay_ok = True
-                    mine_slots = self._extract_mine_slots(orders_res.get("data", []), date_str)
-                    mine_slots_count = len(mine_slots)
-                    for p, t in mine_slots:
-                        if p in matrix and t in matrix[p]:
-                            matrix[p][t] = "mine"
-                    if mine_slots and is_verbose_logs_enabled():
-                        print(f"🔵 [mine覆盖] 日期{date_str} 共标记 {len(mine_slots)} 个mine格子")
+
+    def submit_order(self, date_str, selected_items, submit_profile=None, skip_warmup=False):
+        """
+        入口统一走极简直提：内部仅调用 submit_order_minimal -> submit_delivery_campaign。
+        传统分批下单实现已移除。
+        skip_warmup：手动预订传 True 时不依赖首轮矩阵预拉，递送循环内仍会 get_matrix 算场。
+        """
+        ctx = get_runtime_request_context()
+        quiet_info = quiet_window_block_info(
+            "submit_order",
+            requester_task_id=ctx.get("task_id"),
+            owner_allowed=bool(ctx.get("owner")),
+            scope=self._quiet_scope_from_client(),
+        )
+        if quiet_info:
+            return {
+                "status": "quiet_window_blocked",
+                "msg": quiet_info.get("msg"),
+                "success_items": [],
+                "failed_items": normalize_booking_items(selected_items),
+                "run_metric": {
+                    "request_mode": "quiet_window_blocked",
+                    "submit_req_count": 0,
+                    "submit_success_resp_count": 0,
+                    "submit_retry_count": 0,
+                    "confirm_matrix_poll_count": 0,
+                    "confirm_orders_poll_count": 0,
+                    "verify_exception_count": 0,
+                    "rate_limited": False,
+                    "transport_error": False,
+                    "business_fail_msg": "",
+                    "server_msg_raw": "",
+                },
+                "quiet_window": quiet_info.get("quiet_window"),
+            }
+        profile_name = str(submit_profile or "").strip()
+        return self.submit_order_minimal(
+            date_str, selected_items, submit_profile=profile_name, skip_warmup=skip_warmup
+        )
+
+client = ApiClient()
+sync_primary_client_auth()
+
+# ================= 任务调度系统 =================
+
+# 通知后台发送：worker 数、待发上限、同内容去重窗口、传输失败重试次数与退避
+NOTIFY_DISPATCH_WORKERS = 2
+NOTIFY_DISPATCH_MAX_PENDING = 200
+NOTIFY_DEDUP_WINDOW_SECONDS = 60.0
+NOTIFY_MAX_ATTEMPTS = 3
+NOTIFY_RETRY_BACKOFF_SECONDS = (2.0, 6.0)
+
+
+class NotificationDispatcher:
+    """
+    短信 / PushPlus 后台发送：调度、递送、健康检查线程只入队，不等第三方 HTTP。
+
+    - 去重：同通道、同接收方、同标题同内容，在队列中或 NOTIFY_DEDUP_WINDOW_SECONDS 内已发过的直接丢弃
+    - 合并：仅数字不同的近似消息（如多次 refill 截止提醒）若仍在排队，追加到同一条里一次发出
+    - 重试：send_fn 抛异常（传输层失败）按退避重试，业务失败（返回 (False, msg)）不重试
+    """
+
+    def __init__(
+        self,
+        workers=NOTIFY_DISPATCH_WORKERS,
+        max_pending=NOTIFY_DISPATCH_MAX_PENDING,
+        dedup_window_s=NOTIFY_DEDUP_WINDOW_SECONDS,
+        max_attempts=NOTIFY_MAX_ATTEMPTS,
+        backoff_s=NOTIFY_RETRY_BACKOFF_SECONDS,
+    ):
+        self._workers = max(1, int(workers))
+        self._max_pending = max(1, int(max_pending))
+        self._dedup_window_s = max(0.0, float(dedup_window_s))
+        self._max_attempts = max(1, int(max_attempts))
+        self._backoff_s = tuple(float(x) for x in (backoff_s or (0.0,)))
+        self._cond = threading.Condition()
+        self._pending = deque()
+        self._inflight = 0
+        self._threads = []
+        self._recent = OrderedDict()
+        self._stats = {
+            "enqueued": 0,
+            "sent": 0,
+            "failed": 0,
+            "retried": 0,
+            "deduped": 0,
+            "coalesced": 0,
+            "dropped": 0,
+        }
+
+    @staticmethod
+    def _near_key(channel, targets, content):
+        text = re.sub(r"\s+", " ", str(content or "")).strip()
+        return (channel, targets, re.sub(r"\d+", "#", text))
+
+    def submit(self, channel, targets, content, send_fn, title=None):
+        """入队一条通知；send_fn(content, targets, title) 同步发送。返回 False 表示被去重丢弃。"""
+        targets = tuple(targets or ())
+        key = (channel, targets, title, str(content))
+        near_key = self._near_key(channel, targets, content)
+        now = time.monotonic()
+        with self._cond:
+            sent_at = self._recent.get(key)
+            if sent_at is not None and now - sent_at < self._dedup_window_s:
+                self._stats["deduped"] += 1
+                return False
+            for job in self._pending:
+                if key in job["keys"]:
+                    self._stats["deduped"] += 1
+                    return False
+            for job in self._pending:
+                if job["near_key"] == near_key and job["attempt"] == 0:
+                    job["content"] = f"{job['content']}\n{content}"
+                    job["keys"].append(key)
+                    self._stats["coalesced"] += 1
+                    return True
+            if len(self._pending) >= self._max_pending:
+                self._pending.popleft()
+                self._stats["dropped"] += 1
+            self._pending.append(
+                {
+                    "channel": channel,
+                    "targets": targets,
+                    "title": title,
+                    "content": str(content),
+                    "send_fn": send_fn,
+                    "keys": [key],
+                    "near_key": near_key,
+                    "attempt": 0,
+                    "not_before": now,
+                }
+            )
+            self._stats["enqueued"] += 1
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self._workers:
+                t = threading.Thread(target=self._run, name=f"notify-{len(self._threads)}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            self._cond.notify()
+        return True
+
+    def _take_ready_locked(self):
+        now = time.monotonic()
+        for i, job in enumerate(self._pending):
+            if job["not_before"] <= now:
+                del self._pending[i]
+                return job, None
+        if not self._pending:
+            return None, None
+        return None, max(0.01, min(j["not_before"] for j in self._pending) - now)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                job, wait_s = self._take_ready_locked()
+                while job is None:
+                    self._cond.wait(wait_s)
+                    job, wait_s = self._take_ready_locked()
+                self._inflight += 1
+            exc = None
+            result = None
+            try:
+                result = job["send_fn"](job["content"], job["targets"], job["title"])
+            except Exception as e:
+                exc = e
+            with self._cond:
+                self._inflight -= 1
+                if exc is not None:
+                    job["attempt"] += 1
+                    if job["attempt"] < self._max_attempts:
+                        backoff = self._backoff_s[min(job["attempt"] - 1, len(self._backoff_s) - 1)]
+                        job["not_before"] = time.monotonic() + backoff
+                        self._pending.append(job)
+                        self._stats["retried"] += 1
+                    else:
+                        self._stats["failed"] += 1
                 else:
-                    mine_overlay_error = str(orders_res.get('error') or '')
-                    if is_verbose_logs_enabled():
-                        print(f"⚠️ [mine覆盖] 订单查询失败，跳过mine状态: {mine_overlay_error}")
-            else:
-                mine_overlay_error = "首轮加速模式：跳过mine覆盖"
+                    ok = bool(result[0]) if isinstance(result, tuple) and result else bool(result)
+                    self._stats["sent" if ok else "failed"] += 1
+                    now = time.monotonic()
+                    for key in job["keys"]:
+                        self._recent[key] = now
+                        self._recent.move_to_end(key)
+                    while self._recent and now - next(iter(self._recent.values())) >= self._dedup_window_s:
+                        self._recent.popitem(last=False)
+                self._cond.notify_all()
+            if exc is not None:
+                log(f"⚠️ [通知] {job['channel']} 发送异常(第{job['attempt']}次): {exc}")
+
+    def flush(self, timeout=5.0):
+        """等队列（含重试中的）清空；超时返回 False。"""
+        deadline = time.monotonic() + max(0.0, float(timeout))
+        with self._cond:
+            while self._pending or self._inflight:
+                remain = deadline - time.monotonic()
+                if remain <= 0:
+                    return False
+                self._cond.wait(min(remain, 0.2))
+        return True
+
+    def stats(self):
+        with self._cond:
+            return {**self._stats, "pending": len(self._pending), "inflight": self._inflight}
+
+
+NOTIFY_DISPATCHER = NotificationDispatcher()
+atexit.register(NOTIFY_DISPATCHER.flush, 5.0)
+
+
+class RefillExecutor:
+    """
+    独立 refill 执行池：调度 tick 只判定到期并 submit，任务体在 worker 线程跑，慢任务不拖住其它任务的轮询。
+
+    - 在途保护：同一 task_id 排队或执行中时再次 submit 直接拒绝（与主任务 _try_mark_task_running 同义）
+    - 账号并发：同一账号同时执行的任务数不超过 per_account_limit，超出的留在队列里等
+    - 公平：可执行的任务中优先取「最久没轮到」的账号，同账号内先到先跑
+    worker 数与账号上限每次取任务时重新读取，改配置即时生效。
+    """
+
+    def __init__(self, workers=None, per_account_limit=None):
+        self._workers_override = workers
+        self._per_account_override = per_account_limit
+        self._cond = threading.Condition()
+        self._pending = deque()
+        self._queued_ids = set()
+        self._running_ids = set()
+        self._account_running = {}
+        self._account_served = {}
+        self._serve_seq = 0
+        self._threads = []
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "rejected_busy": 0, "max_wait_ms": 0}
+
+    def _workers(self):
+        raw = self._workers_override if self._workers_override is not None else CONFIG.get("refill_worker_pool_size", 4)
+        try:
+            return max(1, min(16, int(raw or 4)))
+        except (TypeError, ValueError):
+            return 4
+
+    def _per_account_limit(self):
+        raw = self._per_account_override
+        if raw is None:
+            raw = CONFIG.get("refill_per_account_concurrency", 1)
+        try:
+            return max(1, min(4, int(raw or 1)))
+        except (TypeError, ValueError):
+            return 1
+
+    def is_busy(self, task_id):
+        tid = str(task_id)
+        with self._cond:
+            return tid in self._queued_ids or tid in self._running_ids
+
+    def submit(self, task_id, account_key, fn):
+        """入队一次执行；fn() 无参。该任务已在排队/执行时返回 False。"""
+        tid = str(task_id)
+        with self._cond:
+            if tid in self._queued_ids or tid in self._running_ids:
+                self._stats["rejected_busy"] += 1
+                return False
+            self._pending.append(
+                {"task_id": tid, "account": str(account_key or ""), "fn": fn, "enqueued_mono": time.monotonic()}
+            )
+            self._queued_ids.add(tid)
+            self._stats["submitted"] += 1
+            self._threads = [t for t in self._threads if t.is_alive()]
+            while len(self._threads) < self._workers():
+                t = threading.Thread(target=self._run, name=f"refill-{len(self._threads)}", daemon=True)
+                t.start()
+                self._threads.append(t)
+            self._cond.notify_all()
+        return True
+
+    def _take_ready_locked(self):
+        limit = self._per_account_limit()
+        best_i = None
+        best_rank = None
+        for i, job in enumerate(self._pending):
+            acc = job["account"]
+            if self._account_running.get(acc, 0) >= limit:
+                continue
+            rank = self._account_served.get(acc, 0)
+            if best_rank is None or rank < best_rank:
+                best_i, best_rank = i, rank
+        if best_i is None:
+            return None
+        job = self._pending[best_i]
+        del self._pending[best_i]
+        self._queued_ids.discard(job["task_id"])
+        self._running_ids.add(job["task_id"])
+        self._account_running[job["account"]] = self._account_running.get(job["account"], 0) + 1
+        self._serve_seq += 1
+        self._account_served[job["account"]] = self._serve_seq
+        wait_ms = int((time.monotonic() - job["enqueued_mono"]) * 1000)
+        self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], wait_ms)
+        return job
+
+    def _run(self):
+        while True:
+            with self._cond:
+                job = self._take_ready_locked()
+                while job is None:
+                    # 池缩小后多出的 worker 空闲即退出
+                    if len([t for t in self._threads if t.is_alive()]) > self._workers():
+                        self._threads = [t for t in self._threads if t is not threading.current_thread()]
+                        return
+                    self._cond.wait(1.0)
+                    job = self._take_ready_locked()
+            ok = True
+            try:
+                job["fn"]()
+            except Exception as e:
+                ok = False
+                log(f"⚠️ [refill#{job['task_id']}] 执行池任务异常: {e}")
+            with self._cond:
+                self._running_ids.discard(job["task_id"])
+                acc = job["account"]
+                left = self._account_running.get(acc, 0) - 1
+                if left > 0:
+                    self._account_running[acc] = left
+                else:
+                    self._account_running.pop(acc, None)
+                self._stats["completed" if ok else "failed"] += 1
+                self._cond.notify_all()
+
+    def flush(self, timeout=5.0):
+        """等队列与在途清空；超时返回 False。"""
+        deadline = time.monotonic() + max(0.0, float(timeout))
+        with self._cond:
+            while self._pending or self._running_ids:
+                remain = deadline - time.monotonic()
+                if remain <= 0:
+                    return False
+                self._cond.wait(min(remain, 0.2))
+        return True
+
+    def stats(self):
+        with self._cond:
+            return {
+                **self._stats,
+                "workers": self._workers(),
+                "per_account_limit": self._per_account_limit(),
+                "pending": len(self._pending),
+                "running": sorted(self._running_ids),
+            }
+
+
+def scheduler_spin_window_seconds():
+    try:
+        return max(0, min(1000, int(CONFIG.get("scheduler_spin_window_ms", 300) or 0))) / 1000.0
+    except (TypeError, ValueError):
+        return 0.3
+
+
+def task_fire_lead_seconds(task=None):
+    """定时唤醒提前量：task_fire_lead_seconds；legacy 任务开了预热时不少于预热窗口（上限 110s，execute_task 最多等 120s）。"""
+    try:
+        lead = float(max(0, min(110, int(CONFIG.get("task_fire_lead_seconds", 3) or 0))))
+    except (TypeError, ValueError):
+        lead = 3.0
+    cfg = task.get("config") if isinstance(task, dict) and isinstance(task.get("config"), dict) else {}
+    if isinstance(task, dict) and not is_direct_task_config(cfg) and bool(CONFIG.get("auto_preheat_enabled", True)):
+        try:
+            lead = max(lead, float(CONFIG.get("auto_preheat_window_seconds", 30.0) or 30.0))
+        except (TypeError, ValueError):
+            pass
+    return min(110.0, lead)
+
+
+AUTO_PREHEAT_POST_GAP_MARGIN_SECONDS = 1.0
+
+
+def auto_preheat_probe_stop_seconds():
+    """预热探针（reservationPlace POST）最晚发到开抢前多少秒：不少于 5s，且留够 delivery_min_post_interval_seconds + 余量，
+    免得最后一发探针与开抢首个 POST 的间隔小于下单间隔而触发 too fast。"""
+    try:
+        gap_s = _read_delivery_min_post_interval_seconds()
+    except (KeyError, TypeError, ValueError):
+        gap_s = 0.0
+    return max(5.0, gap_s + AUTO_PREHEAT_POST_GAP_MARGIN_SECONDS)
+
+
+def precise_sleep_until(target_perf, spin_s=None):
+    """等到 time.perf_counter() >= target_perf：先 sleep 到最后 spin_s 秒，再自旋；返回超过目标的秒数。"""
+    if spin_s is None:
+        spin_s = scheduler_spin_window_seconds()
+    while True:
+        remain = target_perf - time.perf_counter()
+        if remain <= spin_s:
+            break
+        time.sleep(min(remain - spin_s, 1.0))
+    while time.perf_counter() < target_perf:
+        time.sleep(0)
+    return time.perf_counter() - target_perf
+
+
+def server_aligned_now():
+    """按全局服务器时差估计的服务器本地时间（naive datetime，与 ApiClient.get_aligned_now 同口径）。"""
+    return datetime.now() + timedelta(seconds=float(_LOG_TIME_OFFSET_SECONDS or 0.0))
+
+
+class PreciseTaskScheduler:
+    """
+    自动任务定时器：最小堆按服务器对齐时间排各任务的下一个唤醒点（触发时刻 - 提前量）。
+
+    线程用 Condition.wait 逐次折半逼近唤醒点（时差更新后下一次等待即按新时差算），
+    进入最后 spin 窗口后释放锁自旋到点，再在新线程里跑回调 callback(fire_dt, wake_error_ms)。
+    set_jobs 整体替换任务表；同一 key 已触发过的时刻不会因刷新而再次触发。
+    """
+
+    def __init__(self, now_fn=None, spin_s_fn=None):
+        self._now_fn = now_fn or server_aligned_now
+        self._spin_s_fn = spin_s_fn or scheduler_spin_window_seconds
+        self._cond = threading.Condition()
+        self._heap = []
+        self._seq = 0
+        self._gen = 0
+        self._jobs = {}
+        self._last_fired = {}
+        self._thread = None
+        self._wake_errors_ms = deque(maxlen=50)
+
+    def set_jobs(self, jobs):
+        """jobs: [{"key", "next_fire_fn"(after_dt)->dt|None, "lead_s", "once", "callback"}]。"""
+        with self._cond:
+            self._gen += 1
+            self._heap = []
+            self._jobs = {}
+            now = self._now_fn()
+            for job in jobs or []:
+                key = str(job.get("key"))
+                self._jobs[key] = job
+                last = self._last_fired.get(key)
+                self._push_locked(key, job, last if last is not None and last > now else now)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="task-timer", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def _push_locked(self, key, job, after_dt):
+        try:
+            fire_dt = job["next_fire_fn"](after_dt)
+        except Exception as e:
+            log(f"⚠️ [定时器] 任务 {key} 计算下次触发失败: {e}")
+            return
+        if fire_dt is None:
+            return
+        wake_dt = fire_dt - timedelta(seconds=max(0.0, float(job.get("lead_s") or 0.0)))
+        self._seq += 1
+        heapq.heappush(self._heap, (wake_dt, self._seq, key, fire_dt))
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                wake_dt, seq, key, fire_dt = self._heap[0]
+                remain = (wake_dt - self._now_fn()).total_seconds()
+                spin_s = self._spin_s_fn()
+                if remain > spin_s:
+                    self._cond.wait(min(remain - spin_s, max(0.2, remain / 2.0)))
+                    continue
+                gen = self._gen
+            precise_sleep_until(time.perf_counter() + max(0.0, remain), spin_s=spin_s)
+            with self._cond:
+                if gen != self._gen or not self._heap or self._heap[0][1] != seq:
+                    continue
+                heapq.heappop(self._heap)
+                wake_error_ms = (self._now_fn() - wake_dt).total_seconds() * 1000.0
+                self._wake_errors_ms.append(round(wake_error_ms, 3))
+                self._last_fired[key] = fire_dt
+                job = self._jobs.get(key)
+                if job is not None and not job.get("once"):
+                    self._push_locked(key, job, fire_dt)
+            if job is not None:
+                threading.Thread(target=job["callback"], args=(fire_dt, wake_error_ms), daemon=True).start()
+
+    def next_wake_at(self):
+        with self._cond:
+            return self._heap[0][0] if self._heap else None
+
+    def stats(self):
+        with self._cond:
+            upcoming = sorted(self._heap)[:10]
+            return {
+                "jobs": len(self._jobs),
+                "upcoming": [
+                    {"key": key, "wake_at": wake_dt.strftime("%Y-%m-%d %H:%M:%S.%f")[:-3], "fire_at": fire_dt.strftime("%Y-%m-%d %H:%M:%S")}
+                    for wake_dt, _seq, key, fire_dt in upcoming
+                ],
+                "recent_wake_error_ms": list(self._wake_errors_ms),
+            }
+
+
+PRECISE_TASK_SCHEDULER = PreciseTaskScheduler()
+
+
+def write_json_atomic(path, data, indent=None, keep_backup=False):
+    """
+    同目录临时文件写完并 fsync 后 os.replace 换上：任何时刻崩溃，磁盘上要么是旧文件要么是新文件。
+    keep_backup=True 时换上前把旧文件改名为 .bak，留给 read_json_recovering 兜底。
+    """
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=indent)
+        f.flush()
+        os.fsync(f.fileno())
+    if keep_backup and os.path.exists(path):
+        os.replace(path, f"{path}.bak")
+    os.replace(tmp, path)
+
+
+def read_json_recovering(path):
+    """
+    读 write_json_atomic 写出的文件，返回 (data, 来源文件)；都读不到时 (None, None)。
+    主文件缺失或损坏时依次退回 .tmp（已 fsync 但未来得及改名）与 .bak（上一版）。
+    """
+    for candidate in (path, f"{path}.tmp", f"{path}.bak"):
+        if not os.path.exists(candidate):
+            continue
+        try:
+            with open(candidate, "r", encoding="utf-8") as f:
+                return json.load(f), candidate
+        except (OSError, ValueError):
+            continue
+    return None, None
 
-            sorted_places = sorted(matrix.keys(), key=lambda x: int(x) if x.isdigit() else 999)
-            sorted_times = sorted(list(all_times))
 
-            result = {
-                "places": sorted_places,
-                "times": sorted_times,
-                "matrix": matrix,
-                "meta": {
-                    "mine_overlay_ok": mine_overlay_ok,
-                    "mine_slots_count": mine_slots_count,
-                    "mine_overlay_error": mine_overlay_error,
-                    "date_booking_scope": date_booking_scope,
-                    "last_day_open_time": last_day_open_time_str,
-                }
-            }
-            with self._matrix_cache_lock:
-                self._matrix_cache[cache_key] = {'ts': time.time(), 'data': result}
-                if len(self._matrix_cache) > 8:
-                    oldest = min(self._matrix_cache.keys(), key=lambda k: self._matrix_cache[k].get('ts', 0.0))
-                    self._matrix_cache.pop(oldest, None)
-            return result
-            
-        except Exception as e:
-            return {"error": str(e)}
+class DebouncedJsonWriter:
+    """
+    写后合并落盘：mark_dirty() 只置脏并唤醒后台线程，最后一次置脏后静默 debounce 秒（连续置脏最多拖 max_delay 秒）
+    才调用 snapshot_fn() 取快照、write_json_atomic 写一次；其间的多次修改合并为一次整文件写。
+    flush() 同步写出当前脏数据（接口增删改、进程退出时用）；写失败保留脏标记，下一轮重试。
+    """
 
-    def submit_order(self, date_str, selected_items, submit_profile=None, skip_warmup=False):
-        """
-        入口统一走极简直提：内部仅调用 submit_order_minimal -> submit_delivery_campaign。
-        传统分批下单实现已移除。
-        skip_warmup：手动预订传 True 时不依赖首轮矩阵预拉，递送循环内仍会 get_matrix 算场。
-        """
-        ctx = get_runtime_request_context()
-        quiet_info = quiet_window_block_info(
-            "submit_order",
-            requester_task_id=ctx.get("task_id"),
-            owner_allowed=bool(ctx.get("owner")),
-            scope=self._quiet_scope_from_client(),
-        )
-        if quiet_info:
-            return {
-                "status": "quiet_window_blocked",
-                "msg": quiet_info.get("msg"),
-                "success_items": [],
-                "failed_items": normalize_booking_items(selected_items),
-                "run_metric": {
-                    "request_mode": "quiet_window_blocked",
-                    "submit_req_count": 0,
-                    "submit_success_resp_count": 0,
-                    "submit_retry_count": 0,
-                    "confirm_matrix_poll_count": 0,
-                    "confirm_orders_poll_count": 0,
-                    "verify_exception_count": 0,
-                    "rate_limited": False,
-                    "transport_error": False,
-                    "business_fail_msg": "",
-                    "server_msg_raw": "",
-                },
-                "quiet_window": quiet_info.get("quiet_window"),
-            }
-        profile_name = str(submit_profile or "").strip()
-        return self.submit_order_minimal(
-            date_str, selected_items, submit_profile=profile_name, skip_warmup=skip_warmup
-        )
+    def __init__(self, path, snapshot_fn, debounce_s=1.0, max_delay_s=5.0, indent=2):
+        self.path = path
+        self._snapshot_fn = snapshot_fn
+        self._debounce_s = max(0.0, float(debounce_s))
+        self._max_delay_s = max(self._debounce_s, float(max_delay_s))
+        self._indent = indent
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._dirty_since = None
+        self._last_mark = 0.0
+        self._thread = None
+        self._stats = {"marks": 0, "writes": 0, "coalesced": 0, "errors": 0, "last_write_ms": 0.0, "last_error": ""}
+
+    def mark_dirty(self):
+        with self._cond:
+            now = time.monotonic()
+            if self._dirty_since is None:
+                self._dirty_since = now
+            else:
+                self._stats["coalesced"] += 1
+            self._last_mark = now
+            self._stats["marks"] += 1
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="json-writer", daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+    def is_dirty(self):
+        with self._cond:
+            return self._dirty_since is not None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._dirty_since is None:
+                    self._cond.wait()
+                due = min(self._last_mark + self._debounce_s, self._dirty_since + self._max_delay_s)
+                delay = due - time.monotonic()
+                if delay > 0:
+                    self._cond.wait(delay)
+                    continue
+            if not self.flush():
+                # 写失败：等一个 debounce 再试，避免磁盘满时空转
+                time.sleep(max(0.2, self._debounce_s))
+
+    def flush(self):
+        """有脏数据则立即写一次；返回是否已落盘（无脏数据也算 True）。"""
+        with self._write_lock:
+            with self._cond:
+                if self._dirty_since is None:
+                    return True
+                dirty_since, last_mark = self._dirty_since, self._last_mark
+                self._dirty_since = None
+            t0 = time.perf_counter()
+            try:
+                write_json_atomic(self.path, self._snapshot_fn(), indent=self._indent, keep_backup=True)
+            except Exception as e:
+                with self._cond:
+                    self._stats["errors"] += 1
+                    self._stats["last_error"] = str(e)[:200]
+                    if self._dirty_since is None:
+                        self._dirty_since, self._last_mark = dirty_since, last_mark
+                    else:
+                        self._dirty_since = min(self._dirty_since, dirty_since)
+                return False
+            with self._cond:
+                self._stats["writes"] += 1
+                self._stats["last_write_ms"] = round((time.perf_counter() - t0) * 1000.0, 3)
+            return True
 
-client = ApiClient()
-sync_primary_client_auth()
+    def stats(self):
+        with self._cond:
+            out = dict(self._stats)
+            out["dirty"] = self._dirty_since is not None
+            out["path"] = os.path.basename(self.path)
+            return out
 
-# ================= 任务调度系统 =================
 
 class TaskManager:
     def __init__(self):
@@ -6000,9 +9537,22 @@ class TaskManager:
         self._refill_lock = threading.Lock()
         self._refill_last_run = {}
         self._refill_last_post_end_mono = {}
+        # 独立 refill：上轮无解时的 (求解输入, 矩阵)，按任务 id；矩阵无相关新可订格时跳过求解
+        self._refill_solve_memo = {}
+        # 各任务最近一次落盘的非「执行中」last_result：执行中落盘时沿用它，不把上一轮结果抹成 None
+        self._refill_persisted_results = {}
         self._refill_notify_last_bucket = {}
         self._task_run_lock = threading.Lock()
         self._running_task_ids = set()
+        # 定时器触发时写入 {task_id: {"fire_at", "wake_error_ms"}}，execute_task 取走用于精确开抢与指标
+        self._scheduled_fire_info = {}
+        self.refill_executor = RefillExecutor()
+        self.refill_writer = DebouncedJsonWriter(
+            REFILL_TASKS_FILE,
+            self._refill_tasks_snapshot,
+            debounce_s=REFILL_PERSIST_DEBOUNCE_SECONDS,
+            max_delay_s=REFILL_PERSIST_MAX_DELAY_SECONDS,
+        )
         self.load_tasks()
         self.load_refill_tasks()
         self._refill_scheduler_was_paused = False
@@ -6227,13 +9777,10 @@ class TaskManager:
         
 
     def load_refill_tasks(self):
-        if os.path.exists(REFILL_TASKS_FILE):
-            try:
-                with open(REFILL_TASKS_FILE, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.refill_tasks = data if isinstance(data, list) else []
-            except Exception:
-                self.refill_tasks = []
+        data, source = read_json_recovering(REFILL_TASKS_FILE)
+        self.refill_tasks = data if isinstance(data, list) else []
+        if source and source != REFILL_TASKS_FILE:
+            log(f"⚠️ [refill] {os.path.basename(REFILL_TASKS_FILE)} 缺失或损坏，已从 {os.path.basename(source)} 恢复 {len(self.refill_tasks)} 个任务")
         for t in self.refill_tasks:
             if not isinstance(t, dict):
                 continue
@@ -6254,11 +9801,52 @@ class TaskManager:
                 t['interval_jitter_seconds'] = max(0.0, float(t.get('interval_jitter_seconds', 0.0) or 0.0))
             except Exception:
                 t['interval_jitter_seconds'] = 0.0
+        self._refill_persisted_results = {
+            t.get('id'): t.get('last_result') for t in self.refill_tasks if isinstance(t, dict)
+        }
 
-    def save_refill_tasks(self):
+    def _refill_tasks_snapshot(self):
         with self._refill_lock:
-            with open(REFILL_TASKS_FILE, 'w', encoding='utf-8') as f:
-                json.dump(self.refill_tasks, f, ensure_ascii=False, indent=2)
+            # refill 在执行池线程里改 last_result 等字段：先浅拷贝每个任务再序列化，避免遍历中 dict 被改
+            snapshot = [dict(t) for t in list(self.refill_tasks)]
+        for t in snapshot:
+            # 「执行中」只是运行时状态，重启后没有意义，不落盘：改写上一次落盘的结果
+            if isinstance(t.get('last_result'), dict) and t['last_result'].get('status') == 'running':
+                t['last_result'] = self._refill_persisted_results.get(t.get('id'))
+            else:
+                self._refill_persisted_results[t.get('id')] = t.get('last_result')
+        return snapshot
+
+    def save_refill_tasks(self, immediate=False):
+        """
+        标记 refill_tasks 待落盘，由 refill_writer 合并后原子写入；immediate=True 时同步写出（接口增删改）。
+        只改 last_result 等运行时字段不必调用：它们随下一次落盘带上。
+        """
+        self.refill_writer.mark_dirty()
+        if immediate:
+            self.refill_writer.flush()
+
+    def _run_refill_job(self, refill_task, source='auto'):
+        """执行池内跑一轮 refill 并落结果/历史（自动轮询与手动 1 轮共用）。"""
+        try:
+            res = self._run_refill_task_once(refill_task, source=source)
+        except Exception as e:
+            res = {'status': 'error', 'msg': str(e)}
+        refill_task['last_run_at'] = int(time.time() * 1000)
+        refill_task['last_result'] = res
+        self.append_refill_history(refill_task, res)
+        self.save_refill_tasks()
+        return res
+
+    def submit_refill_run(self, refill_task, account=None, source='auto'):
+        """把一轮 refill 交给执行池；该任务已在排队/执行中时返回 False。"""
+        if account is None:
+            account, _scope, _err = resolve_task_account_and_scope(refill_task)
+        return self.refill_executor.submit(
+            refill_task.get('id'),
+            GymSessionRegistry.account_key(account) or str(refill_task.get('accountId') or ''),
+            lambda: self._run_refill_job(refill_task, source=source),
+        )
 
     def add_refill_task(self, task):
         now_ms = int(time.time() * 1000)
@@ -6295,7 +9883,7 @@ class TaskManager:
         task['exec_history'] = list(task.get('exec_history') or [])[-10:]
         task['accountId'] = str(task.get('accountId') or '').strip()
         self.refill_tasks.append(task)
-        self.save_refill_tasks()
+        self.save_refill_tasks(immediate=True)
         return task
 
     def delete_refill_task(self, task_id):
@@ -6303,7 +9891,9 @@ class TaskManager:
         self.refill_tasks = [t for t in self.refill_tasks if int(t.get('id', -1)) != tid]
         self._refill_last_run.pop(tid, None)
         self._refill_last_post_end_mono.pop(tid, None)
-        self.save_refill_tasks()
+        self._refill_solve_memo.pop(str(tid), None)  # 求解记忆按 str(id) 存
+        self._refill_persisted_results.pop(tid, None)
+        self.save_refill_tasks(immediate=True)
 
 
     def update_refill_task(self, task_id, patch):
@@ -6372,7 +9962,7 @@ class TaskManager:
                     pass
             if 'accountId' in payload:
                 t['accountId'] = str(payload.get('accountId') or '').strip()
-            self.save_refill_tasks()
+            self.save_refill_tasks(immediate=True)
             return t
         return None
 
@@ -6482,11 +10072,13 @@ class TaskManager:
             need_res = {'need_by_time': {}}
             # 不需要订单覆盖，直接依赖解锁窗口+state 的语义映射
             matrix_timeout_s = max(0.5, float(CONFIG.get("matrix_timeout_seconds", 3.0) or 3.0))
+            solve_memo = self._refill_solve_memo.get(task_id)
             matrix_res = refill_client.get_matrix(
                 date_str,
                 include_mine_overlay=False,
                 request_timeout=matrix_timeout_s,
                 bypass_cache=True,
+                delta_base=solve_memo.get("matrix") if solve_memo else None,
             )
             if 'error' in matrix_res:
                 msg = f"获取矩阵失败: {matrix_res.get('error')}"
@@ -6520,6 +10112,8 @@ class TaskManager:
                     "avail_all": avail_by_time_all,
                     "avail_le14": avail_by_time_le14,
                     "mine_by_time": mine_by_time,
+                    "matrix_parse_ms": (matrix_res.get("meta") or {}).get("parse_ms"),
+                    "matrix_response_bytes": (matrix_res.get("meta") or {}).get("response_bytes"),
                 },
             )
             # #endregion
@@ -6608,6 +10202,20 @@ class TaskManager:
                 },
             )
             # #endregion
+            solve_key = (
+                tuple(sorted((str(k), int(v)) for k, v in (need_res.get("need_by_time") or {}).items())),
+                tuple(sorted((str(k), str(v)) for k, v in intent_base.items())),
+                bool(allow_scatter),
+                tuple(candidate_places),
+            )
+            if (
+                solve_memo
+                and solve_memo.get("key") == solve_key
+                and not matrix_delta_may_unlock(matrix_res.get("delta"), candidate_places, target_times)
+            ):
+                msg = f"当前无可补订组合，缺口: {need_res['need_by_time']}"
+                log(f"🙈 {tag} {msg}（矩阵无相关新可订格，跳过求解）")
+                return {'status': 'fail', 'msg': msg}
             solved, used_need, tier_label = solve_refill_with_policy(
                 matrix,
                 candidate_places,
@@ -6617,6 +10225,10 @@ class TaskManager:
                 policy=REFILL_POLICY_INDEPENDENT,
             )
             picks = normalize_booking_items((solved or {}).get("items") or [])
+            if picks:
+                self._refill_solve_memo.pop(task_id, None)
+            else:
+                self._refill_solve_memo[task_id] = {"key": solve_key, "matrix": matrix}
             # #region agent log
             _dbg_log(
                 "H4",
@@ -6759,6 +10371,9 @@ class TaskManager:
             last = float(self._refill_last_run.get(tid, 0.0))
             if now - last < interval:
                 continue
+            # 上一轮仍在执行池中：不重复触发，也不推迟基准，跑完后的下一 tick 即可再次到期
+            if self.refill_executor.is_busy(tid):
+                continue
             sampled_jitter = random.uniform(0.0, interval_jitter_s) if interval_jitter_s > 0 else 0.0
             _ra, scope_r, err_r = resolve_task_account_and_scope(t)
             if err_r:
@@ -6774,15 +10389,7 @@ class TaskManager:
                 continue
             self._refill_last_run[tid] = now + sampled_jitter
             t['last_result'] = {'status': 'running', 'msg': '自动轮询执行中'}
-            self.save_refill_tasks()
-            try:
-                res = self._run_refill_task_once(t, source='auto')
-            except Exception as e:
-                res = {'status': 'error', 'msg': str(e)}
-            t['last_run_at'] = int(time.time() * 1000)
-            t['last_result'] = res
-            self.append_refill_history(t, res)
-            self.save_refill_tasks()
+            self.submit_refill_run(t, account=_ra, source='auto')
 
     def load_tasks(self):
         if os.path.exists(TASKS_FILE):
@@ -6895,11 +10502,12 @@ class TaskManager:
         if refresh:
             self.refresh_schedule()
 
-    def send_notification(self, content, phones=None):
+    def send_notification(self, content, phones=None, wait=False):
         """
         发送短信通知：
         - phones 不为 None 时，优先使用传入的号码（任务级别）
         - 否则退回到全局 CONFIG['notification_phones']
+        - 默认交给 NOTIFY_DISPATCHER 后台发送、立即返回；wait=True 时同步发送并返回接口结果（测试短信用）
         """
         if phones is None:
             phones = CONFIG.get('notification_phones', [])
@@ -6912,48 +10520,54 @@ class TaskManager:
 
         if not phones:
             log(f"⚠️ 未配置短信手机号，通知内容未发送: {content}")
-            return  # 没有号码就直接返回
+            return False, "未配置短信手机号"
 
-        log(f"📧 正在发送短信通知给: {phones}")
+        if not wait:
+            NOTIFY_DISPATCHER.submit("sms", phones, content, lambda c, t, _title: self._send_sms_once(c, list(t)))
+            return True, "已加入发送队列"
         try:
-            u = CONFIG['sms']['user']
-            p = CONFIG['sms']['api_key']
-
-            error_map = {
-                '0': '发送成功',
-                '30': '密码错误',
-                '40': '账号不存在',
-                '41': '余额不足',
-                '42': '帐号过期',
-                '43': 'IP地址限制',
-                '50': '内容含有敏感词',
-                '51': '手机号码不正确'
-            }
+            return self._send_sms_once(content, phones)
+        except Exception as e:
+            log(f"❌ 短信发送异常: {e}")
+            return False, str(e)
 
-            m = ",".join(phones)
-            c = f"【数数云端】{content}"
+    def _send_sms_once(self, content, phones):
+        """同步调用短信宝一次；传输异常直接抛出（由 NOTIFY_DISPATCHER 重试），业务返回码映射为 (ok, msg)。"""
+        log(f"📧 正在发送短信通知给: {phones}")
+        u = CONFIG['sms']['user']
+        p = CONFIG['sms']['api_key']
+
+        error_map = {
+            '0': '发送成功',
+            '30': '密码错误',
+            '40': '账号不存在',
+            '41': '余额不足',
+            '42': '帐号过期',
+            '43': 'IP地址限制',
+            '50': '内容含有敏感词',
+            '51': '手机号码不正确'
+        }
 
-            params = {
-                "u": u,
-                "p": p,
-                "m": m,
-                "c": c
-            }
+        m = ",".join(phones)
+        c = f"【数数云端】{content}"
 
-            resp = requests.get("https://api.smsbao.com/sms", params=params, timeout=10)
+        params = {
+            "u": u,
+            "p": p,
+            "m": m,
+            "c": c
+        }
 
-            code = resp.text
-            msg = error_map.get(code, f"未知错误({code})")
-            log(f"📧 短信接口返回: [{code}] {msg}")
+        resp = requests.get("https://api.smsbao.com/sms", params=params, timeout=10)
 
-            if code != '0':
-                log(f"⚠️ 短信发送异常: {msg}")
-                return False, msg
-            return True, "发送成功"
+        code = resp.text
+        msg = error_map.get(code, f"未知错误({code})")
+        log(f"📧 短信接口返回: [{code}] {msg}")
 
-        except Exception as e:
-            log(f"❌ 短信发送异常: {e}")
-            return False, str(e)
+        if code != '0':
+            log(f"⚠️ 短信发送异常: {msg}")
+            return False, msg
+        return True, "发送成功"
 
     def _build_short_title(self, prefix: str, date_str: str | None, items: list[dict] | None):
         """
@@ -6993,11 +10607,12 @@ class TaskManager:
             return f"{base}{pair_text}"
         return base or None
 
-    def send_wechat_notification(self, content, tokens=None, title=None):
+    def send_wechat_notification(self, content, tokens=None, title=None, wait=False):
         """
         发送微信通知（PushPlus）：
         - tokens 不为 None 时，优先使用传入的 token（任务级别）
         - 否则退回到全局 CONFIG['pushplus_tokens']
+        - 默认每个 token 一条交给 NOTIFY_DISPATCHER 后台发送、立即返回；wait=True 时同步发送
         """
         if tokens is None:
             tokens = CONFIG.get('pushplus_tokens', [])
@@ -7011,37 +10626,52 @@ class TaskManager:
             log(f"⚠️ 未配置 PushPlus token，微信通知未发送: {content}")
             return False, "未配置 PushPlus token"
 
-        try:
-            # 默认标题：从内容截取一段，供未显式传入短标题的场景使用
-            short = str(content or "").replace("\n", " ").strip()
-            if len(short) > 40:
-                short = short[:40] + "..."
-            effective_title = title or short or "场地预订通知"
-            payload = {
-                "title": effective_title,
-                "content": content,
-                "template": "txt",
-            }
+        # 默认标题：从内容截取一段，供未显式传入短标题的场景使用
+        short = str(content or "").replace("\n", " ").strip()
+        if len(short) > 40:
+            short = short[:40] + "..."
+        effective_title = title or short or "场地预订通知"
+        if not wait:
             for token in tokens:
-                payload["token"] = token
-                resp = requests.post(
-                    "http://www.pushplus.plus/send",
-                    json=payload,
-                    timeout=10,
+                NOTIFY_DISPATCHER.submit(
+                    "pushplus",
+                    [token],
+                    content,
+                    lambda c, t, ttl: self._send_wechat_once(c, t[0], ttl),
+                    title=effective_title,
                 )
-                try:
-                    data = resp.json()
-                except ValueError:
-                    data = {"code": -1, "msg": resp.text}
-                if data.get("code") != 200:
-                    log(f"⚠️ PushPlus 发送失败: {data}")
-                else:
-                    log("📩 PushPlus 发送成功")
+            return True, "已加入发送队列"
+        try:
+            for token in tokens:
+                self._send_wechat_once(content, token, effective_title)
             return True, "发送成功"
         except Exception as e:
             log(f"❌ PushPlus 发送异常: {e}")
             return False, str(e)
 
+    def _send_wechat_once(self, content, token, title):
+        """同步调用 PushPlus 一次；传输异常直接抛出（由 NOTIFY_DISPATCHER 重试）。"""
+        payload = {
+            "title": title,
+            "content": content,
+            "template": "txt",
+            "token": token,
+        }
+        resp = requests.post(
+            "http://www.pushplus.plus/send",
+            json=payload,
+            timeout=10,
+        )
+        try:
+            data = resp.json()
+        except ValueError:
+            data = {"code": -1, "msg": resp.text}
+        if data.get("code") != 200:
+            log(f"⚠️ PushPlus 发送失败: {data}")
+            return False, str(data.get("msg") or "")
+        log("📩 PushPlus 发送成功")
+        return True, "发送成功"
+
     def execute_task(self, task):
         account_exec, _scope_exec, acc_err_exec = resolve_task_account_and_scope(task)
         if acc_err_exec:
@@ -7067,6 +10697,8 @@ class TaskManager:
             "first_submit_ms": None,
             "t_first_post_ms": None,
             "submit_latencies_ms": [],
+            # 单次 reservationPlace 的 elapsed_ms（submit_latencies_ms 里还混着整次递送的墙钟时间）
+            "post_latencies_ms": [],
             "submit_req_count": 0,
             "submit_success_resp_count": 0,
             "submit_retry_count": 0,
@@ -7213,6 +10845,10 @@ class TaskManager:
         last_fail_reason = None
         task_config_hint = task.get('config') if isinstance(task.get('config'), dict) else {}
         direct_mode_enabled = is_direct_task_config(task_config_hint)
+        scheduled_info = self._scheduled_fire_info.pop(str(task_id), None) if task_id is not None else None
+        if scheduled_info:
+            run_metrics["scheduler_wake_error_ms"] = scheduled_info.get("wake_error_ms")
+        release_at = scheduled_info.get("fire_at") if scheduled_info else None
 
         def notify_task_result(success, message, items=None, date_str=None, partial=False):
             phones_list = []
@@ -7299,6 +10935,17 @@ class TaskManager:
                 over = len(base_lat) - METRICS_LATENCY_SAMPLES_KEEP
                 if over > 0:
                     del base_lat[0:over]
+            post_lat = submit_metric.get("post_latencies_ms")
+            if isinstance(post_lat, list) and post_lat:
+                base_post = run_metrics.setdefault("post_latencies_ms", [])
+                for x in post_lat:
+                    try:
+                        base_post.append(int(x))
+                    except Exception:
+                        continue
+                over = len(base_post) - METRICS_LATENCY_SAMPLES_KEEP
+                if over > 0:
+                    del base_post[0:over]
             for key in (
                 "attempt_count_total",
                 "dispatch_round_count",
@@ -7327,8 +10974,21 @@ class TaskManager:
                 "interval_candidates_initial",
                 "interval_candidates_pruned",
                 "interval_retry_requeued",
+                "pipelined_matrix_prefetch_count",
+                "pipelined_matrix_hit_count",
+                "pipelined_matrix_discard_count",
+                "pipelined_matrix_prefetch_skipped_count",
+                "refill_solve_skipped_count",
+                "solver_plan_cache_hit_count",
+                "solver_plan_cache_miss_count",
+                "matrix_parse_count",
+                "matrix_response_bytes_total",
+                "matrix_shared_count",
             ):
                 run_metrics[key] = int(run_metrics.get(key) or 0) + int(submit_metric.get(key) or 0)
+            run_metrics["matrix_parse_ms_total"] = round(
+                float(run_metrics.get("matrix_parse_ms_total") or 0.0) + float(submit_metric.get("matrix_parse_ms_total") or 0.0), 3
+            )
             run_metrics["refill_no_candidate_max_streak"] = max(
                 int(run_metrics.get("refill_no_candidate_max_streak") or 0),
                 int(submit_metric.get("refill_no_candidate_max_streak") or 0),
@@ -7346,6 +11006,10 @@ class TaskManager:
                 over_ev = len(base_ev) - TRANSPORT_ERROR_EVENTS_MAX
                 if over_ev > 0:
                     del base_ev[0:over_ev]
+            if submit_metric.get("gym_line_latency"):
+                run_metrics["gym_line_latency"] = merge_gym_line_latency(
+                    run_metrics.get("gym_line_latency"), submit_metric.get("gym_line_latency")
+                )
             run_metrics["goal_satisfied"] = bool(run_metrics.get("goal_satisfied") or submit_metric.get("goal_satisfied"))
             run_metrics["attempt_count_inflight_peak"] = max(
                 int(run_metrics.get("attempt_count_inflight_peak") or 0),
@@ -7358,7 +11022,16 @@ class TaskManager:
                     int(existing_delivery_ms or 0),
                     int(delivery_window_ms or 0),
                 )
-            for key in ("stopped_by", "combo_tier", "picked_group_id", "delivery_status", "business_status", "terminal_reason"):
+            for key in (
+                "stopped_by",
+                "combo_tier",
+                "picked_group_id",
+                "delivery_status",
+                "business_status",
+                "terminal_reason",
+                "delivery_engine",
+                "gym_line_mode",
+            ):
                 val = submit_metric.get(key)
                 if val not in (None, ""):
                     run_metrics[key] = val
@@ -7423,7 +11096,7 @@ class TaskManager:
                 run_metrics["success_within_60s"] = bool(
                     run_metrics.get("first_success_ms") is not None and int(run_metrics.get("first_success_ms") or 0) <= 60000
                 )
-                for arr_key in ("submit_latencies_ms", "confirm_latencies_ms"):
+                for arr_key in ("submit_latencies_ms", "post_latencies_ms", "confirm_latencies_ms"):
                     arr = run_metrics.get(arr_key)
                     if isinstance(arr, list) and len(arr) > METRICS_LATENCY_SAMPLES_KEEP:
                         run_metrics[arr_key] = arr[-METRICS_LATENCY_SAMPLES_KEEP:]
@@ -7516,6 +11189,7 @@ class TaskManager:
                 base_run = base_run + timedelta(days=diff)
 
             target_date = (base_run + timedelta(days=offset_days)).strftime("%Y-%m-%d")
+            release_at = base_run
             log(
                 f"🕒 [时间对齐] server_offset={round(task_client.server_time_offset_seconds, 3)}s, "
                 f"base_run={base_run.strftime('%Y-%m-%d %H:%M:%S')}, target_date={target_date}"
@@ -7534,13 +11208,14 @@ class TaskManager:
                     preheat_window = max(5.0, float(CONFIG.get('auto_preheat_window_seconds', 30.0) or 30.0))
                     min_gap = max(3.0, float(CONFIG.get('auto_preheat_min_gap_seconds', 5.0) or 5.0))
                     max_probes = max(1, min(6, int(CONFIG.get('auto_preheat_max_probes', 4) or 4)))
+                    probe_stop_s = auto_preheat_probe_stop_seconds()
 
                     probes_done = 0
                     while probes_done < max_probes:
                         now_aligned = task_client.get_aligned_now()
                         seconds_to_base = (base_run - now_aligned).total_seconds()
-                        if seconds_to_base <= 5.0:
-                            break  # 离正式抢票太近了，停止预热
+                        if seconds_to_base <= probe_stop_s:
+                            break  # 离正式抢票太近了（不足下单间隔 + 余量），停止预热
 
                         # 只在距离 base_run 不超过预热窗口时才发起探测
                         if seconds_to_base > preheat_window:
@@ -7565,7 +11240,7 @@ class TaskManager:
                         # 控制探针频率，避免在开售前就触发频控
                         now_aligned = task_client.get_aligned_now()
                         seconds_to_base = (base_run - now_aligned).total_seconds()
-                        if seconds_to_base <= 5.0:
+                        if seconds_to_base <= probe_stop_s:
                             break
                         # 保证至少 min_gap 秒间隔，同时不跨过 base_run-3s
                         sleep_s = min(min_gap, max(0.5, seconds_to_base - 3.0))
@@ -7574,12 +11249,22 @@ class TaskManager:
             except Exception as e:
                 log(f"⚠️ [预热探针] 执行异常，跳过预热: {e}")
 
+        # 定时器提前唤醒（或服务端时间慢于本机）：sleep + 最后自旋到开抢时刻，记录实际触发误差
+        if release_at is not None:
+            send_at = release_at
+            clock_est = SERVER_CLOCK.estimate()
+            if clock_est:
+                # 首个 POST 到达服务器时最坏也不早于开抢：+ 时差不确定度（封顶 1s），- 单程时延（最小 RTT 的一半）
+                adjust_ms = min(1000.0, clock_est["uncertainty_ms"]) - clock_est["min_rtt_ms"] / 2.0
+                send_at = release_at + timedelta(milliseconds=adjust_ms)
+                run_metrics["clock_sync"] = {**clock_est, "send_adjust_ms": round(adjust_ms, 3)}
             aligned_now_after = task_client.get_aligned_now()
-            if aligned_now_after < base_run:
-                wait_s = (base_run - aligned_now_after).total_seconds()
-                if 0 < wait_s <= 120:
-                    log(f"⏳ [时间对齐] 服务端未到触发时刻，等待 {round(wait_s, 2)}s 后开始抢票")
-                    time.sleep(wait_s)
+            wait_s = (send_at - aligned_now_after).total_seconds()
+            if 0 < wait_s <= 120:
+                log(f"⏳ [时间对齐] 服务端未到触发时刻，等待 {round(wait_s, 2)}s 后开始抢票")
+                precise_sleep_until(time.perf_counter() + wait_s)
+            if scheduled_info or 0 < wait_s <= 120:
+                run_metrics["fire_error_ms"] = round((task_client.get_aligned_now() - send_at).total_seconds() * 1000.0, 3)
 
         active_started_ts = time.time()
         _rm_close_phase("schedule")
@@ -7719,30 +11404,26 @@ class TaskManager:
             return
 
     def refresh_schedule(self):
-        schedule.clear("task")
         print(f"🔄 [调度器] 正在刷新任务列表 (共 {len(self.tasks)} 个)...")
 
         # 内部工具函数：支持单次任务执行完后自动删除自身
         def make_job(t, is_once=False):
-            def _job():
-                print(f"⏰ [调度器] 触发任务 ID: {t['id']}")
-
-                def _runner():
-                    try:
-                        self.execute_task_with_lock(t)
-                    finally:
-                        if is_once:
-                            print(f"✅ 单次任务 {t['id']} 执行完成，自动从任务列表中删除")
-                            self.delete_task(t['id'], refresh=False)
-
-                threading.Thread(target=_runner, daemon=True).start()
-                # 同刻多任务若同步执行会阻塞 run_pending，导致只能串行；改为后台线程与「立即运行」一致。
-                if is_once:
-                    return schedule.CancelJob
-                return None
+            def _job(fire_dt, wake_error_ms):
+                print(f"⏰ [调度器] 触发任务 ID: {t['id']}（开抢 {fire_dt.strftime('%H:%M:%S')}，唤醒误差 {wake_error_ms:+.2f}ms）")
+                self._scheduled_fire_info[str(t['id'])] = {"fire_at": fire_dt, "wake_error_ms": round(wake_error_ms, 3)}
+                # 定时器已在独立线程里回调：同刻多任务并行执行，与「立即运行」一致
+                try:
+                    self.execute_task_with_lock(t)
+                finally:
+                    # 被任务锁/静默窗口跳过时 execute_task 没取走，避免之后的手动运行误用
+                    self._scheduled_fire_info.pop(str(t['id']), None)
+                    if is_once:
+                        print(f"✅ 单次任务 {t['id']} 执行完成，自动从任务列表中删除")
+                        self.delete_task(t['id'], refresh=False)
 
             return _job
 
+        jobs = []
         for task in self.tasks:
             # 仅对“启用”的任务建立定时调度；停用任务仍保留在列表中，但不会被自动触发
             if not bool(task.get('enabled', True)):
@@ -7753,30 +11434,27 @@ class TaskManager:
                 run_time += ":00"
 
             t_type = task.get('type', 'daily')
-
+            if t_type not in ('daily', 'weekly', 'once'):
+                continue
             try:
+                if t_type == 'weekly':
+                    wd = int(task['weekly_day'])
+                jobs.append({
+                    "key": task['id'],
+                    "next_fire_fn": lambda after, t=task: self._compute_next_run_datetime(t, now=after),
+                    "lead_s": task_fire_lead_seconds(task),
+                    "once": t_type == 'once',
+                    "callback": make_job(task, is_once=(t_type == 'once')),
+                })
                 if t_type == 'daily':
-                    schedule.every().day.at(run_time).do(make_job(task, is_once=False)).tag("task")
                     print(f"   -> 已添加每日任务: {run_time}")
                 elif t_type == 'weekly':
-                    days = [
-                        schedule.every().monday,
-                        schedule.every().tuesday,
-                        schedule.every().wednesday,
-                        schedule.every().thursday,
-                        schedule.every().friday,
-                        schedule.every().saturday,
-                        schedule.every().sunday,
-                    ]
-                    wd = int(task['weekly_day'])
-                    days[wd].at(run_time).do(make_job(task, is_once=False)).tag("task")
                     print(f"   -> 已添加每周任务: 周{['一', '二', '三', '四', '五', '六', '日'][wd]} {run_time}")
-                elif t_type == 'once':
-                    # 单次任务：到点执行一次，然后自动从任务列表和调度器中移除
-                    schedule.every().day.at(run_time).do(make_job(task, is_once=True)).tag("task")
+                else:
                     print(f"   -> 已添加单次任务: {run_time}（执行一次后自动删除）")
             except Exception as e:
                 print(f"❌ 添加任务失败: {e}")
+        PRECISE_TASK_SCHEDULER.set_jobs(jobs)
 
 
 
@@ -7837,24 +11515,31 @@ def validate_templates_on_startup():
         )
 
 task_manager = TaskManager()
+atexit.register(task_manager.refill_writer.flush)
 
 
 
 def smoke_render_pages_on_startup():
-    """启动前做最小页面渲染回归，尽早发现模板运行时问题。"""
+    """启动前做最小页面渲染回归，尽早发现模板运行时问题；渲染结果顺带进缓存，首个请求不再现渲染。"""
+    try:
+        assets = STATIC_ASSETS.load()
+    except OSError as e:
+        raise RuntimeError(f'前端静态资源缺失: {e}')
     with app.test_request_context('/'):
-        render_main_page('semi')
-        render_main_page('tasks')
-        render_main_page('settings')
-    print('✅ 页面渲染冒烟检查通过: /, /tasks, /settings')
+        for page_mode in ('semi', 'tasks', 'mine', 'settings'):
+            render_main_page(page_mode)
+    fingerprints = ', '.join(e['path'] for e in assets.values())
+    print(f'✅ 页面渲染冒烟检查通过: /, /tasks, /mine, /settings（静态资源 {fingerprints}）')
 
 def run_scheduler():
     print("🚀 [后台] 任务调度线程已启动...")
+    SERVER_CLOCK.start_background()
     while True:
         try:
             task_manager.process_quiet_window_tick()
             schedule.run_pending()
             task_manager.run_refill_scheduler_tick()
+            GYM_SESSION_REGISTRY.evict_idle()
         except Exception as e:
             print(f"⚠️ 调度执行出错: {e}")
             print(traceback.format_exc())
@@ -7879,7 +11564,7 @@ def _require_web_ui_login():
     cfg = CONFIG.get("web_ui_auth") or {}
     if not cfg.get("enabled"):
         return None
-    if request.endpoint in ("static", "web_login", "web_logout"):
+    if request.endpoint in ("static", "static_asset", "web_login", "web_logout"):
         return None
     if session.get("web_ui_logged_in"):
         session.permanent = True
@@ -7969,13 +11654,109 @@ def build_dates():
     return dates
 
 
+STATIC_ASSET_DIR = os.path.join(BASE_DIR, 'static')
+STATIC_ASSET_NAMES = ('app.css', 'app.js')
+# 带指纹的 URL 内容永不变化，浏览器可缓存一年
+STATIC_ASSET_MAX_AGE_SECONDS = 365 * 24 * 3600
+STATIC_ASSET_MIMETYPES = {'.css': 'text/css', '.js': 'application/javascript'}
+
+
+class StaticAssetBundle:
+    """页面 CSS/JS 静态包：首次使用时读入内存，按内容 md5 打指纹（/assets/app.<md5>.js）并预压 gzip。
+
+    指纹随内容变化，同一 URL 的内容永远不变，可发长期 immutable 缓存；ETag 即指纹（gzip 版加 -gz）。
+    进程内不热加载，改了 static/ 需重启（与非 debug 下的模板缓存一致）。
+    """
+
+    def __init__(self, root=STATIC_ASSET_DIR, names=STATIC_ASSET_NAMES):
+        self.root = root
+        self.names = tuple(names)
+        self._lock = threading.Lock()
+        self._assets = None
+        self._by_path = {}
+
+    def load(self):
+        with self._lock:
+            if self._assets is not None:
+                return self._assets
+            assets = {}
+            by_path = {}
+            for name in self.names:
+                with open(os.path.join(self.root, name), 'rb') as f:
+                    raw = f.read()
+                digest = hashlib.md5(raw).hexdigest()[:12]
+                stem, ext = os.path.splitext(name)
+                entry = {
+                    'name': name,
+                    'path': f'{stem}.{digest}{ext}',
+                    'etag': digest,
+                    'body': raw,
+                    'gzip': gzip.compress(raw, compresslevel=9, mtime=0),
+                    'mimetype': STATIC_ASSET_MIMETYPES.get(ext, 'application/octet-stream'),
+                }
+                assets[name] = entry
+                by_path[entry['path']] = entry
+            self._assets = assets
+            self._by_path = by_path
+            return assets
+
+    def url(self, name):
+        entry = self.load().get(name)
+        if entry is None:
+            raise KeyError(f'未登记的静态资源: {name}')
+        return f"/assets/{entry['path']}"
+
+    def lookup(self, path):
+        self.load()
+        return self._by_path.get(path)
+
+
+STATIC_ASSETS = StaticAssetBundle()
+
+# 主页面渲染缓存：(page_mode, 当天日期) -> (html, etag)。模板里按请求变化的只有日期按钮与页签高亮，跨天自动换新
+_PAGE_RENDER_CACHE = {}
+_PAGE_RENDER_CACHE_LOCK = threading.Lock()
+
+
 def render_main_page(page_mode: str):
-    return render_template(
-        'index.html',
-        dates=build_dates(),
-        tasks=task_manager.tasks,
-        page_mode=page_mode,
-    )
+    dates = build_dates()
+    today = dates[0]['val']
+    key = (page_mode, today)
+    with _PAGE_RENDER_CACHE_LOCK:
+        cached = _PAGE_RENDER_CACHE.get(key)
+    if cached is None:
+        body = render_template(
+            'index.html',
+            dates=dates,
+            page_mode=page_mode,
+            asset_url=STATIC_ASSETS.url,
+            boot={'page_mode': page_mode, 'today': today},
+        )
+        cached = (body, hashlib.md5(body.encode('utf-8')).hexdigest()[:16])
+        with _PAGE_RENDER_CACHE_LOCK:
+            for stale in [k for k in _PAGE_RENDER_CACHE if k[1] != today]:
+                _PAGE_RENDER_CACHE.pop(stale, None)
+            _PAGE_RENDER_CACHE[key] = cached
+    resp = Response(cached[0], mimetype='text/html')
+    resp.set_etag(cached[1])
+    # 页面本身每次回源校验（304 不带正文），真正的大头在带指纹的静态资源里
+    resp.headers['Cache-Control'] = 'no-cache'
+    return resp.make_conditional(request)
+
+
+@app.route('/assets/<path:filename>')
+def static_asset(filename):
+    entry = STATIC_ASSETS.lookup(filename)
+    if entry is None:
+        return jsonify({"status": "error", "msg": "Not Found"}), 404
+    use_gzip = 'gzip' in (request.headers.get('Accept-Encoding') or '').lower()
+    resp = Response(entry['gzip'] if use_gzip else entry['body'], mimetype=entry['mimetype'])
+    if use_gzip:
+        resp.headers['Content-Encoding'] = 'gzip'
+    resp.headers['Vary'] = 'Accept-Encoding'
+    resp.headers['Cache-Control'] = f'public, max-age={STATIC_ASSET_MAX_AGE_SECONDS}, immutable'
+    resp.set_etag(f"{entry['etag']}-gz" if use_gzip else entry['etag'])
+    return resp.make_conditional(request)
 
 
 @app.route('/mine')
@@ -8007,7 +11788,7 @@ def api_matrix():
     quiet_info = quiet_window_block_info("api_matrix", owner_allowed=False, scope=build_quiet_window_scope(auth=account))
     if quiet_info:
         return jsonify({"error": quiet_info.get("msg"), "quiet_window_blocked": True, "quiet_window": quiet_info.get("quiet_window")})
-    account_client = build_client_for_account(account)
+    account_client = build_client_for_account(account, matrix_share=True)
     with runtime_request_context("api_matrix", owner=False):
         return jsonify(account_client.get_matrix(date, include_mine_overlay=include_mine_overlay))
 
@@ -8234,7 +12015,7 @@ def api_mine_overview():
         def _reconcile_one_matrix(job):
             aid, aname, color_key, acc, d = job
             try:
-                client = build_client_for_account(acc)
+                client = build_client_for_account(acc, matrix_share=True)
                 with runtime_request_context("api_mine_overview", owner=False):
                     mx = client.get_matrix(
                         d,
@@ -9355,6 +13136,17 @@ def _update_config_impl(data, scope=None):
             ('same_time_precheck_limit', 0, 0, 9),
             ('delivery_account_phase_offset_ms', 120, 0, 1000),
             ('delivery_retry_jitter_ms', 180, 0, 1000),
+            ('gym_session_idle_evict_seconds', 900, 30, 86400),
+            ('gym_session_pool_maxsize', 4, 1, 16),
+            ('gym_session_unhealthy_error_streak', 3, 1, 50),
+            ('gym_line_probe_interval_seconds', 5, 1, 300),
+            ('refill_worker_pool_size', 4, 1, 16),
+            ('refill_per_account_concurrency', 1, 1, 4),
+            ('task_fire_lead_seconds', 3, 0, 110),
+            ('scheduler_spin_window_ms', 300, 0, 1000),
+            ('clock_sync_lead_seconds', 120, 10, 900),
+            ('clock_sync_max_rtt_ms', 800, 50, 5000),
+            ('matrix_share_max_age_ms', 0, 0, 5000),
         ):
             if key not in data:
                 continue
@@ -9371,6 +13163,28 @@ def _update_config_impl(data, scope=None):
                 mode = 'smart'
             CONFIG['submit_grouping_mode'] = mode
             saved['submit_grouping_mode'] = mode
+        if 'delivery_engine' in data:
+            mode = str(data.get('delivery_engine') or 'sequential').strip().lower()
+            if mode not in DELIVERY_ENGINE_MODES:
+                mode = 'sequential'
+            CONFIG['delivery_engine'] = mode
+            saved['delivery_engine'] = mode
+        if 'gym_line_mode' in data:
+            mode = str(data.get('gym_line_mode') or 'pinned').strip().lower()
+            if mode not in GYM_LINE_MODES:
+                mode = 'pinned'
+            CONFIG['gym_line_mode'] = mode
+            saved['gym_line_mode'] = mode
+        if 'clock_sync_enabled' in data:
+            val = data['clock_sync_enabled']
+            if isinstance(val, bool):
+                enabled = val
+            elif isinstance(val, str):
+                enabled = val.lower() in ('1', 'true', 'yes', 'on')
+            else:
+                enabled = bool(val)
+            CONFIG['clock_sync_enabled'] = enabled
+            saved['clock_sync_enabled'] = enabled
         if 'health_check_start_time' in data:
             time_str = normalize_time_str(data['health_check_start_time'])
             if time_str:
@@ -10066,6 +13880,10 @@ def update_config():
             CONFIG['verbose_logs'] = enabled
             saved['verbose_logs'] = enabled
 
+        if 'log_category_levels' in data:
+            CONFIG['log_category_levels'] = normalize_log_category_levels(data['log_category_levels'])
+            saved['log_category_levels'] = CONFIG['log_category_levels']
+
         # 3.2) 同时段预检上限（<=0 表示关闭）
         if 'same_time_precheck_limit' in data:
             try:
@@ -10215,10 +14033,20 @@ def api_state_sampler():
         'seconds': snap.get('seconds', 0),
         'states': snap.get('states', {}),
         'recommended_locked_states': snap.get('recommended_locked_states', []),
+        'transitions_per_min': snap.get('transitions_per_min', {}),
         'current_locked_state_values': CONFIG.get('locked_state_values', []),
     })
 
 
+@app.route('/api/gym-sessions', methods=['GET'])
+def api_gym_sessions():
+    """进程级账号会话池观测：各账号 Session 年龄/空闲/健康与各线路 keep-alive 空闲连接数。"""
+    snap = GYM_SESSION_REGISTRY.snapshot()
+    snap['gym_line_mode'] = get_gym_line_mode()
+    snap['gym_lines'] = GYM_LINE_STATS.histogram_since()
+    return jsonify({'status': 'success', **snap})
+
+
 @app.route('/api/refill-tasks', methods=['GET'])
 def get_refill_tasks():
     return jsonify(task_manager.refill_tasks)
@@ -10267,6 +14095,116 @@ def del_refill_task_api(task_id):
     return jsonify({'status': 'success'})
 
 
+def live_state_items():
+    """实时推送的状态类事件 [(类型, key, data)]：各 refill 任务状态、全局暂停、各账号静默窗口。"""
+    items = []
+    with task_manager._refill_lock:
+        refill_tasks = [dict(t) for t in list(task_manager.refill_tasks) if isinstance(t, dict)]
+    for t in refill_tasks:
+        items.append((
+            "refill",
+            str(t.get("id")),
+            {
+                "id": t.get("id"),
+                "enabled": bool(t.get("enabled")),
+                "last_run_at": t.get("last_run_at"),
+                "last_result": t.get("last_result"),
+                "busy": task_manager.refill_executor.is_busy(t.get("id")),
+            },
+        ))
+    st = task_manager.get_refill_global_pause_status()
+    items.append(("pause", "global", {"paused": bool(st.get("paused")), "pause_until_ms": int(st.get("pause_until_ms") or 0)}))
+    now_ts = time.time()
+    for key, snap in (quiet_window_snapshot() or {}).items():
+        snap = snap if isinstance(snap, dict) else {}
+        active = bool(snap.get("active")) and not _quiet_window_is_expired(snap, now_ts=now_ts)
+        items.append((
+            "quiet",
+            str(key),
+            {
+                "account_key": str(key),
+                "active": active,
+                "state": str(snap.get("state") or "idle") if active else "idle",
+                "owner_task_id": snap.get("owner_task_id") if active else None,
+            },
+        ))
+    return items
+
+
+def _sse_message(event_type, data, event_id=None):
+    """一条 SSE 消息：log 事件 data 为日志行原文，其余为 JSON。"""
+    payload = data if isinstance(data, str) else json.dumps(data, ensure_ascii=False, default=str)
+    lines = [f"id: {event_id}"] if event_id is not None else []
+    lines.append(f"event: {event_type}")
+    lines.extend(f"data: {part}" for part in payload.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+@app.route('/api/events', methods=['GET'])
+def api_events():
+    """
+    Server-Sent Events：推送新日志行、refill 状态变化、全局暂停、静默窗口切换、矩阵增量。
+    types=log,refill,... 只收指定类型；断线重连带 Last-Event-ID（或 last_id 参数）续传，
+    首次连接可带 backlog=N 补发最近 N 条事件。连上先发 hello 与当前状态快照；续传断档时发 reset。
+    """
+    raw_types = [x.strip() for x in str(request.args.get('types') or '').split(',') if x.strip()]
+    types = {t for t in raw_types if t in LIVE_EVENT_TYPES} or set(LIVE_EVENT_TYPES)
+    last_raw = str(request.headers.get('Last-Event-ID') or request.args.get('last_id') or '').strip()
+    try:
+        last_id = max(0, int(last_raw)) if last_raw else None
+    except ValueError:
+        last_id = None
+    try:
+        backlog = max(0, min(LIVE_EVENT_BUFFER_SIZE, int(request.args.get('backlog') or 0)))
+    except (TypeError, ValueError):
+        backlog = 0
+    if not LIVE_EVENTS.try_subscribe():
+        return jsonify({"status": "error", "msg": "实时推送连接数已满"}), 503
+
+    def _stream():
+        try:
+            current = LIVE_EVENTS.last_id()
+            cursor = last_id
+            yield "retry: 3000\n\n"
+            if cursor is not None and cursor > current:
+                # 服务重启过：id 从头计，前端按 reset 重拉
+                yield _sse_message("reset", {"last_id": current})
+                cursor = current
+            if cursor is None:
+                cursor = max(0, current - backlog)
+            yield _sse_message("hello", {"last_id": current, "server_now_ms": int(time.time() * 1000), "types": sorted(types)})
+            for event_type, _key, data in live_state_items():
+                if event_type in types:
+                    yield _sse_message(event_type, data)
+            last_write = time.monotonic()
+            while True:
+                events, gap = LIVE_EVENTS.events_after(cursor, LIVE_EVENT_KEEPALIVE_SECONDS)
+                chunks = []
+                if gap:
+                    chunks.append(_sse_message("reset", {"last_id": events[0][0] - 1 if events else cursor}))
+                for seq, event_type, data in events:
+                    cursor = seq
+                    if event_type in types:
+                        chunks.append(_sse_message(event_type, data, seq))
+                if chunks:
+                    yield "".join(chunks)
+                    last_write = time.monotonic()
+                elif time.monotonic() - last_write >= LIVE_EVENT_KEEPALIVE_SECONDS:
+                    yield ": ping\n\n"
+                    last_write = time.monotonic()
+                if events:
+                    # 日志突发时攒一小批再发，避免每行唤醒一次
+                    time.sleep(LIVE_EVENT_BATCH_SECONDS)
+        finally:
+            LIVE_EVENTS.unsubscribe()
+
+    return Response(
+        _stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @app.route('/api/refill-scheduler/pause', methods=['GET'])
 def api_refill_scheduler_pause_get():
     st = task_manager.get_refill_global_pause_status()
@@ -10323,23 +14261,12 @@ def run_refill_task_now(task_id):
     if quiet_info:
         return jsonify({'status': 'quiet_window_blocked', 'msg': quiet_info.get('msg'), 'quiet_window': quiet_info.get('quiet_window')})
 
-    task['last_result'] = {'status': 'running', 'msg': '手动执行中(1轮)'}
-    task_manager.save_refill_tasks()
-
-    def _run():
-        try:
-            res = task_manager._run_refill_task_once(task, source='manual')
-            task['last_run_at'] = int(time.time() * 1000)
-            task['last_result'] = res
-            task_manager.append_refill_history(task, res)
-            task_manager.save_refill_tasks()
-        except Exception as e:
-            task['last_run_at'] = int(time.time() * 1000)
-            task['last_result'] = {'status': 'error', 'msg': str(e)}
-            task_manager.append_refill_history(task, task['last_result'])
-            task_manager.save_refill_tasks()
+    if task_manager.refill_executor.is_busy(task.get('id')):
+        return jsonify({'status': 'busy', 'msg': '该 Refill 上一轮仍在执行中'}), 409
 
-    threading.Thread(target=_run, daemon=True).start()
+    task['last_result'] = {'status': 'running', 'msg': '手动执行中(1轮)'}
+    if not task_manager.submit_refill_run(task, account=_rm, source='manual'):
+        return jsonify({'status': 'busy', 'msg': '该 Refill 上一轮仍在执行中'}), 409
     return jsonify({'status': 'success', 'msg': 'Refill task one-shot started'})
 
 @app.route('/api/config/check-token', methods=['POST'])
@@ -10553,7 +14480,7 @@ def test_sms():
     
     try:
         # 尝试发送
-        success, msg = task_manager.send_notification("这是一条测试短信，收到代表配置成功喵！")
+        success, msg = task_manager.send_notification("这是一条测试短信，收到代表配置成功喵！", wait=True)
         if success:
             return jsonify({"status": "success", "msg": "接口调用成功(返回码0)，请留意手机短信喵"})
         else:
@@ -10575,7 +14502,7 @@ def page_route_fallback(path_like):
         return render_main_page('semi')
 
     # keep API/static 404 behavior
-    if normalized.startswith('api/') or normalized.startswith('static/'):
+    if normalized.startswith('api/') or normalized.startswith('static/') or normalized.startswith('assets/'):
         return jsonify({"status": "error", "msg": "Not Found"}), 404
 
     last = normalized.split('/')[-1]
@@ -10588,63 +14515,113 @@ def page_route_fallback(path_like):
 
 @app.route('/api/logs', methods=['GET'])
 def get_logs():
-    refill_id = (request.args.get('refill_id') or '').strip()
-    status_kw = (request.args.get('status_kw') or '').strip().lower()
+    """
+    内存日志查询。默认返回行文本列表（兼容旧调用）；带 since_seq 或 format=records 时返回
+    {records, last_seq, gap}，records 为 {seq, ts, tid, refill_id, level, text}，前端可按 last_seq 增量拉取。
+    过滤：window_min / start / end / tid / refill_id / level / status_kw（kw）；limit 取最后 N 条。
+    """
+    try:
+        flt = _log_query_filters(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     try:
         window_min = max(0, int(float(request.args.get('window_min', 0) or 0)))
     except Exception:
         window_min = 0
+    try:
+        since_seq = max(0, int(request.args.get('since_seq', 0) or 0))
+    except (TypeError, ValueError):
+        since_seq = 0
+    try:
+        limit = int(request.args.get('limit', 0) or 0)
+    except (TypeError, ValueError):
+        limit = 0
+    limit = max(1, min(limit, MAX_LOG_SIZE)) if limit > 0 else None
 
-    logs = _snapshot_log_buffer()
-    if window_min > 0:
-        now_dt = datetime.now()
-        cutoff = now_dt - timedelta(minutes=window_min)
-        filtered = []
-        for line in logs:
-            try:
-                cur = _log_line_naive_datetime_for_window(line, now_dt)
-                if cur is None:
-                    filtered.append(line)
-                elif cur >= cutoff:
-                    filtered.append(line)
-            except Exception:
-                filtered.append(line)
-        logs = filtered
-    if refill_id:
-        key = f"[refill#{refill_id}|"
-        logs = [line for line in logs if key in line]
-    if status_kw:
-        logs = [line for line in logs if status_kw in str(line).lower()]
-    return jsonify(logs)
+    since_ts = _log_now_ts() - window_min * 60 if window_min > 0 else None
+    records, last_seq, gap = query_log_records(flt, since_seq=since_seq, since_ts=since_ts, limit=limit)
+    if 'since_seq' not in request.args and request.args.get('format') != 'records':
+        return jsonify([rec.text for rec in records])
+    return jsonify({
+        "records": [rec._asdict() for rec in records],
+        "last_seq": last_seq,
+        "gap": gap,
+        # 进程重启后 seq 重新计：客户端持有的 since_seq 比服务端还新，应丢弃本地缓存整体重拉（同 /api/events 的 reset）
+        "reset": bool(since_seq) and since_seq > last_seq,
+    })
+
+
+def _log_file_query_requested(args):
+    return any(k in args for k in (
+        'tail', 'cursor', 'before', 'limit', 'start', 'end', 'tid', 'refill_id', 'level', 'kw', 'status_kw'
+    ))
 
 
 @app.route('/api/logs/file', methods=['GET'])
 def get_logs_file():
-    """返回运行日志文件内容（按天）或内存缓冲区，供前端弹窗查看/复制。"""
+    """
+    返回运行日志文件内容（按天）或内存缓冲区，供前端弹窗查看/复制。
+    不带查询参数时整文件分块流式下发；带 tail / cursor / before / limit / start / end / tid / refill_id / level / kw
+    时走 LOG_FILE_INDEX 分段查询，返回 JSON：
+    - tail=N（可加 before=偏移）：最后 N 条匹配行，prev_cursor 非空时可作 before 继续向前翻
+    - cursor=偏移（或仅 start）+ limit：向后分页，next_cursor 为下一页起点
+    """
     date_str = (request.args.get('date') or '').strip()
     if not date_str:
         date_str = datetime.now().strftime('%Y%m%d')
     if len(date_str) != 8 or not date_str.isdigit():
         return jsonify({"error": "参数 date 需为 YYYYMMDD"}), 400
-    lines = []
+    log_path = ''
     if CONFIG.get('log_to_file'):
-        log_dir = (CONFIG.get('log_file_dir') or 'logs').strip() or 'logs'
-        if not os.path.isabs(log_dir):
-            log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), log_dir)
-        log_path = os.path.join(log_dir, f'run_{date_str}.log')
-        if os.path.isfile(log_path):
-            try:
-                with open(log_path, 'r', encoding='utf-8') as f:
-                    lines = f.readlines()
-            except Exception as e:
-                return jsonify({"error": f"读取日志文件失败: {e}"}), 500
-    if not lines:
-        # 无文件或未开启落盘：返回当天内存缓冲区（与 /api/logs 同源）
-        for line in _snapshot_log_buffer():
-            if isinstance(line, str):
-                lines.append(line + '\n')
+        flush_logs(1.0)
+        log_path = log_file_path_for(date_str)
+        if not os.path.isfile(log_path) or os.path.getsize(log_path) <= 0:
+            log_path = ''
+
+    if _log_file_query_requested(request.args):
+        try:
+            flt = _log_query_filters(request.args)
+            tail_n = request.args.get('tail')
+            limit = max(1, min(int(request.args.get('limit', 500) or 500), LOG_QUERY_MAX_LINES))
+            cursor = request.args.get('cursor')
+            before = request.args.get('before')
+            cursor = int(cursor) if cursor not in (None, '') else None
+            before = int(before) if before not in (None, '') else None
+            tail_n = max(0, min(int(tail_n), LOG_QUERY_MAX_LINES)) if tail_n not in (None, '') else None
+        except ValueError as e:
+            return jsonify({"error": f"参数错误: {e}"}), 400
+        if not log_path:
+            # 无文件或未开启落盘：查当天内存缓冲区
+            records, _last_seq, _gap = query_log_records(flt)
+            lines = [rec.text for rec in records]
+            if tail_n is not None:
+                lines = lines[-tail_n:] if tail_n else []
+            return jsonify({"date": date_str, "source": "memory", "lines": lines[:limit] if tail_n is None else lines})
+        try:
+            if tail_n is not None or (before is not None and cursor is None):
+                page = LOG_FILE_INDEX.tail(log_path, flt, n=tail_n if tail_n is not None else limit, before=before)
+            else:
+                page = LOG_FILE_INDEX.read_page(log_path, flt, cursor=cursor, limit=limit)
+        except OSError as e:
+            return jsonify({"error": f"读取日志文件失败: {e}"}), 500
+        page.update(date=date_str, source="file")
+        return jsonify(page)
+
+    if log_path:
+        try:
+            chunks = LOG_FILE_INDEX.iter_chunks(log_path)
+            first = next(chunks, b'')
+        except OSError as e:
+            return jsonify({"error": f"读取日志文件失败: {e}"}), 500
+
+        def generate():
+            yield first
+            for chunk in chunks:
+                yield chunk
+        return Response(generate(), mimetype='text/plain; charset=utf-8')
+    # 无文件或未开启落盘：返回当天内存缓冲区（与 /api/logs 同源）
+    lines = [line + '\n' for line in _snapshot_log_buffer()]
     text = ''.join(lines) if lines else f'（{date_str} 暂无日志）'
-    from flask import Response
     return Response(text, mimetype='text/plain; charset=utf-8')
 
 
@@ -10680,6 +14657,9 @@ def _slim_run_metric_for_diagnostic_summary(r):
         "started_at_readable": _ms_to_readable(r.get("started_at")),
         "finished_at_readable": _ms_to_readable(r.get("finished_at")),
         "duration_ms": r.get("duration_ms"),
+        "fire_error_ms": r.get("fire_error_ms"),
+        "clock_sync": r.get("clock_sync"),
+        "scheduler_wake_error_ms": r.get("scheduler_wake_error_ms"),
         "target_date": r.get("target_date"),
         "result_status": r.get("result_status"),
         "result_msg": (str(r.get("result_msg") or "")[:240] or None),
@@ -10744,18 +14724,7 @@ def export_run_metrics():
     limit = max(1, min(500, int(limit or 100)))
     source = str(request.args.get('source', 'all') or 'all').strip().lower()
     verbose = str(request.args.get('verbose', '0') or '0').strip().lower() in ('1', 'true', 'yes', 'on')
-    records = []
-    if os.path.exists(TASK_RUN_METRICS_FILE):
-        try:
-            with open(TASK_RUN_METRICS_FILE, 'r', encoding='utf-8') as f:
-                records = json.load(f) or []
-        except Exception:
-            records = []
-    if not isinstance(records, list):
-        records = []
-    if source in ('auto', 'manual'):
-        records = [r for r in records if str(r.get('source') or 'auto').lower() == source]
-    records = records[-limit:]
+    records = load_task_run_metrics(limit=limit, source=source)
     for r in records:
         r['started_at_readable'] = _ms_to_readable(r.get('started_at'))
         r['finished_at_readable'] = _ms_to_readable(r.get('finished_at'))
@@ -10780,16 +14749,43 @@ def export_diagnostic():
     sections.append('=== 导出时间 ===')
     sections.append(export_time)
     sections.append('')
+    sections.append('=== 日志落盘统计 ===')
+    sections.append(json.dumps(dict(_LOG_SINK.stats(), file_index=LOG_FILE_INDEX.stats(), event_renderer=LOG_EVENT_RENDERER.stats()), ensure_ascii=False))
+    sections.append('')
+    sections.append('=== 通知发送统计 ===')
+    sections.append(json.dumps(NOTIFY_DISPATCHER.stats(), ensure_ascii=False))
+    sections.append('')
 
-    records = []
-    if os.path.exists(TASK_RUN_METRICS_FILE):
-        try:
-            with open(TASK_RUN_METRICS_FILE, 'r', encoding='utf-8') as f:
-                records = json.load(f) or []
-        except Exception:
-            records = []
-    if not isinstance(records, list):
-        records = []
+    sections.append('=== Refill 执行池 ===')
+    sections.append(json.dumps(task_manager.refill_executor.stats(), ensure_ascii=False))
+    sections.append(json.dumps(task_manager.refill_writer.stats(), ensure_ascii=False))
+    sections.append('')
+
+    sections.append('=== 自动任务定时器 ===')
+    sections.append(json.dumps(PRECISE_TASK_SCHEDULER.stats(), ensure_ascii=False))
+    sections.append('')
+
+    sections.append('=== 服务器时钟同步 ===')
+    sections.append(json.dumps(SERVER_CLOCK.stats(), ensure_ascii=False))
+    sections.append('')
+
+    sections.append('=== 多账号矩阵共享 ===')
+    sections.append(json.dumps(MATRIX_SHARE.stats(), ensure_ascii=False))
+    sections.append('')
+
+    sections.append('=== 我的订单索引 ===')
+    sections.append(json.dumps(mine_order_index_stats(), ensure_ascii=False))
+    sections.append('')
+
+    sections.append('=== 实时推送 ===')
+    sections.append(json.dumps(LIVE_EVENTS.stats(), ensure_ascii=False))
+    sections.append('')
+
+    sections.append('=== 任务指标存储 ===')
+    sections.append(json.dumps(RUN_METRICS_STORE.stats(), ensure_ascii=False))
+    sections.append('')
+
+    records = load_task_run_metrics(limit=50)
 
     # 2. 终极递送 / 矩阵拉活 关键摘要（最近 10 条，与 task_run_metrics 字段对齐）
     sections.append('=== 递送与任务关键摘要（最近10条，含 phase 尾部）===')
@@ -10814,15 +14810,11 @@ def export_diagnostic():
     sections.append('=== 关键流程日志摘录（当日日志尾部窗口内匹配行）===')
     log_lines = []
     if CONFIG.get('log_to_file'):
-        log_dir = (CONFIG.get('log_file_dir') or 'logs').strip() or 'logs'
-        if not os.path.isabs(log_dir):
-            log_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), log_dir)
-        today_str = now.strftime('%Y%m%d')
-        log_path = os.path.join(log_dir, f'run_{today_str}.log')
+        flush_logs(1.0)
+        log_path = log_file_path_for(now.strftime('%Y%m%d'))
         if os.path.isfile(log_path):
             try:
-                with open(log_path, 'r', encoding='utf-8') as f:
-                    log_lines = f.readlines()
+                log_lines = [line + '\n' for line in LOG_FILE_INDEX.tail(log_path, n=3500)["lines"]]
             except Exception:
                 pass
     if not log_lines:
@@ -10872,25 +14864,12 @@ def get_run_metrics():
     unlock_only = str(request.args.get('unlock_only', '1')).lower() in ('1', 'true', 'yes', 'on')
     limit = request.args.get('limit', default=50, type=int)
     limit = max(1, min(500, int(limit or 50)))
-    records = []
-    if os.path.exists(TASK_RUN_METRICS_FILE):
-        try:
-            with open(TASK_RUN_METRICS_FILE, 'r', encoding='utf-8') as f:
-                records = json.load(f) or []
-        except Exception:
-            records = []
-    if not isinstance(records, list):
-        records = []
-    if task_id:
-        records = [r for r in records if str(r.get('task_id')) == str(task_id)]
-    if source in ('auto', 'manual'):
-        records = [r for r in records if str(r.get('source') or 'auto').lower() == source]
-    if unlock_only and source != 'manual':
-        records = [
-            r for r in records
-            if bool(r.get('saw_locked')) and bool(r.get('unlocked_after_locked'))
-        ]
-    records = records[-limit:]
+    records = load_task_run_metrics(
+        limit=limit,
+        task_id=task_id or None,
+        source=source,
+        unlock_only=bool(unlock_only and source != 'manual'),
+    )
 
     success_within_60 = [r for r in records if r.get('success_within_60s') is True]
     first_success_samples = sorted(int(r.get('first_success_ms')) for r in records if r.get('first_success_ms') is not None)
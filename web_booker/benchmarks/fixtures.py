@@ -0,0 +1,104 @@
+"""
+基准用固定数据：与线上同规模的 20 场地 × 14 小时矩阵（08:00–21:00）与多组递送任务。
+
+全部由固定种子生成，保证不同机器/不同提交之间可比；不依赖 app，可单独 import。
+"""
+
+from __future__ import annotations
+
+import json
+import random
+
+N_PLACES = 20
+HOURS = [f"{h:02d}:00" for h in range(8, 22)]
+PEAK_TIMES = ["18:00", "19:00", "20:00"]
+
+# 馆方 state 整数：1 可订 / 2 我的 / 4 已订 / 6 锁定
+_STATE_TO_INT = {"available": 1, "mine": 2, "booked": 4, "locked": 6}
+
+
+def build_matrix_rows(n_places: int = N_PLACES, times=None, seed: int = 20261018) -> dict:
+    """{place: {time: state}}；晚高峰时段可订率低、白天高，少量 locked/mine，贴近开约后 1–2 秒的矩阵。"""
+    rng = random.Random(seed)
+    times = list(times or HOURS)
+    rows = {}
+    for p in range(1, n_places + 1):
+        row = {}
+        for t in times:
+            p_avail = 0.25 if t in PEAK_TIMES else 0.6
+            r = rng.random()
+            if r < p_avail:
+                row[t] = "available"
+            elif r < p_avail + 0.03:
+                row[t] = "locked"
+            elif r < p_avail + 0.05:
+                row[t] = "mine"
+            else:
+                row[t] = "booked"
+        rows[str(p)] = row
+    return rows
+
+
+def build_place_info_response_text(rows: dict) -> str:
+    """getPlaceInfoByShortName 原始响应文本（data 为 JSON 字符串，与线上一致），供 get_matrix 解析循环基准。"""
+    place_array = []
+    for p, row in rows.items():
+        short = f"mdb{p}" if int(p) >= 15 else f"ymq{p}"
+        place_array.append(
+            {
+                "projectName": {"shortname": short},
+                "projectInfo": [
+                    {
+                        "oldMoney": 80.0 if int(t[:2]) < 14 else 100.0,
+                        "money": 80.0 if int(t[:2]) < 14 else 100.0,
+                        "starttime": t,
+                        "endtime": f"{int(t[:2]) + 1:02d}:00",
+                        "state": _STATE_TO_INT[st],
+                    }
+                    for t, st in row.items()
+                ],
+            }
+        )
+    data = {"continuousSize": "3", "dayType": "nonVacations", "maxsize": 0, "placeArray": place_array}
+    return json.dumps({"msg": "success", "data": json.dumps(data, ensure_ascii=False)}, ensure_ascii=False)
+
+
+def build_delivery_groups() -> list:
+    """多组递送任务：主组 3 场 × 晚高峰 3 小时，两个备选组错开场地/时段。"""
+    return [
+        {
+            "id": "primary",
+            "label": "主",
+            "items": [{"place": str(p), "time": t} for p in (5, 6, 7) for t in PEAK_TIMES],
+        },
+        {
+            "id": "backup-1",
+            "label": "备1",
+            "items": [{"place": str(p), "time": t} for p in (10, 11) for t in ("19:00", "20:00", "21:00")],
+        },
+        {
+            "id": "backup-2",
+            "label": "备2",
+            "items": [{"place": str(p), "time": t} for p in (1, 2, 3, 4) for t in ("17:00", "18:00")],
+        },
+    ]
+
+
+def build_solver_intent(need_by_time=None) -> dict:
+    """与自动递送 refill 同形的求解意图：3 块 × 晚高峰，偏好 5–12 号场。"""
+    intent = {
+        "target_blocks": 3,
+        "target_times": list(PEAK_TIMES),
+        "time_preference_order": ["19:00", "20:00", "18:00"],
+        "selectable_place_min": 1,
+        "selectable_place_max": N_PLACES,
+        "preferred_place_min": 5,
+        "preferred_place_max": 12,
+        "require_consecutive": True,
+        "solver_max_total_cells": True,
+        "solver_scoring": "auto_time_consecutive",
+    }
+    if need_by_time:
+        intent["need_by_time"] = dict(need_by_time)
+        intent["monotone_need_relax"] = True
+    return intent
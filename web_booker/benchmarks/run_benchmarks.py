@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+12:00 关键路径基准：组 fieldinfo、拼下单 body、合法分批、run 合并、求解、refill 分层、get_matrix 解析循环。
+
+每项输出 µs/op 与单次调用的分配量（tracemalloc：峰值字节 / 返回时存活的新增块数），无网络、无后台调度
+（import app 前设 BEIJINTICK_SKIP_IMPORT_SCHEDULER=1）。固定数据见 benchmarks/fixtures.py。
+
+用法：
+  cd web_booker
+  python benchmarks/run_benchmarks.py                        # 全部
+  python benchmarks/run_benchmarks.py -k solve               # 名称包含 solve 的项
+  python benchmarks/run_benchmarks.py --save benchmarks/baseline.json
+  python benchmarks/run_benchmarks.py --compare benchmarks/baseline.json --threshold 0.25
+    # 任一项 µs/op 比基线慢超过 25% 时退出码 1，高峰日前跑一遍即可看到回退
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+WEB_BOOKER_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+class _FakeResponse:
+    """只够 get_matrix 用的响应：每次都真实反序列化 content / json()，计入解析成本。"""
+
+    def __init__(self, text):
+        self.text = text
+        self.content = text.encode("utf-8")
+        self.headers = {}
+        self.status_code = 200
+
+    def json(self):
+        return json.loads(self.text)
+
+
+class _FakeSession:
+    def __init__(self, text):
+        self._resp = _FakeResponse(text)
+
+    def get(self, *args, **kwargs):
+        return self._resp
+
+
+def build_cases(booker, fx) -> list:
+    """[(name, fn)]；fn 无参，准备工作在闭包外完成，只计被测函数本身。"""
+    rows = fx.build_matrix_rows()
+    cm = booker.CourtMatrix(rows)
+    places = list(cm.places)
+    groups = fx.build_delivery_groups()
+    all_items = [it for g in groups for it in g["items"]]
+    primary = groups[0]["items"]
+
+    client = booker.ApiClient(inherit_global_auth=False)
+    client.token = "bench-token"
+    client.shop_num = "1001"
+    client.card_index = "0"
+    client.card_st_id = "cs"
+
+    parse_client = booker.ApiClient(inherit_global_auth=False, session=_FakeSession(fx.build_place_info_response_text(rows)))
+    parse_client.token = "bench-token"
+    parse_client.shop_num = "1001"
+
+    batch_limits = {"max_items_per_batch": 6, "max_consecutive_slots_per_place": 3, "max_places_per_timeslot": 3}
+    need = {"18:00": 2, "19:00": 3, "20:00": 1}
+    intent = fx.build_solver_intent()
+    intent_need = fx.build_solver_intent(need)
+    tiered_base = {k: v for k, v in intent.items() if k not in ("solver_scoring", "solver_max_total_cells")}
+
+    return [
+        ("build_field_info_list", lambda: client._build_field_info_list("2026-04-12", all_items)),
+        ("build_reservation_body", lambda: client._build_reservation_body("2026-04-12", primary)),
+        (
+            "group_booking_items_into_legal_batches",
+            lambda: booker.group_booking_items_into_legal_batches(all_items, booker.cfg_get, batch_limits=batch_limits),
+        ),
+        ("items_to_booking_runs", lambda: booker.items_to_booking_runs(all_items, max_slot_count=3)),
+        ("solve_candidate.strict", lambda: booker.solve_candidate_from_matrix(cm, places, intent, mode="strict")),
+        ("solve_candidate.aggressive", lambda: booker.solve_candidate_from_matrix(cm, places, intent, mode="aggressive")),
+        ("solve_candidate.exact", lambda: booker.solve_candidate_from_matrix(cm, places, intent, mode="exact")),
+        ("solve_candidate.need_strict", lambda: booker.solve_candidate_from_matrix(cm, places, intent_need, mode="strict")),
+        ("solve_refill_need_tiered", lambda: booker.solve_refill_need_tiered(cm, places, tiered_base, need)),
+        ("court_matrix.build", lambda: booker.CourtMatrix(rows)),
+        (
+            "get_matrix.parse",
+            lambda: parse_client.get_matrix("2026-04-12", include_mine_overlay=False, bypass_cache=True),
+        ),
+    ]
+
+
+def time_per_op_us(fn, min_seconds: float) -> tuple:
+    """自适应次数：先估单次耗时，再跑满 min_seconds；返回 (µs/op, 次数)。"""
+    fn()
+    n = 1
+    while True:
+        t0 = time.perf_counter()
+        for _ in range(n):
+            fn()
+        dt = time.perf_counter() - t0
+        if dt >= min_seconds or n >= 1_000_000:
+            return dt * 1e6 / n, n
+        n = max(n * 2, int(n * min_seconds / max(dt, 1e-9)) + 1)
+
+
+def alloc_per_op(fn, repeat: int = 5) -> tuple:
+    """单次调用的分配：(峰值字节, 返回时仍存活的新增块数) 取 repeat 次中位数。"""
+    peaks, blocks = [], []
+    gc.collect()
+    tracemalloc.start()
+    try:
+        for _ in range(repeat):
+            before = tracemalloc.take_snapshot()
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            result = fn()
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+            stats = after.compare_to(before, "traceback")
+            blocks.append(sum(max(0, s.count_diff) for s in stats))
+            peaks.append(max(0, peak - base))
+            del result
+    finally:
+        tracemalloc.stop()
+    peaks.sort()
+    blocks.sort()
+    return peaks[len(peaks) // 2], blocks[len(blocks) // 2]
+
+
+def main() -> None:
+    os.chdir(WEB_BOOKER_ROOT)
+    for p in (WEB_BOOKER_ROOT, BENCH_DIR):
+        if p not in sys.path:
+            sys.path.insert(0, p)
+    # import app 会加载全模块；跳过后台调度，避免仅跑基准时拉起定时线程
+    os.environ["BEIJINTICK_SKIP_IMPORT_SCHEDULER"] = "1"
+
+    parser = argparse.ArgumentParser(description="订场关键路径基准（µs/op + 分配）")
+    parser.add_argument("-k", "--filter", default="", help="只跑名称包含该子串的项")
+    parser.add_argument("--min-seconds", type=float, default=0.3, help="每项计时至少跑多少秒")
+    parser.add_argument("--no-alloc", action="store_true", help="跳过 tracemalloc 分配统计")
+    parser.add_argument("--save", default="", help="结果写入 JSON（作基线）")
+    parser.add_argument("--compare", default="", help="与基线 JSON 对比 µs/op")
+    parser.add_argument("--threshold", type=float, default=0.25, help="相对基线变慢超过该比例视为回退（退出码 1）")
+    args = parser.parse_args()
+
+    import app as booker  # noqa: E402
+    import fixtures as fx  # noqa: E402
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = (json.load(f) or {}).get("results") or {}
+
+    results = {}
+    regressions = []
+    print(f"{'name':<40} {'us/op':>10} {'iters':>8} {'peak B':>9} {'blocks':>7}  vs baseline")
+    for name, fn in build_cases(booker, fx):
+        if args.filter and args.filter not in name:
+            continue
+        us, n = time_per_op_us(fn, args.min_seconds)
+        peak_b, n_blocks = (None, None) if args.no_alloc else alloc_per_op(fn)
+        results[name] = {"us_per_op": round(us, 3), "iterations": n, "peak_alloc_bytes": peak_b, "alloc_blocks": n_blocks}
+        cmp_txt = ""
+        base = (baseline.get(name) or {}).get("us_per_op")
+        if base:
+            ratio = us / float(base) - 1.0
+            cmp_txt = f"{ratio * 100:+.1f}%"
+            if ratio > args.threshold:
+                cmp_txt += "  REGRESSION"
+                regressions.append(name)
+        print(
+            f"{name:<40} {us:>10.2f} {n:>8} {'-' if peak_b is None else peak_b:>9} "
+            f"{'-' if n_blocks is None else n_blocks:>7}  {cmp_txt}"
+        )
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({"python": sys.version.split()[0], "results": results}, f, ensure_ascii=False, indent=2)
+        print(f"已写入 {args.save}")
+    if regressions:
+        print(f"回退 {len(regressions)} 项（>{args.threshold * 100:.0f}%）: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""benchmarks/ 冒烟：固定数据规模正确，每个基准项可无网络跑通一次（零 pytest 依赖）。"""
+import os
+import sys
+import unittest
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+_BENCH_DIR = os.path.join(_WEB_BOOKER_DIR, "benchmarks")
+for _p in (_WEB_BOOKER_DIR, _BENCH_DIR):
+    if _p not in sys.path:
+        sys.path.insert(0, _p)
+
+import app as booker  # noqa: E402
+import fixtures as fx  # noqa: E402
+import run_benchmarks as rb  # noqa: E402
+
+
+class TestBenchmarkSuite(unittest.TestCase):
+    def test_fixture_shape(self):
+        rows = fx.build_matrix_rows()
+        self.assertEqual(len(rows), 20)
+        self.assertTrue(all(len(r) == 14 for r in rows.values()))
+        self.assertEqual(rows, fx.build_matrix_rows())
+
+    def test_every_case_runs(self):
+        cases = rb.build_cases(booker, fx)
+        self.assertIn("get_matrix.parse", dict(cases))
+        for name, fn in cases:
+            res = fn()
+            # 晚高峰连号 3 块在固定矩阵里本就无解，strict 返回 None 也是要计时的真实路径
+            if not name.startswith("solve_candidate.strict"):
+                self.assertIsNotNone(res, name)
+        parsed = dict(cases)["get_matrix.parse"]()
+        self.assertEqual(len(parsed["places"]), 20)
+        self.assertEqual(len(parsed["times"]), 14)
+
+
+if __name__ == "__main__":
+    unittest.main()
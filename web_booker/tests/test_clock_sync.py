@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""服务器时钟同步：Date 秒跳变区间求交、二分相位探测、RTT 过滤、时钟跳变丢旧样本（零 pytest 依赖）。"""
+import os
+import random
+import sys
+import unittest
+from email.utils import formatdate
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+_TOOLS_DIR = os.path.join(_WEB_BOOKER_DIR, "tools")
+if _TOOLS_DIR not in sys.path:
+    sys.path.insert(0, _TOOLS_DIR)
+
+import app as booker  # noqa: E402
+import gym_simulator as sim  # noqa: E402
+
+
+class _Clock:
+    def __init__(self, t):
+        self.t = t
+
+    def __call__(self):
+        return self.t
+
+
+def _feed(cs, clock, theta, t0, rtt):
+    """本机 t0 发出、t0+rtt 收到；服务器在途中点处理，Date 取整秒。"""
+    server_s = int(t0 + rtt / 2.0 + theta)
+    clock.t = t0 + rtt
+    return cs.add_sample(formatdate(server_s, usegmt=True), t0, t0 + rtt)
+
+
+class TestServerClockSync(unittest.TestCase):
+    def setUp(self):
+        self._orig_offset = booker._LOG_TIME_OFFSET_SECONDS
+
+    def tearDown(self):
+        booker._LOG_TIME_OFFSET_SECONDS = self._orig_offset
+
+    def test_random_phase_samples_bound_offset(self):
+        rng = random.Random(3)
+        clock = _Clock(1_800_000_000.0)
+        cs = booker.ServerClockSync(now_fn=clock)
+        theta = 0.3721
+        t = clock.t
+        for _ in range(40):
+            t += rng.uniform(0.2, 1.3)
+            _feed(cs, clock, theta, t, rng.uniform(0.02, 0.04))
+        est = cs.estimate()
+        self.assertLessEqual(abs(est["offset_ms"] - theta * 1000.0), est["uncertainty_ms"] + 1e-6)
+        self.assertLess(est["uncertainty_ms"], 60.0)
+        self.assertAlmostEqual(booker._LOG_TIME_OFFSET_SECONDS, est["offset_ms"] / 1000.0, places=6)
+
+    def test_bisection_probing_converges_to_rtt_scale(self):
+        clock = _Clock(1_800_000_000.25)
+        cs = booker.ServerClockSync(now_fn=clock)
+        theta = -1.6180
+        rtt = 0.02
+        _feed(cs, clock, theta, clock.t, rtt)
+        self.assertAlmostEqual(cs.estimate()["uncertainty_ms"], (1.0 + rtt) * 500.0, places=3)
+        for _ in range(12):
+            t0 = clock.t + cs.next_probe_delay()
+            _feed(cs, clock, theta, t0, rtt)
+        est = cs.estimate()
+        self.assertLessEqual(abs(est["offset_ms"] - theta * 1000.0), est["uncertainty_ms"] + 1e-6)
+        self.assertLess(est["uncertainty_ms"], rtt * 1000.0)
+
+    def test_rtt_filter_and_clock_step(self):
+        clock = _Clock(1_800_000_000.0)
+        cs = booker.ServerClockSync(now_fn=clock)
+        self.assertFalse(_feed(cs, clock, 0.5, clock.t, 5.0))
+        self.assertIsNone(cs.estimate())
+        t = clock.t
+        for _ in range(10):
+            t += 0.37
+            _feed(cs, clock, 0.5, t, 0.03)
+        self.assertLess(abs(cs.offset_seconds() - 0.5), 0.2)
+        # 服务器时钟跳了 5 秒：旧样本与新样本矛盾，丢旧保新
+        for _ in range(10):
+            t += 0.37
+            _feed(cs, clock, 5.5, t, 0.03)
+        self.assertLess(abs(cs.offset_seconds() - 5.5), 0.2)
+        self.assertGreater(cs.stats()["dropped_inconsistent"], 0)
+
+    def test_probe_against_simulator(self):
+        state = sim.GymSimulatorState(places=1, times=["18:00"], sellout="0:0", seed=1)
+        server = sim.start_simulator(state)
+        try:
+            c = booker.ApiClient(inherit_global_auth=False)
+            c.gym_base_url = server.base_url
+            cs = booker.ServerClockSync()
+            for _ in range(3):
+                self.assertTrue(cs.probe_once(c))
+            est = cs.estimate()
+            # 模拟器与本机同钟：真实时差 0 落在区间内
+            self.assertLessEqual(abs(est["offset_ms"]), est["uncertainty_ms"] + 1e-6)
+            self.assertEqual(cs.stats()["probes"], 3)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
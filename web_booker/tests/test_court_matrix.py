@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""CourtMatrix：紧凑状态码与 dict 视图一致，求解结果与传入普通 dict 相同（零 pytest 依赖）。"""
+import json
+import os
+import sys
+import unittest
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+
+import app as booker  # noqa: E402
+
+
+def _rows():
+    return {
+        "1": {"18:00": "booked", "19:00": "available", "20:00": "available"},
+        "2": {"18:00": "available", "19:00": "locked", "20:00": "mine"},
+        "3": {"18:00": "available", "19:00": "available", "20:00": "booked"},
+        "10": {"18:00": "available", "19:00": "available", "20:00": "available"},
+        "11": {"18:00": "Mine", "19:00": "available"},
+    }
+
+
+class TestCourtMatrix(unittest.TestCase):
+    def test_dict_view_and_codes(self):
+        cm = booker.CourtMatrix(_rows())
+        self.assertEqual(cm.places, ("1", "2", "3", "10", "11"))
+        self.assertEqual(cm.times, ("18:00", "19:00", "20:00"))
+        self.assertEqual(cm["2"]["19:00"], "locked")
+        self.assertEqual(cm.code("2", "19:00"), booker.COURT_STATE_LOCKED)
+        self.assertEqual(cm.code("11", "20:00"), booker.COURT_STATE_MISSING)
+        self.assertEqual(cm.code("99", "18:00"), booker.COURT_STATE_MISSING)
+        self.assertTrue(cm.has_locked_cell())
+        self.assertEqual(json.loads(json.dumps(cm)), _rows())
+        with self.assertRaises(TypeError):
+            cm["1"] = {}
+
+    def test_time_queries(self):
+        cm = booker.CourtMatrix(_rows())
+        self.assertEqual(cm.bookable_places("19:00"), ("1", "2", "3", "10", "11"))
+        self.assertEqual(cm.bookable_places("19:00", 2, 10), ("2", "3", "10"))
+        self.assertEqual(cm.mine_places("20:00"), ("2",))
+        self.assertEqual(cm.mine_places("18:00"), ("11",))
+        self.assertEqual(cm.bookable_places("07:00"), ())
+
+    def test_freeze_builds_court_matrix(self):
+        res = booker.freeze_matrix_result({"places": ["1"], "times": ["18:00"], "matrix": {"1": {"18:00": "available"}}})
+        self.assertIsInstance(res["matrix"], booker.CourtMatrix)
+        self.assertIs(booker.as_court_matrix(res["matrix"]), res["matrix"])
+
+    def test_overlay_keeps_compact_form(self):
+        cm = booker.CourtMatrix(_rows())
+        out = booker.overlay_accepted_cells_on_matrix(cm, {("10", "18:00")})
+        self.assertIsInstance(out, booker.CourtMatrix)
+        self.assertFalse(out.is_bookable("10", "18:00"))
+        self.assertTrue(cm.is_bookable("10", "18:00"))
+
+    def test_solver_parity_dict_vs_compact(self):
+        rows = _rows()
+        places = ["1", "2", "3", "10", "11"]
+        for consecutive in (True, False):
+            for need in ({"18:00": 2, "19:00": 2}, {"19:00": 3}, {"20:00": 2, "18:00": 1}):
+                intent = {
+                    "target_blocks": 2,
+                    "target_times": ["18:00", "19:00", "20:00"],
+                    "time_preference_order": ["19:00", "18:00", "20:00"],
+                    "selectable_place_min": 1,
+                    "selectable_place_max": 14,
+                    "require_consecutive": consecutive,
+                    "need_by_time": need,
+                    "mine_places_by_time": booker.mine_places_by_time_from_matrix(rows, places, ["18:00", "19:00", "20:00"]),
+                }
+                a = booker.solve_candidate_from_matrix(rows, places, intent, mode="strict")
+                b = booker.solve_candidate_from_matrix(booker.CourtMatrix(rows), places, intent, mode="strict")
+                self.assertEqual(a, b)
+        tiered_dict = booker.solve_refill_need_tiered(rows, places, {"target_times": ["18:00", "19:00"]}, {"18:00": 3, "19:00": 1})
+        tiered_cm = booker.solve_refill_need_tiered(booker.CourtMatrix(rows), places, {"target_times": ["18:00", "19:00"]}, {"18:00": 3, "19:00": 1})
+        self.assertEqual(tiered_dict, tiered_cm)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""递送引擎 pipelined：POST 在途预拉矩阵被下一轮循环取用；已受理格叠加（零 pytest 依赖）。"""
+import os
+import sys
+import unittest
+from unittest.mock import patch
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+
+import app as booker  # noqa: E402
+
+
+def _minimal_matrix(n_places=1):
+    places = [str(p) for p in range(1, n_places + 1)]
+    return {
+        "places": places,
+        "times": ["10:00"],
+        "matrix": {p: {"10:00": "available"} for p in places},
+    }
+
+
+_OK = {
+    "ok": True,
+    "status_code": 200,
+    "resp_data": {"msg": "success"},
+    "raw_text": "{}",
+    "raw_message": "success",
+    "elapsed_ms": 1,
+}
+
+
+class TestPipelinedDeliveryEngine(unittest.TestCase):
+    def setUp(self):
+        self._saved_engine = booker.CONFIG.get("delivery_engine")
+        self._saved_interval = booker.CONFIG.get("delivery_min_post_interval_seconds")
+        # 补齐那次 POST 不必真等线上 5s 间隔
+        booker.CONFIG["delivery_min_post_interval_seconds"] = 0.0
+
+    def tearDown(self):
+        booker.CONFIG["delivery_engine"] = self._saved_engine
+        if self._saved_interval is None:
+            booker.CONFIG.pop("delivery_min_post_interval_seconds", None)
+        else:
+            booker.CONFIG["delivery_min_post_interval_seconds"] = self._saved_interval
+
+    def _run_campaign(self, target_blocks=1):
+        c = booker.ApiClient(inherit_global_auth=False)
+        c.token = "t"
+        c.shop_num = "1001"
+        c.card_index = "0"
+        c.card_st_id = "cs"
+        c.delivery_max_places_per_timeslot = 3
+
+        gm_calls = []
+
+        def fake_get_matrix(date_str, include_mine_overlay=True, request_timeout=None, bypass_cache=False):
+            gm_calls.append(bypass_cache)
+            return _minimal_matrix(target_blocks)
+
+        post_calls = []
+
+        def fake_post_once(sess, hdrs, url, body, timeout_s):
+            post_calls.append(1)
+            return _OK
+
+        groups = [{"id": "primary", "label": "主", "items": [{"place": "1", "time": "10:00"}]}]
+        tc = {
+            "delivery_target_blocks": target_blocks,
+            "delivery_target_times": ["10:00"],
+            "delivery_time_preference_order": ["10:00"],
+            "delivery_matrix_place_min": 1,
+            "delivery_matrix_place_max": 14,
+        }
+        with patch.object(c, "get_matrix", side_effect=fake_get_matrix):
+            with patch.object(c, "_post_reservation_once", side_effect=fake_post_once):
+                res = c.submit_delivery_campaign(
+                    "2026-04-12",
+                    groups,
+                    submit_profile="auto_minimal",
+                    task_config=tc,
+                    skip_warmup=True,
+                )
+        return res, gm_calls, post_calls
+
+    def test_sequential_default_has_no_prefetch(self):
+        booker.CONFIG["delivery_engine"] = "sequential"
+        res, _gm, post_calls = self._run_campaign()
+        self.assertEqual(res.get("status"), "success")
+        rm = res.get("run_metric") or {}
+        self.assertEqual(rm.get("delivery_engine"), "sequential")
+        self.assertEqual(int(rm.get("pipelined_matrix_prefetch_count") or 0), 0)
+        self.assertEqual(len(post_calls), 1)
+
+    def test_pipelined_uses_prefetched_matrix(self):
+        booker.CONFIG["delivery_engine"] = "pipelined"
+        # 主单 1 格、目标 2 格：首个 POST 在途时预拉，补齐的那个 POST 受理即达标、不再预拉
+        res, gm_calls, post_calls = self._run_campaign(target_blocks=2)
+        self.assertEqual(res.get("status"), "success")
+        rm = res.get("run_metric") or {}
+        self.assertEqual(rm.get("delivery_engine"), "pipelined")
+        self.assertEqual(int(rm.get("pipelined_matrix_prefetch_count") or 0), 1)
+        self.assertEqual(int(rm.get("pipelined_matrix_hit_count") or 0), 1)
+        self.assertEqual(int(rm.get("pipelined_matrix_prefetch_skipped_count") or 0), 1)
+        self.assertEqual(len(post_calls), 2)
+        self.assertTrue(all(gm_calls))
+
+    def test_pipelined_skips_prefetch_on_goal_completing_post(self):
+        booker.CONFIG["delivery_engine"] = "pipelined"
+        res, gm_calls, post_calls = self._run_campaign()
+        self.assertEqual(res.get("status"), "success")
+        rm = res.get("run_metric") or {}
+        self.assertEqual(int(rm.get("pipelined_matrix_prefetch_count") or 0), 0)
+        self.assertEqual(int(rm.get("pipelined_matrix_prefetch_skipped_count") or 0), 1)
+        self.assertEqual(len(post_calls), 1)
+
+    def test_unknown_engine_falls_back_to_sequential(self):
+        booker.CONFIG["delivery_engine"] = "asyncio"
+        self.assertEqual(booker.get_delivery_engine_mode(), "sequential")
+
+
+class TestOverlayAcceptedCells(unittest.TestCase):
+    def test_marks_bookable_cells_without_mutating_source(self):
+        src = {"1": {"10:00": "available", "11:00": "locked"}, "2": {"10:00": "mine"}}
+        out = booker.overlay_accepted_cells_on_matrix(src, {("1", "10:00"), ("2", "10:00"), ("9", "10:00")})
+        self.assertEqual(out["1"]["10:00"], "booked")
+        self.assertEqual(out["1"]["11:00"], "locked")
+        self.assertEqual(out["2"]["10:00"], "mine")
+        self.assertIs(out["2"], src["2"])
+        self.assertEqual(src["1"]["10:00"], "available")
+
+    def test_empty_accepted_returns_same_matrix(self):
+        src = {"1": {"10:00": "available"}}
+        self.assertIs(booker.overlay_accepted_cells_on_matrix(src, set()), src)
+
+
+if __name__ == "__main__":
+    unittest.main()
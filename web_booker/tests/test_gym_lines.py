@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""双线路：GymLineStats 选线/直方图、fastest 选线、race 模式矩阵 GET 取先回者（零 pytest 依赖）。"""
+import os
+import sys
+import threading
+import time
+import unittest
+import urllib.parse
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+
+import app as booker  # noqa: E402
+
+_A, _B = booker.GYM_API_LINE_IPS
+
+
+class _Resp:
+    status_code = 200
+    headers = {}
+
+    def __init__(self, ip):
+        self.ip = ip
+
+
+class _LineSession:
+    """按 URL 里的线路 IP 模拟不同 RTT；fail 集合里的线路抛连接错误。"""
+
+    def __init__(self, delays, fail=(), status=None):
+        self.delays = delays
+        self.fail = set(fail)
+        self.status = dict(status or {})
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def get(self, url, **kwargs):
+        ip = urllib.parse.urlparse(url).hostname
+        with self._lock:
+            self.calls.append(ip)
+        time.sleep(self.delays.get(ip, 0.0))
+        if ip in self.fail:
+            raise booker.requests.ConnectionError(f"line {ip} down")
+        resp = _Resp(ip)
+        if ip in self.status:
+            resp.status_code = self.status[ip]
+        return resp
+
+
+class TestGymLineStats(unittest.TestCase):
+    def test_pick_probe_then_fastest(self):
+        st = booker.GymLineStats(alpha=1.0)
+        self.assertEqual(st.pick(probe_interval_s=60, probe=True), _A)
+        st.record(_A, 100, True)
+        self.assertEqual(st.pick(probe_interval_s=60, probe=True), _B)
+        st.record(_B, 40, True)
+        self.assertEqual(st.pick(probe_interval_s=60, probe=True), _B)
+        st.record(_B, 0, False)
+        self.assertEqual(st.pick(probe_interval_s=60, probe=True), _A)
+
+    def test_post_pick_is_score_only(self):
+        st = booker.GymLineStats(alpha=1.0)
+        st.record(_A, 100, True)
+        # 非 probe：没样本的 _B、超期未测的线路都不拿来试
+        self.assertEqual(st.pick(probe_interval_s=60), _A)
+        self.assertEqual(st.pick(probe_interval_s=0), _A)
+        st.record(_B, 40, True)
+        self.assertEqual(st.pick(probe_interval_s=0), _B)
+
+    def test_histogram_since_and_merge(self):
+        st = booker.GymLineStats()
+        st.record(_A, 30, True)
+        mark = st.snapshot()
+        st.record(_A, 30, True)
+        st.record(_A, 5000, True)
+        st.record(_A, 10, False)
+        st.record("1.2.3.4", 10, True)
+        h = st.histogram_since(mark)
+        self.assertEqual(list(h), [_A])
+        self.assertEqual((h[_A]["count"], h[_A]["errors"]), (3, 1))
+        self.assertEqual((h[_A]["hist"]["le_50"], h[_A]["hist"]["gt_3200"]), (1, 1))
+        merged = booker.merge_gym_line_latency(h, h)
+        self.assertEqual((merged[_A]["count"], merged[_A]["hist"]["le_50"]), (6, 2))
+
+
+class TestGymLineRouting(unittest.TestCase):
+    def setUp(self):
+        self._saved = booker.CONFIG.get("gym_line_mode")
+        self._stats = booker.GYM_LINE_STATS
+        booker.GYM_LINE_STATS = booker.GymLineStats()
+
+    def tearDown(self):
+        booker.CONFIG["gym_line_mode"] = self._saved
+        booker.GYM_LINE_STATS = self._stats
+
+    def _client(self, session):
+        c = booker.ApiClient(inherit_global_auth=False, session=session)
+        c.gym_base_url = ""
+        return c
+
+    def test_pinned_and_fastest_netloc(self):
+        c = self._client(_LineSession({}))
+        booker.CONFIG["gym_line_mode"] = "pinned"
+        self.assertEqual(c._gym_tcp_netloc(), booker.GYM_API_TARGET_HOST)
+        booker.CONFIG["gym_line_mode"] = "fastest"
+        booker.GYM_LINE_STATS.record(_A, 200, True)
+        booker.GYM_LINE_STATS.record(_B, 20, True)
+        self.assertEqual(c._gym_tcp_netloc(), _B)
+        c.gym_connect_ip = _A
+        self.assertEqual(c._gym_tcp_netloc(), _A)
+
+    def test_race_takes_first_and_records_both(self):
+        booker.CONFIG["gym_line_mode"] = "race"
+        sess = _LineSession({_A: 0.25, _B: 0.0})
+        c = self._client(sess)
+        resp = c._line_get("easyserpClient/place/getPlaceInfoByShortName", {}, 2.0)
+        self.assertEqual(resp.ip, _B)
+        time.sleep(0.4)
+        self.assertEqual(sorted(sess.calls), sorted([_A, _B]))
+        self.assertEqual(set(c.line_stats.histogram_since()), {_A, _B})
+
+    def test_race_falls_back_when_one_line_fails(self):
+        booker.CONFIG["gym_line_mode"] = "race"
+        c = self._client(_LineSession({_A: 0.05, _B: 0.0}, fail={_B}))
+        self.assertEqual(c._line_get("x", {}, 2.0).ip, _A)
+        c2 = self._client(_LineSession({}, fail={_A, _B}))
+        with self.assertRaises(booker.requests.ConnectionError):
+            c2._line_get("x", {}, 2.0)
+
+    def test_race_keeps_first_5xx_when_other_line_raises(self):
+        booker.CONFIG["gym_line_mode"] = "race"
+        c = self._client(_LineSession({_A: 0.0, _B: 0.1}, fail={_B}, status={_A: 502}))
+        resp = c._line_get("x", {}, 2.0)
+        self.assertEqual((resp.ip, resp.status_code), (_A, 502))
+
+
+if __name__ == "__main__":
+    unittest.main()
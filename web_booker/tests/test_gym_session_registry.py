@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""进程级账号会话池：同账号复用、凭证变化/不健康重建、空闲回收（零 pytest 依赖）。"""
+import os
+import sys
+import unittest
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+
+import app as booker  # noqa: E402
+
+
+def _acc(**kwargs):
+    base = {
+        "id": "acc_pool",
+        "name": "t",
+        "token": "tok",
+        "cookie": "JSESSIONID=a",
+        "shop_num": "1001",
+        "delivery_max_places_per_timeslot": 2,
+    }
+    base.update(kwargs)
+    return base
+
+
+class TestGymSessionRegistry(unittest.TestCase):
+    def setUp(self):
+        self.reg = booker.GymSessionRegistry()
+
+    def tearDown(self):
+        self.reg.reset()
+
+    def test_same_account_reuses_session(self):
+        s1, k1 = self.reg.session_for(_acc())
+        s2, k2 = self.reg.session_for(_acc())
+        self.assertIs(s1, s2)
+        self.assertEqual(k1, "acc_pool")
+        self.assertEqual(k2, "acc_pool")
+
+    def test_distinct_accounts_distinct_sessions(self):
+        s1, _ = self.reg.session_for(_acc(id="a1"))
+        s2, _ = self.reg.session_for(_acc(id="a2"))
+        self.assertIsNot(s1, s2)
+
+    def test_credential_change_rebuilds(self):
+        s1, _ = self.reg.session_for(_acc())
+        s2, _ = self.reg.session_for(_acc(token="tok2"))
+        self.assertIsNot(s1, s2)
+        snap = self.reg.snapshot()["sessions"][0]
+        self.assertEqual(snap["last_recycle_reason"], "credential_changed")
+
+    def test_error_streak_marks_unhealthy_then_rebuilds(self):
+        s1, key = self.reg.session_for(_acc())
+        streak = self.reg.snapshot()["unhealthy_error_streak"]
+        for _ in range(streak):
+            self.reg.note_result(key, False)
+        self.assertTrue(self.reg.snapshot()["sessions"][0]["unhealthy"])
+        s2, _ = self.reg.session_for(_acc())
+        self.assertIsNot(s1, s2)
+
+    def test_ok_resets_streak(self):
+        _s, key = self.reg.session_for(_acc())
+        self.reg.note_result(key, False)
+        self.reg.note_result(key, True)
+        self.assertEqual(self.reg.snapshot()["sessions"][0]["error_streak"], 0)
+
+    def test_evict_idle(self):
+        _s, key = self.reg.session_for(_acc())
+        self.reg._entries[key]["last_used_mono"] -= 10 ** 6
+        self.assertEqual(self.reg.evict_idle(), 1)
+        self.assertEqual(self.reg.snapshot()["sessions"], [])
+
+    def test_line_ip_adapters_mounted(self):
+        s, _ = self.reg.session_for(_acc())
+        for ip in booker.GYM_API_LINE_IPS:
+            self.assertIsInstance(s.get_adapter(f"https://{ip}/x"), booker._GymLineHTTPSAdapter)
+
+    def test_build_client_uses_registry_session(self):
+        acc = _acc(id="acc_build_client")
+        c1 = booker.build_client_for_account(acc)
+        c2 = booker.build_client_for_account(acc)
+        try:
+            self.assertIs(c1.session, c2.session)
+            self.assertEqual(c1.session_registry_key, "acc_build_client")
+        finally:
+            booker.GYM_SESSION_REGISTRY.reset("acc_build_client")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""离线馆方模拟器：ApiClient.gym_base_url 指向本地，矩阵/下单/订单/操作过快与线上解析路径一致（零 pytest 依赖）。"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+_TOOLS_DIR = os.path.join(_WEB_BOOKER_DIR, "tools")
+if _TOOLS_DIR not in sys.path:
+    sys.path.insert(0, _TOOLS_DIR)
+
+import app as booker  # noqa: E402
+import gym_simulator as sim  # noqa: E402
+
+
+class TestSelloutCurve(unittest.TestCase):
+    def test_inverse(self):
+        curve = sim.parse_sellout_curve("1:0.5,3:0.9")
+        self.assertEqual(curve[0], (0.0, 0.0))
+        self.assertAlmostEqual(sim.sellout_time_for_quantile(curve, 0.25), 0.5)
+        self.assertAlmostEqual(sim.sellout_time_for_quantile(curve, 0.7), 2.0)
+        self.assertIsNone(sim.sellout_time_for_quantile(curve, 0.95))
+
+
+class TestFitFromLogs(unittest.TestCase):
+    def test_post_latency_uses_per_post_samples_only(self):
+        root = tempfile.mkdtemp()
+        try:
+            os.makedirs(os.path.join(root, "task_run_metrics"))
+            with open(os.path.join(root, "task_run_metrics", "seg_000001.ndjson"), "w", encoding="utf-8") as f:
+                # 任务级 submit_latencies_ms 含整次递送墙钟（8578），不能当单次 POST 时延
+                f.write(json.dumps({"submit_latencies_ms": [8578, 120], "post_latencies_ms": [120, 140]}) + "\n")
+                f.write(json.dumps({"submit_latencies_ms": [9000]}) + "\n")
+            fitted = sim.fit_from_logs(root)
+            self.assertEqual(fitted["post_ms"], [120.0, 140.0])
+            self.assertEqual(fitted["matrix_ms"], [])
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+class TestGymSimulatorRoundTrip(unittest.TestCase):
+    def setUp(self):
+        # 售罄曲线全 0：不被他人抢，结果只取决于本账号的请求
+        self.state = sim.GymSimulatorState(places=4, times=["18:00", "19:00"], sellout="0:0", rate_limit_interval_s=60.0, seed=1)
+        self.server = sim.start_simulator(self.state)
+        c = booker.ApiClient(inherit_global_auth=False)
+        c.gym_base_url = self.server.base_url
+        c.token = "tok"
+        c.shop_num = "1001"
+        c.card_index = "0"
+        c.card_st_id = "cs"
+        self.client = c
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_url_override(self):
+        self.assertEqual(
+            self.client._gym_https_url("/easyserpClient/place/getPlaceOrder"),
+            f"{self.server.base_url}/easyserpClient/place/getPlaceOrder",
+        )
+        self.assertTrue(booker.ApiClient(inherit_global_auth=False)._gym_https_url("x").startswith("https://"))
+
+    def test_matrix_post_orders_and_rate_limit(self):
+        c = self.client
+        res = c.get_matrix("2026-04-12", include_mine_overlay=False, bypass_cache=True)
+        self.assertEqual(list(res["places"]), ["1", "2", "3", "4"])
+        self.assertEqual(res["matrix"]["3"]["19:00"], "available")
+
+        ok = c.test_raw_reservation_place_post("2026-04-12", [{"place": "3", "time": "18:00"}, {"place": "3", "time": "19:00"}])
+        self.assertEqual(c._classify_delivery_response(ok["raw_message"], ok["resp_data"])["bucket"], "success")
+        fast = c.test_raw_reservation_place_post("2026-04-12", [{"place": "1", "time": "18:00"}])
+        self.assertEqual(c._classify_delivery_response(fast["raw_message"], fast["resp_data"])["bucket"], "rate_limited")
+
+        # mine 覆盖查账号订单索引（get_matrix 不再同步翻订单）：先同步刷新一次
+        self.assertTrue(c.mine_order_index().refresh(c))
+        res = c.get_matrix("2026-04-12", include_mine_overlay=True, bypass_cache=True)
+        self.assertEqual(res["matrix"]["3"]["18:00"], "mine")
+        self.assertEqual(res["matrix"]["1"]["18:00"], "available")
+        self.assertEqual(res["meta"]["mine_slots_count"], 2)
+
+        summ = self.state.summary("tok")
+        self.assertEqual(summ["cells_won"], 2)
+        self.assertEqual(summ["outcomes"], {"accepted": 1, "rate_limited": 1})
+
+    def test_interval_post_success_notes_mine_index(self):
+        c = self.client
+        c.token = "tok-interval"
+        c.delivery_max_places_per_timeslot = 1
+        saved = booker.CONFIG.get("delivery_min_post_interval_seconds")
+        booker.CONFIG["delivery_min_post_interval_seconds"] = 0.0
+        try:
+            groups = [{"id": "primary", "label": "主", "items": [{"place": "2", "time": "18:00"}, {"place": "2", "time": "19:00"}]}]
+            tc = {
+                "delivery_target_blocks": 1,
+                "delivery_target_times": ["18:00", "19:00"],
+                "delivery_time_preference_order": ["18:00", "19:00"],
+                "delivery_matrix_place_min": 1,
+                "delivery_matrix_place_max": 4,
+                "interval_post_consecutive_hours": 2,
+                "target_count": 2,
+            }
+            res = c.submit_interval_post_campaign("2026-04-12", groups, task_config=tc)
+        finally:
+            if saved is None:
+                booker.CONFIG.pop("delivery_min_post_interval_seconds", None)
+            else:
+                booker.CONFIG["delivery_min_post_interval_seconds"] = saved
+        self.assertEqual(res["run_metric"].get("stopped_by"), "goal_satisfied")
+        # 受理即乐观记入订单索引，不等 MINE_INDEX_MAX_AGE_SECONDS 后的刷新
+        won = {(p, t) for (p, t) in c.mine_order_index().slots_for("2026-04-12")}
+        self.assertEqual(len(won), 2)
+        self.assertEqual(won, {(p, t) for p, t in self.state._owner if self.state._owner[(p, t)] == "tok-interval"})
+
+
+if __name__ == "__main__":
+    unittest.main()
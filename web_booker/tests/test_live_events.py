@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""实时推送：事件 id 单调、Last-Event-ID 续传、断档 reset、矩阵增量仅有订阅者时计算、/api/events 流格式（零 pytest 依赖）。"""
+import copy
+import os
+import sys
+import unittest
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+_BENCH_DIR = os.path.join(_WEB_BOOKER_DIR, "benchmarks")
+for _p in (_WEB_BOOKER_DIR, _BENCH_DIR):
+    if _p not in sys.path:
+        sys.path.insert(0, _p)
+
+import app as booker  # noqa: E402
+import fixtures as fx  # noqa: E402
+
+
+def _read_until(resp, needle, max_chunks=50):
+    buf = ""
+    for i, chunk in enumerate(resp.response):
+        buf += chunk.decode("utf-8") if isinstance(chunk, bytes) else chunk
+        if needle in buf or i >= max_chunks:
+            break
+    return buf
+
+
+class TestLiveEventHub(unittest.TestCase):
+    def test_resume_after_id_and_gap(self):
+        hub = booker.LiveEventHub(maxlen=3)
+        ids = [hub.publish("log", f"line{i}") for i in range(5)]
+        self.assertEqual(ids, [1, 2, 3, 4, 5])
+        events, gap = hub.events_after(3, 0.01)
+        self.assertEqual([(e[0], e[2]) for e in events], [(4, "line3"), (5, "line4")])
+        self.assertFalse(gap)
+        events, gap = hub.events_after(0, 0.01)
+        self.assertTrue(gap)
+        self.assertEqual([e[0] for e in events], [3, 4, 5])
+        self.assertEqual(hub.events_after(5, 0.01), ([], False))
+
+    def test_matrix_delta_only_with_subscribers(self):
+        hub = booker.LiveEventHub()
+        rows = fx.build_matrix_rows()
+        res = booker.freeze_matrix_result({"places": sorted(rows), "times": sorted(next(iter(rows.values()))), "matrix": rows})
+        hub.publish_matrix(("1001", "d"), "d", res)
+        self.assertEqual(hub.last_id(), 0)
+
+        self.assertTrue(hub.try_subscribe())
+        try:
+            hub.publish_matrix(("1001", "d"), "d", res)
+            events, _gap = hub.events_after(0, 0.01)
+            matrix_events = [e for e in events if e[1] == "matrix"]
+            self.assertTrue(matrix_events[-1][2]["full"])
+            place = sorted(rows)[0]
+            t0 = sorted(rows[place])[0]
+            changed = copy.deepcopy(rows)
+            changed[place][t0] = "booked" if rows[place][t0] != "booked" else "available"
+            res2 = booker.freeze_matrix_result({"places": res["places"], "times": res["times"], "matrix": changed})
+            last = hub.last_id()
+            hub.publish_matrix(("1001", "d"), "d", res2)
+            hub.publish_matrix(("1001", "d"), "d", res2)
+            events, _gap = hub.events_after(last, 0.01)
+            matrix_events = [e for e in events if e[1] == "matrix"]
+            self.assertEqual(len(matrix_events), 1)
+            self.assertEqual(matrix_events[0][2]["cells"], [[place, t0, changed[place][t0]]])
+        finally:
+            hub.unsubscribe()
+
+    def test_subscriber_limit(self):
+        hub = booker.LiveEventHub(max_subscribers=1)
+        self.assertTrue(hub.try_subscribe())
+        self.assertFalse(hub.try_subscribe())
+        hub.unsubscribe()
+        self.assertEqual(hub.stats()["rejected"], 1)
+
+
+class TestEventsEndpoint(unittest.TestCase):
+    def setUp(self):
+        self._orig_hub = booker.LIVE_EVENTS
+        self._orig_web_ui = copy.deepcopy(booker.CONFIG.get("web_ui_auth") or {})
+        booker.CONFIG["web_ui_auth"] = {"enabled": False}
+        booker.LIVE_EVENTS = booker.LiveEventHub(maxlen=50)
+        self.client = booker.app.test_client()
+
+    def tearDown(self):
+        booker.LIVE_EVENTS = self._orig_hub
+        booker.CONFIG["web_ui_auth"] = self._orig_web_ui
+
+    def test_streams_logs_with_ids_and_resumes(self):
+        booker.log("live-events-A")
+        start = booker.LIVE_EVENTS.last_id()
+        booker.log("live-events-B")
+        resp = self.client.get(f"/api/events?types=log&last_id={start}", buffered=False)
+        try:
+            self.assertEqual(resp.mimetype, "text/event-stream")
+            body = _read_until(resp, "live-events-B")
+        finally:
+            resp.close()
+        self.assertIn("event: hello", body)
+        self.assertIn(f"id: {start + 1}\nevent: log\ndata: ", body)
+        self.assertNotIn("live-events-A", body)
+        self.assertEqual(booker.LIVE_EVENTS.subscriber_count(), 0)
+
+        booker.log("live-events-C")
+        resp = self.client.get("/api/events?types=log", headers={"Last-Event-ID": str(start + 1)}, buffered=False)
+        try:
+            body = _read_until(resp, "live-events-C")
+        finally:
+            resp.close()
+        self.assertIn("live-events-C", body)
+        self.assertNotIn("live-events-B", body)
+
+    def test_gap_sends_reset_and_snapshot_sent_on_connect(self):
+        for i in range(60):
+            booker.LIVE_EVENTS.publish("log", f"x{i}")
+        resp = self.client.get("/api/events?types=log,pause&last_id=1", buffered=False)
+        try:
+            body = _read_until(resp, "event: reset")
+        finally:
+            resp.close()
+        self.assertIn("event: pause", body)
+        self.assertIn("event: reset", body)
+
+
+if __name__ == "__main__":
+    unittest.main()
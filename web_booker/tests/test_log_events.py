@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""结构化日志事件：调用线程不做格式化、后台渲染与原行文本一致、分类级别随 verbose_logs、落盘按行首时间排序（零 pytest 依赖）。"""
+import os
+import sys
+import threading
+import unittest
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+
+import app as booker  # noqa: E402
+
+
+class _Probe:
+    """记录被格式化时所在线程。"""
+
+    def __init__(self):
+        self.threads = []
+
+    def __format__(self, spec):
+        self.threads.append(threading.current_thread().name)
+        return "PROBE"
+
+
+def _texts_after(seq):
+    return [r.text for r in booker.query_log_records(since_seq=seq)[0]]
+
+
+class TestLogEvents(unittest.TestCase):
+    _KEYS = ("verbose_logs", "log_category_levels")
+
+    def setUp(self):
+        self._saved = {k: booker.CONFIG.get(k) for k in self._KEYS}
+        booker.CONFIG["verbose_logs"] = False
+        booker.CONFIG["log_category_levels"] = {}
+
+    def tearDown(self):
+        booker.CONFIG.update(self._saved)
+
+    def test_rendered_off_thread_with_original_text(self):
+        probe = _Probe()
+        items = [{"place": "3", "time": "18:00"}]
+        seq = booker.query_log_records()[1]
+        booker.log_event("delivery", "batch", tag="首单", group_id=1, group_label=probe, items=items)
+        self.assertEqual(probe.threads, [])
+        self.assertTrue(booker.LOG_EVENT_RENDERER.flush(2.0))
+        self.assertEqual(probe.threads, ["log-render"])
+        texts = _texts_after(seq)
+        self.assertTrue(texts[-1].endswith(f"[极速订场] 首单 group=1 (PROBE) items={items}"))
+
+    def test_category_levels(self):
+        seq = booker.query_log_records()[1]
+        booker.log_event("matrix", "mine_overlay", level="debug", date="d", count=1)
+        booker.CONFIG["log_category_levels"] = {"delivery": "off"}
+        booker.log_event("delivery", "round_done")
+        booker.log_event("interval_post", "retry_exhausted", cid="c1")
+        booker.CONFIG["verbose_logs"] = True
+        booker.log_event("matrix", "mine_overlay", level="debug", date="d2", count=2)
+        booker.LOG_EVENT_RENDERER.flush(2.0)
+        texts = _texts_after(seq)
+        self.assertEqual(len(texts), 2)
+        self.assertIn("候选 c1 重试超限", texts[0])
+        self.assertIn("日期d2 共标记 2 个mine格子", texts[1])
+        self.assertFalse(booker.log_event_enabled("delivery"))
+        self.assertEqual(booker.normalize_log_category_levels({"a": "DEBUG", "b": "loud", "": "off"}), {"a": "debug"})
+
+    def test_unknown_event_and_format_error_fall_back_to_fields(self):
+        r = booker.LogEventRenderer(formats={("x", "bad"): "{missing}"})
+        self.assertEqual(r.render("x", "bad", {"a": 1}), "[x] bad a=1")
+        self.assertEqual(r.render("x", "other", {}), "[x] other")
+        self.assertEqual(r.stats()["format_errors"], 1)
+
+    def test_sink_batch_sorted_by_line_time(self):
+        lines = ["[10:00:00.050] b", "[10:00:00.010] a", "[10:00:00.050] c"]
+        self.assertEqual(booker._sort_log_lines_by_time(lines), ["[10:00:00.010] a", "[10:00:00.050] b", "[10:00:00.050] c"])
+        self.assertEqual(booker._sort_log_lines_by_time(["x2", "x1"]), ["x2", "x1"])
+        midnight = ["[23:59:59.990] a", "[00:00:00.010] b"]
+        self.assertEqual(booker._sort_log_lines_by_time(midnight), midnight)
+
+
+if __name__ == "__main__":
+    unittest.main()
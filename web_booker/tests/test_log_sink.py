@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""日志后台落地 _LogSink：攒批写文件、常驻句柄、队列满丢最旧并计数、LOG_BUFFER 有界（零 pytest 依赖）。"""
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+
+import app as booker  # noqa: E402
+
+
+class TestLogSink(unittest.TestCase):
+    _KEYS = ("log_to_file", "log_file_dir", "log_retention_days")
+
+    def setUp(self):
+        self._saved = {k: booker.CONFIG.get(k) for k in self._KEYS}
+        self.tmp = tempfile.mkdtemp()
+        booker.CONFIG["log_to_file"] = True
+        booker.CONFIG["log_file_dir"] = self.tmp
+        booker.CONFIG["log_retention_days"] = 3
+
+    def tearDown(self):
+        booker.CONFIG.update(self._saved)
+        shutil.rmtree(self.tmp, ignore_errors=True)
+
+    def _today_file(self):
+        return os.path.join(self.tmp, f"run_{datetime.now().strftime('%Y%m%d')}.log")
+
+    def test_batched_write(self):
+        sink = booker._LogSink(flush_interval_s=0.05)
+        for i in range(50):
+            sink.enqueue(f"line {i}")
+        self.assertTrue(sink.flush(5.0))
+        with open(self._today_file(), encoding="utf-8") as f:
+            self.assertEqual(f.read().splitlines(), [f"line {i}" for i in range(50)])
+        st = sink.stats()
+        self.assertEqual((st["written"], st["dropped"], st["pending"]), (50, 0, 0))
+        self.assertLess(st["batches"], 50)
+
+    def test_overflow_drops_oldest_and_reports(self):
+        sink = booker._LogSink(maxlen=2, flush_interval_s=5.0)
+        for i in range(5):
+            sink.enqueue(f"x{i}")
+        self.assertTrue(sink.flush(5.0))
+        with open(self._today_file(), encoding="utf-8") as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[:2], ["x3", "x4"])
+        self.assertIn("丢弃最旧 3 行", lines[2])
+        self.assertEqual(sink.stats()["dropped"], 3)
+
+    def test_memory_buffer_bounded(self):
+        self.assertEqual(booker.LOG_BUFFER.maxlen, booker.MAX_LOG_SIZE)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""结构化日志：LogRecord 环形缓冲 since_seq 增量与断档、日志文件稀疏索引分页/尾部/时间段、/api/logs 与 /api/logs/file 查询（零 pytest 依赖）。"""
+import copy
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from datetime import datetime
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+
+import app as booker  # noqa: E402
+
+
+def _line(i):
+    ts = f"10:{i // 60:02d}:{i % 60:02d}.000"
+    if i % 5 == 0:
+        return f"[{ts}] tid=7| ⚠️ [refill#3|auto|acc] 第 {i} 行"
+    return f"[{ts}] 普通第 {i} 行"
+
+
+class TestLogRecords(unittest.TestCase):
+    def test_since_seq_filters_and_gap(self):
+        booker.log("log-store-first")
+        start = booker.query_log_records()[1]
+        booker.log("⚠️ [refill#42|manual|a] log-store-second")
+        booker.log("log-store-third")
+        records, last_seq, gap = booker.query_log_records(since_seq=start)
+        self.assertEqual([r.seq for r in records], [start + 1, start + 2])
+        self.assertEqual(last_seq, start + 2)
+        self.assertFalse(gap)
+        self.assertEqual((records[0].refill_id, records[0].level), ("42", "warn"))
+
+        flt = booker._log_query_filters({"refill_id": "42"})
+        self.assertEqual([r.seq for r in booker.query_log_records(flt, since_seq=start)[0]], [start + 1])
+        for i in range(booker.MAX_LOG_SIZE):
+            booker.log(f"log-store-fill {i}")
+        self.assertTrue(booker.query_log_records(since_seq=start)[2])
+
+
+class TestLogFileIndex(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "run_20260412.log")
+        with open(self.path, "w", encoding="utf-8") as f:
+            for i in range(600):
+                f.write(_line(i) + "\n")
+                if i == 301:
+                    f.write("  续行：属于第 301 行\n")
+        self.idx = booker.LogFileIndex(stride_bytes=512)
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_index_is_sparse_and_extends_incrementally(self):
+        entries, end_off = self.idx._refresh(self.path)
+        self.assertEqual(end_off, os.path.getsize(self.path))
+        self.assertGreater(len(entries), 10)
+        self.assertLess(len(entries), 100)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(_line(600) + "\n不完整的尾行")
+        _entries, end2 = self.idx._refresh(self.path)
+        self.assertEqual(end2, os.path.getsize(self.path) - len("不完整的尾行".encode("utf-8")))
+        self.assertEqual(self.idx.tail(self.path, n=1)["lines"], [_line(600)])
+
+    def test_forward_pages_and_time_range(self):
+        flt = booker._log_query_filters({"start": "10:05", "end": "10:06:59"})
+        got, cursor = [], None
+        while True:
+            page = self.idx.read_page(self.path, flt, cursor=cursor, limit=25)
+            got.extend(page["lines"])
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+        expected = [_line(i) for i in range(300, 420)]
+        expected.insert(expected.index(_line(301)) + 1, "  续行：属于第 301 行")
+        self.assertEqual(got, expected)
+
+    def test_tail_with_filter_and_before(self):
+        flt = booker._log_query_filters({"tid": "7", "level": "warn"})
+        page = self.idx.tail(self.path, flt, n=3)
+        self.assertEqual(page["lines"], [_line(i) for i in (585, 590, 595)])
+        older = self.idx.tail(self.path, flt, n=2, before=page["prev_cursor"])
+        self.assertEqual(older["lines"], [_line(575), _line(580)])
+        everything = self.idx.tail(self.path, flt, n=1000)
+        self.assertEqual(len(everything["lines"]), 120)
+        self.assertIsNone(everything["prev_cursor"])
+
+
+class TestLogEndpoints(unittest.TestCase):
+    _KEYS = ("log_to_file", "log_file_dir")
+
+    def setUp(self):
+        self._saved = {k: booker.CONFIG.get(k) for k in self._KEYS}
+        self._orig_web_ui = copy.deepcopy(booker.CONFIG.get("web_ui_auth") or {})
+        self.dir = tempfile.mkdtemp()
+        booker.CONFIG.update(log_to_file=True, log_file_dir=self.dir, web_ui_auth={"enabled": False})
+        self.date = datetime.now().strftime("%Y%m%d")
+        with open(os.path.join(self.dir, f"run_{self.date}.log"), "w", encoding="utf-8") as f:
+            f.write("".join(_line(i) + "\n" for i in range(200)))
+        self.client = booker.app.test_client()
+
+    def tearDown(self):
+        booker.CONFIG.update(self._saved)
+        booker.CONFIG["web_ui_auth"] = self._orig_web_ui
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_file_query_and_stream(self):
+        data = self.client.get(f"/api/logs/file?date={self.date}&tail=2&refill_id=3").get_json()
+        self.assertEqual(data["lines"], [_line(190), _line(195)])
+        self.assertEqual(data["source"], "file")
+        data = self.client.get(f"/api/logs/file?date={self.date}&start=10:01&limit=3").get_json()
+        self.assertEqual(data["lines"], [_line(60), _line(61), _line(62)])
+        self.assertIsNotNone(data["next_cursor"])
+        self.assertEqual(self.client.get(f"/api/logs/file?date={self.date}&start=1001").status_code, 400)
+
+        resp = self.client.get(f"/api/logs/file?date={self.date}")
+        self.assertEqual(resp.get_data(as_text=True).splitlines(), [_line(i) for i in range(200)])
+
+    def test_memory_records_since_seq(self):
+        booker.log("endpoint-records-A")
+        last = booker.query_log_records()[1]
+        booker.log("endpoint-records-B")
+        data = self.client.get(f"/api/logs?since_seq={last}").get_json()
+        self.assertEqual(data["last_seq"], last + 1)
+        self.assertFalse(data["gap"])
+        self.assertIn("endpoint-records-B", data["records"][0]["text"])
+        legacy = self.client.get("/api/logs?status_kw=endpoint-records").get_json()
+        self.assertTrue(legacy[-1].endswith("endpoint-records-B"))
+
+    def test_since_seq_ahead_of_server_is_reset(self):
+        booker.log("endpoint-records-restart")
+        last = booker.query_log_records()[1]
+        # 模拟进程重启：客户端拿着旧进程更大的 since_seq 来轮询
+        records, last_seq, gap = booker.query_log_records(since_seq=last + 1000)
+        self.assertTrue(gap)
+        self.assertEqual(last_seq, last)
+        self.assertTrue(records and records[-1].text.endswith("endpoint-records-restart"))
+        data = self.client.get(f"/api/logs?since_seq={last + 1000}").get_json()
+        self.assertTrue(data["gap"])
+        self.assertTrue(data["reset"])
+        self.assertFalse(self.client.get(f"/api/logs?since_seq={last}").get_json()["reset"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""矩阵缓存：命中零拷贝共享只读结果，改动须 thaw（零 pytest 依赖）。"""
+import copy
+import json
+import os
+import sys
+import time
+import unittest
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+
+import app as booker  # noqa: E402
+
+
+def _result():
+    return {
+        "places": ["1", "2"],
+        "times": ["10:00", "11:00"],
+        "matrix": {"1": {"10:00": "available", "11:00": "booked"}, "2": {"10:00": "locked", "11:00": "available"}},
+        "meta": {"mine_overlay_ok": False, "mine_slots_count": 0},
+    }
+
+
+class TestFrozenMatrixResult(unittest.TestCase):
+    def test_cache_hit_returns_shared_object(self):
+        c = booker.ApiClient(inherit_global_auth=False)
+        frozen = booker.freeze_matrix_result(_result())
+        c._matrix_cache[("2026-04-12", False)] = {"ts": time.time(), "data": frozen}
+        c._matrix_cache_window_s = 60.0
+        a = c.get_matrix("2026-04-12", include_mine_overlay=False)
+        b = c.get_matrix("2026-04-12", include_mine_overlay=False)
+        self.assertIs(a, frozen)
+        self.assertIs(b, frozen)
+
+    def test_frozen_rejects_mutation(self):
+        frozen = booker.freeze_matrix_result(_result())
+        with self.assertRaises(TypeError):
+            frozen["matrix"]["1"]["10:00"] = "mine"
+        with self.assertRaises(TypeError):
+            frozen["matrix"].pop("1")
+        with self.assertRaises(TypeError):
+            frozen["meta"].update({"x": 1})
+        self.assertIsInstance(frozen["places"], tuple)
+
+    def test_thaw_is_writable_copy(self):
+        frozen = booker.freeze_matrix_result(_result())
+        work = booker.thaw_matrix_result(frozen)
+        work["matrix"]["1"]["10:00"] = "mine"
+        work["places"].append("3")
+        self.assertEqual(frozen["matrix"]["1"]["10:00"], "available")
+        self.assertEqual(list(frozen["places"]), ["1", "2"])
+        dc = copy.deepcopy(frozen)
+        dc["matrix"]["2"]["10:00"] = "booked"
+        self.assertEqual(frozen["matrix"]["2"]["10:00"], "locked")
+
+    def test_json_roundtrip_unchanged(self):
+        self.assertEqual(json.loads(json.dumps(booker.freeze_matrix_result(_result()))), _result())
+
+
+if __name__ == "__main__":
+    unittest.main()
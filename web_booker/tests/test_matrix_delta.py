@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+"""矩阵增量：diff_court_matrices 与 refill 无解时跳过重复求解（零 pytest 依赖）。"""
+import os
+import sys
+import time
+import unittest
+from unittest.mock import patch
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+
+import app as booker  # noqa: E402
+
+
+def _rows(**overrides):
+    rows = {
+        "1": {"10:00": "available", "11:00": "booked"},
+        "2": {"10:00": "booked", "11:00": "booked"},
+        "3": {"10:00": "booked", "11:00": "available"},
+    }
+    for key, st in overrides.items():
+        p, t = key.split("_")
+        rows[p][f"{t[:2]}:{t[2:]}"] = st
+    return rows
+
+
+class TestDiffCourtMatrices(unittest.TestCase):
+    def test_no_base_is_full(self):
+        d = booker.diff_court_matrices(None, _rows())
+        self.assertTrue(d["full"])
+        self.assertTrue(booker.matrix_delta_may_unlock(d, ["1"], ["10:00"]))
+
+    def test_identical_is_empty(self):
+        d = booker.diff_court_matrices(_rows(), booker.CourtMatrix(_rows()))
+        self.assertFalse(d["full"])
+        self.assertEqual(d["changed_cells"], ())
+
+    def test_changed_and_newly_bookable(self):
+        d = booker.diff_court_matrices(_rows(), _rows(**{"2_1000": "available", "1_1000": "booked"}))
+        self.assertEqual(set(d["changed_cells"]), {("1", "10:00"), ("2", "10:00")})
+        self.assertEqual(d["changed_times"], ("10:00",))
+        self.assertEqual(d["newly_bookable_cells"], (("2", "10:00"),))
+        self.assertTrue(booker.matrix_delta_may_unlock(d, ["2"], ["10:00"]))
+        self.assertFalse(booker.matrix_delta_may_unlock(d, ["2"], ["11:00"]))
+        self.assertFalse(booker.matrix_delta_may_unlock(d, ["1", "3"], ["10:00"]))
+
+    def test_shape_change_is_full(self):
+        rows = _rows()
+        rows["4"] = {"10:00": "booked", "11:00": "booked"}
+        self.assertTrue(booker.diff_court_matrices(_rows(), rows)["full"])
+
+    def test_get_matrix_delta_base(self):
+        c = booker.ApiClient(inherit_global_auth=False)
+        cur = booker.freeze_matrix_result({"places": ["1", "2", "3"], "times": ["10:00", "11:00"], "matrix": _rows(**{"2_1100": "locked"})})
+        c._matrix_cache[("2026-04-12", False)] = {"ts": time.time(), "data": cur}
+        c._matrix_cache_window_s = 60.0
+        res = c.get_matrix("2026-04-12", include_mine_overlay=False, delta_base={"matrix": _rows()})
+        self.assertIs(res["matrix"], cur["matrix"])
+        self.assertEqual(res["delta"]["newly_bookable_cells"], (("2", "11:00"),))
+
+
+class TestCampaignRefillSkip(unittest.TestCase):
+    _KEYS = ("delivery_refill_no_candidate_streak_limit", "delivery_refill_matrix_poll_seconds")
+
+    def setUp(self):
+        self._saved = {k: booker.CONFIG.get(k) for k in self._KEYS}
+        booker.CONFIG["delivery_refill_no_candidate_streak_limit"] = 4
+        booker.CONFIG["delivery_refill_matrix_poll_seconds"] = 0.05
+
+    def tearDown(self):
+        booker.CONFIG.update(self._saved)
+
+    def test_unchanged_matrix_skips_resolve(self):
+        c = booker.ApiClient(inherit_global_auth=False)
+        c.token = "t"
+        c.shop_num = "1001"
+        c.card_index = "0"
+        c.card_st_id = "cs"
+        c.delivery_max_places_per_timeslot = 3
+        before = booker.freeze_matrix_result({"places": ["1", "2", "3"], "times": ["10:00", "11:00"], "matrix": _rows()})
+        after = booker.freeze_matrix_result(
+            {"places": ["1", "2", "3"], "times": ["10:00", "11:00"], "matrix": _rows(**{"1_1000": "mine"})}
+        )
+        gm_calls = []
+
+        def fake_get_matrix(date_str, include_mine_overlay=True, request_timeout=None, bypass_cache=False):
+            gm_calls.append(1)
+            return before if len(gm_calls) == 1 else after
+
+        ok = {"ok": True, "status_code": 200, "resp_data": {"msg": "success"}, "raw_text": "{}", "raw_message": "success", "elapsed_ms": 1}
+        solve_calls = []
+        real_solve = booker.solve_refill_with_policy
+
+        def counting_solve(*args, **kwargs):
+            solve_calls.append(1)
+            return real_solve(*args, **kwargs)
+
+        groups = [{"id": "primary", "label": "主", "items": [{"place": "1", "time": "10:00"}]}]
+        tc = {
+            "delivery_target_blocks": 2,
+            "delivery_target_times": ["10:00"],
+            "delivery_time_preference_order": ["10:00"],
+            "delivery_matrix_place_min": 1,
+            "delivery_matrix_place_max": 14,
+        }
+        with patch.object(c, "get_matrix", side_effect=fake_get_matrix), patch.object(
+            c, "_post_reservation_once", return_value=ok
+        ), patch.object(booker, "solve_refill_with_policy", side_effect=counting_solve):
+            res = c.submit_delivery_campaign("2026-04-12", groups, submit_profile="auto_minimal", task_config=tc, skip_warmup=True)
+
+        rm = res.get("run_metric") or {}
+        self.assertEqual(rm.get("stopped_by"), "refill_no_candidate_streak")
+        self.assertEqual(len(solve_calls), 1)
+        self.assertEqual(int(rm.get("refill_solve_skipped_count") or 0), 3)
+
+
+
+class TestRefillSolveMemoCleanup(unittest.TestCase):
+    def test_delete_refill_task_drops_solve_memo(self):
+        tm = booker.task_manager
+        orig_tasks, orig_memo = tm.refill_tasks, tm._refill_solve_memo
+        try:
+            tm.refill_tasks = [{"id": 901}, {"id": 902}]
+            tm._refill_solve_memo = {"901": {"key": "k", "matrix": {}}, "902": {"key": "k", "matrix": {}}}
+            tm.save_refill_tasks = lambda immediate=False: None
+            tm.delete_refill_task(901)
+            self.assertEqual(list(tm._refill_solve_memo), ["902"])
+        finally:
+            tm.refill_tasks, tm._refill_solve_memo = orig_tasks, orig_memo
+            del tm.save_refill_tasks
+
+
+if __name__ == "__main__":
+    unittest.main()
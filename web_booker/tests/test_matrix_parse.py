@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""get_matrix 单遍解析：投影结果与状态计数、verbose 才收集调试样本、meta 带解析耗时与字节数（零 pytest 依赖）。"""
+import os
+import sys
+import unittest
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+_BENCH_DIR = os.path.join(_WEB_BOOKER_DIR, "benchmarks")
+for _p in (_WEB_BOOKER_DIR, _BENCH_DIR):
+    if _p not in sys.path:
+        sys.path.insert(0, _p)
+
+import app as booker  # noqa: E402
+import fixtures as fx  # noqa: E402
+import run_benchmarks as rb  # noqa: E402
+
+
+def _place_array():
+    return [
+        {"projectName": {"shortname": "ymq1"}, "projectInfo": [
+            {"starttime": "18:00", "state": 1, "money": 100.0},
+            {"starttime": "19:00", "state": "4"},
+        ]},
+        {"projectName": {"shortname": "mdb15"}, "projectInfo": [
+            {"starttime": "18:00", "state": 6},
+            {"starttime": "19:00", "state": "x"},
+        ]},
+    ]
+
+
+class TestProjectPlaceArray(unittest.TestCase):
+    def test_projection_and_counts(self):
+        matrix, times, counts, debug = booker.project_place_array(_place_array(), {6})
+        self.assertEqual(matrix, {
+            "1": {"18:00": "available", "19:00": "booked"},
+            "15": {"18:00": "locked", "19:00": "booked"},
+        })
+        self.assertEqual(times, {"18:00", "19:00"})
+        self.assertEqual(counts, {1: 1, 4: 1, 6: 1, -999: 1})
+        self.assertEqual(debug, [])
+        _m, _t, _c, debug = booker.project_place_array(_place_array(), {6}, collect_debug=True)
+        self.assertEqual(debug[0], "1号18:00=1")
+
+    def test_counts_match_state_sampler_walk(self):
+        sampler = booker.StateSampler()
+        sampler.ingest(_place_array())
+        single = booker.StateSampler()
+        single.ingest_counts(booker.project_place_array(_place_array(), {6})[2])
+        self.assertEqual(sampler.snapshot()["states"], single.snapshot()["states"])
+
+
+class TestGetMatrixParseStats(unittest.TestCase):
+    def test_meta_and_client_totals(self):
+        text = fx.build_place_info_response_text(fx.build_matrix_rows())
+        c = booker.ApiClient(inherit_global_auth=False, session=rb._FakeSession(text))
+        c.token = "t"
+        c.shop_num = "1001"
+        before = c.matrix_parse_snapshot()
+        res = c.get_matrix("2026-04-12", include_mine_overlay=False, bypass_cache=True)
+        c.get_matrix("2026-04-12", include_mine_overlay=False, bypass_cache=True)
+        self.assertEqual(res["meta"]["response_bytes"], len(text.encode("utf-8")))
+        self.assertGreater(res["meta"]["parse_ms"], 0.0)
+        delta = c.matrix_parse_delta(before)
+        self.assertEqual(delta["matrix_parse_count"], 2)
+        self.assertEqual(delta["matrix_response_bytes_total"], 2 * len(text.encode("utf-8")))
+        self.assertEqual(res["matrix"], fx.build_matrix_rows())
+
+
+if __name__ == "__main__":
+    unittest.main()
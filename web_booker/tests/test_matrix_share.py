@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""多账号矩阵共享：跨账号复用、single-flight、bypass 只取新一轮、保鲜上限、失败自拉、mine 覆盖按账号（零 pytest 依赖）。"""
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+_BENCH_DIR = os.path.join(_WEB_BOOKER_DIR, "benchmarks")
+for _p in (_WEB_BOOKER_DIR, _BENCH_DIR):
+    if _p not in sys.path:
+        sys.path.insert(0, _p)
+
+import app as booker  # noqa: E402
+import fixtures as fx  # noqa: E402
+import run_benchmarks as rb  # noqa: E402
+
+_DATE = "2026-04-12"
+_TEXT = fx.build_place_info_response_text(fx.build_matrix_rows())
+
+
+class _CountingSession:
+    def __init__(self, text=_TEXT, delay_s=0.0):
+        self._resp = rb._FakeResponse(text)
+        self._delay_s = delay_s
+        self.calls = 0
+
+    def get(self, *args, **kwargs):
+        self.calls += 1
+        if self._delay_s:
+            time.sleep(self._delay_s)
+        return self._resp
+
+
+def _client(session, token="t"):
+    c = booker.ApiClient(inherit_global_auth=False, session=session)
+    c.token = token
+    c.shop_num = "1001"
+    c.matrix_share = True
+    return c
+
+
+class TestSharedMatrix(unittest.TestCase):
+    def setUp(self):
+        self._orig_share = booker.MATRIX_SHARE
+        self._orig_age = booker.CONFIG.get("matrix_share_max_age_ms")
+        booker.MATRIX_SHARE = booker.SharedMatrixService()
+        booker.CONFIG["matrix_share_max_age_ms"] = 2000
+
+    def tearDown(self):
+        booker.MATRIX_SHARE = self._orig_share
+        booker.CONFIG["matrix_share_max_age_ms"] = self._orig_age
+
+    def test_second_account_reuses_and_bypass_needs_newer_round(self):
+        sa, sb = _CountingSession(), _CountingSession()
+        a, b = _client(sa, "ta"), _client(sb, "tb")
+        ra = a.get_matrix(_DATE, include_mine_overlay=False, bypass_cache=True)
+        rb_ = b.get_matrix(_DATE, include_mine_overlay=False, bypass_cache=True)
+        self.assertIs(ra, rb_)
+        self.assertEqual((sa.calls, sb.calls), (1, 0))
+        # 同一客户端再 bypass：自己见过这一轮，必须新拉；另一账号随后直接用这新一轮
+        a.get_matrix(_DATE, include_mine_overlay=False, bypass_cache=True)
+        b.get_matrix(_DATE, include_mine_overlay=False, bypass_cache=True)
+        self.assertEqual((sa.calls, sb.calls), (2, 0))
+        self.assertEqual(b.matrix_parse_delta({})["matrix_shared_count"], 2)
+        self.assertEqual(booker.MATRIX_SHARE.stats()["fetches"], 2)
+
+    def test_concurrent_subscribers_single_flight(self):
+        sessions = [_CountingSession(delay_s=0.2) for _ in range(4)]
+        clients = [_client(s, f"t{i}") for i, s in enumerate(sessions)]
+        results = [None] * 4
+        barrier = threading.Barrier(4)
+
+        def run(i):
+            barrier.wait()
+            if i:
+                time.sleep(0.05)
+            results[i] = clients[i].get_matrix(_DATE, include_mine_overlay=False, bypass_cache=True)
+
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join(3.0)
+        self.assertEqual(sum(s.calls for s in sessions), 1)
+        self.assertTrue(all(r is results[0] for r in results))
+        self.assertEqual(booker.MATRIX_SHARE.stats()["joined"], 3)
+
+    def test_freshness_bounds(self):
+        sa, sb = _CountingSession(), _CountingSession()
+        a, b = _client(sa), _client(sb)
+        a.get_matrix(_DATE, include_mine_overlay=False, bypass_cache=True)
+        # 递送期间的保鲜上限更短：超龄不复用
+        b.matrix_share_age_cap_s = 0.05
+        time.sleep(0.08)
+        b.get_matrix(_DATE, include_mine_overlay=False, bypass_cache=True)
+        self.assertEqual(sb.calls, 1)
+        # 0 = 不共享
+        booker.CONFIG["matrix_share_max_age_ms"] = 0
+        c = _CountingSession()
+        _client(c).get_matrix(_DATE, include_mine_overlay=False)
+        self.assertEqual(c.calls, 1)
+        # 不同日期、不同 shop 不共用
+        booker.CONFIG["matrix_share_max_age_ms"] = 2000
+        d = _client(_CountingSession())
+        d.get_matrix("2026-04-13", include_mine_overlay=False)
+        self.assertEqual(d.session.calls, 1)
+
+    def test_post_capable_clients_prime_own_token(self):
+        # 抢票/refill/手动预订用的客户端默认不共享：POST 前的矩阵 GET 必须带自己的 token
+        acc = {"id": "acc_share_default", "token": "tk", "shop_num": "1001"}
+        try:
+            self.assertFalse(booker.build_client_for_account(acc).matrix_share)
+            self.assertTrue(booker.build_client_for_account(acc, matrix_share=True).matrix_share)
+        finally:
+            booker.GYM_SESSION_REGISTRY.reset("acc_share_default")
+        sa, sb = _CountingSession(), _CountingSession()
+        a, b = _client(sa, "ta"), _client(sb, "tb")
+        b.matrix_share = False
+        a.get_matrix(_DATE, include_mine_overlay=False)
+        b.get_matrix(_DATE, include_mine_overlay=False)
+        self.assertEqual((sa.calls, sb.calls), (1, 1))
+
+    def test_shipped_default_still_joins_inflight(self):
+        with open(os.path.join(_WEB_BOOKER_DIR, "config.example.json"), "r", encoding="utf-8") as f:
+            booker.CONFIG["matrix_share_max_age_ms"] = json.load(f)["matrix_share_max_age_ms"]
+        self.assertEqual(booker.CONFIG["matrix_share_max_age_ms"], 0)
+        sa, sb = _CountingSession(delay_s=0.15), _CountingSession()
+        a, b = _client(sa, "ta"), _client(sb, "tb")
+        out = {}
+        t = threading.Thread(target=lambda: out.setdefault("a", a.get_matrix(_DATE, include_mine_overlay=False)))
+        t.start()
+        time.sleep(0.05)
+        res_b = b.get_matrix(_DATE, include_mine_overlay=False)
+        t.join(2.0)
+        self.assertIs(out["a"], res_b)
+        self.assertEqual((sa.calls, sb.calls), (1, 0))
+        # 完成后的结果在 max_age=0 下不复用
+        a.get_matrix(_DATE, include_mine_overlay=False, bypass_cache=True)
+        self.assertEqual(sa.calls, 2)
+
+    def test_joiner_falls_back_when_owner_fails(self):
+        bad = _CountingSession(text="<html>502</html>", delay_s=0.15)
+        good = _CountingSession()
+        a, b = _client(bad, "ta"), _client(good, "tb")
+        out = {}
+        t = threading.Thread(target=lambda: out.setdefault("a", a.get_matrix(_DATE, include_mine_overlay=False)))
+        t.start()
+        time.sleep(0.05)
+        res_b = b.get_matrix(_DATE, include_mine_overlay=False)
+        t.join(2.0)
+        self.assertIn("error", out["a"])
+        self.assertNotIn("error", res_b)
+        self.assertEqual(good.calls, 1)
+        st = booker.MATRIX_SHARE.stats()
+        self.assertEqual((st["joined"], st["fallbacks"]), (1, 1))
+
+    def test_mine_overlay_is_per_account(self):
+        rows = fx.build_matrix_rows()
+        place = sorted(rows.keys())[0]
+        t0 = sorted(rows[place].keys())[0]
+        a, b = _client(_CountingSession(), "ta"), _client(_CountingSession(), "tb")
+        order = {"billNum": "B1", "jsonArray": [
+            {"reversionDate": _DATE, "siteName": f"{place}号场", "start": t0, "end": f"{int(t0[:2]) + 1:02d}:00"},
+        ]}
+        a.fetch_place_order_page = lambda page_no, page_size: ([order], "")
+        b.fetch_place_order_page = lambda page_no, page_size: ([], "")
+        self.assertTrue(a.mine_order_index().refresh(a))
+        self.assertTrue(b.mine_order_index().refresh(b))
+        ra = a.get_matrix(_DATE, include_mine_overlay=True)
+        rb_ = b.get_matrix(_DATE, include_mine_overlay=True)
+        self.assertEqual(ra["matrix"][place][t0], "mine")
+        self.assertEqual(ra["meta"]["mine_slots_count"], 1)
+        self.assertEqual(rb_["matrix"][place][t0], rows[place][t0])
+        self.assertTrue(rb_["meta"]["mine_overlay_ok"])
+        self.assertEqual(b.session.calls, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
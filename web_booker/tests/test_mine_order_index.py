@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""我的订单索引：get_matrix 不等翻订单、增量刷新遇整页一致即停、下单乐观记入、取消删除并全量刷新（零 pytest 依赖）。"""
+import os
+import sys
+import time
+import unittest
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+_BENCH_DIR = os.path.join(_WEB_BOOKER_DIR, "benchmarks")
+for _p in (_WEB_BOOKER_DIR, _BENCH_DIR):
+    if _p not in sys.path:
+        sys.path.insert(0, _p)
+
+import app as booker  # noqa: E402
+import fixtures as fx  # noqa: E402
+import run_benchmarks as rb  # noqa: E402
+
+_DATE = "2026-04-12"
+
+
+def _order(bill, place, start, end=None, show_status=0):
+    end = end or f"{int(start[:2]) + 1:02d}:00"
+    return {
+        "billNum": bill,
+        "showStatus": show_status,
+        "jsonArray": [{"reversionDate": _DATE, "siteName": f"羽毛球{place}", "start": start, "end": end}],
+    }
+
+
+class _PagedOrders:
+    """fetch_place_order_page 替身：按页切 orders，记录请求过的页号。"""
+
+    def __init__(self, orders, delay_s=0.0):
+        self.orders = orders
+        self.delay_s = delay_s
+        self.pages = []
+
+    def __call__(self, page_no, page_size):
+        if self.delay_s:
+            time.sleep(self.delay_s)
+        self.pages.append(page_no)
+        return self.orders[page_no * page_size:(page_no + 1) * page_size], ""
+
+
+class _Client:
+    def __init__(self, fetch):
+        self.fetch_place_order_page = fetch
+
+
+class TestMineOrderIndex(unittest.TestCase):
+    def test_incremental_refresh_stops_at_unchanged_page(self):
+        orders = [_order(f"B{i}", str(i % 5 + 1), f"{8 + i // 5:02d}:00") for i in range(25)]
+        src = _PagedOrders(orders)
+        idx = booker.MineOrderIndex(page_size=10, max_pages=4)
+        self.assertTrue(idx.refresh(_Client(src)))
+        self.assertEqual(src.pages, [0, 1, 2])
+        self.assertEqual(idx.slots_for(_DATE)[("1", "08:00")], "B0")
+        self.assertFalse(idx.is_stale())
+
+        # 新单排在最前：增量刷新翻到第二页（与索引一致）即停，旧单保留
+        src.orders = [_order("N1", "9", "21:00")] + orders
+        src.pages = []
+        self.assertTrue(idx.refresh(_Client(src)))
+        self.assertEqual(src.pages, [0, 1])
+        slots = idx.slots_for(_DATE)
+        self.assertEqual(slots[("9", "21:00")], "N1")
+        self.assertEqual(slots[("5", "12:00")], "B24")
+
+    def test_booked_and_cancelled_invalidate(self):
+        src = _PagedOrders([_order("B1", "2", "18:00", "20:00")])
+        idx = booker.MineOrderIndex()
+        idx.refresh(_Client(src))
+        self.assertEqual(idx.slots_for(_DATE), {("2", "18:00"): "B1", ("2", "19:00"): "B1"})
+
+        idx.note_booked(_DATE, [{"place": "3", "time": "18:00"}])
+        self.assertEqual(idx.slots_for(_DATE)[("3", "18:00")], "")
+        self.assertTrue(idx.is_stale())
+        src.orders = [_order("B2", "3", "18:00"), _order("B1", "2", "18:00", "20:00")]
+        idx.refresh(_Client(src))
+        self.assertEqual(idx.slots_for(_DATE)[("3", "18:00")], "B2")
+        self.assertEqual(idx.stats()["pending"], 0)
+
+        idx.note_cancelled("B1")
+        self.assertNotIn(("2", "18:00"), idx.slots_for(_DATE))
+        # 全量刷新以接口为准：已取消的单不再出现
+        src.orders = [_order("B2", "3", "18:00"), _order("B1", "2", "18:00", "20:00", show_status=2)]
+        idx.refresh(_Client(src))
+        self.assertEqual(idx.slots_for(_DATE), {("3", "18:00"): "B2"})
+        self.assertFalse(idx.stats()["needs_full"])
+
+    def test_failed_refresh_keeps_index(self):
+        idx = booker.MineOrderIndex()
+        idx.refresh(_Client(_PagedOrders([_order("B1", "1", "18:00")])))
+        self.assertFalse(idx.refresh(_Client(lambda page_no, page_size: ([], "获取订单失败: timeout"))))
+        self.assertEqual(idx.slots_for(_DATE), {("1", "18:00"): "B1"})
+        self.assertEqual(idx.stats()["errors"], 1)
+
+
+class TestGetMatrixMineOverlay(unittest.TestCase):
+    def test_get_matrix_does_not_wait_for_orders(self):
+        rows = fx.build_matrix_rows()
+        place = sorted(rows.keys())[0]
+        t0 = sorted(rows[place].keys())[0]
+        c = booker.ApiClient(inherit_global_auth=False, session=rb._FakeSession(fx.build_place_info_response_text(rows)))
+        c.token = f"mine-index-{time.time()}"
+        c.shop_num = "1001"
+        c.fetch_place_order_page = _PagedOrders([_order("B1", place, t0)], delay_s=0.3)
+
+        started = time.perf_counter()
+        res = c.get_matrix(_DATE, include_mine_overlay=True, bypass_cache=True)
+        self.assertLess(time.perf_counter() - started, 0.2)
+        self.assertFalse(res["meta"]["mine_overlay_ok"])
+        self.assertIsNone(res["meta"]["mine_index_age_ms"])
+
+        deadline = time.time() + 2.0
+        while c.mine_order_index().is_stale() and time.time() < deadline:
+            time.sleep(0.02)
+        res = c.get_matrix(_DATE, include_mine_overlay=True, bypass_cache=True)
+        self.assertTrue(res["meta"]["mine_overlay_ok"])
+        self.assertEqual(res["matrix"][place][t0], "mine")
+        self.assertEqual(res["meta"]["mine_slots_count"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+"""通知后台发送：入队不阻塞、去重、近似消息合并、传输异常退避重试（零 pytest 依赖）。"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+
+import app as booker  # noqa: E402
+
+
+class TestNotificationDispatcher(unittest.TestCase):
+    def test_submit_does_not_wait_for_send(self):
+        d = booker.NotificationDispatcher(workers=1)
+        sent = []
+
+        def slow(content, targets, title):
+            time.sleep(0.3)
+            sent.append(content)
+            return True, "ok"
+
+        t0 = time.monotonic()
+        d.submit("sms", ["13800000000"], "hello", slow)
+        self.assertLess(time.monotonic() - t0, 0.1)
+        self.assertTrue(d.flush(3.0))
+        self.assertEqual(sent, ["hello"])
+        self.assertEqual(d.stats()["sent"], 1)
+
+    def test_dedup_and_coalesce_while_queued(self):
+        d = booker.NotificationDispatcher(workers=1)
+        gate = threading.Event()
+        sent = []
+
+        def fn(content, targets, title):
+            gate.wait(3.0)
+            sent.append(content)
+            return True, "ok"
+
+        d.submit("sms", ["1"], "blocker", fn)
+        time.sleep(0.05)
+        self.assertTrue(d.submit("sms", ["1"], "refill#3 截止 12 格", fn))
+        self.assertFalse(d.submit("sms", ["1"], "refill#3 截止 12 格", fn))
+        self.assertTrue(d.submit("sms", ["1"], "refill#4 截止 9 格", fn))
+        self.assertTrue(d.submit("sms", ["2"], "refill#4 截止 9 格", fn))
+        gate.set()
+        self.assertTrue(d.flush(3.0))
+        self.assertEqual(sorted(sent), sorted(["blocker", "refill#3 截止 12 格\nrefill#4 截止 9 格", "refill#4 截止 9 格"]))
+        self.assertFalse(d.submit("sms", ["1"], "blocker", fn))
+        st = d.stats()
+        self.assertEqual((st["deduped"], st["coalesced"], st["sent"]), (2, 1, 3))
+
+    def test_retry_with_backoff_on_transport_error(self):
+        d = booker.NotificationDispatcher(workers=1, max_attempts=3, backoff_s=(0.01,))
+        calls = []
+
+        def flaky(content, targets, title):
+            calls.append(1)
+            if len(calls) < 3:
+                raise booker.requests.ConnectionError("gateway down")
+            return True, "ok"
+
+        d.submit("pushplus", ["tok"], "x", flaky)
+        self.assertTrue(d.flush(3.0))
+        st = d.stats()
+        self.assertEqual((len(calls), st["retried"], st["sent"], st["failed"]), (3, 2, 1, 0))
+
+    def test_wechat_queues_one_job_per_token(self):
+        tm = booker.TaskManager.__new__(booker.TaskManager)
+        seen = []
+        tm._send_wechat_once = lambda content, token, title: seen.append((token, title)) or (True, "ok")
+        ok, _msg = tm.send_wechat_notification("任务成功 6#18", tokens="a,b", title="已预订")
+        self.assertTrue(ok)
+        self.assertTrue(booker.NOTIFY_DISPATCHER.flush(3.0))
+        self.assertEqual(sorted(seen), [("a", "已预订"), ("b", "已预订")])
+
+
+if __name__ == "__main__":
+    unittest.main()
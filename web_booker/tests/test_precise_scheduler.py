@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""自动任务定时器：按服务器对齐时间唤醒、sleep+spin 精度、提前量、刷新不重复触发（零 pytest 依赖）。"""
+import os
+import sys
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+
+import app as booker  # noqa: E402
+
+
+def _fixed_fires(fires):
+    """next_fire_fn：返回 fires 中第一个晚于 after 的时刻。"""
+    def _fn(after):
+        for dt in fires:
+            if dt > after:
+                return dt
+        return None
+    return _fn
+
+
+class TestPreciseSleep(unittest.TestCase):
+    def test_overshoot_is_small(self):
+        for _ in range(5):
+            target = time.perf_counter() + 0.05
+            late = booker.precise_sleep_until(target, spin_s=0.02)
+            self.assertGreaterEqual(late, 0.0)
+            self.assertLess(late, 0.005)
+
+
+class TestPreciseTaskScheduler(unittest.TestCase):
+    def setUp(self):
+        # 服务器比本机快 2 秒：唤醒点按服务器时间算
+        self.offset = timedelta(seconds=2)
+        self.sched = booker.PreciseTaskScheduler(
+            now_fn=lambda: datetime.now() + self.offset,
+            spin_s_fn=lambda: 0.03,
+        )
+
+    def tearDown(self):
+        self.sched.set_jobs([])
+
+    def test_fires_at_server_aligned_time_minus_lead(self):
+        fired = []
+        done = threading.Event()
+        now = datetime.now() + self.offset
+        fire_at = now + timedelta(seconds=0.4)
+
+        def cb(fire_dt, wake_error_ms):
+            fired.append((datetime.now() + self.offset, fire_dt, wake_error_ms))
+            done.set()
+
+        self.sched.set_jobs([{"key": 1, "next_fire_fn": _fixed_fires([fire_at]), "lead_s": 0.2, "callback": cb}])
+        self.assertTrue(done.wait(2.0))
+        actual, fire_dt, wake_error_ms = fired[0]
+        self.assertEqual(fire_dt, fire_at)
+        err_ms = (actual - (fire_at - timedelta(seconds=0.2))).total_seconds() * 1000.0
+        self.assertGreaterEqual(wake_error_ms, 0.0)
+        self.assertLess(wake_error_ms, 10.0)
+        self.assertLess(abs(err_ms), 15.0)
+        self.assertLess(abs(wake_error_ms - err_ms), 15.0)
+
+    def test_recurring_and_refresh_does_not_refire(self):
+        calls = []
+        lock = threading.Lock()
+        now = datetime.now() + self.offset
+        fires = [now + timedelta(seconds=0.15), now + timedelta(seconds=0.35)]
+
+        def cb(fire_dt, wake_error_ms):
+            with lock:
+                calls.append(fire_dt)
+
+        job = {"key": "t", "next_fire_fn": _fixed_fires(fires), "lead_s": 0.0, "callback": cb}
+        self.sched.set_jobs([job])
+        time.sleep(0.25)
+        # 第一次触发后刷新任务表：已触发的时刻不会重来，下一次照常
+        self.sched.set_jobs([job])
+        time.sleep(0.4)
+        with lock:
+            self.assertEqual(calls, fires)
+        self.assertEqual(len(self.sched.stats()["recent_wake_error_ms"]), 2)
+
+    def test_once_job_not_rescheduled(self):
+        calls = []
+        now = datetime.now() + self.offset
+        fires = [now + timedelta(seconds=0.1), now + timedelta(seconds=0.2)]
+        self.sched.set_jobs(
+            [{"key": "o", "next_fire_fn": _fixed_fires(fires), "lead_s": 0.0, "once": True, "callback": lambda f, e: calls.append(f)}]
+        )
+        time.sleep(0.4)
+        self.assertEqual(calls, fires[:1])
+        self.assertEqual(self.sched.stats()["upcoming"], [])
+
+
+class TestFireLead(unittest.TestCase):
+    def setUp(self):
+        self._orig = {k: booker.CONFIG.get(k) for k in ("task_fire_lead_seconds", "auto_preheat_enabled", "auto_preheat_window_seconds")}
+
+    def tearDown(self):
+        for k, v in self._orig.items():
+            if v is None:
+                booker.CONFIG.pop(k, None)
+            else:
+                booker.CONFIG[k] = v
+
+    def test_lead_covers_preheat_for_legacy_tasks(self):
+        booker.CONFIG["task_fire_lead_seconds"] = 3
+        booker.CONFIG["auto_preheat_enabled"] = True
+        booker.CONFIG["auto_preheat_window_seconds"] = 30
+        self.assertEqual(booker.task_fire_lead_seconds(None), 3.0)
+        legacy = {"config": {}}
+        if not booker.is_direct_task_config({}):
+            self.assertEqual(booker.task_fire_lead_seconds(legacy), 30.0)
+        booker.CONFIG["auto_preheat_enabled"] = False
+        self.assertEqual(booker.task_fire_lead_seconds(legacy), 3.0)
+
+    def test_preheat_probes_stop_before_post_interval(self):
+        orig = booker.CONFIG.get("delivery_min_post_interval_seconds")
+        try:
+            booker.CONFIG["delivery_min_post_interval_seconds"] = 2.0
+            self.assertEqual(booker.auto_preheat_probe_stop_seconds(), 5.0)
+            booker.CONFIG["delivery_min_post_interval_seconds"] = 8.0
+            self.assertEqual(booker.auto_preheat_probe_stop_seconds(), 8.0 + booker.AUTO_PREHEAT_POST_GAP_MARGIN_SECONDS)
+        finally:
+            if orig is None:
+                booker.CONFIG.pop("delivery_min_post_interval_seconds", None)
+            else:
+                booker.CONFIG["delivery_min_post_interval_seconds"] = orig
+
+
+if __name__ == "__main__":
+    unittest.main()
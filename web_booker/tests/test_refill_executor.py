@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""独立 refill 执行池：慢任务不阻塞其它任务、同任务在途不重复、同账号并发上限、账号间轮转（零 pytest 依赖）。"""
+import os
+import sys
+import threading
+import time
+import unittest
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+
+import app as booker  # noqa: E402
+
+
+class TestRefillExecutor(unittest.TestCase):
+    def test_slow_task_does_not_block_other_accounts(self):
+        ex = booker.RefillExecutor(workers=2, per_account_limit=1)
+        gate = threading.Event()
+        done = threading.Event()
+        self.assertTrue(ex.submit(1, "acc-a", lambda: gate.wait(3.0)))
+        self.assertTrue(ex.submit(2, "acc-b", done.set))
+        self.assertTrue(done.wait(1.0))
+        self.assertTrue(ex.is_busy(1))
+        gate.set()
+        self.assertTrue(ex.flush(3.0))
+        self.assertFalse(ex.is_busy(1))
+        self.assertEqual(ex.stats()["completed"], 2)
+
+    def test_in_flight_task_is_rejected(self):
+        ex = booker.RefillExecutor(workers=2, per_account_limit=2)
+        gate = threading.Event()
+        self.assertTrue(ex.submit(7, "acc-a", lambda: gate.wait(3.0)))
+        self.assertFalse(ex.submit(7, "acc-a", lambda: None))
+        gate.set()
+        self.assertTrue(ex.flush(3.0))
+        self.assertTrue(ex.submit(7, "acc-a", lambda: None))
+        self.assertTrue(ex.flush(3.0))
+        st = ex.stats()
+        self.assertEqual(st["rejected_busy"], 1)
+        self.assertEqual(st["completed"], 2)
+
+    def test_per_account_limit_and_round_robin(self):
+        ex = booker.RefillExecutor(workers=4, per_account_limit=1)
+        lock = threading.Lock()
+        running = {}
+        peak = {}
+        order = []
+
+        def job(acc, tid):
+            def _fn():
+                with lock:
+                    running[acc] = running.get(acc, 0) + 1
+                    peak[acc] = max(peak.get(acc, 0), running[acc])
+                    order.append(tid)
+                time.sleep(0.05)
+                with lock:
+                    running[acc] -= 1
+            return _fn
+
+        for i in range(3):
+            ex.submit(f"a{i}", "acc-a", job("acc-a", f"a{i}"))
+        for i in range(3):
+            ex.submit(f"b{i}", "acc-b", job("acc-b", f"b{i}"))
+        self.assertTrue(ex.flush(5.0))
+        self.assertEqual(peak, {"acc-a": 1, "acc-b": 1})
+        # 同账号内先到先跑
+        self.assertEqual([x for x in order if x.startswith("a")], ["a0", "a1", "a2"])
+        self.assertEqual([x for x in order if x.startswith("b")], ["b0", "b1", "b2"])
+
+
+class TestRefillSchedulerTick(unittest.TestCase):
+    def setUp(self):
+        self.tm = booker.task_manager
+        self._orig_tasks = self.tm.refill_tasks
+        self._orig_last_run = dict(self.tm._refill_last_run)
+        self._orig_executor = self.tm.refill_executor
+        self._orig_pause = getattr(self.tm, "_refill_global_pause_until_ms", 0)
+        self._orig_resolve = booker.resolve_task_account_and_scope
+        self._orig_quiet = booker.quiet_window_block_info
+        self._orig_save = self.tm.save_refill_tasks
+        self._orig_run_once = self.tm._run_refill_task_once
+        self.tm._refill_global_pause_until_ms = 0
+        self.tm.refill_executor = booker.RefillExecutor(workers=4, per_account_limit=1)
+        self.tm.save_refill_tasks = lambda: None
+        booker.resolve_task_account_and_scope = lambda t: ({"id": t.get("accountId")}, None, "")
+        booker.quiet_window_block_info = lambda *a, **k: None
+
+    def tearDown(self):
+        self.tm.refill_executor.flush(3.0)
+        self.tm.refill_tasks = self._orig_tasks
+        self.tm._refill_last_run = self._orig_last_run
+        self.tm.refill_executor = self._orig_executor
+        self.tm._refill_global_pause_until_ms = self._orig_pause
+        self.tm.save_refill_tasks = self._orig_save
+        self.tm._run_refill_task_once = self._orig_run_once
+        booker.resolve_task_account_and_scope = self._orig_resolve
+        booker.quiet_window_block_info = self._orig_quiet
+
+    def test_tick_returns_while_task_runs_and_skips_in_flight(self):
+        gate = threading.Event()
+        calls = []
+
+        def fake_once(task, source="auto"):
+            calls.append(task["id"])
+            if task["id"] == 1:
+                gate.wait(3.0)
+            return {"status": "success", "msg": "ok"}
+
+        self.tm._run_refill_task_once = fake_once
+        self.tm.refill_tasks = [
+            {"id": 1, "enabled": True, "interval_seconds": 1, "accountId": "a"},
+            {"id": 2, "enabled": True, "interval_seconds": 1, "accountId": "b"},
+        ]
+        self.tm._refill_last_run = {}
+        t0 = time.monotonic()
+        self.tm.run_refill_scheduler_tick()
+        self.assertLess(time.monotonic() - t0, 0.5)
+        self.assertTrue(self.tm.refill_executor.is_busy(1))
+
+        # 任务 1 仍在执行：再次到期也不重复提交
+        self.tm._refill_last_run = {}
+        self.tm.run_refill_scheduler_tick()
+        self.assertEqual(self.tm.refill_executor.stats()["rejected_busy"], 0)
+        gate.set()
+        self.assertTrue(self.tm.refill_executor.flush(3.0))
+        self.assertEqual(calls.count(1), 1)
+        self.assertEqual(self.tm.refill_tasks[0]["last_result"]["status"], "success")
+        self.assertEqual(len(self.tm.refill_tasks[1]["exec_history"]), calls.count(2))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+"""refill_tasks.json 落盘：写后合并、最长拖延、原子写与 .tmp/.bak 恢复、写失败重试、运行时状态不落盘（零 pytest 依赖）。"""
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+
+import app as booker  # noqa: E402
+
+
+def _wait_for(pred, timeout=2.0):
+    deadline = time.time() + timeout
+    while not pred() and time.time() < deadline:
+        time.sleep(0.01)
+    return pred()
+
+
+class TestDebouncedJsonWriter(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "refill_tasks.json")
+        self.data = []
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _read(self):
+        with open(self.path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def test_burst_of_marks_coalesces_into_one_write(self):
+        w = booker.DebouncedJsonWriter(self.path, lambda: list(self.data), debounce_s=0.05, max_delay_s=1.0)
+        for i in range(20):
+            self.data.append(i)
+            w.mark_dirty()
+        self.assertTrue(_wait_for(lambda: w.stats()["writes"] >= 1))
+        time.sleep(0.1)
+        st = w.stats()
+        self.assertEqual(st["writes"], 1)
+        self.assertEqual(st["coalesced"], 19)
+        self.assertEqual(self._read(), list(range(20)))
+
+    def test_continuous_marks_bounded_by_max_delay(self):
+        w = booker.DebouncedJsonWriter(self.path, lambda: list(self.data), debounce_s=0.1, max_delay_s=0.15)
+        t_end = time.time() + 0.4
+        while time.time() < t_end:
+            self.data.append(1)
+            w.mark_dirty()
+            time.sleep(0.02)
+        # 一直在改也不会无限推迟：期间至少已写一次
+        self.assertGreaterEqual(w.stats()["writes"], 1)
+        self.assertTrue(w.flush())
+        self.assertEqual(len(self._read()), len(self.data))
+
+    def test_failed_write_keeps_dirty_and_retries(self):
+        calls = {"n": 0}
+
+        def snap():
+            calls["n"] += 1
+            if calls["n"] == 1:
+                raise OSError("disk full")
+            return [1]
+
+        w = booker.DebouncedJsonWriter(self.path, snap, debounce_s=10.0)
+        w.mark_dirty()
+        self.assertFalse(w.flush())
+        self.assertTrue(w.is_dirty())
+        self.assertTrue(w.flush())
+        self.assertFalse(w.is_dirty())
+        self.assertEqual(self._read(), [1])
+        self.assertEqual(w.stats()["errors"], 1)
+
+
+class TestAtomicJsonRecovery(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "refill_tasks.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_corrupt_main_falls_back_to_backup(self):
+        booker.write_json_atomic(self.path, [1], keep_backup=True)
+        booker.write_json_atomic(self.path, [1, 2], keep_backup=True)
+        self.assertFalse(os.path.exists(self.path + ".tmp"))
+        self.assertEqual(booker.read_json_recovering(self.path), ([1, 2], self.path))
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write('[{"id": 1, "da')
+        self.assertEqual(booker.read_json_recovering(self.path), ([1], self.path + ".bak"))
+
+    def test_crash_between_renames_recovers_from_tmp(self):
+        booker.write_json_atomic(self.path, [1], keep_backup=True)
+        with open(self.path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump([1, 2, 3], f)
+        os.replace(self.path, self.path + ".bak")
+        self.assertEqual(booker.read_json_recovering(self.path), ([1, 2, 3], self.path + ".tmp"))
+        self.assertEqual(booker.read_json_recovering(os.path.join(self.dir, "none.json")), (None, None))
+
+
+class TestRefillTasksSnapshot(unittest.TestCase):
+    def setUp(self):
+        self.tm = booker.task_manager
+        self._orig_tasks = self.tm.refill_tasks
+        self._orig_persisted = self.tm._refill_persisted_results
+        self.tm._refill_persisted_results = {}
+
+    def tearDown(self):
+        self.tm.refill_tasks = self._orig_tasks
+        self.tm._refill_persisted_results = self._orig_persisted
+
+    def test_running_marker_not_persisted(self):
+        running = {"status": "running", "msg": "自动轮询执行中"}
+        self.tm.refill_tasks = [
+            {"id": 1, "last_result": running},
+            {"id": 2, "last_result": {"status": "success", "msg": "ok"}},
+        ]
+        snap = self.tm._refill_tasks_snapshot()
+        self.assertIsNone(snap[0]["last_result"])
+        self.assertEqual(snap[1]["last_result"]["status"], "success")
+        # 内存中的任务不受影响
+        self.assertIs(self.tm.refill_tasks[0]["last_result"], running)
+
+    def test_running_keeps_previous_persisted_result(self):
+        done = {"status": "success", "msg": "上一轮"}
+        task = {"id": 7, "last_result": done}
+        self.tm.refill_tasks = [task]
+        self.assertEqual(self.tm._refill_tasks_snapshot()[0]["last_result"], done)
+        # 执行中时别的写入合并落盘：沿用上一轮结果而不是 None
+        task["last_result"] = {"status": "running", "msg": "自动轮询执行中"}
+        self.assertEqual(self.tm._refill_tasks_snapshot()[0]["last_result"], done)
+        task["last_result"] = {"status": "error", "msg": "新一轮"}
+        self.assertEqual(self.tm._refill_tasks_snapshot()[0]["last_result"]["status"], "error")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""任务指标分段存储：只追加、换段、索引筛选、读取即按保留口径、后台压缩、旧文件导入（零 pytest 依赖）。"""
+import copy
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+
+import app as booker  # noqa: E402
+
+
+def _rec(i, ts_ms=None, **kw):
+    r = {"task_id": i % 3, "source": "manual" if i % 2 else "auto", "finished_at": ts_ms or int(time.time() * 1000), "seq": i}
+    r.update(kw)
+    return r
+
+
+class TestRunMetricsStore(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self._orig_cfg = {k: booker.CONFIG.get(k) for k in ("metrics_keep_last", "metrics_retention_days")}
+        booker.CONFIG["metrics_keep_last"] = 300
+        booker.CONFIG["metrics_retention_days"] = 7
+
+    def tearDown(self):
+        booker.CONFIG.update(self._orig_cfg)
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _store(self, **kw):
+        return booker.RunMetricsStore(
+            directory=os.path.join(self.dir, "m"), legacy_file=os.path.join(self.dir, "legacy.json"), auto_compact=False, **kw
+        )
+
+    def test_append_rotate_and_indexed_query(self):
+        st = self._store(segment_max_records=4)
+        for i in range(10):
+            st.append(_rec(i))
+        self.assertEqual(len(os.listdir(os.path.join(self.dir, "m"))), 3)
+        self.assertEqual([r["seq"] for r in st.query(limit=3)], [7, 8, 9])
+        self.assertEqual([r["seq"] for r in st.query(task_id=1)], [1, 4, 7])
+        self.assertEqual([r["seq"] for r in st.query(source="manual", limit=2)], [7, 9])
+        # 重新打开：索引由段文件重建，结果一致
+        again = self._store(segment_max_records=4)
+        self.assertEqual([r["seq"] for r in again.query()], list(range(10)))
+
+    def test_unlock_filter_and_partial_line(self):
+        st = self._store()
+        st.append(_rec(0))
+        st.append(_rec(1, saw_locked=True, unlocked_after_locked=True))
+        seg = os.path.join(self.dir, "m", st.stats()["active_segment"])
+        with open(seg, "ab") as f:
+            f.write(b'{"seq": 99')
+        again = self._store()
+        self.assertEqual([r["seq"] for r in again.query(unlock_only=True)], [1])
+        again.append(_rec(2))
+        self.assertEqual([r["seq"] for r in again.query()], [0, 1, 2])
+
+    def test_retention_applies_on_read_and_compaction_drops_segments(self):
+        st = self._store(segment_max_records=2)
+        old_ts = int((time.time() - 10 * 24 * 3600) * 1000)
+        for i in range(4):
+            st.append(_rec(i, ts_ms=old_ts))
+        for i in range(4, 7):
+            st.append(_rec(i))
+        self.assertEqual([r["seq"] for r in st.query()], [4, 5, 6])
+        st.compact()
+        stats = st.stats()
+        self.assertEqual(stats["segments_deleted"], 2)
+        self.assertEqual(stats["indexed_records"], 3)
+        self.assertEqual([r["seq"] for r in self._store(segment_max_records=2).query()], [4, 5, 6])
+
+    def test_compaction_rewrites_mostly_dead_segment(self):
+        # 4 条一段、保留最近 50 条：前两段整段删，seg3 的 8..11 过期一半 → 重写
+        st = self._store(segment_max_records=4)
+        booker.CONFIG["metrics_keep_last"] = 50
+        for i in range(60):
+            st.append(_rec(i))
+        st.compact()
+        self.assertEqual([r["seq"] for r in st.query()], list(range(10, 60)))
+        self.assertEqual((st.stats()["segments_deleted"], st.stats()["segments_rewritten"]), (2, 1))
+        self.assertEqual([r["seq"] for r in self._store(segment_max_records=4).query()], list(range(10, 60)))
+
+    def test_background_compaction_after_rotation(self):
+        st = booker.RunMetricsStore(directory=os.path.join(self.dir, "bg"), legacy_file=None, segment_max_records=2)
+        old_ts = int((time.time() - 10 * 24 * 3600) * 1000)
+        for i in range(2):
+            st.append(_rec(i, ts_ms=old_ts))
+        st.append(_rec(2))
+        deadline = time.time() + 3.0
+        while st.stats()["segments_deleted"] < 1 and time.time() < deadline:
+            time.sleep(0.02)
+        self.assertEqual(st.stats()["segments_deleted"], 1)
+        self.assertEqual([r["seq"] for r in st.query()], [2])
+
+    def test_legacy_file_imported_once(self):
+        with open(os.path.join(self.dir, "legacy.json"), "w", encoding="utf-8") as f:
+            json.dump([_rec(0), _rec(1)], f)
+        st = self._store()
+        self.assertEqual([r["seq"] for r in st.query()], [0, 1])
+        self.assertFalse(os.path.exists(os.path.join(self.dir, "legacy.json")))
+        self.assertTrue(os.path.exists(os.path.join(self.dir, "legacy.json.migrated")))
+
+
+class TestRunMetricsApi(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self._orig_store = booker.RUN_METRICS_STORE
+        self._orig_web_ui = copy.deepcopy(booker.CONFIG.get("web_ui_auth") or {})
+        booker.CONFIG["web_ui_auth"] = {"enabled": False}
+        booker.RUN_METRICS_STORE = booker.RunMetricsStore(directory=self.dir, legacy_file=None)
+
+    def tearDown(self):
+        booker.RUN_METRICS_STORE = self._orig_store
+        booker.CONFIG["web_ui_auth"] = self._orig_web_ui
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def test_endpoints_read_store(self):
+        for i in range(5):
+            booker.append_task_run_metric(_rec(i, saw_locked=(i >= 3), unlocked_after_locked=True))
+        c = booker.app.test_client()
+        j = c.get("/api/run-metrics/export?limit=2&source=all").get_json()
+        self.assertEqual([r["seq"] for r in j["records"]], [3, 4])
+        self.assertIn("finished_at_readable", j["records"][0])
+        j = c.get("/api/run-metrics?unlock_only=1&source=all").get_json()
+        self.assertEqual([r["seq"] for r in j["records"]], [3, 4])
+        self.assertEqual(j["summary"]["total_runs"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
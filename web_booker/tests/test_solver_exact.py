@@ -0,0 +1,145 @@
+# -*- coding: utf-8 -*-
+"""mode=exact 与现有 strict/aggressive（总格数最大化路径）对拍：总格数、分数一致（零 pytest 依赖）。"""
+import os
+import random
+import sys
+import unittest
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+
+import app as booker  # noqa: E402
+
+_TIMES = ["18:00", "19:00", "20:00", "21:00"]
+
+
+def _random_matrix(rng, n_places=20, p_avail=0.45):
+    states = ("booked", "mine", "locked")
+    return {
+        str(p): {t: ("available" if rng.random() < p_avail else rng.choice(states)) for t in _TIMES}
+        for p in range(1, n_places + 1)
+    }
+
+
+def _cells(solved):
+    return len((solved or {}).get("items") or [])
+
+
+class TestExactSolverParity(unittest.TestCase):
+    def _intent(self, rng, consecutive, need=None):
+        n_times = rng.randint(1, 3)
+        times = _TIMES[:n_times]
+        intent = {
+            "target_blocks": rng.randint(1, 3),
+            "target_times": times,
+            "time_preference_order": list(reversed(times)) if rng.random() < 0.5 else list(times),
+            "selectable_place_min": 1,
+            "selectable_place_max": 20,
+            "require_consecutive": consecutive,
+            "solver_max_total_cells": True,
+            "solver_scoring": "auto_time_consecutive",
+        }
+        if rng.random() < 0.5:
+            intent["preferred_place_min"] = 5
+            intent["preferred_place_max"] = 12
+        if need:
+            intent["need_by_time"] = {t: rng.randint(0, 3) for t in times}
+            intent["monotone_need_relax"] = True
+        return intent
+
+    def test_parity_with_aggressive_max_total(self):
+        rng = random.Random(20261018)
+        places = [str(p) for p in range(1, 21)]
+        for _ in range(150):
+            matrix = _random_matrix(rng, p_avail=rng.choice([0.15, 0.4, 0.7]))
+            consecutive = rng.random() < 0.7
+            intent = self._intent(rng, consecutive)
+            ref = booker.solve_candidate_from_matrix(matrix, places, intent, mode="aggressive")
+            ex = booker.solve_candidate_from_matrix(matrix, places, intent, mode="exact")
+            self.assertEqual(_cells(ref), _cells(ex), (intent, matrix))
+            if consecutive and ref:
+                self.assertAlmostEqual(float(ref["score"]), float(ex["score"]), places=6)
+
+    def test_parity_with_strict_need_relax(self):
+        rng = random.Random(7)
+        places = [str(p) for p in range(1, 21)]
+        for _ in range(150):
+            matrix = _random_matrix(rng, p_avail=rng.choice([0.2, 0.5]))
+            consecutive = rng.random() < 0.7
+            intent = self._intent(rng, consecutive, need=True)
+            if not any(intent["need_by_time"].values()):
+                continue
+            ref = booker.solve_candidate_from_matrix(matrix, places, intent, mode="strict")
+            ex = booker.solve_candidate_from_matrix(matrix, places, intent, mode="exact")
+            self.assertEqual(_cells(ref), _cells(ex), (intent, matrix))
+            if consecutive and ref:
+                self.assertAlmostEqual(float(ref["score"]), float(ex["score"]), places=6)
+
+    def test_exact_never_worse_than_full_strict(self):
+        rng = random.Random(11)
+        places = [str(p) for p in range(1, 21)]
+        for _ in range(100):
+            matrix = _random_matrix(rng)
+            intent = self._intent(rng, True)
+            strict = booker.solve_candidate_from_matrix(matrix, places, intent, mode="strict")
+            ex = booker.solve_candidate_from_matrix(matrix, places, intent, mode="exact")
+            if strict:
+                self.assertGreaterEqual(_cells(ex), _cells(strict))
+
+    def test_return_shape(self):
+        matrix = {"1": {"18:00": "available"}, "2": {"18:00": "available"}, "3": {"18:00": "booked"}}
+        intent = {"target_blocks": 3, "target_times": ["18:00"], "require_consecutive": True}
+        ex = booker.solve_candidate_from_matrix(matrix, ["1", "2", "3"], intent, mode="exact")
+        self.assertEqual(set(ex.keys()), {"items", "level_index", "level_spec", "score"})
+        self.assertEqual(ex["items"], [{"place": "1", "time": "18:00"}, {"place": "2", "time": "18:00"}])
+        self.assertEqual(ex["level_spec"], {"18:00": 2})
+        self.assertIsNone(booker.solve_candidate_from_matrix({"1": {"18:00": "booked"}}, ["1"], intent, mode="exact"))
+
+
+
+class TestSolverExactFlag(unittest.TestCase):
+    def setUp(self):
+        self._orig = booker.CONFIG.get("delivery_solver_exact")
+
+    def tearDown(self):
+        booker.CONFIG["delivery_solver_exact"] = self._orig
+
+    def test_task_config_overrides_global(self):
+        booker.CONFIG["delivery_solver_exact"] = False
+        self.assertFalse(booker.delivery_solver_exact_enabled())
+        self.assertFalse(booker.delivery_solver_exact_enabled({}))
+        self.assertTrue(booker.delivery_solver_exact_enabled({"delivery_solver_exact": True}))
+        self.assertTrue(booker.delivery_solver_exact_enabled({"delivery_solver_exact": "yes"}))
+        booker.CONFIG["delivery_solver_exact"] = True
+        self.assertFalse(booker.delivery_solver_exact_enabled({"delivery_solver_exact": "false"}))
+        self.assertTrue(booker.delivery_solver_exact_enabled(None))
+
+    def test_first_group_uses_task_level_flag(self):
+        booker.CONFIG["delivery_solver_exact"] = False
+        matrix = {str(p): {"18:00": "available", "19:00": "available"} for p in range(1, 5)}
+        cfg = {
+            "delivery_target_blocks": 2,
+            "delivery_first_group_times": ["18:00", "19:00"],
+            "delivery_matrix_place_min": 1,
+            "delivery_matrix_place_max": 4,
+            "delivery_solver_exact": True,
+        }
+        seen = []
+        orig_solve = booker.solve_candidate_from_matrix
+
+        def _spy(matrix, places, intent, mode="strict"):
+            seen.append(mode)
+            return orig_solve(matrix, places, intent, mode=mode)
+
+        booker.solve_candidate_from_matrix = _spy
+        try:
+            items, _ = booker.compute_first_group_from_matrix(matrix, list(matrix), ["18:00", "19:00"], cfg)
+        finally:
+            booker.solve_candidate_from_matrix = orig_solve
+        self.assertEqual(seen, ["exact"])
+        self.assertEqual(len(items), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""求解档位表 LRU：命中/未命中计数、淘汰、只读且与原构造函数一致（零 pytest 依赖）。"""
+import os
+import sys
+import unittest
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+
+import app as booker  # noqa: E402
+
+
+class TestSolverPlanCache(unittest.TestCase):
+    def test_lru_hits_misses_and_eviction(self):
+        cache = booker.SolverPlanCache(maxsize=2)
+        builds = []
+
+        def build(v):
+            def _b():
+                builds.append(v)
+                return (v,)
+            return _b
+
+        cache.get("a", build("a"))
+        cache.get("a", build("a"))
+        cache.get("b", build("b"))
+        cache.get("c", build("c"))
+        cache.get("a", build("a"))
+        self.assertEqual(builds, ["a", "b", "c", "a"])
+        st = cache.stats()
+        self.assertEqual((st["hits"], st["misses"], st["size"]), (1, 4, 2))
+        self.assertEqual(cache.thread_counters(), (1, 4))
+
+    def test_cached_plans_match_builders_and_are_readonly(self):
+        order = ["18:00", "19:00"]
+        lv = booker.cached_level_plan("monotone_total", 2, order, order)
+        self.assertEqual([dict(x) for x in lv], booker._build_monotone_total_budget_levels(2, order, order))
+        self.assertIs(lv, booker.cached_level_plan("monotone_total", 2, order, order))
+        with self.assertRaises(TypeError):
+            lv[0]["18:00"] = 9
+        by_s = booker.cached_level_plan("enum_need", order, {"18:00": 2, "19:00": 1})
+        raw = booker._enumerate_need_specs_by_total(order, {"18:00": 2, "19:00": 1})
+        self.assertEqual({s: [dict(x) for x in v] for s, v in by_s.items()}, raw)
+
+    def test_repeated_solve_hits_cache(self):
+        matrix = {"1": {"18:00": "available", "19:00": "available"}, "2": {"18:00": "available", "19:00": "booked"}}
+        intent = {
+            "target_blocks": 2,
+            "target_times": ["18:00", "19:00"],
+            "time_preference_order": ["18:00", "19:00"],
+            "solver_max_total_cells": True,
+        }
+        booker.solve_candidate_from_matrix(matrix, ["1", "2"], intent, mode="aggressive")
+        h0, m0 = booker.SOLVER_PLAN_CACHE.thread_counters()
+        first = booker.solve_candidate_from_matrix(matrix, ["1", "2"], intent, mode="aggressive")
+        h1, m1 = booker.SOLVER_PLAN_CACHE.thread_counters()
+        self.assertEqual((h1 - h0, m1 - m0), (1, 0))
+        self.assertEqual(first["items"], booker.solve_candidate_from_matrix(matrix, ["1", "2"], intent, mode="aggressive")["items"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""StateSampler 环形桶：按秒槽位过期、同秒覆盖、滚动合计、按 key 的迁移速率与 locked 推荐（零 pytest 依赖）。"""
+import os
+import sys
+import unittest
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+
+import app as booker  # noqa: E402
+
+
+class TestSecondRing(unittest.TestCase):
+    def test_window_eviction_and_replace(self):
+        ring = booker._SecondRing(5, 3)
+        ring.add(100, [1, 0, 0])
+        ring.add(100, [2, 0, 0], replace=True)
+        ring.add(102, [0, 3, 0])
+        self.assertEqual((ring.totals, ring.live), ([2, 3, 0], 2))
+        # 窗口 (now-5, now]：105 时 100 过期，102 仍在
+        ring.add(105, [0, 0, 1])
+        self.assertEqual((ring.totals, ring.live), ([0, 3, 1], 2))
+        ring.evict(107)
+        self.assertEqual(ring.totals, [0, 0, 1])
+        ring.evict(1000)
+        self.assertEqual((ring.totals, ring.live), ([0, 0, 0], 0))
+        ring.add(1000, [1, 1, 1])
+        ring.add(1000, [1, 0, 0])
+        self.assertEqual(ring.totals, [2, 1, 1])
+
+
+class TestStateSampler(unittest.TestCase):
+    def test_same_second_overwrites_and_states_merged(self):
+        sampler = booker.StateSampler()
+        sampler.ingest_counts({1: 10, 4: 2})
+        sampler.ingest_counts({1: 8, 4: 4})
+        snap = sampler.snapshot()
+        self.assertEqual(snap["seconds"], 1)
+        self.assertEqual(snap["states"], {1: 8, 4: 4})
+        self.assertEqual(snap["transitions_per_min"], {})
+
+    def test_transitions_per_key_and_inflow_recommendation(self):
+        sampler = booker.StateSampler()
+        sampler.ingest_counts({1: 200, 4: 20}, key=("1001", "d1"))
+        sampler.ingest_counts({1: 50, 4: 20}, key=("1001", "d2"))
+        # 同一 key：4 格由可订变为 6（锁定），计数里 6 只占 4 格，低于 5% 可订阈值，但一分钟内流入达标
+        sampler.ingest_counts({1: 196, 4: 20, 6: 4}, key=("1001", "d1"))
+        snap = sampler.snapshot()
+        self.assertEqual(snap["transitions_per_min"], {1: {"in": 0, "out": 4}, 6: {"in": 4, "out": 0}})
+        self.assertEqual(snap["recommended_locked_states"], [6])
+        self.assertEqual(snap["states"][6], 4)
+
+    def test_key_separates_accounts(self):
+        a = booker.ApiClient(inherit_global_auth=False)
+        b = booker.ApiClient(inherit_global_auth=False)
+        a.shop_num = b.shop_num = "1001"
+        a.token, b.token = "ta", "tb"
+        ka, kb = booker.state_sampler_key(a, "d1"), booker.state_sampler_key(b, "d1")
+        self.assertNotEqual(ka, kb)
+        sampler = booker.StateSampler()
+        # 两个账号交替拉同一天：各自的 mine（state 2）不同，不应算作流转
+        sampler.ingest_counts({1: 100, 2: 3}, key=ka)
+        sampler.ingest_counts({1: 100, 4: 3}, key=kb)
+        sampler.ingest_counts({1: 100, 2: 3}, key=ka)
+        self.assertEqual(sampler.snapshot()["transitions_per_min"], {})
+
+    def test_state_columns_are_bounded(self):
+        sampler = booker.StateSampler(max_states=3)
+        sampler.ingest_counts({1: 1, 2: 1, 3: 1, 9: 1})
+        self.assertEqual(sampler.snapshot()["states"], {-999: 2, 1: 1, 2: 1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""前端静态包：指纹 URL 长期缓存 + ETag 304、gzip 协商、页面按 page_mode 记忆渲染且只注入引导数据（零 pytest 依赖）。"""
+import copy
+import gzip
+import os
+import re
+import sys
+import unittest
+
+_WEB_BOOKER_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _WEB_BOOKER_DIR not in sys.path:
+    sys.path.insert(0, _WEB_BOOKER_DIR)
+
+import app as booker  # noqa: E402
+
+
+class TestStaticAssets(unittest.TestCase):
+    def setUp(self):
+        self._orig_web_ui = copy.deepcopy(booker.CONFIG.get("web_ui_auth") or {})
+        booker.CONFIG["web_ui_auth"] = {"enabled": False}
+        self.client = booker.app.test_client()
+
+    def tearDown(self):
+        booker.CONFIG["web_ui_auth"] = self._orig_web_ui
+
+    def test_fingerprinted_asset_cache_headers_and_304(self):
+        url = booker.STATIC_ASSETS.url("app.js")
+        self.assertRegex(url, r"^/assets/app\.[0-9a-f]{12}\.js$")
+        with open(os.path.join(_WEB_BOOKER_DIR, "static", "app.js"), "rb") as f:
+            raw = f.read()
+
+        resp = self.client.get(url)
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.data, raw)
+        self.assertIn("immutable", resp.headers["Cache-Control"])
+        etag = resp.headers["ETag"]
+        self.assertEqual(self.client.get(url, headers={"If-None-Match": etag}).status_code, 304)
+
+        gz = self.client.get(url, headers={"Accept-Encoding": "gzip, deflate"})
+        self.assertEqual(gz.headers["Content-Encoding"], "gzip")
+        self.assertEqual(gzip.decompress(gz.data), raw)
+        self.assertNotEqual(gz.headers["ETag"], etag)
+
+        self.assertEqual(self.client.get("/assets/app.000000000000.js").status_code, 404)
+
+    def test_pages_memoized_per_mode_with_boot_data(self):
+        booker._PAGE_RENDER_CACHE.clear()
+        resp = self.client.get("/tasks")
+        self.assertEqual(resp.status_code, 200)
+        body = resp.get_data(as_text=True)
+        self.assertIn(booker.STATIC_ASSETS.url("app.css"), body)
+        self.assertIn(booker.STATIC_ASSETS.url("app.js"), body)
+        boot = re.search(r"window\.BEIJINTICK_BOOT = (\{.*?\});", body).group(1)
+        self.assertIn('"page_mode": "tasks"', boot)
+        # 页面本身不再内联大段脚本/样式
+        self.assertLess(len(body), 100 * 1024)
+        self.assertNotIn("function renderTable", body)
+
+        cached = dict(booker._PAGE_RENDER_CACHE)
+        self.assertEqual([k[0] for k in cached], ["tasks"])
+        again = self.client.get("/tasks")
+        self.assertEqual(again.get_data(as_text=True), body)
+        self.assertEqual(booker._PAGE_RENDER_CACHE, cached)
+        self.assertEqual(self.client.get("/tasks", headers={"If-None-Match": resp.headers["ETag"]}).status_code, 304)
+
+        semi = self.client.get("/").get_data(as_text=True)
+        self.assertIn('"page_mode": "semi"', semi)
+        self.assertIn('class="date-btn active"', semi)
+
+
+if __name__ == "__main__":
+    unittest.main()
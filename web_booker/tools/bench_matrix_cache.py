@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+矩阵缓存命中开销对比：旧实现 json.dumps/json.loads 深拷贝 vs 现实现共享只读 FrozenDict。
+
+不发任何网络请求：构造与线上同规模的矩阵结果塞进 ApiClient._matrix_cache，反复 get_matrix 命中。
+
+用法：
+  cd web_booker
+  python tools/bench_matrix_cache.py --places 20 --times 16 --iterations 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import time
+
+WEB_BOOKER_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _build_result(n_places: int, n_times: int) -> dict:
+    states = ("available", "locked", "booked", "mine")
+    places = [str(i) for i in range(1, n_places + 1)]
+    times = [f"{8 + i // 2:02d}:{'30' if i % 2 else '00'}" for i in range(n_times)]
+    matrix = {p: {t: states[(int(p) + j) % len(states)] for j, t in enumerate(times)} for p in places}
+    return {
+        "places": places,
+        "times": times,
+        "matrix": matrix,
+        "meta": {
+            "mine_overlay_ok": False,
+            "mine_slots_count": 0,
+            "mine_overlay_error": "",
+            "date_booking_scope": "open",
+            "last_day_open_time": "12:00:00",
+        },
+    }
+
+
+def _per_op_us(fn, iterations: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - t0) * 1e6 / iterations
+
+
+def main() -> None:
+    os.chdir(WEB_BOOKER_ROOT)
+    if WEB_BOOKER_ROOT not in sys.path:
+        sys.path.insert(0, WEB_BOOKER_ROOT)
+    # import app 会加载全模块；跳过后台调度，避免仅跑基准时拉起定时线程
+    os.environ["BEIJINTICK_SKIP_IMPORT_SCHEDULER"] = "1"
+
+    parser = argparse.ArgumentParser(description="get_matrix 缓存命中单次耗时对比")
+    parser.add_argument("--places", type=int, default=20)
+    parser.add_argument("--times", type=int, default=16)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    import app as booker  # noqa: E402
+
+    raw = _build_result(max(1, args.places), max(1, args.times))
+    frozen = booker.freeze_matrix_result(raw)
+    client = booker.ApiClient(inherit_global_auth=False)
+    client._matrix_cache_window_s = 3600.0
+    client._matrix_cache[("2026-01-01", False)] = {"ts": time.time(), "data": frozen}
+
+    before_us = _per_op_us(lambda: json.loads(json.dumps(raw)), args.iterations)
+    after_us = _per_op_us(lambda: client.get_matrix("2026-01-01", include_mine_overlay=False), args.iterations)
+    thaw_us = _per_op_us(lambda: booker.thaw_matrix_result(frozen), args.iterations)
+
+    print(f"matrix={args.places}x{args.times} iterations={args.iterations}")
+    print(f"  before  json 往返深拷贝        {before_us:9.2f} us/hit")
+    print(f"  after   get_matrix 共享命中     {after_us:9.2f} us/hit")
+    print(f"  (按需) thaw_matrix_result      {thaw_us:9.2f} us/op")
+    if after_us > 0:
+        print(f"  speedup x{before_us / after_us:.1f}")
+
+
+if __name__ == "__main__":
+    main()
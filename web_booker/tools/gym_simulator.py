@@ -0,0 +1,499 @@
+#!/usr/bin/env python3
+"""
+离线馆方模拟器：本地 HTTP 仿 getPlaceInfoByShortName / reservationPlace / getPlaceOrder，
+用于不打真实馆方的情况下回放开约高峰、对比递送策略。
+
+- 售罄曲线：开约后 t 秒内被「他人」抢走的格子比例（分段线性，--sellout "0:0,1:0.35,3:0.7,10:0.9"）
+- 「操作过快」：同 token 两次 reservationPlace 间隔小于 --rate-limit-interval 时拒单（与线上 min_post_interval 同义）
+- 时延：矩阵/下单/订单分别按样本重放；--fit-logs 从任务指标（task_run_metrics/seg_*.ndjson）的 post_latencies_ms（单次 POST）、
+  logs/run_*.log 的「矩阵完成 ... elapsed_ms=」拟合，否则按 --matrix-ms / --post-ms 中位数的对数正态
+
+ApiClient 指向模拟器：设环境变量 BEIJINTICK_GYM_BASE_URL=http://127.0.0.1:8765 后启动 app，
+或代码里 client.gym_base_url = server.base_url。
+
+用法：
+  cd web_booker
+  python tools/gym_simulator.py serve --port 8765 --open-delay 5 --fit-logs
+  python tools/gym_simulator.py bench --times 18:00,19:00 --blocks 2 --rate-limit-interval 0.5 --fit-logs
+"""
+
+from __future__ import annotations
+
+import argparse
+import glob
+import json
+import math
+import os
+import random
+import re
+import sys
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WEB_BOOKER_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STATE_AVAILABLE = 1
+STATE_MINE = 2
+STATE_BOOKED = 4
+STATE_LOCKED = 6
+
+DEFAULT_SELLOUT = "0:0,1:0.35,3:0.7,10:0.9,30:0.97"
+MSG_RATE_LIMITED = "操作过快，请稍后再试"
+MSG_TAKEN = "该场地已被预订，请重新选择"
+MSG_NOT_OPEN = "未到开放时间，不可预约"
+MSG_TOKEN = "token失效，请重新登录"
+
+
+def parse_sellout_curve(spec: str) -> list:
+    """"秒:比例,..." → 按秒升序的 [(t, frac)]；比例单调不减并截到 [0,1]。"""
+    points = []
+    for part in str(spec or "").split(","):
+        part = part.strip()
+        if not part:
+            continue
+        t_s, _, frac_s = part.partition(":")
+        points.append((max(0.0, float(t_s)), max(0.0, min(1.0, float(frac_s)))))
+    points.sort()
+    if not points or points[0][0] > 0:
+        points.insert(0, (0.0, 0.0))
+    out = []
+    hi = 0.0
+    for t, f in points:
+        hi = max(hi, f)
+        out.append((t, hi))
+    return out
+
+
+def sellout_time_for_quantile(curve: list, u: float):
+    """售罄曲线的反函数：比例 u 的格子在开约后第几秒被他人抢走；u 超过曲线终值返回 None（始终不被抢）。"""
+    if u > curve[-1][1]:
+        return None
+    for (t0, f0), (t1, f1) in zip(curve, curve[1:]):
+        if u <= f1:
+            if f1 <= f0:
+                return t0
+            return t0 + (t1 - t0) * (u - f0) / (f1 - f0)
+    return curve[0][0]
+
+
+class LatencyModel:
+    """单类请求的服务端时延：有样本时有放回重放，否则对数正态（中位数 median_ms）。scale 整体缩放。"""
+
+    def __init__(self, samples_ms=None, median_ms=30.0, sigma=0.5, scale=1.0, rng=None):
+        self.samples_ms = sorted(float(x) for x in (samples_ms or []) if x is not None and float(x) >= 0)
+        self.median_ms = max(0.0, float(median_ms))
+        self.sigma = max(0.0, float(sigma))
+        self.scale = max(0.0, float(scale))
+        self._rng = rng or random.Random()
+
+    def sample_seconds(self) -> float:
+        if self.scale <= 0:
+            return 0.0
+        if self.samples_ms:
+            ms = self._rng.choice(self.samples_ms)
+        elif self.median_ms <= 0:
+            return 0.0
+        else:
+            ms = self._rng.lognormvariate(math.log(self.median_ms), self.sigma)
+        return ms * self.scale / 1000.0
+
+    def describe(self) -> str:
+        if self.samples_ms:
+            n = len(self.samples_ms)
+            p50 = self.samples_ms[n // 2]
+            p90 = self.samples_ms[min(n - 1, int(n * 0.9))]
+            return f"samples n={n} p50={p50:.0f}ms p90={p90:.0f}ms x{self.scale:g}"
+        return f"lognormal median={self.median_ms:.0f}ms sigma={self.sigma:g} x{self.scale:g}"
+
+
+_MATRIX_ELAPSED_RE = re.compile(r"矩阵完成 .*?elapsed_ms=(\d+)")
+
+
+def fit_from_logs(root: str = WEB_BOOKER_ROOT) -> dict:
+    """
+    从线上记录拟合时延：
+    - post_ms：任务指标各次运行的 post_latencies_ms（task_run_metrics/seg_*.ndjson，兼容未迁移的 task_run_metrics.json）；
+      不读 submit_latencies_ms——任务级那里还混着整次递送的墙钟时间，不是单次 POST 时延
+    - matrix_ms：logs/run_*.log 中「矩阵完成 ... elapsed_ms=N」（0 视为缓存命中，不计入）
+    """
+    post_ms, matrix_ms = [], []
+    rows = []
+    try:
+        with open(os.path.join(root, "task_run_metrics.json"), "r", encoding="utf-8") as f:
+            legacy = json.load(f)
+        rows.extend(legacy if isinstance(legacy, list) else [])
+    except (OSError, ValueError):
+        pass
+    for path in sorted(glob.glob(os.path.join(root, "task_run_metrics", "seg_*.ndjson"))):
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    try:
+                        rows.append(json.loads(line))
+                    except ValueError:
+                        continue
+        except OSError:
+            continue
+    for row in rows:
+        if not isinstance(row, dict):
+            continue
+        for x in row.get("post_latencies_ms") or []:
+            try:
+                post_ms.append(float(x))
+            except (TypeError, ValueError):
+                continue
+    for path in sorted(glob.glob(os.path.join(root, "logs", "run_*.log"))):
+        try:
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                for line in f:
+                    m = _MATRIX_ELAPSED_RE.search(line)
+                    if m and int(m.group(1)) > 0:
+                        matrix_ms.append(float(m.group(1)))
+        except OSError:
+            continue
+    return {"post_ms": post_ms, "matrix_ms": matrix_ms}
+
+
+class GymSimulatorState:
+    """
+    模拟器的场地/订单状态（线程安全）。开约时刻 open_at 为 time.time() 基准；
+    每格按售罄曲线预抽「被他人抢走」的秒数，查询时按当前时刻判定，不需要后台线程推进。
+    """
+
+    def __init__(
+        self,
+        places=20,
+        times=None,
+        open_delay_s=0.0,
+        sellout=DEFAULT_SELLOUT,
+        rate_limit_interval_s=5.0,
+        latency=None,
+        seed=None,
+    ):
+        self.places = [str(p) for p in range(1, int(places) + 1)]
+        self.times = list(times or [f"{h:02d}:00" for h in range(8, 22)])
+        self.open_at = time.time() + max(0.0, float(open_delay_s))
+        self.curve = parse_sellout_curve(sellout)
+        self.rate_limit_interval_s = max(0.0, float(rate_limit_interval_s))
+        self.latency = dict(latency or {})
+        rng = random.Random(seed)
+        self._taken_at = {}
+        for p in self.places:
+            for t in self.times:
+                self._taken_at[(p, t)] = sellout_time_for_quantile(self.curve, rng.random())
+        self._owner = {}
+        self._orders = {}
+        self._last_post = {}
+        self._lock = threading.Lock()
+        self.events = []
+
+    def _elapsed(self, now=None):
+        return (time.time() if now is None else now) - self.open_at
+
+    def _cell_state_locked(self, p, t, token, elapsed):
+        owner = self._owner.get((p, t))
+        if owner is not None:
+            return STATE_MINE if owner == token else STATE_BOOKED
+        if elapsed < 0:
+            return STATE_LOCKED
+        taken = self._taken_at.get((p, t))
+        if taken is not None and elapsed >= taken:
+            return STATE_BOOKED
+        return STATE_AVAILABLE
+
+    def place_info(self, token, date_str):
+        elapsed = self._elapsed()
+        with self._lock:
+            place_array = [
+                {
+                    "projectName": {"shortname": f"ymq{p}"},
+                    "projectInfo": [
+                        {
+                            "starttime": t,
+                            "endtime": (datetime.strptime(t, "%H:%M") + timedelta(hours=1)).strftime("%H:%M"),
+                            "state": self._cell_state_locked(p, t, token, elapsed),
+                        }
+                        for t in self.times
+                    ],
+                }
+                for p in self.places
+            ]
+            self.events.append({"ts": time.time(), "kind": "matrix", "token": token})
+        return {"msg": "success", "data": json.dumps({"placeArray": place_array}, ensure_ascii=False)}
+
+    def reserve(self, form):
+        token = str(form.get("token") or "")
+        now = time.time()
+        if not token:
+            return {"msg": MSG_TOKEN, "data": ""}
+        try:
+            rows = json.loads(form.get("fieldinfo") or "[]")
+        except ValueError:
+            rows = []
+        cells = []
+        for row in rows if isinstance(rows, list) else []:
+            m = re.search(r"(\d+)", str(row.get("placeShortName") or ""))
+            if not m:
+                continue
+            try:
+                cur = datetime.strptime(str(row.get("startTime")), "%H:%M")
+                end = datetime.strptime(str(row.get("endTime")), "%H:%M")
+            except (TypeError, ValueError):
+                continue
+            while cur < end:
+                cells.append((m.group(1), cur.strftime("%H:%M"), str(row.get("day") or "")))
+                cur += timedelta(hours=1)
+        with self._lock:
+            last = self._last_post.get(token)
+            self._last_post[token] = now
+            if last is not None and now - last < self.rate_limit_interval_s:
+                outcome, resp = "rate_limited", {"msg": "fail", "data": MSG_RATE_LIMITED}
+            elif self._elapsed(now) < 0:
+                outcome, resp = "not_open", {"msg": "fail", "data": MSG_NOT_OPEN}
+            elif not cells or any(
+                self._cell_state_locked(p, t, token, self._elapsed(now)) != STATE_AVAILABLE for p, t, _d in cells
+            ):
+                outcome, resp = "taken", {"msg": "fail", "data": MSG_TAKEN}
+            else:
+                for p, t, _d in cells:
+                    self._owner[(p, t)] = token
+                self._orders.setdefault(token, []).append(
+                    {
+                        "showStatus": "0",
+                        "prestatus": "已预约",
+                        "readydate": cells[0][2],
+                        "jsonArray": [
+                            {
+                                "reversionDate": d,
+                                "siteName": f"羽毛球{p}",
+                                "start": t,
+                                "end": (datetime.strptime(t, "%H:%M") + timedelta(hours=1)).strftime("%H:%M"),
+                            }
+                            for p, t, d in cells
+                        ],
+                    }
+                )
+                outcome, resp = "accepted", {"msg": "success", "data": "预约成功"}
+            self.events.append(
+                {"ts": now, "kind": "post", "token": token, "outcome": outcome, "cells": [(p, t) for p, t, _d in cells]}
+            )
+        return resp
+
+    def place_orders(self, token, page_no, page_size):
+        with self._lock:
+            orders = list(self._orders.get(token) or [])
+        start = max(0, int(page_no)) * max(1, int(page_size))
+        return {"msg": "success", "data": orders[start:start + max(1, int(page_size))]}
+
+    def summary(self, token, since_ts=None):
+        """某 token 的结果：抢到格数、POST 次数/各结果计数、首个受理距 since_ts 的毫秒数。"""
+        with self._lock:
+            posts = [e for e in self.events if e["kind"] == "post" and e["token"] == token]
+            won = sorted(k for k, v in self._owner.items() if v == token)
+        outcomes = {}
+        for e in posts:
+            outcomes[e["outcome"]] = outcomes.get(e["outcome"], 0) + 1
+        first_accept = next((e["ts"] for e in posts if e["outcome"] == "accepted"), None)
+        base = self.open_at if since_ts is None else since_ts
+        return {
+            "cells_won": len(won),
+            "won": won,
+            "post_count": len(posts),
+            "outcomes": outcomes,
+            "t_first_accept_ms": None if first_accept is None else int(max(0.0, first_accept - base) * 1000),
+        }
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, fmt, *args):  # noqa: D401 — 静默默认访问日志
+        return
+
+    def _sleep(self, kind):
+        model = self.server.state.latency.get(kind)
+        if model is not None:
+            time.sleep(model.sample_seconds())
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json;charset=UTF-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        parsed = urllib.parse.urlparse(self.path)
+        qs = {k: v[-1] for k, v in urllib.parse.parse_qs(parsed.query, keep_blank_values=True).items()}
+        state = self.server.state
+        if parsed.path.endswith("/place/getPlaceInfoByShortName"):
+            self._sleep("matrix")
+            self._send_json(state.place_info(qs.get("token", ""), qs.get("dateymd", "")))
+        elif parsed.path.endswith("/place/getPlaceOrder"):
+            self._sleep("orders")
+            self._send_json(state.place_orders(qs.get("token", ""), qs.get("pageNo", 0), qs.get("pageSize", 20)))
+        else:
+            self._send_json({"msg": "not found"}, status=404)
+
+    def do_POST(self):
+        parsed = urllib.parse.urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length).decode("utf-8", errors="replace") if length else ""
+        form = {k: v[-1] for k, v in urllib.parse.parse_qs(raw, keep_blank_values=True).items()}
+        if parsed.path.endswith("/place/reservationPlace"):
+            self._sleep("post")
+            self._send_json(self.server.state.reserve(form))
+        else:
+            self._send_json({"msg": "not found"}, status=404)
+
+
+def start_simulator(state: GymSimulatorState, host: str = "127.0.0.1", port: int = 0):
+    """后台线程起模拟器；返回的 server.base_url 可直接赋给 ApiClient.gym_base_url。用完 server.shutdown()。"""
+    server = ThreadingHTTPServer((host, int(port)), _Handler)
+    server.daemon_threads = True
+    server.state = state
+    server.base_url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, name="gym-simulator", daemon=True).start()
+    return server
+
+
+def _build_latency(args, rng) -> dict:
+    fitted = fit_from_logs() if args.fit_logs else {}
+    scale = float(args.latency_scale)
+    return {
+        "matrix": LatencyModel(fitted.get("matrix_ms"), median_ms=args.matrix_ms, scale=scale, rng=rng),
+        "post": LatencyModel(fitted.get("post_ms"), median_ms=args.post_ms, scale=scale, rng=rng),
+        "orders": LatencyModel(None, median_ms=args.matrix_ms, scale=scale, rng=rng),
+    }
+
+
+def _new_state(args, latency) -> GymSimulatorState:
+    times = [t.strip() for t in str(args.all_times or "").split(",") if t.strip()] or None
+    return GymSimulatorState(
+        places=args.places,
+        times=times,
+        open_delay_s=args.open_delay,
+        sellout=args.sellout,
+        rate_limit_interval_s=args.rate_limit_interval,
+        latency=latency,
+        seed=args.seed,
+    )
+
+
+def _run_bench(args, latency) -> list:
+    import app as booker  # noqa: E402 — 需在 main() 设好 sys.path / 环境变量之后
+
+    target_times = [t.strip() for t in str(args.times).split(",") if t.strip()]
+    date_str = (datetime.now() + timedelta(days=1)).strftime("%Y-%m-%d")
+    saved_cfg = {k: booker.CONFIG.get(k) for k in ("delivery_min_post_interval_seconds", "delivery_total_budget_seconds")}
+    booker.CONFIG["delivery_min_post_interval_seconds"] = float(args.rate_limit_interval)
+    booker.CONFIG["delivery_total_budget_seconds"] = float(args.budget)
+    rows = []
+    try:
+        for mode in [m.strip() for m in str(args.modes).split(",") if m.strip()]:
+            state = _new_state(args, latency)
+            server = start_simulator(state)
+            try:
+                client = booker.ApiClient(inherit_global_auth=False)
+                client.gym_base_url = server.base_url
+                client.token = f"bench-{mode}"
+                client.shop_num = "1001"
+                client.card_index = "0"
+                client.card_st_id = "cs"
+                client.delivery_max_places_per_timeslot = int(args.blocks)
+                groups = [
+                    {
+                        "id": "primary",
+                        "label": "主",
+                        "items": [{"place": str(i + 1), "time": t} for i in range(int(args.blocks)) for t in target_times],
+                    }
+                ]
+                tc = {
+                    "delivery_target_blocks": int(args.blocks),
+                    "delivery_target_times": target_times,
+                    "delivery_time_preference_order": target_times,
+                    "delivery_matrix_place_min": 1,
+                    "delivery_matrix_place_max": int(args.places),
+                    "interval_post_consecutive_hours": max(1, min(3, len(target_times))),
+                    "target_count": int(args.blocks) * len(target_times),
+                }
+                started = time.time()
+                if mode == "interval":
+                    res = client.submit_interval_post_campaign(date_str, groups, task_config=tc)
+                else:
+                    res = client.submit_delivery_campaign(date_str, groups, task_config=tc, skip_warmup=True)
+                wall_ms = int((time.time() - started) * 1000)
+                summ = state.summary(client.token, since_ts=max(started, state.open_at))
+                rows.append(
+                    {
+                        "mode": mode,
+                        "status": (res or {}).get("status"),
+                        "stopped_by": ((res or {}).get("run_metric") or {}).get("stopped_by"),
+                        "wall_ms": wall_ms,
+                        **summ,
+                    }
+                )
+            finally:
+                server.shutdown()
+                server.server_close()
+    finally:
+        booker.CONFIG.update(saved_cfg)
+    return rows
+
+
+def main() -> None:
+    os.chdir(WEB_BOOKER_ROOT)
+    if WEB_BOOKER_ROOT not in sys.path:
+        sys.path.insert(0, WEB_BOOKER_ROOT)
+    # bench 会 import app；跳过后台调度，避免仅跑模拟时拉起定时线程
+    os.environ["BEIJINTICK_SKIP_IMPORT_SCHEDULER"] = "1"
+
+    parser = argparse.ArgumentParser(description="离线馆方模拟器 / 递送策略离线对比")
+    parser.add_argument("command", choices=("serve", "bench"), help="serve 仅起模拟器；bench 起模拟器并跑递送对比")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765, help="serve 监听端口（bench 用随机端口）")
+    parser.add_argument("--places", type=int, default=20, help="场地数（1..N）")
+    parser.add_argument("--all-times", default="", help="逗号分隔的全部时段；默认 08:00..21:00 整点")
+    parser.add_argument("--open-delay", type=float, default=0.0, help="启动后多少秒开约（之前全部 locked）")
+    parser.add_argument("--sellout", default=DEFAULT_SELLOUT, help="售罄曲线 秒:比例,...（开约后累计被他人抢走的比例）")
+    parser.add_argument("--rate-limit-interval", type=float, default=5.0, help="同 token 两次下单最小间隔秒，不足返回操作过快")
+    parser.add_argument("--matrix-ms", type=float, default=120.0, help="矩阵时延中位数（无拟合样本时）")
+    parser.add_argument("--post-ms", type=float, default=400.0, help="下单时延中位数（无拟合样本时）")
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="时延整体缩放，0 为不等待")
+    parser.add_argument("--fit-logs", action="store_true", help="按任务指标 / logs/run_*.log 拟合时延")
+    parser.add_argument("--seed", type=int, default=20261018)
+    parser.add_argument("--modes", default="delivery,interval", help="bench：delivery=submit_delivery_campaign，interval=submit_interval_post_campaign")
+    parser.add_argument("--times", default="18:00,19:00", help="bench：目标时段")
+    parser.add_argument("--blocks", type=int, default=2, help="bench：每时段目标场地数（亦作账号每时段上限）")
+    parser.add_argument("--budget", type=float, default=30.0, help="bench：delivery_total_budget_seconds")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    latency = _build_latency(args, rng)
+    for kind, model in latency.items():
+        print(f"latency[{kind}] {model.describe()}")
+
+    if args.command == "serve":
+        server = start_simulator(_new_state(args, latency), host=args.host, port=args.port)
+        print(f"模拟器已启动 {server.base_url}；设 BEIJINTICK_GYM_BASE_URL={server.base_url} 后启动 app 即可指向它")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            server.shutdown()
+        return
+
+    for row in _run_bench(args, latency):
+        print(
+            f"{row['mode']:>9}  status={row['status']} stopped_by={row['stopped_by']} "
+            f"first_accept={row['t_first_accept_ms']}ms cells_won={row['cells_won']} "
+            f"posts={row['post_count']} outcomes={row['outcomes']} wall={row['wall_ms']}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()